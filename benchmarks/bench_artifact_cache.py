@@ -0,0 +1,75 @@
+"""
+Time saved by the artifact cache when the same images and plan are re-run.
+
+Runs the bulk pipeline over synthetic images with a Warp + Rain plan once per
+prompt, against the offline FakeBackend with no latency, with and without an
+ArtifactCache, and prints the time per pass and the cache hit rate.
+
+Usage:
+    python benchmarks/bench_artifact_cache.py --images 4 --size 3840 2160 --passes 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from artifact_cache import ArtifactCache  # noqa: E402
+from backends import FakeBackend  # noqa: E402
+from bulk import run_bulk_analysis  # noqa: E402
+from distortion_plan import DistortionPlan  # noqa: E402
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([
+    {'type': 'Warp', 'intensity': 0.4},
+    {'type': 'Rain', 'intensity': 0.5},
+])
+
+
+def run_passes(paths, passes, artifact_cache):
+    backend = FakeBackend()
+    times = []
+    for i in range(passes):
+        items = [(path, PLAN, f"Prompt {i}") for path in paths]
+        start = time.perf_counter()
+        for *_, error in run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=backend,
+                                           artifact_cache=artifact_cache):
+            if error is not None:
+                raise error
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--size", type=int, nargs=2, default=[3840, 2160], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--passes", type=int, default=3, help="Runs over the same images, each with a new prompt")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(directory, f"image_{i}.png")
+            small = rng.integers(0, 256, size=(9, 16, 3), dtype=np.uint8)
+            Image.fromarray(small).resize(tuple(args.size), Image.BILINEAR).save(path)
+            paths.append(path)
+
+        print(f"{args.images} images at {args.size[0]}x{args.size[1]}, plan: {PLAN.describe()}")
+        uncached = run_passes(paths, args.passes, None)
+        cache = ArtifactCache(os.path.join(directory, "artifacts"))
+        cached = run_passes(paths, args.passes, cache)
+        print(f"{'pass':>5} {'uncached s':>11} {'cached s':>9}")
+        for i, (a, b) in enumerate(zip(uncached, cached)):
+            print(f"{i + 1:>5} {a:>11.2f} {b:>9.2f}")
+        print(f"total {sum(uncached):>11.2f} {sum(cached):>9.2f}   hit rate {cache.hit_rate:.0%}, "
+              f"{cache.size / (1024 * 1024):.1f} MB cached")
+
+
+if __name__ == "__main__":
+    main()
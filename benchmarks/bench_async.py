@@ -0,0 +1,83 @@
+"""
+Throughput of the async API against the threaded bulk pipeline.
+
+Analyses the same synthetic images through run_bulk_analysis with a thread pool
+and through async_api.analyze_many on one event loop, both against the offline
+FakeBackend, and prints wall time, throughput and the number of threads used.
+Images are small by default so that request latency, not encoding, dominates.
+
+Usage:
+    python benchmarks/bench_async.py --images 2000 --latency-mean 0.2 --workers 64 --in-flight 1000
+"""
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from async_api import AnalysisLimiter, analyze_many  # noqa: E402
+from backends import FakeBackend  # noqa: E402
+from bulk import encode_image, run_bulk_analysis  # noqa: E402
+from distortion_plan import DistortionPlan  # noqa: E402
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{'type': 'Brightness', 'intensity': 0.3}])
+
+
+def make_images(count, size):
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 256, size=(9, 16, 3), dtype=np.uint8)).resize(size, Image.BILINEAR)
+    return [encode_image(base) for _ in range(count)]
+
+
+def run_threaded(images, backend, workers):
+    items = [(io.BytesIO(data), PLAN, f"Prompt {i}") for i, data in enumerate(images)]
+    for i, (file, _, _) in enumerate(items):
+        file.name = f"image_{i}.png"
+    peak_threads = 0
+    start = time.perf_counter()
+    for _ in run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=backend, max_workers=workers):
+        peak_threads = max(peak_threads, threading.active_count())
+    return time.perf_counter() - start, peak_threads
+
+
+def run_async(images, backend, in_flight):
+    async def main():
+        limiter = AnalysisLimiter(max_in_flight=in_flight)
+        items = [(data, PLAN, f"Prompt {i}") for i, data in enumerate(images)]
+        try:
+            start = time.perf_counter()
+            await analyze_many(items, "models/fake-flash", None, FIELDS, backend=backend, limiter=limiter)
+            return time.perf_counter() - start, threading.active_count()
+        finally:
+            limiter.shutdown()
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--size", type=int, nargs=2, default=[64, 36], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--latency-mean", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=64, help="Threads for the threaded pipeline")
+    parser.add_argument("--in-flight", type=int, default=1000, help="max_in_flight for the async pipeline")
+    args = parser.parse_args()
+
+    images = make_images(args.images, tuple(args.size))
+    print(f"{args.images} images at {args.size[0]}x{args.size[1]}, latency {args.latency_mean}s")
+    print(f"{'pipeline':>24} {'seconds':>8} {'images/s':>9} {'threads':>8}")
+    elapsed, threads = run_threaded(images, FakeBackend(latency_mean=args.latency_mean), args.workers)
+    print(f"{f'threaded ({args.workers} workers)':>24} {elapsed:>8.2f} {args.images / elapsed:>9.1f} {threads:>8}")
+    elapsed, threads = run_async(images, FakeBackend(latency_mean=args.latency_mean), args.in_flight)
+    print(f"{f'async ({args.in_flight} in flight)':>24} {elapsed:>8.2f} {args.images / elapsed:>9.1f} {threads:>8}")
+
+
+if __name__ == "__main__":
+    main()
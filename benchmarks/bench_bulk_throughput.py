@@ -0,0 +1,114 @@
+"""
+Throughput benchmark for the bulk analysis path.
+
+Drives run_bulk_analysis and build_results_dataframe end to end against the
+offline FakeBackend, so it runs on a machine with no network access.
+
+Usage:
+    python benchmarks/bench_bulk_throughput.py --images 200 --workers 1 4 16 --latency-mean 0.2
+    python benchmarks/bench_bulk_throughput.py --images 50 --models models/fake-flash models/fake-pro
+"""
+import os
+import io
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from backends import FakeBackend, LATENCY_DISTRIBUTIONS  # noqa: E402
+from bulk import run_bulk_analysis, build_results_dataframe  # noqa: E402
+from distortion_plan import DistortionPlan  # noqa: E402
+
+EXPECTED_JSON_FIELDS = [
+    "scene_description",
+    "safety_features",
+    "potential_hazards",
+    "suggested_improvements",
+    "overall_safety"
+]
+
+PLAN = DistortionPlan.from_distortions([
+    {'type': 'Blur', 'intensity': 0.2},
+    {'type': 'Brightness', 'intensity': 0.3},
+])
+
+
+def make_images(count, size, seed=0):
+    """Encodes `count` synthetic PNG images (smooth blocks plus light noise) in memory."""
+    rng = np.random.default_rng(seed)
+    files = []
+    for i in range(count):
+        blocks = rng.integers(0, 256, size=(9, 16, 3), dtype=np.uint8)
+        image = Image.fromarray(blocks).resize(size, Image.BILINEAR)
+        noise = rng.integers(-8, 9, size=(size[1], size[0], 3))
+        pixels = np.clip(np.asarray(image, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='PNG')
+        files.append((f"image_{i:05d}.png", buffer.getvalue()))
+    return files
+
+
+def run_once(files, workers, backend_kwargs, models):
+    backend = FakeBackend(**backend_kwargs)
+    items = []
+    for name, data in files:
+        file = io.BytesIO(data)
+        file.name = name
+        items.append((file, PLAN, "Analyze the road safety features visible in this image."))
+
+    results = []
+    errors = 0
+    start = time.perf_counter()
+    for _, _, result, error in run_bulk_analysis(items, models, None, EXPECTED_JSON_FIELDS,
+                                                 backend=backend, max_workers=workers):
+        if error is not None:
+            errors += 1
+        else:
+            results.append(result)
+    if results:
+        build_results_dataframe(results, EXPECTED_JSON_FIELDS)
+    elapsed = time.perf_counter() - start
+    return elapsed, errors, backend.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 360], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--models", nargs="+", default=["models/fake-flash"],
+                        help="Several models fan each prepared image out to all of them")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.1)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--safety-block-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-json-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files = make_images(args.images, tuple(args.size), seed=args.seed)
+    backend_kwargs = {
+        "latency": args.latency,
+        "latency_mean": args.latency_mean,
+        "latency_spread": args.latency_spread,
+        "rate_limit_rate": args.rate_limit_rate,
+        "safety_block_rate": args.safety_block_rate,
+        "malformed_json_rate": args.malformed_json_rate,
+        "seed": args.seed,
+    }
+
+    print(f"{args.images} images at {args.size[0]}x{args.size[1]}, latency={args.latency} "
+          f"mean={args.latency_mean}s spread={args.latency_spread}, models: {', '.join(args.models)}")
+    print(f"{'workers':>8} {'seconds':>9} {'images/s':>9} {'errors':>7} {'429s':>5} {'blocked':>8} {'malformed':>10}")
+    for workers in args.workers:
+        elapsed, errors, stats = run_once(files, workers, backend_kwargs, args.models)
+        print(f"{workers:>8} {elapsed:>9.2f} {args.images / elapsed:>9.1f} {errors:>7} "
+              f"{stats['rate_limited']:>5} {stats['blocked']:>8} {stats['malformed']:>10}")
+
+
+if __name__ == "__main__":
+    main()
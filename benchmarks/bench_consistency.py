@@ -0,0 +1,68 @@
+"""
+Cost and accuracy of self-consistency sampling against a noisy model.
+
+The fake backend answers each request with its canonical verdict, except for
+a `--variability` share of calls that get a random one. For each setting the
+benchmark prints the model calls spent per image and how often the returned
+overall_safety matches the canonical one: single calls, a fixed number of
+samples (early stopping disabled), and early stopping at a few thresholds.
+
+Usage:
+    python benchmarks/bench_consistency.py --images 200 --variability 0.3 --max-samples 5
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from backends import FakeBackend  # noqa: E402
+from consistency import SelfConsistency  # noqa: E402
+from utils import get_gemini_response  # noqa: E402
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--variability", type=float, default=0.3)
+    parser.add_argument("--max-samples", type=int, default=5)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.8, 1.0])
+    parser.add_argument("--latency-mean", type=float, default=0.0)
+    args = parser.parse_args()
+
+    prompts = [f"Describe road scene {i}" for i in range(args.images)]
+    canonical = [get_gemini_response(prompt, None, "models/fake-flash", None, FIELDS, backend=FakeBackend())[1]
+                 ["overall_safety"] for prompt in prompts]
+
+    def run(consistency):
+        backend = FakeBackend(variability=args.variability, latency_mean=args.latency_mean, seed=0)
+        start = time.perf_counter()
+        correct = 0
+        for prompt, expected in zip(prompts, canonical):
+            if consistency is None:
+                _, response = get_gemini_response(prompt, None, "models/fake-flash", None, FIELDS, backend=backend)
+            else:
+                _, response, _ = consistency.respond(prompt, None, "models/fake-flash", None, FIELDS, backend=backend)
+            correct += response.get("overall_safety") == expected
+        elapsed = time.perf_counter() - start
+        if consistency is not None:
+            consistency.shutdown()
+        return backend.stats["calls"] / len(prompts), correct / len(prompts), elapsed
+
+    print(f"{args.images} images, {args.variability:.0%} of calls answered at random")
+    print(f"{'setting':>26} {'calls/image':>12} {'correct':>8} {'seconds':>8}")
+    settings = [("single call", None),
+                (f"fixed {args.max_samples} samples",
+                 SelfConsistency(max_samples=args.max_samples, min_samples=args.max_samples))]
+    settings += [(f"early stop at {threshold:.2f}", SelfConsistency(max_samples=args.max_samples, threshold=threshold))
+                 for threshold in args.thresholds]
+    for label, consistency in settings:
+        calls, accuracy, elapsed = run(consistency)
+        print(f"{label:>26} {calls:>12.2f} {accuracy:>8.1%} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
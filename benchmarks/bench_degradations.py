@@ -0,0 +1,55 @@
+"""
+Time per frame of each distortion, at a few intensities, on 1080p frames.
+
+Uses a synthetic noisy frame so compression and blurs have detail to work on.
+Run it before and after changing a kernel; anything much above a quarter of a
+second per 1080p frame makes bulk sweeps slow.
+
+Usage:
+    python benchmarks/bench_degradations.py --size 1920 1080 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from distortion_plan import DistortionPlan, DistortionStep  # noqa: E402
+
+DISTORTIONS = [
+    ("Fog", {}), ("Snow", {}), ("Night", {}), ("Glare", {}), ("Motion Blur", {}),
+    ("Motion Blur", {"angle": 30.0}), ("JPEG", {}),
+    # Existing distortions, for comparison
+    ("Blur", {}), ("Rain", {}), ("Warp", {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs=2, default=[1920, 1080], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--intensities", type=float, nargs="+", default=[0.25, 0.5, 1.0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = Image.effect_noise(tuple(args.size), 40).convert("RGB")
+    print(f"{args.size[0]}x{args.size[1]} frame, best of {args.repeat}, seconds per frame")
+    print(f"{'distortion':<22}" + "".join(f"{intensity:>8.2f}" for intensity in args.intensities))
+    for distortion_type, params in DISTORTIONS:
+        label = distortion_type + (f" {params['angle']:.0f}°" if "angle" in params else "")
+        timings = []
+        for intensity in args.intensities:
+            step = DistortionStep(distortion_type, tuple(sorted(dict(params, intensity=intensity).items())))
+            compiled = DistortionPlan((step,)).compile()
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                compiled.apply(frame, seed=0)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+        print(f"{label:<22}" + "".join(f"{timing:>8.3f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Log volume and overhead of the distortion path at different log levels.
+
+Applies a distortion plan to synthetic images with the platform logger set to
+each level in turn, counting the records and bytes that would be written.
+
+Usage:
+    python benchmarks/bench_diagnostics.py --images 50 --levels WARNING DEBUG TRACE --sample-every 1 100
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import diagnostics  # noqa: E402
+import utils  # noqa: E402
+from diagnostics import ROOT_LOGGER, CountingHandler, Sampler, configure_logging  # noqa: E402
+from distortion_plan import DistortionPlan  # noqa: E402
+
+PLAN = DistortionPlan.from_distortions([
+    {'type': 'Color', 'saturation': 1.4, 'hue_shift': 0.1},
+    {'type': 'Blur', 'intensity': 0.1},
+    {'type': 'Warp', 'intensity': 0.4},
+])
+
+
+def make_images(count, size, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        Image.fromarray(rng.integers(0, 256, size=(9, 16, 3), dtype=np.uint8)).resize(size, Image.BILINEAR)
+        for _ in range(count)
+    ]
+
+
+def run_once(images, level, sample_every):
+    configure_logging(level=level, module_levels={}, force=True)
+    root = logging.getLogger(ROOT_LOGGER)
+    saved_handlers = root.handlers[:]
+    counter = CountingHandler()
+    root.handlers = [counter]
+    utils._distortion_sampler = Sampler(sample_every)
+    compiled = PLAN.compile()
+    try:
+        start = time.perf_counter()
+        for image in images:
+            compiled.apply(image)
+        elapsed = time.perf_counter() - start
+    finally:
+        root.handlers = saved_handlers
+    return elapsed, counter.records, counter.bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 360], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--levels", nargs="+", default=["WARNING", "DEBUG", "TRACE"])
+    parser.add_argument("--sample-every", type=int, nargs="+", default=[1, diagnostics.DEFAULT_SAMPLE_EVERY])
+    args = parser.parse_args()
+
+    images = make_images(args.images, tuple(args.size))
+    # Warm up imports and caches so the first level measured is not penalised
+    run_once(images[:1], "WARNING", 1)
+
+    print(f"{args.images} images at {args.size[0]}x{args.size[1]}, plan: {PLAN.describe()}")
+    print(f"{'level':>8} {'sample':>7} {'ms/image':>9} {'records':>8} {'bytes':>9}")
+    for level in args.levels:
+        for sample_every in args.sample_every:
+            elapsed, records, size = run_once(images, level, sample_every)
+            print(f"{level:>8} {sample_every:>7} {elapsed / args.images * 1000:>9.2f} {records:>8} {size:>9}")
+
+
+if __name__ == "__main__":
+    main()
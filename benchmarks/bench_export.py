@@ -0,0 +1,62 @@
+"""
+Throughput of the augmentation export with increasing numbers of worker processes.
+
+Writes synthetic source images to a temporary folder, exports them under a few
+distortion plans with N workers, and prints variants per second, the speedup
+over rendering in-process, and the peak memory of the parent process, which
+should not grow with the number of variants.
+
+Usage:
+    python benchmarks/bench_export.py --images 200 --workers 0 1 2 4
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from distortion_plan import DistortionPlan  # noqa: E402
+from export import export_augmentations  # noqa: E402
+
+PLANS = [
+    DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.3}]),
+    DistortionPlan.from_distortions([{'type': 'Rain', 'intensity': 0.4}]),
+    DistortionPlan.from_distortions([{'type': 'Warp', 'intensity': 0.5}]),
+    DistortionPlan.from_distortions([{'type': 'Brightness', 'intensity': 0.2}, {'type': 'Rain', 'intensity': 0.2}]),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--size", type=int, nargs=2, default=[320, 180], metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = os.path.join(directory, "source")
+        os.makedirs(source_dir)
+        for i in range(args.images):
+            Image.new('RGB', tuple(args.size), color=(i % 256, 80, 160)).save(os.path.join(source_dir, f"image_{i}.png"))
+
+        variants = args.images * len(PLANS)
+        print(f"{variants} variants of {args.size[0]}x{args.size[1]} images, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>8} {'variants/s':>11} {'speedup':>8} {'peak RSS MB':>12}")
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            summary = export_augmentations(source_dir, PLANS, os.path.join(directory, f"out_{workers}"),
+                                           workers=workers)
+            elapsed = time.perf_counter() - start
+            throughput = summary["written"] / elapsed
+            baseline = baseline or throughput
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{workers:>8} {elapsed:>8.2f} {throughput:>11.1f} {throughput / baseline:>7.2f}x {peak_mb:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
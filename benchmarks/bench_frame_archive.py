@@ -0,0 +1,80 @@
+"""
+Frame read time from a packed archive versus decoding the source files.
+
+Writes synthetic JPEG frames to a temporary folder, packs them, then reads
+every frame several times, as a sweep over many grid points would, both by
+decoding the JPEGs and from the memory-mapped archive. Prints milliseconds per
+frame and the speedup.
+
+Usage:
+    python benchmarks/bench_frame_archive.py --images 50 --size 1920 1080 --passes 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from frame_archive import FrameArchive, pack_images  # noqa: E402
+from utils import open_image  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--size", type=int, nargs=2, default=[1920, 1080], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--passes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_dir = os.path.join(directory, "images")
+        os.makedirs(source_dir)
+        rng = np.random.default_rng(0)
+        width, height = args.size
+        for i in range(args.images):
+            # Smooth noise compresses like a photograph rather than like flat colour
+            coarse = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+            Image.fromarray(coarse).resize((width, height), Image.BILINEAR).save(
+                os.path.join(source_dir, f"frame_{i:05d}.jpg"), quality=90)
+
+        start = time.perf_counter()
+        archive_path = os.path.join(directory, "images.frames")
+        pack_images(source_dir, archive_path)
+        pack_seconds = time.perf_counter() - start
+        archive = FrameArchive(archive_path)
+        paths = [os.path.join(source_dir, name) for name in archive.names]
+        reads = args.images * args.passes
+        print(f"{args.images} frames of {width}x{height}, packed in {pack_seconds:.2f}s "
+              f"({os.path.getsize(archive_path) / 2 ** 20:.0f} MB)")
+
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            for path in paths:
+                open_image(path).convert("RGB")
+        decode_ms = (time.perf_counter() - start) / reads * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            for item in archive.items():
+                open_image(item)
+        archive_ms = (time.perf_counter() - start) / reads * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.passes):
+            for index in range(len(archive)):
+                archive.frame(index)
+        view_ms = (time.perf_counter() - start) / reads * 1000
+
+        print(f"{'source':>22} {'ms/frame':>9} {'speedup':>8}")
+        print(f"{'JPEG decode':>22} {decode_ms:>9.2f} {1:>7.1f}x")
+        print(f"{'archive (PIL image)':>22} {archive_ms:>9.2f} {decode_ms / archive_ms:>7.1f}x")
+        print(f"{'archive (array view)':>22} {view_ms:>9.3f} {decode_ms / view_ms:>7.0f}x")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Tail latency with and without request hedging.
+
+Sends requests to the offline FakeBackend with a heavy-tailed latency
+distribution, first directly and then through HedgingBackend, and prints
+p50/p95/p99 and a latency histogram for each.
+
+Usage:
+    python benchmarks/bench_hedging.py --requests 1000 --concurrency 16 --hedge-percentile 80 --hedge-budget 0.25
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from backends import FakeBackend, LATENCY_DISTRIBUTIONS  # noqa: E402
+from hedging import HedgingBackend, LatencyTracker  # noqa: E402
+
+CONTENT = ["Analyze the road safety features visible in this image."]
+
+
+def run(backend, requests, concurrency):
+    def call(_):
+        start = time.perf_counter()
+        try:
+            backend.generate_content("models/fake-flash", CONTENT)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(call, range(requests)))
+    wall = time.perf_counter() - start
+    latencies = np.array([latency for latency, error in outcomes if error is None])
+    errors = sum(error is not None for _, error in outcomes)
+    return latencies, errors, wall
+
+
+def histogram(latencies, bins, upper, width=50):
+    counts, edges = np.histogram(np.minimum(latencies, upper), bins=bins, range=(0, upper))
+    scale = width / max(1, counts.max())
+    lines = []
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        label = f"{low:6.2f}-{high:6.2f}s" if high < upper else f"{low:6.2f}s+      "
+        lines.append(f"  {label} {'#' * int(round(count * scale)):<{width}} {count}")
+    return "\n".join(lines)
+
+
+def report(title, latencies, errors, wall, upper, bins):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{title}: p50 {p50:.3f}s  p95 {p95:.3f}s  p99 {p99:.3f}s  max {latencies.max():.3f}s  "
+          f"errors {errors}  wall {wall:.2f}s")
+    print(histogram(latencies, bins, upper))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="Median for lognormal latency")
+    parser.add_argument("--latency-spread", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=None, help="Per-request deadline in seconds")
+    parser.add_argument("--hedge-percentile", type=float, default=80)
+    parser.add_argument("--hedge-budget", type=float, default=0.25)
+    parser.add_argument("--warmup", type=int, default=50, help="Requests used to seed the latency window")
+    parser.add_argument("--bins", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    backend_kwargs = {"latency": args.latency, "latency_mean": args.latency_mean,
+                      "latency_spread": args.latency_spread, "seed": args.seed}
+
+    baseline = run(HedgingBackend(FakeBackend(**backend_kwargs), timeout=args.timeout),
+                   args.requests, args.concurrency)
+
+    tracker = LatencyTracker()
+    hedged_backend = HedgingBackend(FakeBackend(**backend_kwargs), timeout=args.timeout,
+                                    hedge_percentile=args.hedge_percentile, hedge_budget=args.hedge_budget,
+                                    tracker=tracker)
+    run(hedged_backend, args.warmup, args.concurrency)
+    warmup_stats = dict(hedged_backend.stats)
+    hedged = run(hedged_backend, args.requests, args.concurrency)
+    hedges = hedged_backend.stats["hedges"] - warmup_stats["hedges"]
+    wins = hedged_backend.stats["hedge_wins"] - warmup_stats["hedge_wins"]
+
+    upper = float(np.percentile(baseline[0], 99.5))
+    print(f"{args.requests} requests, concurrency {args.concurrency}, latency={args.latency} "
+          f"median={args.latency_mean}s spread={args.latency_spread}")
+    report("No hedging", *baseline, upper, args.bins)
+    print()
+    report(f"Hedged at p{args.hedge_percentile:g}, budget {args.hedge_budget:.0%}", *hedged, upper, args.bins)
+    print(f"  extra requests: {hedges} ({hedges / args.requests:.1%}), hedge wins: {wins}")
+
+
+if __name__ == "__main__":
+    main()
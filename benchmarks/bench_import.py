@@ -0,0 +1,113 @@
+"""
+Cold-start benchmark for the library and the app.
+
+Each target is measured in a fresh interpreter. Module imports are timed with
+`python -X importtime`; app first paint is the time from interpreter start until
+the first script run of src/app.py (rendered headless with Streamlit's AppTest and
+the offline backend) has finished. Results are compared with the budgets in
+benchmarks/import_budget.json and the script exits non-zero if one is exceeded.
+
+Usage:
+    python benchmarks/bench_import.py --repeat 5
+    python benchmarks/bench_import.py --top 15 utils
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC_DIR = os.path.join(ROOT, 'src')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+print(time.perf_counter() - start)
+"""
+
+
+def _env():
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, ROAD_SAFETY_BACKEND="fake")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_import(module):
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative milliseconds, list of (cumulative ms, package) for top-level packages).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=_env(), cwd=SRC_DIR, check=True
+    )
+    total = 0.0
+    packages = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000.0
+        depth = len(match.group(3)) - 1
+        name = match.group(4)
+        if name == module and depth == 0:
+            total = cumulative_ms
+        elif depth == 1:
+            packages.append((cumulative_ms, name))
+    return total, sorted(packages, reverse=True)
+
+
+def measure_first_paint():
+    """Returns the seconds from interpreter start to the end of the app's first script run."""
+    script = FIRST_PAINT_SCRIPT.format(app=os.path.join(SRC_DIR, 'app.py'))
+    completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                               env=_env(), cwd=SRC_DIR, check=True)
+    return float(completed.stdout.strip().splitlines()[-1]) * 1000.0
+
+
+def main():
+    with open(BUDGET_FILE) as f:
+        budgets = json.load(f)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=list(budgets),
+                        help="Module names and/or 'app' (default: every target in the budget file)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the median is reported")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest packages per module")
+    args = parser.parse_args()
+
+    print(f"{'target':<20} {'median ms':>10} {'budget ms':>10}  status")
+    over_budget = False
+    for target in args.targets:
+        if target == "app":
+            timings = [measure_first_paint() for _ in range(args.repeat)]
+            packages = []
+        else:
+            runs = [measure_import(target) for _ in range(args.repeat)]
+            timings = [total for total, _ in runs]
+            packages = runs[-1][1]
+        median = statistics.median(timings)
+        budget = budgets.get(target)
+        status = "-" if budget is None else ("ok" if median <= budget else "OVER BUDGET")
+        over_budget |= budget is not None and median > budget
+        print(f"{target:<20} {median:>10.1f} {budget if budget is not None else '-':>10}  {status}")
+        for cumulative_ms, name in packages[:args.top]:
+            print(f"    {name:<30} {cumulative_ms:>10.1f}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Throughput of the durable job queue with increasing numbers of worker processes.
+
+Queues jobs for synthetic images in a temporary SQLite queue, drains it with N
+worker processes against the offline FakeBackend, and prints jobs per second and
+the speedup over one worker. With request latency dominating, throughput should
+grow roughly linearly with workers.
+
+Usage:
+    python benchmarks/bench_job_queue.py --jobs 400 --workers 1 2 4 8 --latency-mean 0.1
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from backends import FakeBackend  # noqa: E402
+from distortion_plan import DistortionPlan  # noqa: E402
+from job_queue import JobQueue, run_worker  # noqa: E402
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{'type': 'Brightness', 'intensity': 0.3}])
+
+
+def work(path, worker_id, latency_mean, batch_size):
+    queue = JobQueue(path)
+    stats = run_worker(queue, worker_id, backend=FakeBackend(latency_mean=latency_mean),
+                       batch_size=batch_size, stop_when_empty=True, poll_interval=0.05)
+    queue.close()
+    return stats["completed"]
+
+
+def run(directory, images, jobs, workers, latency_mean, batch_size):
+    path = os.path.join(directory, f"jobs_{workers}.sqlite")
+    queue = JobQueue(path)
+    prompts = [f"Prompt {i}" for i in range((jobs + len(images) - 1) // len(images))]
+    for prompt in prompts:
+        queue.enqueue(images, PLAN, prompt, "models/fake-flash", fields=FIELDS)
+    start = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        completed = sum(pool.starmap(work, [(path, f"worker-{i}", latency_mean, batch_size) for i in range(workers)]))
+    elapsed = time.perf_counter() - start
+    queue.close()
+    return completed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency-mean", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=1, help="Jobs leased per round trip")
+    parser.add_argument("--size", type=int, nargs=2, default=[64, 36], metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        images = []
+        for i in range(20):
+            path = os.path.join(directory, f"image_{i}.png")
+            Image.new('RGB', tuple(args.size), color=(i * 12, 80, 160)).save(path)
+            images.append(path)
+
+        print(f"{args.jobs} jobs, latency {args.latency_mean}s, batch size {args.batch_size}")
+        print(f"{'workers':>8} {'jobs':>6} {'seconds':>8} {'jobs/s':>8} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            completed, elapsed = run(directory, images, args.jobs, workers, args.latency_mean, args.batch_size)
+            throughput = completed / elapsed
+            baseline = baseline or throughput
+            print(f"{workers:>8} {completed:>6} {elapsed:>8.2f} {throughput:>8.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Slider feedback latency: full-resolution renders against proxy previews.
+
+For each distortion type the benchmark times one render of the distortion on
+a full-size JPEG, and one proxy preview. The proxy is decoded once per file,
+as the app keeps it in the session, so only the render runs per slider change. Preview times should stay under about 100 ms
+whatever the source size.
+
+Usage:
+    python benchmarks/bench_preview.py --size 3840 2160 --repeat 3
+"""
+import io
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from distortion_plan import DistortionPlan, default_params  # noqa: E402
+from preview import load_proxy, render_preview  # noqa: E402
+
+TYPES = ["Blur", "Brightness", "Color", "Rain", "Warp", "Fog", "Snow", "Night", "Glare", "Motion Blur", "JPEG"]
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs=2, default=[3840, 2160])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Gradients with mild noise compress and decode roughly like a road photo
+    width, height = args.size
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    noise = np.random.default_rng(0).integers(-12, 12, (height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+
+    decode_ms = best_of(args.repeat, lambda: Image.open(io.BytesIO(buffer.getvalue())).load())
+    proxy_ms = best_of(args.repeat, lambda: load_proxy(io.BytesIO(buffer.getvalue())))
+    print(f"{width}x{height} JPEG: full decode {decode_ms:.0f} ms, proxy decode {proxy_ms:.0f} ms")
+
+    full = Image.open(io.BytesIO(buffer.getvalue()))
+    full.load()
+    proxy, full_size = load_proxy(io.BytesIO(buffer.getvalue()))
+    print(f"{'distortion':>12} {'full ms':>9} {'preview ms':>11}")
+    for distortion_type in TYPES:
+        params = {key: value for key, value in default_params(distortion_type).items() if key != "overlay_image"}
+        compiled = DistortionPlan.from_distortions([{"type": distortion_type, **params}]).compile()
+        full_ms = best_of(args.repeat, lambda: compiled.apply(full.copy(), seed=0))
+        preview_ms = best_of(args.repeat, lambda: render_preview(compiled, proxy, full_size))
+        print(f"{distortion_type:>12} {full_ms:>9.0f} {preview_ms:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
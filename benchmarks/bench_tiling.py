@@ -0,0 +1,75 @@
+"""
+Time and peak memory of the Warp, Blur and Rain distortions on one large image.
+
+Each configuration runs in a fresh process so its peak resident set size can be
+read independently. A memory limit of 0 means one strip covering the whole image,
+the same as applying the distortion without tiling.
+
+Usage:
+    python benchmarks/bench_tiling.py --size 6000 4000 --memory-mb 0 256 64 --workers 1 4
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+WORKER = """
+import sys, json, time, random, resource
+sys.path.insert(0, {src!r})
+import numpy as np
+from PIL import Image
+import tiling
+from utils import apply_blur, apply_rain_effect, apply_warp_effect
+
+width, height, memory_mb, workers, effect = {width}, {height}, {memory_mb}, {workers}, {effect!r}
+tiling.configure_tiling(memory_limit_mb=memory_mb or 1e9, workers=workers)
+rng = np.random.default_rng(0)
+image = Image.fromarray(rng.integers(0, 256, size=(90, 160, 3), dtype=np.uint8)).resize((width, height))
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+random.seed(0)
+start = time.perf_counter()
+if effect == "Warp":
+    apply_warp_effect(image, 0.5, {{"wave_amplitude": 20, "wave_frequency": 0.01, "bulge_factor": 30}})
+elif effect == "Blur":
+    apply_blur(image, 5)
+else:
+    apply_rain_effect(image, 0.5)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "peak_mb": peak / 1024, "extra_mb": (peak - before) / 1024}}))
+"""
+
+
+def run(width, height, memory_mb, workers, effect):
+    code = WORKER.format(src=SRC, width=width, height=height, memory_mb=memory_mb, workers=workers, effect=effect)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs=2, default=[6000, 4000], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--memory-mb", type=float, nargs="+", default=[0, 256, 64])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--effects", nargs="+", default=["Warp", "Blur", "Rain"])
+    args = parser.parse_args()
+
+    width, height = args.size
+    print(f"{width}x{height} ({width * height / 1e6:.0f} MP)")
+    print(f"{'effect':>6} {'limit MB':>9} {'workers':>8} {'seconds':>8} {'peak MB':>8} {'+MB':>7}")
+    for effect in args.effects:
+        for memory_mb in args.memory_mb:
+            for workers in args.workers:
+                if memory_mb == 0 and workers != args.workers[0]:
+                    continue
+                result = run(width, height, memory_mb, workers, effect)
+                limit = f"{memory_mb:g}" if memory_mb else "untiled"
+                print(f"{effect:>6} {limit:>9} {workers:>8} {result['seconds']:>8.2f} "
+                      f"{result['peak_mb']:>8.0f} {result['extra_mb']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
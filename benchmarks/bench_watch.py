@@ -0,0 +1,83 @@
+"""
+Per-frame latency of watched-folder ingestion as the folder grows.
+
+Fills a temporary folder with N existing frames, starts a watcher, then drops
+new frames one at a time and measures the time from the write to the result
+being stored, less the settle time. With inotify or directory-mtime polling the
+latency should stay flat whatever the number of frames already in the folder.
+
+Usage:
+    python benchmarks/bench_watch.py --existing 100 1000 10000 --frames 20
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from backends import FakeBackend  # noqa: E402
+from distortion_plan import EMPTY_PLAN  # noqa: E402
+from results_store import ResultsStore  # noqa: E402
+from watch import FolderWatcher, watch_and_analyze  # noqa: E402
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--existing", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--settle", type=float, default=0.2)
+    parser.add_argument("--polling", action="store_true", help="Poll modification times instead of using inotify")
+    args = parser.parse_args()
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (320, 180), color=(90, 90, 90)).save(buffer, format='PNG')
+    frame = buffer.getvalue()
+
+    print(f"{'existing':>9} {'backend':>8} {'median ms':>10} {'max ms':>8} {'scans':>6}")
+    for existing in args.existing:
+        with tempfile.TemporaryDirectory() as directory:
+            folder = os.path.join(directory, "frames")
+            os.makedirs(folder)
+            for i in range(existing):
+                with open(os.path.join(folder, f"old_{i}.png"), "wb") as f:
+                    f.write(frame)
+            store = ResultsStore(os.path.join(directory, "results.sqlite"))
+            watcher = FolderWatcher(folder, settle_time=args.settle, poll_interval=0.01,
+                                    use_inotify=False if args.polling else None)
+            written = {}
+            latencies = []
+            done = threading.Event()
+
+            def stored(path, row, error):
+                latencies.append(time.perf_counter() - written[path] - args.settle)
+                done.set()
+
+            runner = threading.Thread(target=watch_and_analyze, daemon=True, kwargs=dict(
+                watcher=watcher, plan=EMPTY_PLAN, input_text="Describe", model_name="models/fake-flash",
+                system_instructions=None, expected_fields=FIELDS, store=store, backend=FakeBackend(),
+                max_files=args.frames, on_result=stored))
+            runner.start()
+            for i in range(args.frames):
+                path = os.path.join(watcher.directory, f"new_{i}.png")
+                done.clear()
+                written[path] = time.perf_counter()
+                with open(path, "wb") as f:
+                    f.write(frame)
+                done.wait(10)
+            runner.join(10)
+            latencies.sort()
+            print(f"{existing:>9} {watcher.backend:>8} {latencies[len(latencies) // 2] * 1000:>10.1f} "
+                  f"{latencies[-1] * 1000:>8.1f} {watcher.stats['scans']:>6}")
+            watcher.close()
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,28 @@
 import streamlit as st
 import os
 from PIL import Image
-import google.generativeai as genai
-from utils import apply_distortions, get_gemini_response, list_available_models
-from red_teaming_utils import run_prompt_injection_test, analyze_safety_of_response
+from utils import apply_distortions, get_gemini_response, list_available_models, get_data_dir, open_image
+from backends import get_backend
+from hedging import HedgingBackend, LatencyTracker, DEFAULT_HEDGE_BUDGET, DEFAULT_HEDGE_PERCENTILE
+from consistency import SelfConsistency, DEFAULT_MAX_SAMPLES, DEFAULT_AGREEMENT_THRESHOLD
+from bulk import build_results_dataframe, build_comparison_dataframe, get_file_name, image_digest
+from bulk_settings import ImageSettings, PAGE_SIZES, build_plan, page_bounds
+from distortion_plan import DistortionPlan, plan_seed
+from dedup import HASH_METHODS, HashIndex, hash_files, cluster_hashes, fan_out_results
+from ingest import SCENE_CHANGE_METHODS, iter_frames, detect_scene_changes, frame_to_file
+from blob_store import BlobStore, DEFAULT_MEMORY_LIMIT_MB
+from artifact_cache import ArtifactCache, DEFAULT_CACHE_MB
+from bulk_jobs import BulkJobManager, get_bulk_workers
+from frame_archive import FrameArchive, is_archive
+from preview import load_proxy, render_preview
+from red_teaming_utils import (run_prompt_injection_test, analyze_safety_of_response, apply_occlusion,
+                               search_robustness, exhaustive_sweep_calls, EvaluationMemo, SEARCH_DISTORTION_TYPES)
 import traceback
-import pandas as pd
 from io import StringIO
 import io
-import json
+import time
+import itertools
+import uuid
 
 # Set page configuration
 st.set_page_config(page_title="Multimodal LLM Road Safety Platform", layout="wide")
@@ -68,7 +82,8 @@ PREDEFINED_PROMPTS = [
 ]
 
 # Distortion Types
-DISTORTION_TYPES = ["None", "Blur", "Brightness", "Contrast", "Sharpness", "Color", "Rain", "Overlay", "Warp"]
+DISTORTION_TYPES = ["None", "Blur", "Brightness", "Contrast", "Sharpness", "Color", "Rain", "Overlay", "Warp",
+                    "Fog", "Snow", "Night", "Glare", "Motion Blur", "JPEG"]
 
 # Expected JSON Fields
 EXPECTED_JSON_FIELDS = [
@@ -87,6 +102,208 @@ EXPECTED_JSON_FIELDS = [
     "overall_safety"
 ]
 
+@st.cache_data(show_spinner="Sampling frames...")
+def load_video_frames(path, modified_time, stride, interval, fps, scene_method, scene_threshold, max_frames):
+    """
+    Samples informative frames from a video or frame folder as (name, PNG bytes, metadata) tuples.
+
+    `modified_time` is only part of the cache key, so edited sources are re-read.
+    """
+    frames = detect_scene_changes(iter_frames(path, stride=stride, interval=interval, fps=fps),
+                                  method=scene_method, threshold=scene_threshold)
+    sampled = []
+    for frame in itertools.islice(frames, int(max_frames)):
+        frame_file = frame_to_file(path, frame)
+        sampled.append((frame_file.name, frame_file.getvalue(), frame_file.metadata))
+    return sampled
+
+def get_blob_store():
+    """Returns this session's blob store for uploaded images and overlay payloads."""
+    if 'blob_store' not in st.session_state:
+        memory_limit_mb = int(os.environ.get("ROAD_SAFETY_SESSION_MEMORY_MB", DEFAULT_MEMORY_LIMIT_MB))
+        st.session_state.blob_store = BlobStore(memory_limit=memory_limit_mb * 1024 * 1024)
+    return st.session_state.blob_store
+
+@st.cache_resource
+def get_results_store():
+    """Returns the local store that bulk runs are persisted to."""
+    # Imported here so pandas is only loaded once results are stored or explored
+    from results_store import ResultsStore
+    return ResultsStore(os.path.join(get_data_dir(), "results.sqlite"))
+
+@st.cache_resource
+def get_artifact_cache():
+    """Returns the disk cache of distorted, encoded images shared by bulk runs."""
+    max_mb = int(os.environ.get("ROAD_SAFETY_ARTIFACT_CACHE_MB", DEFAULT_CACHE_MB))
+    return ArtifactCache(get_data_dir("artifacts"), max_bytes=max_mb * 1024 * 1024)
+
+@st.cache_resource
+def get_frame_archive(path, mtime_ns):
+    """Returns a packed frame archive, mapped once for every session; repacking changes `mtime_ns`."""
+    return FrameArchive(path)
+
+@st.cache_resource
+def get_bulk_manager():
+    """Returns the worker pool shared by the background bulk jobs of every session."""
+    return BulkJobManager(max_workers=get_bulk_workers())
+
+def save_bulk_job_results(job, bulk_items, analysed_indices, assignments, request_backend, results_store,
+                          consistency=None, blob_store=None):
+    """
+    Fans out and stores the results of a finished bulk job.
+
+    Runs on a bulk worker thread once the job is completed or cancelled, so results
+    are saved even if the session that submitted the job has ended. It must not
+    use Streamlit. Files of `bulk_items` held in `blob_store` are released afterwards.
+    """
+    try:
+        _save_bulk_job_results(job, bulk_items, analysed_indices, assignments, request_backend, results_store,
+                               consistency)
+    finally:
+        if blob_store is not None:
+            blob_store.release([item[0] for item in bulk_items if isinstance(item[0], str)])
+
+def _save_bulk_job_results(job, bulk_items, analysed_indices, assignments, request_backend, results_store,
+                           consistency):
+    request_backend.shutdown()
+    latency = request_backend.tracker.summary()
+    if latency["p50"] is not None:
+        job.meta["latency"] = (
+            f"Request latency p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, p99 {latency['p99']:.2f}s; "
+            f"{request_backend.stats['hedges']} hedged, {request_backend.stats['hedge_wins']} hedge wins, "
+            f"{request_backend.stats['deadline_exceeded']} past deadline"
+        )
+    if consistency is not None:
+        consistency.shutdown()
+        job.meta["consistency"] = (
+            f"Self-consistency: {consistency.average_samples:.2f} model calls per image on average "
+            f"(at most {consistency.max_samples}); {consistency.stats['early_stops']} of "
+            f"{consistency.stats['requests']} stopped early"
+        )
+
+    results_by_index = {analysed_indices[i]: rows for i, rows in job.results.items()}
+    if assignments is not None:
+        results = fan_out_results(results_by_index, assignments, [get_file_name(item[0]) for item in bulk_items],
+                                  [getattr(item[0], 'metadata', None) for item in bulk_items])
+        result_indices = [i for i, rep in enumerate(assignments) if rep in results_by_index
+                          for _ in results_by_index[rep]]
+    else:
+        result_indices = [i for i in sorted(results_by_index) for _ in results_by_index[i]]
+        results = [result for i in sorted(results_by_index) for result in results_by_index[i]]
+
+    if results:
+        run_id = results_store.start_run(label=job.label, model=", ".join(job.model_names))
+        results_store.record_results(run_id, [
+            {
+                "result": result,
+                "image_hash": image_digest(bulk_items[i][0]),
+                "plan": bulk_items[i][1],
+                "model": result.get("Model", job.model_names[0])
+            }
+            for i, result in zip(result_indices, results)
+        ])
+        job.meta["run_id"] = run_id
+    job.meta["results"] = results
+
+def show_bulk_jobs(owner):
+    """Lists an analyst's background bulk jobs with progress, controls and (partial) results."""
+    manager = get_bulk_manager()
+    jobs = manager.jobs(owner)
+    if not jobs:
+        return
+    st.subheader("Bulk Jobs")
+    for job in reversed(jobs):
+        with st.expander(f"{job.label}: {job.state}, {job.completed}/{job.total} analysed", expanded=not job.finished):
+            st.progress(job.progress)
+            col1, col2, _ = st.columns([1, 1, 4])
+            if job.state == "paused":
+                col1.button("Resume", key=f"resume_{job.job_id}", on_click=manager.resume, args=(job.job_id,))
+            elif not job.finished:
+                col1.button("Pause", key=f"pause_{job.job_id}", on_click=manager.pause, args=(job.job_id,))
+            if job.finished:
+                col2.button("Dismiss", key=f"dismiss_{job.job_id}", on_click=manager.remove, args=(job.job_id,))
+            else:
+                col2.button("Cancel", key=f"cancel_{job.job_id}", on_click=manager.cancel, args=(job.job_id,))
+
+            for _, file_name, error in job.errors:
+                st.error(f"Error processing {file_name}")
+                st.code(error)
+
+            if not job.wait(0):
+                # Still running: show what has arrived so far
+                if job.results:
+                    st.dataframe(build_results_dataframe(job.result_rows(), EXPECTED_JSON_FIELDS))
+                continue
+
+            if job.meta.get("latency"):
+                st.caption(job.meta["latency"])
+            if job.meta.get("consistency"):
+                st.caption(job.meta["consistency"])
+            results = job.meta.get("results")
+            if not results:
+                st.warning("No results were generated. Please check your inputs and try again.")
+                continue
+            st.caption(f"Saved {len(results)} results as run {job.meta['run_id']}. Compare runs in the Results Explorer.")
+            results_df = build_results_dataframe(results, EXPECTED_JSON_FIELDS)
+            st.dataframe(results_df)
+
+            if len(job.model_names) > 1:
+                st.markdown("**Model Comparison**")
+                comparison_fields = ["overall_safety", "potential_hazards", "suggested_improvements", "AI Response"]
+                for tab, field in zip(st.tabs(comparison_fields), comparison_fields):
+                    with tab:
+                        st.dataframe(build_comparison_dataframe(results, field), use_container_width=True)
+
+            st.download_button(
+                label="Download CSV",
+                data=results_df.to_csv(index=False),
+                file_name="bulk_analysis_results.csv",
+                mime="text/csv",
+                key=f"download_{job.job_id}"
+            )
+
+def load_overlay(ref):
+    """Decodes an overlay stored in the session blob store."""
+    return Image.open(io.BytesIO(get_blob_store().get(ref))).convert("RGBA")
+
+def compile_plan(plan, max_entries=32):
+    """Compiles a distortion plan once per session and reuses it across reruns."""
+    compiled_plans = st.session_state.setdefault('compiled_plans', {})
+    if plan not in compiled_plans:
+        if len(compiled_plans) >= max_entries:
+            compiled_plans.pop(next(iter(compiled_plans)))
+        compiled_plans[plan] = plan.compile(load_overlay)
+    return compiled_plans[plan]
+
+def preview_image(image, max_size=(640, 640)):
+    """Returns a downscaled copy for display so full-size renders are not kept by the media cache."""
+    preview = image.copy()
+    preview.thumbnail(max_size)
+    return preview
+
+def get_preview_proxy(file, max_entries=64):
+    """
+    Returns (proxy, full size, source image hash) for an image source, decoded once per session.
+
+    Slider changes rerun the script; keeping proxies means a rerun only renders
+    the distortions on the proxy and never decodes the full-size image. The hash
+    seeds the preview like the full-size render (see distortion_plan.plan_seed).
+    """
+    if isinstance(file, str):
+        key = file
+    elif hasattr(file, 'file_id'):
+        key = file.file_id
+    elif hasattr(file, 'open_image'):
+        key = repr(file)
+    else:
+        key = get_file_name(file)
+    proxies = st.session_state.setdefault('preview_proxies', {})
+    if key not in proxies:
+        if len(proxies) >= max_entries:
+            proxies.pop(next(iter(proxies)))
+        proxies[key] = load_proxy(file) + (image_digest(file),)
+    return proxies[key]
+
 # Title
 st.title("Multimodal LLM Road Safety Platform")
 
@@ -114,7 +331,7 @@ st.session_state.api_key = st.text_input("Enter your Gemini API key:", type="pas
 
 if st.session_state.api_key:
     os.environ['GEMINI_API_KEY'] = st.session_state.api_key
-    genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+    get_backend().configure(os.environ['GEMINI_API_KEY'])
 
     # Fetch available models
     try:
@@ -142,7 +359,7 @@ if st.session_state.api_key:
     )
 
     # Add a new option in the sidebar for analysis mode
-    analysis_mode = st.sidebar.radio("Analysis Mode", ["Single", "Bulk", "Red Teaming"])
+    analysis_mode = st.sidebar.radio("Analysis Mode", ["Single", "Bulk", "Red Teaming", "Results Explorer"])
 
     if analysis_mode == "Single":
         st.sidebar.subheader("Distortions")
@@ -184,6 +401,14 @@ if st.session_state.api_key:
                             'intensity': intensity,
                             'overlay_image': overlay_image_bytes
                         })
+                    elif distortion_type == "Motion Blur":
+                        intensity = st.slider(f"{distortion_type} Intensity", 0.0, 1.0, 0.5)
+                        angle = st.slider(f"{distortion_type} Angle", 0.0, 180.0, 0.0)
+                        distortions.append({
+                            'type': distortion_type,
+                            'intensity': intensity,
+                            'angle': angle
+                        })
                     elif distortion_type == "Warp":
                         intensity = st.slider(f"{distortion_type} Intensity", 0.0, 1.0, 0.5)
                         wave_amplitude = st.slider(f"{distortion_type} Wave Amplitude", 0.0, 50.0, 20.0)
@@ -214,26 +439,27 @@ if st.session_state.api_key:
 
         uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
 
-        image = None
-        processed_image = None
+        compiled_plan = DistortionPlan.from_distortions(distortions).compile() if distortions else None
         if uploaded_file:
+            # The preview is rendered on a downscaled proxy; the full-size image is only
+            # decoded and distorted when "Analyse" is clicked
             try:
-                image = Image.open(uploaded_file)
+                proxy, full_size, source_hash = get_preview_proxy(uploaded_file)
 
                 if distortions:
-                    processed_image = apply_distortions(image, distortions)
-                    if processed_image is not None:
+                    processed_preview = render_preview(compiled_plan, proxy, full_size,
+                                                       seed=plan_seed(0, source_hash, compiled_plan.plan.content_hash))
+                    if processed_preview is not None:
                         col1, col2 = st.columns(2)
                         with col1:
-                            st.image(image, caption="Original Image", use_column_width=True)
+                            st.image(proxy, caption="Original Image", use_column_width=True)
                         with col2:
                             caption = f"Processed Image ({', '.join([d['type'] for d in distortions])})"
-                            st.image(processed_image, caption=caption, use_column_width=True)
+                            st.image(processed_preview, caption=caption, use_column_width=True)
                     else:
                         st.error("Failed to process the image. The distortion function returned None.")
                 else:
-                    st.image(image, caption="Original Image", use_column_width=True)
-                    processed_image = image  # If no distortions, use the original image
+                    st.image(proxy, caption="Original Image", use_column_width=True)
             except Exception as e:
                 st.error(f"An error occurred while processing the image: {str(e)}")
                 st.error(traceback.format_exc())
@@ -241,6 +467,18 @@ if st.session_state.api_key:
         submit = st.button("Analyse")
 
         if submit:
+            processed_image = None
+            if uploaded_file:
+                try:
+                    uploaded_file.seek(0)
+                    processed_image = Image.open(uploaded_file)
+                    if compiled_plan is not None:
+                        # Seeded like the preview and like bulk runs of the same image and plan
+                        seed = plan_seed(0, image_digest(uploaded_file), compiled_plan.plan.content_hash)
+                        processed_image = compiled_plan.apply(processed_image, seed=seed)
+                except Exception as e:
+                    st.error(f"An error occurred while processing the image: {str(e)}")
+                    st.error(traceback.format_exc())
             if input_text or processed_image:
                 try:
                     text_response, json_response = get_gemini_response(
@@ -269,7 +507,80 @@ if st.session_state.api_key:
     elif analysis_mode == "Bulk":
         st.subheader("Bulk Analysis Settings")
 
+        blob_store = get_blob_store()
+        st.sidebar.subheader("Session Memory")
+        memory_limit_mb = st.sidebar.number_input(
+            "Memory ceiling for cached images (MB)",
+            min_value=8,
+            value=blob_store.memory_limit // (1024 * 1024),
+            help="Uploaded images and overlays are kept on disk; at most this much is cached in memory."
+        )
+        blob_store.set_memory_limit(int(memory_limit_mb) * 1024 * 1024)
+        st.sidebar.caption(f"Cached in memory: {blob_store.memory_usage / (1024 * 1024):.1f} MB, "
+                           f"on disk: {blob_store.disk_usage / (1024 * 1024):.1f} MB")
+
+        if 'analyst' not in st.session_state:
+            st.session_state.analyst = f"session-{uuid.uuid4().hex[:6]}"
+        analyst = st.sidebar.text_input(
+            "Analyst",
+            key="analyst",
+            help="Bulk jobs are listed and share the worker pool per analyst. Enter the same name in another browser session to see your jobs there."
+        ).strip() or "anonymous"
+
+        use_artifact_cache = st.sidebar.checkbox(
+            "Cache distorted images on disk",
+            value=True,
+            help="Reuse distorted, encoded images when the same image and distortions are sent again, e.g. to another model or with another prompt."
+        )
+        if use_artifact_cache:
+            artifact_cache = get_artifact_cache()
+            st.sidebar.caption(f"Image cache: {artifact_cache.size / (1024 * 1024):.1f} MB, "
+                               f"hit rate {artifact_cache.hit_rate:.0%}")
+
+        st.sidebar.subheader("Request Deadlines")
+        request_timeout = st.sidebar.number_input(
+            "Per-request deadline (seconds, 0 for none)",
+            min_value=0.0,
+            value=120.0,
+            step=10.0,
+            help="Requests without a response by then are abandoned and reported as errors."
+        )
+        hedge_requests = st.sidebar.checkbox(
+            "Hedge slow requests",
+            value=False,
+            help="Send a duplicate request when a call is slower than most recent calls, and use whichever answers first."
+        )
+        hedge_percentile = None
+        hedge_budget = DEFAULT_HEDGE_BUDGET
+        if hedge_requests:
+            hedge_percentile = st.sidebar.slider("Hedge after latency percentile", 50, 99, DEFAULT_HEDGE_PERCENTILE)
+            hedge_budget = st.sidebar.slider("Max extra requests (%)", 1, 50, int(DEFAULT_HEDGE_BUDGET * 100)) / 100
+        if 'latency_tracker' not in st.session_state:
+            st.session_state.latency_tracker = LatencyTracker()
+
+        st.sidebar.subheader("Self-Consistency")
+        use_consistency = st.sidebar.checkbox(
+            "Sample each image several times",
+            value=False,
+            help="Ask each model several times and report the majority verdict with an agreement score. Sampling stops as soon as the answers agree, so stable images cost about two calls."
+        )
+        if use_consistency:
+            consistency_samples = st.sidebar.slider("Max samples per image", 2, 10, DEFAULT_MAX_SAMPLES)
+            consistency_threshold = st.sidebar.slider(
+                "Stop at agreement", 0.5, 1.0, DEFAULT_AGREEMENT_THRESHOLD, 0.05,
+                help="Agreement on overall_safety and potential_hazards at which no more samples are requested."
+            )
+
+        bulk_models = st.multiselect(
+            "Models",
+            model_options,
+            default=[st.session_state.model_choice] if st.session_state.model_choice in model_options else None,
+            help="Select several models to send each image to all of them concurrently and compare the results side by side."
+        ) or [st.session_state.model_choice]
+
         use_centralized_distortions = st.checkbox("Use centralized distortion settings for all images", value=False)
+        centralized_distortions = None
+        centralized_distortion_settings = None
 
         if use_centralized_distortions:
             st.subheader("Centralized Distortion Settings")
@@ -324,19 +635,33 @@ if st.session_state.api_key:
                             overlay_img.save(img_byte_arr, format='PNG')
                             centralized_distortion_settings[distortion_type] = {
                                 'intensity': intensity,
-                                'overlay_image': img_byte_arr.getvalue()
+                                'overlay_image': get_blob_store().put(img_byte_arr.getvalue())
                             }
                             st.success("Overlay image uploaded successfully.")
                         else:
                             # Clear the overlay image if no file is uploaded
-                            if distortion_type in centralized_distortion_settings:
-                                centralized_distortion_settings[distortion_type]['overlay_image'] = None
-                            else:
-                                centralized_distortion_settings[distortion_type] = {
-                                    'intensity': intensity,
-                                    'overlay_image': None
-                                }
+                            centralized_distortion_settings[distortion_type] = {
+                                'intensity': intensity,
+                                'overlay_image': None
+                            }
                             st.info("No overlay image selected.")
+                    elif distortion_type == "Motion Blur":
+                        intensity = st.slider(
+                            f"{distortion_type} Intensity",
+                            0.0,
+                            1.0,
+                            centralized_distortion_settings.get(distortion_type, {}).get('intensity', 0.5)
+                        )
+                        angle = st.slider(
+                            f"{distortion_type} Angle",
+                            0.0,
+                            180.0,
+                            centralized_distortion_settings.get(distortion_type, {}).get('angle', 0.0)
+                        )
+                        centralized_distortion_settings[distortion_type] = {
+                            'intensity': intensity,
+                            'angle': angle
+                        }
                     elif distortion_type == "Warp":
                         intensity = st.slider(
                             f"{distortion_type} Intensity",
@@ -348,27 +673,25 @@ if st.session_state.api_key:
                             f"{distortion_type} Wave Amplitude",
                             0.0,
                             50.0,
-                            centralized_distortion_settings.get(distortion_type, {}).get('warp_params', {}).get('wave_amplitude', 20.0)
+                            centralized_distortion_settings.get(distortion_type, {}).get('wave_amplitude', 20.0)
                         )
                         wave_frequency = st.slider(
                             f"{distortion_type} Wave Frequency",
                             0.0,
                             0.1,
-                            centralized_distortion_settings.get(distortion_type, {}).get('warp_params', {}).get('wave_frequency', 0.04)
+                            centralized_distortion_settings.get(distortion_type, {}).get('wave_frequency', 0.04)
                         )
                         bulge_factor = st.slider(
                             f"{distortion_type} Bulge Factor",
                             -50.0,
                             50.0,
-                            centralized_distortion_settings.get(distortion_type, {}).get('warp_params', {}).get('bulge_factor', 30.0)
+                            centralized_distortion_settings.get(distortion_type, {}).get('bulge_factor', 30.0)
                         )
                         centralized_distortion_settings[distortion_type] = {
                             'intensity': intensity,
-                            'warp_params': {
-                                'wave_amplitude': wave_amplitude,
-                                'wave_frequency': wave_frequency,
-                                'bulge_factor': bulge_factor
-                            }
+                            'wave_amplitude': wave_amplitude,
+                            'wave_frequency': wave_frequency,
+                            'bulge_factor': bulge_factor
                         }
                     else:
                         intensity = st.slider(
@@ -383,11 +706,82 @@ if st.session_state.api_key:
 
         st.subheader("Bulk Analysis")
 
-        analysis_source = st.radio("Choose analysis source:", ["Upload Files", "Specify Folder Path"])
+        analysis_source = st.radio("Choose analysis source:", ["Upload Files", "Specify Folder Path", "Video / Frame Sequence"])
 
         if analysis_source == "Upload Files":
+            if 'bulk_uploads' not in st.session_state:
+                st.session_state.bulk_uploads = []
+                st.session_state.bulk_uploader_key = 0
+
             # File uploader for multiple images
-            uploaded_files = st.file_uploader("Choose multiple images...", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+            new_files = st.file_uploader(
+                "Choose multiple images...",
+                type=["jpg", "jpeg", "png"],
+                accept_multiple_files=True,
+                key=f"bulk_uploader_{st.session_state.bulk_uploader_key}"
+            )
+            if new_files:
+                # Spill uploads to the session blob store and reset the uploader so
+                # Streamlit releases its in-memory copies
+                blob_store = get_blob_store()
+                for new_file in new_files:
+                    st.session_state.bulk_uploads.append(blob_store.put_file(new_file))
+                st.session_state.bulk_uploader_key += 1
+                st.rerun()
+
+            uploaded_files = list(st.session_state.bulk_uploads)
+            if uploaded_files:
+                st.write(f"{len(uploaded_files)} images added to this session.")
+                if st.button("Clear uploaded images"):
+                    # Removes the files from disk too; files a running bulk job reads are removed when it finishes
+                    get_blob_store().discard_files(st.session_state.bulk_uploads)
+                    st.session_state.bulk_uploads = []
+                    st.rerun()
+        elif analysis_source == "Video / Frame Sequence":
+            st.write("Enter the path to a video file (or animated GIF) or a folder of sequential frames. "
+                     "Frames are sampled and filtered for scene changes before analysis.")
+            video_path = st.text_input("Enter video file or frame folder path:")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                sampling_mode = st.radio("Frame sampling", ["Fixed stride", "Time interval"], horizontal=True)
+                if sampling_mode == "Fixed stride":
+                    frame_stride = st.number_input("Analyse every Nth frame", min_value=1, value=30)
+                    frame_interval = None
+                else:
+                    frame_stride = 1
+                    frame_interval = st.number_input("Seconds between frames", min_value=0.1, value=1.0, step=0.5)
+                sequence_fps = st.number_input("Frame rate of image sequences (fps)", min_value=1.0, value=30.0,
+                                               help="Used to derive timestamps for folders of frames.")
+            with col2:
+                scene_method = st.selectbox("Scene change detection", SCENE_CHANGE_METHODS, index=1)
+                scene_threshold = st.slider("Scene change threshold", 0.0, 1.0, 0.2,
+                                            disabled=scene_method == "None")
+                max_frames = st.number_input("Maximum frames to analyse", min_value=1, value=100)
+
+            uploaded_files = []
+            if video_path:
+                safe_path = os.path.abspath(os.path.expanduser(video_path))
+                base_dir = os.path.abspath(os.path.expanduser("~"))
+
+                if not safe_path.startswith(base_dir):
+                    st.error(f"Security Error: Access denied. Please select a path within your home directory ({base_dir}).")
+                elif os.path.exists(safe_path):
+                    try:
+                        sampled_frames = load_video_frames(
+                            safe_path, os.path.getmtime(safe_path), frame_stride, frame_interval,
+                            sequence_fps, scene_method, scene_threshold, max_frames
+                        )
+                        for name, data, metadata in sampled_frames:
+                            frame_file = io.BytesIO(data)
+                            frame_file.name = name
+                            frame_file.metadata = metadata
+                            uploaded_files.append(frame_file)
+                        st.success(f"Selected {len(uploaded_files)} informative frames from {os.path.basename(safe_path)}.")
+                    except Exception as e:
+                        st.error(f"Could not read frames: {str(e)}")
+                else:
+                    st.error("Invalid path or file does not exist.")
         else:
             # Folder path input with instructions
             st.write("To specify a folder path:")
@@ -395,9 +789,12 @@ if st.session_state.api_key:
             st.write("2. Navigate to the folder containing your images.")
             st.write("3. Copy the full path of that folder.")
             st.write("4. Paste the path into the text box below.")
+            st.caption("A packed frame archive (see src/frame_archive.py) can be given instead of a folder; "
+                       "its frames are read without decoding.")
 
             folder_path = st.text_input("Enter folder path containing images:")
 
+            uploaded_files = []
             if folder_path:
                 # Sanitize and validate path
                 # 1. Expand user (~) and get absolute path
@@ -410,23 +807,24 @@ if st.session_state.api_key:
                 if not safe_path.startswith(base_dir):
                     st.error(f"Security Error: Access denied. Please select a folder within your home directory ({base_dir}).")
                 elif os.path.isdir(safe_path):
-                    image_files = [f for f in os.listdir(safe_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+                    image_files = sorted(f for f in os.listdir(safe_path) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
                     uploaded_files = [os.path.join(safe_path, f) for f in image_files]
                     st.success(f"Found {len(uploaded_files)} images in the specified folder.")
-
-                    # Display a sample of found images
-                    if uploaded_files:
-                        st.write("Sample of found images:")
-                        sample_size = min(5, len(uploaded_files))
-                        sample_images = uploaded_files[:sample_size]
-                        cols = st.columns(sample_size)
-                        for i, img_path in enumerate(sample_images):
-                            with cols[i]:
-                                st.image(Image.open(img_path), caption=os.path.basename(img_path), use_column_width=True)
+                elif is_archive(safe_path):
+                    uploaded_files = get_frame_archive(safe_path, os.stat(safe_path).st_mtime_ns).items()
+                    st.success(f"Found {len(uploaded_files)} frames in the archive.")
                 else:
                     st.error("Invalid folder path or directory does not exist.")
-            else:
-                uploaded_files = []
+
+                # Display a sample of found images
+                if uploaded_files:
+                    st.write("Sample of found images:")
+                    sample_size = min(5, len(uploaded_files))
+                    sample_images = uploaded_files[:sample_size]
+                    cols = st.columns(sample_size)
+                    for i, img_path in enumerate(sample_images):
+                        with cols[i]:
+                            st.image(preview_image(open_image(img_path)), caption=get_file_name(img_path), use_column_width=True)
 
         # Clear all image settings if the number of files changes
         if 'previous_file_count' not in st.session_state:
@@ -443,79 +841,77 @@ if st.session_state.api_key:
         if uploaded_files:
             # Ensure image_settings has the same length as uploaded_files
             while len(st.session_state.image_settings) < len(uploaded_files):
-                st.session_state.image_settings.append({
-                    "distortion": "None",
-                    "intensity": 0.5,
-                    "input_text": "",
-                    "overlay_image": None,
-                    "warp_params": {
-                        "wave_amplitude": 20.0,
-                        "wave_frequency": 0.04,
-                        "bulge_factor": 30.0
-                    },
-                    "saturation": 1.0,
-                    "hue_shift": 0.0
-                })
+                st.session_state.image_settings.append(ImageSettings())
 
             # Remove extra settings if files were removed
             st.session_state.image_settings = st.session_state.image_settings[:len(uploaded_files)]
 
-            for i, (file, settings) in enumerate(zip(uploaded_files, st.session_state.image_settings)):
-                file_name = file.name if hasattr(file, 'name') else os.path.basename(file)
+            # Only the current page of images is rendered
+            col1, col2 = st.columns(2)
+            with col1:
+                page_size = st.selectbox("Images per page", PAGE_SIZES, key="bulk_page_size")
+            _, _, page_count = page_bounds(len(uploaded_files), page_size, 1)
+            with col2:
+                page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, key="bulk_page")
+            page_start, page_end, _ = page_bounds(len(uploaded_files), page_size, page)
+            st.caption(f"Showing images {page_start + 1}-{page_end} of {len(uploaded_files)}")
+
+            for i in range(page_start, page_end):
+                file = uploaded_files[i]
+                settings = st.session_state.image_settings[i]
+                file_name = get_file_name(file)
 
                 with st.expander(f"Settings for {file_name}", expanded=True):
                     col1, col2 = st.columns(2)
 
                     with col1:
-                        # Load and display original image
-                        image = Image.open(file) if isinstance(file, str) else Image.open(file)
-                        st.image(image, caption="Original Image", use_column_width=True)
+                        # Display a proxy of the original; full-size renders happen when the run starts
+                        proxy, full_size, source_hash = get_preview_proxy(file)
+                        st.image(proxy, caption="Original Image", use_column_width=True)
 
                     with col2:
                         if use_centralized_distortions:
                             st.write("Using centralized distortion settings")
-                            settings['distortions'] = centralized_distortions
-                            for distortion_type in centralized_distortions:
-                                if distortion_type in centralized_distortion_settings:
-                                    for key, value in centralized_distortion_settings[distortion_type].items():
-                                        settings[f"{distortion_type}_{key}"] = value
+                            settings.distortions = None
                         else:
                             # Multiple distortion selection
-                            settings['distortions'] = st.multiselect(
+                            settings.distortions = st.multiselect(
                                 "Choose Distortions:",
                                 DISTORTION_TYPES[1:],  # Exclude "None" from the options
-                                default=settings.get('distortions', []),
+                                default=settings.distortions or [],
                                 key=f"distortions_{i}"
                             )
+                        selected_distortions = settings.selected_distortions(centralized_distortions)
 
-                        # Distortion settings using tabs
-                        if settings['distortions']:
-                            tabs = st.tabs(settings['distortions'])
-                            for tab, distortion_type in zip(tabs, settings['distortions']):
+                        # Distortion settings using tabs; only values that differ from the
+                        # centralized plan are stored on the image
+                        if selected_distortions:
+                            tabs = st.tabs(selected_distortions)
+                            for tab, distortion_type in zip(tabs, selected_distortions):
                                 with tab:
                                     if distortion_type == "Color":
-                                        settings[f"{distortion_type}_saturation"] = st.slider(
+                                        settings.set(distortion_type, "saturation", st.slider(
                                             "Saturation",
                                             0.0,
                                             2.0,
-                                            settings.get(f"{distortion_type}_saturation", 1.0),
+                                            settings.get(distortion_type, "saturation", centralized_distortion_settings),
                                             key=f"saturation_{i}_{distortion_type}"
-                                        )
-                                        settings[f"{distortion_type}_hue_shift"] = st.slider(
+                                        ), centralized_distortion_settings)
+                                        settings.set(distortion_type, "hue_shift", st.slider(
                                             "Hue Shift",
                                             -0.5,
                                             0.5,
-                                            settings.get(f"{distortion_type}_hue_shift", 0.0),
+                                            settings.get(distortion_type, "hue_shift", centralized_distortion_settings),
                                             key=f"hue_shift_{i}_{distortion_type}"
-                                        )
+                                        ), centralized_distortion_settings)
                                     elif distortion_type == "Overlay":
-                                        settings[f"{distortion_type}_intensity"] = st.slider(
+                                        settings.set(distortion_type, "intensity", st.slider(
                                             "Intensity",
                                             0.0,
                                             1.0,
-                                            settings.get(f"{distortion_type}_intensity", 0.5),
+                                            settings.get(distortion_type, "intensity", centralized_distortion_settings),
                                             key=f"intensity_{i}_{distortion_type}"
-                                        )
+                                        ), centralized_distortion_settings)
 
                                         # Add the file uploader for the overlay image
                                         overlay_image = st.file_uploader(
@@ -529,251 +925,164 @@ if st.session_state.api_key:
                                             overlay_img.thumbnail((300, 300))  # Resize to a manageable size
                                             img_byte_arr = io.BytesIO()
                                             overlay_img.save(img_byte_arr, format='PNG')
-                                            settings[f"{distortion_type}_overlay_image"] = img_byte_arr.getvalue()
+                                            settings.set(distortion_type, "overlay_image", get_blob_store().put(img_byte_arr.getvalue()), centralized_distortion_settings)
                                             st.success("Overlay image uploaded successfully.")
-                                        elif f"{distortion_type}_overlay_image" not in settings:
-                                            settings[f"{distortion_type}_overlay_image"] = None
+                                        elif not settings.get(distortion_type, "overlay_image", centralized_distortion_settings):
                                             st.info("No overlay image selected.")
+                                    elif distortion_type == "Motion Blur":
+                                        settings.set(distortion_type, "intensity", st.slider(
+                                            "Intensity",
+                                            0.0,
+                                            1.0,
+                                            settings.get(distortion_type, "intensity", centralized_distortion_settings),
+                                            key=f"intensity_{i}_{distortion_type}"
+                                        ), centralized_distortion_settings)
+                                        settings.set(distortion_type, "angle", st.slider(
+                                            "Angle",
+                                            0.0,
+                                            180.0,
+                                            settings.get(distortion_type, "angle", centralized_distortion_settings),
+                                            key=f"angle_{i}_{distortion_type}"
+                                        ), centralized_distortion_settings)
                                     elif distortion_type == "Warp":
-                                        settings[f"{distortion_type}_intensity"] = st.slider(
+                                        settings.set(distortion_type, "intensity", st.slider(
                                             "Intensity",
                                             0.0,
                                             1.0,
-                                            settings.get(f"{distortion_type}_intensity", 0.5),
+                                            settings.get(distortion_type, "intensity", centralized_distortion_settings),
                                             key=f"intensity_{i}_{distortion_type}"
-                                        )
-                                        settings[f"{distortion_type}_wave_amplitude"] = st.slider(
+                                        ), centralized_distortion_settings)
+                                        settings.set(distortion_type, "wave_amplitude", st.slider(
                                             "Wave Amplitude",
                                             0.0,
                                             50.0,
-                                            settings.get(f"{distortion_type}_wave_amplitude", 20.0),
+                                            settings.get(distortion_type, "wave_amplitude", centralized_distortion_settings),
                                             key=f"wave_amplitude_{i}_{distortion_type}"
-                                        )
-                                        settings[f"{distortion_type}_wave_frequency"] = st.slider(
+                                        ), centralized_distortion_settings)
+                                        settings.set(distortion_type, "wave_frequency", st.slider(
                                             "Wave Frequency",
                                             0.0,
                                             0.1,
-                                            settings.get(f"{distortion_type}_wave_frequency", 0.04),
+                                            settings.get(distortion_type, "wave_frequency", centralized_distortion_settings),
                                             key=f"wave_frequency_{i}_{distortion_type}"
-                                        )
-                                        settings[f"{distortion_type}_bulge_factor"] = st.slider(
+                                        ), centralized_distortion_settings)
+                                        settings.set(distortion_type, "bulge_factor", st.slider(
                                             "Bulge Factor",
                                             -50.0,
                                             50.0,
-                                            settings.get(f"{distortion_type}_bulge_factor", 30.0),
+                                            settings.get(distortion_type, "bulge_factor", centralized_distortion_settings),
                                             key=f"bulge_factor_{i}_{distortion_type}"
-                                        )
+                                        ), centralized_distortion_settings)
                                     else:
-                                        settings[f"{distortion_type}_intensity"] = st.slider(
+                                        settings.set(distortion_type, "intensity", st.slider(
                                             "Intensity",
                                             0.0,
                                             1.0,
-                                            settings.get(f"{distortion_type}_intensity", 0.5),
+                                            settings.get(distortion_type, "intensity", centralized_distortion_settings),
                                             key=f"intensity_{i}_{distortion_type}"
-                                        )
+                                        ), centralized_distortion_settings)
 
                         # Apply distortions and display processed image
-                        distortions_list = []
-                        for distortion_type in settings['distortions']:
-                            distortion_params = {"type": distortion_type}
-                            if distortion_type == "Color":
-                                distortion_params["saturation"] = settings.get(f"{distortion_type}_saturation", 1.0)
-                                distortion_params["hue_shift"] = settings.get(f"{distortion_type}_hue_shift", 0.0)
-                            elif distortion_type == "Overlay":
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                                overlay_image_bytes = settings.get(f"{distortion_type}_overlay_image")
-                                if overlay_image_bytes:
-                                    distortion_params["overlay_image"] = Image.open(io.BytesIO(overlay_image_bytes)).convert("RGBA")
-                                else:
-                                    distortion_params["overlay_image"] = None
-                            elif distortion_type == "Warp":
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                                distortion_params["warp_params"] = {
-                                    "wave_amplitude": settings.get(f"{distortion_type}_wave_amplitude", 20.0),
-                                    "wave_frequency": settings.get(f"{distortion_type}_wave_frequency", 0.04),
-                                    "bulge_factor": settings.get(f"{distortion_type}_bulge_factor", 30.0)
-                                }
-                            else:
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                            distortions_list.append(distortion_params)
-
-                        # Only apply distortions if there are valid distortions to apply
-                        if any(d for d in distortions_list if d.get("overlay_image") is not None or d["type"] != "Overlay"):
-                            processed_image = apply_distortions(image, distortions_list)
-                        else:
-                            processed_image = image
-
-                        st.image(processed_image, caption="Processed Image", use_column_width=True)
+                        plan = build_plan(settings, centralized_distortions, centralized_distortion_settings)
+                        # Seeded as prepare_bulk_item seeds the full-size render of this image and plan
+                        st.image(render_preview(compile_plan(plan), proxy, full_size,
+                                                seed=plan_seed(0, source_hash, plan.content_hash)),
+                                 caption="Processed Image", use_column_width=True)
 
                         # Input text
                         st.markdown("### Prompt Settings")
                         prompt_option = st.radio("Choose prompt type:", ["Predefined", "Custom"], key=f"prompt_option_{i}")
                         if prompt_option == "Predefined":
-                            settings["input_text"] = st.selectbox(
+                            settings.input_text = st.selectbox(
                                 "Select a predefined prompt:",
                                 PREDEFINED_PROMPTS,
                                 key=f"predefined_prompt_{i}"
                             )
                         else:
-                            settings["input_text"] = st.text_input(
+                            settings.input_text = st.text_input(
                                 "Input custom text",
-                                value=settings.get("input_text", ""),
+                                value=settings.input_text,
                                 key=f"input_{i}"
                             )
 
                 st.markdown("---")  # Add a separator between images
 
-        # Button to start bulk analysis
-        if st.button("Run Bulk Analysis") and uploaded_files:
-            results = []
-            progress_bar = st.progress(0)
-
-            for i, file in enumerate(uploaded_files):
-                try:
-                    image = Image.open(file)
-                    file_name = file.name if hasattr(file, 'name') else os.path.basename(file)
-
-                    # Apply distortions
-                    distortions_list = []
-                    if use_centralized_distortions:
-                        for distortion_type in centralized_distortions:
-                            distortion_params = {"type": distortion_type}
-                            if distortion_type == "Overlay":
-                                distortion_params["intensity"] = centralized_distortion_settings[distortion_type]['intensity']
-                                # Convert bytes back to PIL Image for overlay
-                                if centralized_distortion_settings[distortion_type]['overlay_image']:
-                                    overlay_bytes = centralized_distortion_settings[distortion_type]['overlay_image']
-                                    distortion_params["overlay_image"] = Image.open(io.BytesIO(overlay_bytes)).convert("RGBA")
-                                else:
-                                    distortion_params["overlay_image"] = None
-                            elif distortion_type == "Color":
-                                distortion_params.update(centralized_distortion_settings[distortion_type])
-                            elif distortion_type == "Warp":
-                                distortion_params["intensity"] = centralized_distortion_settings[distortion_type]['intensity']
-                                distortion_params["warp_params"] = centralized_distortion_settings[distortion_type]['warp_params']
-                            else:
-                                distortion_params["intensity"] = centralized_distortion_settings[distortion_type]['intensity']
-                            distortions_list.append(distortion_params)
-                    else:
-                        settings = st.session_state.image_settings[i]
-                        for distortion_type in settings['distortions']:
-                            distortion_params = {"type": distortion_type}
-                            if distortion_type == "Color":
-                                distortion_params["saturation"] = settings.get(f"{distortion_type}_saturation", 1.0)
-                                distortion_params["hue_shift"] = settings.get(f"{distortion_type}_hue_shift", 0.0)
-                            elif distortion_type == "Overlay":
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                                overlay_image_bytes = settings.get(f"{distortion_type}_overlay_image")
-                                if overlay_image_bytes:
-                                    distortion_params["overlay_image"] = Image.open(io.BytesIO(overlay_image_bytes)).convert("RGBA")
-                                else:
-                                    distortion_params["overlay_image"] = None
-                            elif distortion_type == "Warp":
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                                distortion_params["warp_params"] = {
-                                    "wave_amplitude": settings.get(f"{distortion_type}_wave_amplitude", 20.0),
-                                    "wave_frequency": settings.get(f"{distortion_type}_wave_frequency", 0.04),
-                                    "bulge_factor": settings.get(f"{distortion_type}_bulge_factor", 30.0)
-                                }
-                            else:
-                                distortion_params["intensity"] = settings.get(f"{distortion_type}_intensity", 0.5)
-                            distortions_list.append(distortion_params)
-
-                    # Only apply distortions if there are valid distortions to apply
-                    if any(d for d in distortions_list if d.get("overlay_image") is not None or d["type"] != "Overlay"):
-                        processed_image = apply_distortions(image, distortions_list)
-                    else:
-                        processed_image = image
-
-                    # Modify this part to include intensity information
-                    distortions_info = []
-                    for d in distortions_list:
-                        if d['type'] == 'Color':
-                            distortions_info.append(f"{d['type']} (Saturation: {d['saturation']:.2f}, Hue Shift: {d['hue_shift']:.2f})")
-                        elif d['type'] == 'Warp':
-                            distortions_info.append(f"{d['type']} (Intensity: {d['intensity']:.2f}, Wave Amp: {d['warp_params']['wave_amplitude']:.2f}, Wave Freq: {d['warp_params']['wave_frequency']:.2f}, Bulge: {d['warp_params']['bulge_factor']:.2f})")
-                        else:
-                            distortions_info.append(f"{d['type']} (Intensity: {d['intensity']:.2f})")
+            # Images that have not been shown yet still need a prompt
+            for settings in st.session_state.image_settings:
+                if not settings.input_text:
+                    settings.input_text = PREDEFINED_PROMPTS[0]
 
-                    # Get AI response
-                    text_response, json_response = get_gemini_response(
-                        settings["input_text"],
-                        processed_image,
-                        st.session_state.model_choice,
-                        st.session_state.system_instructions if st.session_state.use_system_instructions else None,
-                        EXPECTED_JSON_FIELDS  # Add this line
-                    )
-
-                    # Create a result dictionary with basic info
-                    result = {
-                        "Image": file_name,
-                        "Distortions": ', '.join(distortions_info),
-                        "Input Text": settings["input_text"],
-                        "AI Response": text_response,
-                        "JSON Response": json.dumps(json_response, indent=2)
-                    }
-
-                    # Add result to list
-                    results.append(result)
-
-                    # Show AI response
-                    st.write(f"AI Response for {file_name}:")
-                    st.write(text_response)
-
-                    st.markdown("---")  # Add a separator between images
-
-                except Exception as e:
-                    st.error(f"Error processing {file_name}: {str(e)}")
-                    st.error(traceback.format_exc())
-
-                progress_bar.progress((i + 1) / len(uploaded_files))
-
-            if results:
-                # Create DataFrame
-                results_df = pd.DataFrame(results)
-
-                # Add JSON fields as separate columns
-                for field in EXPECTED_JSON_FIELDS:
-                    results_df[field] = results_df['JSON Response'].apply(
-                        lambda x: json.loads(x).get(field, '')
-                    )
-                    # Check if the field contains a list and join it into a string
-                    if results_df[field].dtype == 'object':
-                        results_df[field] = results_df[field].apply(
-                            lambda x: ', '.join(x) if isinstance(x, list) else x
-                        )
-
-                # Remove empty columns
-                results_df = results_df.dropna(axis=1, how='all')
-
-                # Remove columns that are entirely empty strings
-                results_df = results_df.loc[:, (results_df != '').any()]
-
-                # Reorder columns
-                base_columns = ["Image", "Distortions", "Input Text", "AI Response", "JSON Response"]
-                json_columns = [col for col in EXPECTED_JSON_FIELDS if col in results_df.columns]
-                columns_order = base_columns + json_columns
-
-                # Only include columns that exist in the DataFrame
-                columns_order = [col for col in columns_order if col in results_df.columns]
-                results_df = results_df[columns_order]
-
-                st.subheader("Analysis Results")
-                st.dataframe(results_df)
+        deduplicate_frames = False
+        if uploaded_files:
+            deduplicate_frames = st.checkbox(
+                "Deduplicate near-identical frames",
+                value=False,
+                help="Analyse one representative per cluster of near-identical images and copy its result to the duplicates."
+            )
+            if deduplicate_frames:
+                col1, col2 = st.columns(2)
+                with col1:
+                    hash_method = st.selectbox("Perceptual hash", HASH_METHODS)
+                with col2:
+                    max_hamming_distance = st.slider("Max Hamming distance", 0, 20, 5)
 
-                # Convert DataFrame to CSV
-                csv = results_df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name="bulk_analysis_results.csv",
-                    mime="text/csv",
-                )
-            else:
-                st.warning("No results were generated. Please check your inputs and try again.")
+        # Button to start bulk analysis
+        if st.button("Run Bulk Analysis") and uploaded_files:
+            bulk_items = []
+            for file, settings in zip(uploaded_files, st.session_state.image_settings):
+                plan = build_plan(settings, centralized_distortions, centralized_distortion_settings)
+                bulk_items.append((file, plan, settings.input_text))
+
+            analysed_indices = list(range(len(bulk_items)))
+            if deduplicate_frames:
+                with st.spinner("Hashing images for deduplication..."):
+                    hash_index = HashIndex(os.path.join(get_data_dir(), "hash_index.json"))
+                    hashes = hash_files([item[0] for item in bulk_items], method=hash_method, index=hash_index)
+                groups = [(plan.content_hash, input_text) for _, plan, input_text in bulk_items]
+                assignments = cluster_hashes(hashes, max_hamming_distance, groups)
+                analysed_indices = sorted(set(assignments))
+                st.info(f"Deduplication: analysing {len(analysed_indices)} of {len(bulk_items)} images.")
+
+            request_backend = HedgingBackend(
+                get_backend(),
+                timeout=request_timeout or None,
+                hedge_percentile=hedge_percentile,
+                hedge_budget=hedge_budget,
+                tracker=st.session_state.latency_tracker
+            )
+            results_store = get_results_store()
+            dedup_assignments = assignments if deduplicate_frames else None
+            consistency = None
+            if use_consistency:
+                consistency = SelfConsistency(max_samples=consistency_samples, threshold=consistency_threshold)
+            # Uploads stay on disk until the job has read them and its results are saved
+            blob_store = get_blob_store()
+            blob_store.hold([item[0] for item in bulk_items if isinstance(item[0], str)])
+            get_bulk_manager().submit(
+                [bulk_items[i] for i in analysed_indices],
+                bulk_models,
+                st.session_state.system_instructions if st.session_state.use_system_instructions else None,
+                EXPECTED_JSON_FIELDS,
+                owner=analyst,
+                label=f"{len(bulk_items)} images, {', '.join(bulk_models)} ({time.strftime('%H:%M:%S')})",
+                backend=request_backend,
+                load_overlay=load_overlay,
+                artifact_cache=get_artifact_cache() if use_artifact_cache else None,
+                on_finish=lambda job: save_bulk_job_results(job, bulk_items, analysed_indices, dedup_assignments,
+                                                            request_backend, results_store, consistency,
+                                                            blob_store),
+                resources=blob_store,
+                consistency=consistency
+            )
+            st.success(f"Bulk job submitted. It keeps running if you change settings or close this page; "
+                       f"enter analyst name '{analyst}' to find it again.")
         elif not uploaded_files:
             st.warning("Please upload at least one image or specify a valid folder path to proceed with bulk analysis.")
 
+        # Jobs run on the server's worker pool; poll them while any is unfinished
+        polling = any(not job.finished for job in get_bulk_manager().jobs(analyst))
+        st.fragment(run_every=2 if polling else None)(show_bulk_jobs)(analyst)
+
     elif analysis_mode == "Red Teaming":
         st.header("Red Teaming & Safety Testing")
         st.markdown("Test the robustness of the Road Safety AI against adversarial attacks and prompt injections.")
@@ -845,52 +1154,169 @@ if st.session_state.api_key:
         elif attack_type == "Adversarial Image Testing":
             st.subheader("Adversarial Image Testing")
             st.info("Test how the model responds to distorted or manipulated images.")
-            
-            uploaded_file = st.file_uploader("Upload Base Image", type=["jpg", "jpeg", "png"])
-            
-            if uploaded_file:
-                image = Image.open(uploaded_file)
-                
-                # Re-use existing distortion tools for this
-                st.write("Apply Distortions to simulate adversarial noise:")
-                
-                distortion_type = st.selectbox("Select Distortion", ["Noise (simulated via grain)", "Blur", "Occlusion (Overlay)"])
-                
-                processed_image = image
-                distortion_desc = "None"
-                
-                if distortion_type == "Blur":
-                    radius = st.slider("Blur Radius", 0, 20, 5)
-                    # Simple inline blur for demo or use utils if available. 
-                    # using utils.apply_distortions would be better but keeping it simple here or linking back.
-                    # We will construct a minimal settings dict to reuse apply_distortions
-                    processed_image = apply_distortions(image, [{'type': 'Blur', 'intensity': radius/20}]) # normalize roughly
-                    distortion_desc = f"Blur (Radius: {radius})"
-                    
-                elif distortion_type == "Occlusion (Overlay)":
-                     st.write("Use the 'Single' analysis mode for full overlay controls. This is a quick test.")
-                     # Setup a simple black box overlay
-                     # For now, just pass through or add a simple placeholder if needed
-                     # We'll just stick to Blur for the quick red team demo to avoid complexity
-                
-                st.image(processed_image, caption=f"Adversarial Candidate: {distortion_desc}", width=400)
-                
-                test_prompt = st.text_input("Test Prompt", value="Identify all safety hazards.")
-                
-                if st.button("Test Model on Adversarial Image"):
-                    try:
-                        text_response, _ = get_gemini_response(
+
+            test_mode = st.radio("Mode", ["Manual", "Automated Robustness Search"], horizontal=True)
+
+            if test_mode == "Manual":
+                uploaded_file = st.file_uploader("Upload Base Image", type=["jpg", "jpeg", "png"])
+
+                if uploaded_file:
+                    image = Image.open(uploaded_file)
+
+                    # Re-use existing distortion tools for this
+                    st.write("Apply Distortions to simulate adversarial noise:")
+
+                    distortion_type = st.selectbox("Select Distortion", ["Noise (simulated via grain)", "Blur", "Occlusion (Overlay)"])
+
+                    processed_image = image
+                    distortion_desc = "None"
+
+                    if distortion_type == "Blur":
+                        radius = st.slider("Blur Radius", 0, 20, 5)
+                        # We will construct a minimal settings dict to reuse apply_distortions
+                        processed_image = apply_distortions(image, [{'type': 'Blur', 'intensity': radius/20}]) # normalize roughly
+                        distortion_desc = f"Blur (Radius: {radius})"
+
+                    elif distortion_type == "Occlusion (Overlay)":
+                        coverage = st.slider("Occluded area (%)", 0, 100, 20)
+                        processed_image = apply_occlusion(image, coverage / 100)
+                        distortion_desc = f"Occlusion ({coverage}% of the image)"
+
+                    st.image(processed_image, caption=f"Adversarial Candidate: {distortion_desc}", width=400)
+
+                    test_prompt = st.text_input("Test Prompt", value="Identify all safety hazards.")
+
+                    if st.button("Test Model on Adversarial Image"):
+                        try:
+                            text_response, _ = get_gemini_response(
+                                test_prompt,
+                                processed_image,
+                                st.session_state.model_choice,
+                                st.session_state.system_instructions,
+                                EXPECTED_JSON_FIELDS
+                            )
+                            st.write("### Model Response")
+                            st.write(text_response)
+
+                        except Exception as e:
+                            st.error(f"Error: {str(e)}")
+
+            else:
+                st.write("For each image and distortion, find the smallest intensity at which the model's "
+                         "`overall_safety` or `potential_hazards` output changes materially.")
+                search_files = st.file_uploader("Upload Images", type=["jpg", "jpeg", "png"], accept_multiple_files=True,
+                                                key="robustness_files")
+                search_types = st.multiselect("Distortions", SEARCH_DISTORTION_TYPES, default=["Blur", "Occlusion"])
+                test_prompt = st.text_input("Test Prompt", value="Identify all safety hazards.", key="robustness_prompt")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    tolerance = st.select_slider("Precision", options=[0.1, 0.05, 0.02, 0.01], value=0.02)
+                with col2:
+                    hazard_similarity = st.slider(
+                        "Hazard overlap still counted as unchanged", 0.0, 1.0, 0.5, 0.05,
+                        help="Jaccard similarity between the hazard lists of the clean and distorted image."
+                    )
+                with col3:
+                    grid_points = st.number_input(
+                        "Coarse grid points", min_value=0, max_value=9, value=0,
+                        help="Evaluate a coarse grid in parallel before bisecting; helps when responses flip back and forth."
+                    )
+
+                if st.button("Run Robustness Search") and search_files and search_types:
+                    memo = st.session_state.setdefault('robustness_memo', EvaluationMemo())
+                    calls_before = memo.stats["calls"]
+                    with st.spinner("Searching for robustness thresholds..."):
+                        rows = search_robustness(
+                            search_files,
+                            search_types,
                             test_prompt,
-                            processed_image,
                             st.session_state.model_choice,
-                            st.session_state.system_instructions,
-                            EXPECTED_JSON_FIELDS
+                            st.session_state.system_instructions if st.session_state.use_system_instructions else None,
+                            EXPECTED_JSON_FIELDS,
+                            tolerance=tolerance,
+                            grid_points=int(grid_points),
+                            hazard_similarity_threshold=hazard_similarity,
+                            memo=memo
                         )
-                        st.write("### Model Response")
-                        st.write(text_response)
-                        
-                    except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                    import pandas as pd
+                    table = pd.DataFrame(rows)
+                    table["Threshold"] = [
+                        ("search failed" if error else "robust up to 1.0") if t is None else f"{t:.3f}"
+                        for t, error in zip(table["Threshold"], table["Error"])
+                    ]
+                    failed = int(table["Error"].notna().sum())
+                    if failed:
+                        st.warning(f"{failed} searches failed because a model call returned an error; run the search again to retry them.")
+                    st.dataframe(table.drop(columns=["Bracket"]))
+                    st.caption(
+                        f"{memo.stats['calls'] - calls_before} model calls; an exhaustive sweep at this precision "
+                        f"would need {exhaustive_sweep_calls(len(search_files), len(search_types), tolerance=tolerance)}."
+                    )
+
+    elif analysis_mode == "Results Explorer":
+        st.header("Results Explorer")
+        st.markdown("Query and aggregate the results of previous bulk runs.")
+
+        results_store = get_results_store()
+        runs = results_store.list_runs()
+        if runs.empty:
+            st.info("No bulk runs have been saved yet. Run a bulk analysis to populate the results store.")
+        else:
+            run_labels = {
+                row.run_id: f"{row.run_id} ({row.model}, {row.item_count} results)"
+                for row in runs.itertuples()
+            }
+            col1, col2 = st.columns(2)
+            with col1:
+                selected_runs = st.multiselect("Runs", list(run_labels), format_func=run_labels.get,
+                                               placeholder="All runs")
+            with col2:
+                selected_models = st.multiselect("Models", results_store.distinct_values("model"),
+                                                 placeholder="All models")
+            filters = {"run_id": selected_runs or None, "model": selected_models or None}
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                fields = results_store.fields()
+                field = st.selectbox("Field", fields,
+                                     index=fields.index("potential_hazards") if "potential_hazards" in fields else 0)
+            with col2:
+                group_by = st.selectbox("Group by", ["model", "run_id", "distortions", "prompt", "image_name"])
+            with col3:
+                top = st.number_input("Top values per group", min_value=1, max_value=100, value=10)
+
+            start_time = time.perf_counter()
+            counts = results_store.field_value_counts(field, group_by=group_by, top=int(top), **filters)
+            totals = results_store.count_results(group_by=group_by, **filters)
+            elapsed = time.perf_counter() - start_time
+
+            st.subheader(f"Most frequent {field} values by {group_by}")
+            st.dataframe(counts, use_container_width=True)
+            st.caption(f"Query time: {elapsed * 1000:.0f} ms")
+
+            with st.expander("Results per group"):
+                st.dataframe(totals, use_container_width=True)
+
+            with st.expander("Result rows"):
+                row_limit = st.number_input("Row limit", min_value=10, max_value=10000, value=200, step=10)
+                rows = results_store.query_results(limit=int(row_limit), **filters)
+                st.dataframe(rows.drop(columns=["json_response", "plan_json"], errors="ignore"),
+                             use_container_width=True)
+
+            st.subheader("Degradation vs. clean baseline")
+            st.markdown("Compares each distorted result with the undistorted result for the same image, model and prompt.")
+            if st.button("Score Degradation"):
+                from scoring import score_degradation
+                with st.spinner("Scoring..."):
+                    start_time = time.perf_counter()
+                    scores, summary = score_degradation(results_store.query_results(limit=None, **filters),
+                                                        EXPECTED_JSON_FIELDS)
+                    elapsed = time.perf_counter() - start_time
+                if scores.empty:
+                    st.info("No distorted results have a clean baseline. Include runs without distortions to score degradation.")
+                else:
+                    st.dataframe(summary, use_container_width=True)
+                    st.caption(f"Scored {len(scores)} pairs in {elapsed * 1000:.0f} ms")
 
 
 else:
@@ -0,0 +1,156 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+
+DEFAULT_CACHE_MB = 1024
+# Bump when distortion or encoding code changes what a plan produces, so old artifacts are not reused
+ARTIFACT_VERSION = 2
+
+
+def artifact_key(source_hash, plan_hash, encoding="png"):
+    """
+    Cache key for the upload-ready bytes of one image under one distortion plan.
+
+    Args:
+        source_hash (str): SHA-256 of the source image's encoded bytes.
+        plan_hash (str): DistortionPlan.content_hash.
+        encoding (str): Encoding settings of the output, e.g. "png".
+
+    Returns:
+        str: Hex digest used as the artifact's file name.
+    """
+    return hashlib.sha256(f"{ARTIFACT_VERSION}|{source_hash}|{plan_hash}|{encoding}".encode()).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size-capped, content-addressed disk cache of distorted and encoded images.
+
+    Entries are files named by artifact_key, so the cache can be shared by
+    processes using the same directory. When the total size exceeds `max_bytes`,
+    the least recently used entries are removed; a hit touches the file's
+    modification time, since access times are often not updated.
+
+    Plans with random distortions (Rain, Fog, Snow, Night, Glare) are rendered
+    with a seed derived from the source hash and plan hash (distortion_plan.plan_seed),
+    the inputs of the key. A cached entry is therefore the same rendering a miss
+    would produce, and whether a run hits or misses does not change what the
+    model sees.
+
+    Args:
+        directory (str): Cache directory, created if needed.
+        max_bytes (int): Size ceiling for all entries.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                self._entries[entry.name] = (stat.st_size, stat.st_mtime)
+        self._size = sum(size for size, _ in self._entries.values())
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    @property
+    def size(self):
+        """Bytes of artifacts currently on disk (as known to this process)."""
+        return self._size
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def get(self, key):
+        """Returns the cached bytes for `key`, or None."""
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["misses"] += 1
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)[0]
+            return None
+        now = time.time()
+        try:
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.stats["hits"] += 1
+            if key not in self._entries:
+                self._size += len(data)
+            self._entries[key] = (len(data), now)
+        return data
+
+    def put(self, key, data):
+        """Stores `data` under `key`, evicting old entries if the cache is over its size limit."""
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.stats["writes"] += 1
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._size -= previous[0]
+            self._entries[key] = (len(data), time.time())
+            self._size += len(data)
+            self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        if self._size <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+            self._size -= size
+            self.stats["evictions"] += 1
+
+    def get_or_create(self, key, produce):
+        """Returns the cached bytes for `key`, calling `produce()` and caching its result on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = produce()
+            self.put(key, data)
+        return data
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Removes every artifact."""
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,257 @@
+import io
+import os
+import asyncio
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from backends import get_backend
+from bulk import encode_image, image_digest
+from diagnostics import get_logger
+from distortion_plan import DistortionPlan, CompiledPlan, EMPTY_PLAN, plan_seed
+from utils import build_model_content, parse_model_response
+
+logger = get_logger("async_api")
+
+DEFAULT_MAX_IN_FLIGHT = 1000
+# Threads used to call backends that only have a blocking generate_content
+DEFAULT_BLOCKING_REQUEST_THREADS = 64
+
+
+class AnalysisLimiter:
+    """
+    Bounds the work started by analyze_one and analyze_many on one event loop.
+
+    `max_in_flight` caps whole analyses, from decoding the image to parsing the
+    response, so callers that start thousands of analyses hold at most that many
+    prepared images and open requests at once. `max_cpu_jobs` caps decode, distort
+    and encode steps running on the CPU executor at the same time.
+
+    Semaphores are bound to the event loop that first uses them, so a limiter should
+    not be shared between loops.
+
+    Args:
+        max_in_flight (int): Analyses allowed past admission at once.
+        max_cpu_jobs (int): Concurrent CPU steps; defaults to the number of CPUs.
+        executor: Executor for CPU steps; a thread pool of `max_cpu_jobs` threads by default.
+        request_executor: Executor for backends without generate_content_async.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_cpu_jobs=None, executor=None,
+                 request_executor=None):
+        self.max_in_flight = max_in_flight
+        self.max_cpu_jobs = max_cpu_jobs or os.cpu_count() or 1
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.cpu = asyncio.Semaphore(self.max_cpu_jobs)
+        self._executor = executor
+        self._request_executor = request_executor
+        self._owned = []
+        self.stats = {"started": 0, "completed": 0, "failed": 0, "peak_in_flight": 0}
+        self._active = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_cpu_jobs, thread_name_prefix="async-cpu")
+            self._owned.append(self._executor)
+        return self._executor
+
+    @property
+    def request_executor(self):
+        if self._request_executor is None:
+            self._request_executor = ThreadPoolExecutor(
+                max_workers=min(self.max_in_flight, DEFAULT_BLOCKING_REQUEST_THREADS),
+                thread_name_prefix="async-request")
+            self._owned.append(self._request_executor)
+        return self._request_executor
+
+    async def run_cpu(self, func, *args):
+        """Runs a blocking CPU step on the executor, waiting for a free CPU slot first."""
+        async with self.cpu:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def shutdown(self):
+        """Stops the executors this limiter created."""
+        for executor in self._owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._owned = []
+
+    def _enter(self):
+        self._active += 1
+        self.stats["started"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._active)
+
+    def _exit(self, failed):
+        self._active -= 1
+        self.stats["failed" if failed else "completed"] += 1
+
+
+_default_limiters = weakref.WeakKeyDictionary()
+
+
+def get_default_limiter():
+    """Returns the limiter shared by calls on the running event loop that do not pass one."""
+    loop = asyncio.get_running_loop()
+    limiter = _default_limiters.get(loop)
+    if limiter is None:
+        limiter = _default_limiters[loop] = AnalysisLimiter()
+    return limiter
+
+
+def _as_compiled(distortions, load_overlay=None):
+    if isinstance(distortions, CompiledPlan):
+        return distortions
+    if isinstance(distortions, DistortionPlan):
+        return distortions.compile(load_overlay)
+    return DistortionPlan.from_distortions(distortions or []).compile(load_overlay)
+
+
+def _prepare_image(image, compiled):
+    """Decodes (if needed), distorts and PNG-encodes an image. Runs on the CPU executor."""
+    if isinstance(image, (bytes, bytearray)) and not compiled.plan.is_effective:
+        return bytes(image)
+    # Random distortions are seeded from the source, as in bulk runs
+    if isinstance(image, (bytes, bytearray)):
+        source_hash = hashlib.sha256(image).hexdigest()
+        image = Image.open(io.BytesIO(image))
+    elif not isinstance(image, Image.Image):
+        source_hash = image_digest(image)
+        if hasattr(image, 'seek'):
+            image.seek(0)
+        image = Image.open(image)
+    else:
+        source_hash = hashlib.sha256(image.tobytes()).hexdigest()
+    return encode_image(compiled.apply(image, seed=plan_seed(0, source_hash, compiled.plan.content_hash)))
+
+
+async def _generate(backend, model_name, content, timeout, limiter):
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    if hasattr(backend, "generate_content_async"):
+        return await backend.generate_content_async(model_name, content, **kwargs)
+    # Blocking backends (e.g. HedgingBackend) run on a bounded thread pool
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(limiter.request_executor,
+                                      lambda: backend.generate_content(model_name, content, **kwargs))
+
+
+async def get_gemini_response_async(input_text, image, model_name, system_instructions, expected_fields,
+                                    backend=None, timeout=None, limiter=None):
+    """
+    Async counterpart of utils.get_gemini_response.
+
+    Uses the backend's generate_content_async when it has one, so the request does
+    not occupy a thread while it waits.
+
+    Args:
+        input_text (str): Prompt sent along with the image.
+        image (PIL.Image or bytes): PNG bytes or an image, or None.
+        model_name (str): Model used for the analysis.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        timeout (float): Per-request deadline in seconds, passed to the backend.
+        limiter (AnalysisLimiter): Executors used for blocking backends.
+
+    Returns:
+        tuple: (text_response, json_response), the same as get_gemini_response.
+    """
+    backend = backend or get_backend()
+    limiter = limiter or get_default_limiter()
+    content = build_model_content(input_text, image, system_instructions, expected_fields)
+    if not content:
+        return "No input provided to the model.", {}
+    try:
+        response = await _generate(backend, model_name, content, timeout, limiter)
+        return parse_model_response(response)
+    except Exception as e:
+        logger.debug("Model request to %s failed", model_name, exc_info=True)
+        error_message = f"Error generating response: {str(e)}"
+        return error_message, {"error": error_message}
+
+
+async def analyze_one(image, distortions, input_text, model_name, system_instructions, expected_fields,
+                      backend=None, timeout=None, limiter=None, load_overlay=None):
+    """
+    Distorts one image and analyses it, without blocking the event loop.
+
+    Decoding, distorting and encoding run on the limiter's CPU executor; the model
+    request is awaited on the loop.
+
+    Args:
+        image: PIL image, encoded image bytes, a path or a file object.
+        distortions: DistortionPlan, CompiledPlan, a list of distortion dicts as used by
+                     apply_distortions, or None.
+        input_text (str): Prompt sent along with the image.
+        model_name (str): Model used for the analysis.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        timeout (float): Per-request deadline in seconds.
+        limiter (AnalysisLimiter): Concurrency bounds; the running loop's default limiter otherwise.
+        load_overlay (callable): Resolves overlay references in the plan.
+
+    Returns:
+        tuple: (text_response, json_response), the same as get_gemini_response.
+    """
+    limiter = limiter or get_default_limiter()
+    async with limiter.in_flight:
+        limiter._enter()
+        failed = True
+        try:
+            compiled = _as_compiled(distortions, load_overlay)
+            image_bytes = await limiter.run_cpu(_prepare_image, image, compiled)
+            result = await get_gemini_response_async(input_text, image_bytes, model_name, system_instructions,
+                                                     expected_fields, backend=backend, timeout=timeout,
+                                                     limiter=limiter)
+            failed = False
+            return result
+        finally:
+            limiter._exit(failed)
+
+
+async def analyze_many(items, model_name, system_instructions, expected_fields, backend=None, timeout=None,
+                       limiter=None, load_overlay=None, return_exceptions=False):
+    """
+    Analyses many images concurrently from one event loop.
+
+    All items are scheduled at once and the limiter's semaphores apply backpressure,
+    so thousands of items can be passed in. Each distinct DistortionPlan is compiled
+    once and shared by every item that uses it.
+
+    Args:
+        items (iterable): (image, distortions, input_text) tuples, as accepted by analyze_one.
+        model_name (str): Model used for the analysis.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        timeout (float): Per-request deadline in seconds.
+        limiter (AnalysisLimiter): Concurrency bounds; the running loop's default limiter otherwise.
+        load_overlay (callable): Resolves overlay references in the plans.
+        return_exceptions (bool): Return an item's exception in its place instead of raising it.
+
+    Returns:
+        list: (text_response, json_response) per item, in input order.
+    """
+    limiter = limiter or get_default_limiter()
+    compiled_plans = {}
+
+    def compiled_for(distortions):
+        if distortions is None:
+            distortions = EMPTY_PLAN
+        if not isinstance(distortions, DistortionPlan):
+            return distortions
+        if distortions not in compiled_plans:
+            compiled_plans[distortions] = distortions.compile(load_overlay)
+        return compiled_plans[distortions]
+
+    tasks = [
+        asyncio.ensure_future(analyze_one(image, compiled_for(distortions), input_text, model_name,
+                                          system_instructions, expected_fields, backend=backend,
+                                          timeout=timeout, limiter=limiter, load_overlay=load_overlay))
+        for image, distortions, input_text in items
+    ]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,300 @@
+import os
+import re
+import math
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+
+# Fields the fake backend fills in when it cannot find a field list in the prompt
+DEFAULT_FAKE_FIELDS = [
+    "scene_description",
+    "potential_hazards",
+    "suggested_improvements",
+    "overall_safety"
+]
+
+# Vocabulary used by the fake backend to build plausible analysis payloads
+FAKE_HAZARDS = [
+    "pedestrian crossing without signal",
+    "faded lane markings",
+    "parked vehicles obstructing view",
+    "cyclist in traffic lane",
+    "poor street lighting",
+    "wet road surface",
+    "sharp bend ahead",
+    "overgrown vegetation near signage",
+    "missing pedestrian barrier",
+    "heavy traffic congestion"
+]
+
+FAKE_IMPROVEMENTS = [
+    "repaint lane markings",
+    "install additional street lighting",
+    "add a signalised pedestrian crossing",
+    "trim vegetation around signs",
+    "introduce a dedicated cycle lane",
+    "reduce the speed limit",
+    "add warning signage before the bend"
+]
+
+FAKE_SAFETY_LEVELS = ["Safe", "Moderately safe", "Moderately unsafe", "Unsafe"]
+
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "normal", "lognormal", "exponential"]
+
+
+class FakeRateLimitError(Exception):
+    """Raised by the fake backend to simulate a 429 quota error."""
+
+
+class GeminiBackend:
+    """
+    Backend that sends requests to the Gemini API through google.generativeai.
+
+    The SDK is imported on first use; it is by far the slowest import in the platform.
+    """
+    name = "gemini"
+
+    def configure(self, api_key):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+
+    def generate_content(self, model_name, content, timeout=None):
+        import google.generativeai as genai
+        model = genai.GenerativeModel(model_name)
+        if timeout is not None:
+            # Enforced by the underlying transport, so a hung request is actually abandoned
+            return model.generate_content(content, request_options={"timeout": timeout})
+        return model.generate_content(content)
+
+    async def generate_content_async(self, model_name, content, timeout=None):
+        import google.generativeai as genai
+        model = genai.GenerativeModel(model_name)
+        if timeout is not None:
+            return await model.generate_content_async(content, request_options={"timeout": timeout})
+        return await model.generate_content_async(content)
+
+    def list_models(self):
+        import google.generativeai as genai
+        models = []
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                models.append(m.name)
+        return models
+
+
+class FakeResponse:
+    """
+    Minimal stand-in for a google.generativeai response object.
+
+    Accessing `text` on a blocked response raises, just like the real SDK does
+    when there are no candidates to read from.
+    """
+
+    def __init__(self, text, block_reason=None):
+        self._text = text
+        self.prompt_feedback = SimpleNamespace(block_reason=block_reason)
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("The response has no candidates to read text from.")
+        return self._text
+
+
+class FakeBackend:
+    """
+    Offline backend that returns valid ===JSON=== payloads without any network access.
+
+    Latency, rate limiting (429s), safety blocks and malformed JSON are simulated
+    so the bulk pipeline can be load-tested without spending API quota.
+
+    Args:
+        latency (str): One of LATENCY_DISTRIBUTIONS.
+        latency_mean (float): Mean latency in seconds.
+        latency_spread (float): Spread of the distribution (half-width for uniform,
+                                standard deviation for normal, sigma for lognormal).
+        rate_limit_rate (float): Probability that a call raises FakeRateLimitError.
+        safety_block_rate (float): Probability that a call is blocked by safety filters.
+        malformed_json_rate (float): Probability that the JSON block is malformed.
+        variability (float): Probability that a payload is drawn at random rather than
+                             from the request, as a model sampled at a nonzero temperature
+                             answers identical requests differently.
+        seed (int): Seed for the random number generator.
+        models (list): Model names returned by list_models.
+    """
+    name = "fake"
+
+    def __init__(self, latency="constant", latency_mean=0.0, latency_spread=0.0,
+                 rate_limit_rate=0.0, safety_block_rate=0.0, malformed_json_rate=0.0,
+                 variability=0.0, seed=None, models=None):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_spread = latency_spread
+        self.rate_limit_rate = rate_limit_rate
+        self.safety_block_rate = safety_block_rate
+        self.malformed_json_rate = malformed_json_rate
+        self.variability = variability
+        self.models = models or ["models/fake-flash", "models/fake-pro"]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "rate_limited": 0, "blocked": 0, "malformed": 0}
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def sample_latency(self):
+        """Draws one latency value (in seconds) from the configured distribution."""
+        with self._lock:
+            if self.latency == "constant":
+                value = self.latency_mean
+            elif self.latency == "uniform":
+                value = self._rng.uniform(self.latency_mean - self.latency_spread,
+                                          self.latency_mean + self.latency_spread)
+            elif self.latency == "normal":
+                value = self._rng.gauss(self.latency_mean, self.latency_spread)
+            elif self.latency == "lognormal":
+                # latency_mean is the median of the distribution
+                if self.latency_mean > 0:
+                    value = self._rng.lognormvariate(math.log(self.latency_mean), self.latency_spread)
+                else:
+                    value = 0.0
+            else:
+                value = self._rng.expovariate(1 / self.latency_mean) if self.latency_mean > 0 else 0.0
+        return max(0.0, value)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def configure(self, api_key):
+        """The fake backend accepts any API key."""
+
+    def generate_content(self, model_name, content, timeout=None):
+        self._count("calls")
+        latency = self.sample_latency()
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Simulated request exceeded its {timeout:.2f}s timeout")
+        time.sleep(latency)
+        return self._respond(model_name, content)
+
+    async def generate_content_async(self, model_name, content, timeout=None):
+        """Same as generate_content, but waits on the event loop instead of blocking a thread."""
+        self._count("calls")
+        latency = self.sample_latency()
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"Simulated request exceeded its {timeout:.2f}s timeout")
+        await asyncio.sleep(latency)
+        return self._respond(model_name, content)
+
+    def _respond(self, model_name, content):
+        if self._random() < self.rate_limit_rate:
+            self._count("rate_limited")
+            raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+        if self._random() < self.safety_block_rate:
+            self._count("blocked")
+            return FakeResponse(None, block_reason="SAFETY")
+
+        fields = _fields_from_content(content)
+        digest = _content_digest(content, model_name)
+        if self.variability and self._random() < self.variability:
+            digest += str(self._random()).encode()
+        payload = build_fake_payload(fields, digest)
+        text = f"Simulated analysis from {model_name}."
+        if self._random() < self.malformed_json_rate:
+            self._count("malformed")
+            json_block = json.dumps(payload)[:-1] + ","
+        else:
+            json_block = json.dumps(payload, indent=2)
+        return FakeResponse(f"{text}\n===JSON===\n{json_block}\n===JSON===")
+
+    def list_models(self):
+        return list(self.models)
+
+
+def _fields_from_content(content):
+    """Recovers the requested JSON fields from the instructions built by get_gemini_response."""
+    for part in content:
+        if isinstance(part, str):
+            match = re.search(r'following fields[^:]*:\s*\n\s*(.+)', part)
+            if match:
+                return [f.strip() for f in match.group(1).split(',') if f.strip()]
+    return list(DEFAULT_FAKE_FIELDS)
+
+
+def _content_digest(content, model_name):
+    digest = hashlib.sha256(model_name.encode())
+    for part in content:
+        if isinstance(part, str):
+            digest.update(part.encode())
+        elif isinstance(part, dict) and part.get("data"):
+            digest.update(part["data"])
+    return digest.digest()
+
+
+def build_fake_payload(fields, digest):
+    """
+    Builds a deterministic analysis payload for the given fields.
+
+    Args:
+        fields (list): JSON field names to fill in.
+        digest (bytes): Seed material, so identical requests produce identical payloads.
+
+    Returns:
+        dict: A payload shaped like the model's JSON output.
+    """
+    rng = random.Random(digest)
+    payload = {}
+    for field in fields:
+        if field == "potential_hazards":
+            payload[field] = rng.sample(FAKE_HAZARDS, rng.randint(1, 4))
+        elif field in ("suggested_improvements", "safety_features"):
+            payload[field] = rng.sample(FAKE_IMPROVEMENTS, rng.randint(1, 3))
+        elif field == "overall_safety":
+            payload[field] = rng.choice(FAKE_SAFETY_LEVELS)
+        else:
+            payload[field] = f"Simulated {field.replace('_', ' ')}: {rng.choice(FAKE_HAZARDS)}."
+    return payload
+
+
+_active_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the active model backend.
+
+    The Gemini backend is used unless another backend was installed with
+    set_backend or the ROAD_SAFETY_BACKEND environment variable is set to "fake".
+    """
+    global _active_backend
+    with _backend_lock:
+        if _active_backend is None:
+            if os.environ.get("ROAD_SAFETY_BACKEND", "").lower() == "fake":
+                _active_backend = FakeBackend()
+            else:
+                _active_backend = GeminiBackend()
+        return _active_backend
+
+
+def set_backend(backend):
+    """
+    Installs the backend used by get_gemini_response and list_available_models.
+
+    Args:
+        backend: An object with generate_content(model_name, content) and list_models(),
+                 or None to fall back to the default backend.
+    """
+    global _active_backend
+    with _backend_lock:
+        _active_backend = backend
@@ -0,0 +1,234 @@
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, Counter
+
+BLOB_PREFIX = "blob:"
+DEFAULT_MEMORY_LIMIT_MB = 64
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_blob_ref(value):
+    """Returns True if `value` is a reference returned by BlobStore.put."""
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+
+def _safe_file_name(name):
+    name = os.path.basename(name) or "file"
+    return re.sub(r'[^A-Za-z0-9._#-]', '_', name)
+
+
+class BlobStore:
+    """
+    Per-session, content-addressed store for image and overlay payloads.
+
+    Payloads live on disk; session state only holds short references. Recently
+    used payloads are kept in memory up to `memory_limit` bytes and evicted
+    least-recently-used first. Identical payloads are stored once.
+
+    Args:
+        directory (str): Directory for the store, or None for a new temporary directory
+                         that is removed when the store is garbage collected.
+        memory_limit (int): Ceiling in bytes for payloads cached in memory.
+    """
+
+    def __init__(self, directory=None, memory_limit=DEFAULT_MEMORY_LIMIT_MB * 1024 * 1024):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="road_safety_session_")
+            self._finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        else:
+            self._finalizer = None
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self._objects_dir = os.path.join(directory, "objects")
+        self._files_dir = os.path.join(directory, "files")
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._files_dir, exist_ok=True)
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._file_count = 0
+        # Digest behind every file view, digests referenced through put(), and files held by running jobs
+        self._file_digests = {}
+        self._ref_digests = set()
+        self._holds = Counter()
+        self._discarded = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_dir, digest)
+
+    def _write(self, chunks):
+        """Streams chunks to disk, returning the content digest."""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+            hexdigest = digest.hexdigest()
+            os.replace(tmp_path, self._object_path(hexdigest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return hexdigest
+
+    def put(self, data):
+        """
+        Stores a payload.
+
+        Args:
+            data (bytes): The payload.
+
+        Returns:
+            str: A reference of the form "blob:<sha256>".
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self._object_path(digest)):
+            self._write([data])
+        with self._lock:
+            self._ref_digests.add(digest)
+        return BLOB_PREFIX + digest
+
+    def put_file(self, file, name=None):
+        """
+        Copies an uploaded file into the store without building an extra in-memory copy.
+
+        Args:
+            file: A readable binary file object.
+            name (str): File name to expose; defaults to `file.name`.
+
+        Returns:
+            str: Path to a read-only view of the file that keeps the original file name,
+                 usable anywhere an image path is accepted.
+        """
+        name = _safe_file_name(name or getattr(file, 'name', 'file'))
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        digest = self._write(iter(lambda: file.read(CHUNK_SIZE), b""))
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+        with self._lock:
+            self._file_count += 1
+            link_dir = os.path.join(self._files_dir, str(self._file_count))
+        os.makedirs(link_dir, exist_ok=True)
+        link_path = os.path.join(link_dir, name)
+        try:
+            os.link(self._object_path(digest), link_path)
+        except OSError:
+            shutil.copyfile(self._object_path(digest), link_path)
+        with self._lock:
+            self._file_digests[link_path] = digest
+        return link_path
+
+    def hold(self, paths):
+        """Keeps files from being discarded until they are released, e.g. while a job reads them."""
+        with self._lock:
+            self._holds.update(paths)
+
+    def release(self, paths):
+        """Undoes hold; files discarded in the meantime are removed once nothing holds them."""
+        with self._lock:
+            self._holds.subtract(paths)
+            released = [path for path in set(paths) if self._holds[path] <= 0]
+            for path in released:
+                del self._holds[path]
+            self._remove_files([path for path in released if path in self._discarded])
+
+    def discard_files(self, paths):
+        """
+        Removes file views returned by put_file, and their payloads unless another
+        file or a put() reference still uses them. Held files are removed on release.
+        """
+        with self._lock:
+            held = {path for path in paths if self._holds[path] > 0}
+            self._discarded.update(held)
+            self._remove_files([path for path in paths if path not in held])
+
+    def _remove_files(self, paths):
+        digests = set()
+        for path in paths:
+            self._discarded.discard(path)
+            digest = self._file_digests.pop(path, None)
+            if digest is None:
+                continue
+            digests.add(digest)
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        for digest in digests - self._ref_digests - set(self._file_digests.values()):
+            data = self._cache.pop(digest, None)
+            if data is not None:
+                self._cache_bytes -= len(data)
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def get(self, ref):
+        """
+        Returns the payload for a reference, from memory if it is cached.
+
+        Args:
+            ref (str): A reference returned by put.
+
+        Returns:
+            bytes: The payload.
+        """
+        digest = ref[len(BLOB_PREFIX):]
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                self.stats["hits"] += 1
+                return self._cache[digest]
+            self.stats["misses"] += 1
+
+        with open(self._object_path(digest), "rb") as f:
+            data = f.read()
+
+        with self._lock:
+            if len(data) <= self.memory_limit and digest not in self._cache:
+                self._cache[digest] = data
+                self._cache_bytes += len(data)
+                self._evict()
+        return data
+
+    def _evict(self):
+        while self._cache_bytes > self.memory_limit and self._cache:
+            _, data = self._cache.popitem(last=False)
+            self._cache_bytes -= len(data)
+            self.stats["evictions"] += 1
+
+    def set_memory_limit(self, memory_limit):
+        """Changes the memory ceiling, evicting cached payloads if needed."""
+        with self._lock:
+            self.memory_limit = memory_limit
+            self._evict()
+
+    @property
+    def memory_usage(self):
+        """Bytes of payload currently cached in memory."""
+        return self._cache_bytes
+
+    @property
+    def disk_usage(self):
+        """Bytes of unique payloads stored on disk."""
+        return sum(entry.stat().st_size for entry in os.scandir(self._objects_dir) if entry.is_file())
+
+    def clear(self):
+        """Removes every payload from memory and disk."""
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+            self._file_digests.clear()
+            self._ref_digests.clear()
+            self._discarded.clear()
+            shutil.rmtree(self._objects_dir, ignore_errors=True)
+            shutil.rmtree(self._files_dir, ignore_errors=True)
+            os.makedirs(self._objects_dir, exist_ok=True)
+            os.makedirs(self._files_dir, exist_ok=True)
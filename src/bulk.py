@@ -0,0 +1,325 @@
+import io
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import get_gemini_response, open_image
+from distortion_plan import DistortionPlan, plan_seed
+from artifact_cache import artifact_key
+
+BASE_RESULT_COLUMNS = ["Image", "Model", "Distortions", "Input Text", "AI Response", "JSON Response"]
+# Encoding settings of the bytes sent to the model, part of the artifact cache key
+ENCODING = "png"
+
+
+def get_file_name(file):
+    """Returns a display name for an uploaded file or a path on disk."""
+    return file.name if hasattr(file, 'name') else os.path.basename(file)
+
+
+def image_digest(file):
+    """
+    Returns the SHA-256 of an image's encoded bytes, for an uploaded file or a path on disk.
+
+    Frames of a packed archive carry the digest of their source, recorded when packed.
+    """
+    if hasattr(file, 'digest') and isinstance(file.digest, str):
+        return file.digest
+    digest = hashlib.sha256()
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    elif hasattr(file, 'getvalue'):
+        digest.update(file.getvalue())
+    else:
+        position = file.tell()
+        file.seek(0)
+        digest.update(file.read())
+        file.seek(position)
+    return digest.hexdigest()
+
+
+def encode_image(image):
+    """Encodes an image as PNG bytes, the format sent to the model."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def prepare_bulk_item(file, compiled, artifact_cache=None):
+    """
+    Decodes, distorts and encodes one image, returning the PNG bytes sent to the model.
+
+    With an ArtifactCache, the bytes are looked up by source image hash and plan
+    hash first, so repeating an image and plan (e.g. for another model or prompt)
+    skips decoding, distortion and encoding.
+
+    Random distortions (Rain, Fog, Snow, Night, Glare) are seeded from the source
+    image hash and plan hash, so an image renders the same in every run, whether
+    or not it comes from the cache.
+    """
+    def produce(source_hash=None):
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        image = open_image(file)
+        if not compiled.plan.is_effective:
+            return encode_image(image)
+        seed = plan_seed(0, source_hash or image_digest(file), compiled.plan.content_hash)
+        return encode_image(compiled.apply(image, seed=seed))
+
+    if artifact_cache is None:
+        return produce()
+    source_hash = image_digest(file)
+    key = artifact_key(source_hash, compiled.plan.content_hash, ENCODING)
+    return artifact_cache.get_or_create(key, lambda: produce(source_hash))
+
+
+def _result_row(file, compiled, input_text, text_response, json_response):
+    result = {
+        "Image": get_file_name(file),
+        "Distortions": compiled.plan.describe(),
+        "Input Text": input_text,
+        "AI Response": text_response,
+        "JSON Response": json.dumps(json_response, indent=2)
+    }
+    # Sources such as video frames carry extra columns (frame index, timestamp)
+    result.update(getattr(file, 'metadata', {}))
+    return result
+
+
+def _get_response(input_text, image_bytes, model_name, system_instructions, expected_fields, backend,
+                  consistency):
+    """Returns (text_response, json_response, extra columns), sampling several times with a SelfConsistency."""
+    if consistency is None:
+        return get_gemini_response(input_text, image_bytes, model_name, system_instructions, expected_fields,
+                                   backend=backend) + ({},)
+    text_response, json_response, info = consistency.respond(input_text, image_bytes, model_name,
+                                                             system_instructions, expected_fields, backend=backend)
+    return text_response, json_response, {"Agreement": info["agreement"], "Samples": info["samples"]}
+
+
+def analyze_bulk_item(file, plan, input_text, model_name, system_instructions,
+                      expected_fields, backend=None, artifact_cache=None, consistency=None):
+    """
+    Runs one bulk item through the distortion and analysis pipeline.
+
+    Args:
+        file: Uploaded file object or path to the image.
+        plan: DistortionPlan, or a CompiledPlan to reuse decoded overlays across images.
+        input_text (str): Prompt sent along with the image.
+        model_name (str): Model used for the analysis.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        artifact_cache (ArtifactCache): Optional cache of distorted, encoded images.
+        consistency (SelfConsistency): Optional sampler for a merged verdict of several calls;
+                                       adds "Agreement" and "Samples" columns.
+
+    Returns:
+        dict: A result row with the columns in BASE_RESULT_COLUMNS, plus any
+              `metadata` attached to the file.
+    """
+    compiled = plan.compile() if isinstance(plan, DistortionPlan) else plan
+    image_bytes = prepare_bulk_item(file, compiled, artifact_cache)
+
+    text_response, json_response, extra = _get_response(
+        input_text,
+        image_bytes,
+        model_name,
+        system_instructions,
+        expected_fields,
+        backend,
+        consistency
+    )
+    row = _result_row(file, compiled, input_text, text_response, json_response)
+    row.update(extra)
+    return row
+
+
+def analyze_bulk_item_models(file, plan, input_text, model_names, system_instructions,
+                             expected_fields, backend=None, executor=None, artifact_cache=None, consistency=None):
+    """
+    Runs one bulk item through several models.
+
+    The image is decoded, distorted and encoded once, and the same bytes are sent to
+    every model concurrently, so the item takes about as long as the slowest model.
+
+    Args:
+        file: Uploaded file object or path to the image.
+        plan: DistortionPlan or CompiledPlan.
+        input_text (str): Prompt sent along with the image.
+        model_names (list): Models to compare.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        executor: Optional executor for the model calls; a temporary one is used otherwise.
+        artifact_cache (ArtifactCache): Optional cache of distorted, encoded images.
+        consistency (SelfConsistency): Optional sampler, applied to each model separately.
+
+    Returns:
+        list: One result row per model, in the order of `model_names`, each with a "Model" column.
+    """
+    compiled = plan.compile() if isinstance(plan, DistortionPlan) else plan
+    image_bytes = prepare_bulk_item(file, compiled, artifact_cache)
+
+    def call(model_name):
+        return _get_response(input_text, image_bytes, model_name, system_instructions, expected_fields, backend,
+                             consistency)
+
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=len(model_names)) as pool:
+            responses = list(pool.map(call, model_names))
+    else:
+        responses = [future.result() for future in [executor.submit(call, name) for name in model_names]]
+
+    rows = []
+    for model_name, (text_response, json_response, extra) in zip(model_names, responses):
+        row = _result_row(file, compiled, input_text, text_response, json_response)
+        row.update(extra)
+        row["Model"] = model_name
+        rows.append(row)
+    return rows
+
+
+def run_bulk_analysis(items, model_name, system_instructions, expected_fields, backend=None, max_workers=1,
+                      load_overlay=None, artifact_cache=None, consistency=None):
+    """
+    Analyses bulk items, optionally with several requests in flight.
+
+    Each distinct distortion plan is compiled once per run and shared by every
+    image that uses it. Given several models, each image is prepared once and sent
+    to all of them concurrently.
+
+    Args:
+        items (list): (file, DistortionPlan, input_text) tuples.
+        model_name (str or list): Model used for the analysis, or a list of models to compare.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        backend: Optional model backend, defaults to the active backend.
+        max_workers (int): Number of items processed concurrently.
+        load_overlay (callable): Resolves overlay references in the plans.
+        artifact_cache (ArtifactCache): Optional cache of distorted, encoded images.
+        consistency (SelfConsistency): Optional sampler for a merged verdict of several calls per model.
+
+    Yields:
+        tuple: (index, file_name, result, error) in completion order. Exactly one of
+               result and error is None. With several models there is one result per
+               (item, model), yielded in model order once the item is done, and each
+               result has a "Model" column.
+    """
+    model_names = [model_name] if isinstance(model_name, str) else list(model_name)
+    compiled_plans = {}
+    for _, plan, _ in items:
+        if plan not in compiled_plans:
+            compiled_plans[plan] = plan.compile(load_overlay)
+
+    model_executor = None
+    if len(model_names) > 1:
+        model_executor = ThreadPoolExecutor(max_workers=max(1, max_workers) * len(model_names))
+
+    def run(item):
+        file, plan, input_text = item
+        if model_executor is not None:
+            return analyze_bulk_item_models(file, compiled_plans[plan], input_text, model_names, system_instructions,
+                                            expected_fields, backend=backend, executor=model_executor,
+                                            artifact_cache=artifact_cache, consistency=consistency)
+        return [analyze_bulk_item(file, compiled_plans[plan], input_text, model_names[0],
+                                  system_instructions, expected_fields, backend=backend,
+                                  artifact_cache=artifact_cache, consistency=consistency)]
+
+    try:
+        if max_workers <= 1:
+            for i, item in enumerate(items):
+                try:
+                    rows = run(item)
+                except Exception as e:
+                    yield i, get_file_name(item[0]), None, e
+                    continue
+                for row in rows:
+                    yield i, get_file_name(item[0]), row, None
+            return
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                i = futures[future]
+                file_name = get_file_name(items[i][0])
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    yield i, file_name, None, e
+                    continue
+                for row in rows:
+                    yield i, file_name, row, None
+    finally:
+        if model_executor is not None:
+            model_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_comparison_dataframe(results, field):
+    """
+    Lays out one JSON field side by side per model.
+
+    Args:
+        results (list): Result rows with a "Model" column, as yielded for several models.
+        field (str): JSON field to compare, or "AI Response".
+
+    Returns:
+        pandas.DataFrame: One row per image and one column per model.
+    """
+    import pandas as pd
+
+    def value(row):
+        if field == "AI Response":
+            return row["AI Response"]
+        item = json.loads(row["JSON Response"]).get(field, "")
+        return ', '.join(map(str, item)) if isinstance(item, list) else item
+
+    models = list(dict.fromkeys(row["Model"] for row in results))
+    table = pd.DataFrame([{"Image": row["Image"], "Model": row["Model"], field: value(row)} for row in results])
+    table = table.drop_duplicates(["Image", "Model"], keep="last")
+    comparison = table.pivot(index="Image", columns="Model", values=field)
+    images = list(dict.fromkeys(row["Image"] for row in results))
+    return comparison.reindex(index=images, columns=models).reset_index().rename_axis(columns=None)
+
+
+def build_results_dataframe(results, expected_fields):
+    """
+    Turns bulk result rows into the DataFrame shown in the app and exported as CSV.
+
+    Args:
+        results (list): Result dicts as returned by analyze_bulk_item.
+        expected_fields (list): JSON fields to expand into their own columns.
+
+    Returns:
+        pandas.DataFrame: Results with one column per non-empty JSON field.
+    """
+    import pandas as pd
+    results_df = pd.DataFrame(results)
+
+    # Add JSON fields as separate columns
+    for field in expected_fields:
+        results_df[field] = results_df['JSON Response'].apply(
+            lambda x: json.loads(x).get(field, '')
+        )
+        # Check if the field contains a list and join it into a string
+        if results_df[field].dtype == 'object':
+            results_df[field] = results_df[field].apply(
+                lambda x: ', '.join(x) if isinstance(x, list) else x
+            )
+
+    # Remove empty columns
+    results_df = results_df.dropna(axis=1, how='all')
+
+    # Remove columns that are entirely empty strings
+    results_df = results_df.loc[:, (results_df != '').any()]
+
+    # Reorder columns
+    base_columns = [col for col in results_df.columns if col not in expected_fields]
+    json_columns = [col for col in expected_fields if col in results_df.columns]
+    columns_order = [col for col in BASE_RESULT_COLUMNS if col in base_columns]
+    columns_order += [col for col in base_columns if col not in BASE_RESULT_COLUMNS]
+    columns_order += json_columns
+
+    return results_df[columns_order]
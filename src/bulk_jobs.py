@@ -0,0 +1,339 @@
+"""
+Background bulk analysis jobs shared by all sessions of a server process.
+
+A BulkJobManager owns a fixed pool of worker threads. Jobs submitted to it run
+independently of the Streamlit script run that submitted them, so widgets can be
+used, or the browser closed, while a job runs; the UI polls the job for progress
+and partial results. Jobs can be paused, resumed and cancelled. Workers hand out
+items round-robin across owners (analysts), then in submission order within an
+owner, so one analyst's large job does not hold up everyone else's.
+"""
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from bulk import analyze_bulk_item, analyze_bulk_item_models, get_file_name
+from diagnostics import get_logger
+
+logger = get_logger("bulk_jobs")
+
+DEFAULT_BULK_WORKERS = 4
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+FINISHED_STATES = (CANCELLED, COMPLETED)
+
+
+class BulkJob:
+    """
+    One submitted bulk run and its progress.
+
+    State changes go through the owning BulkJobManager; the attributes read by
+    the UI (state, counts, results and errors) are safe to read at any time.
+
+    Attributes:
+        job_id (str): Identifier used by the manager.
+        owner (str): Analyst or session that submitted the job; the unit of fair scheduling.
+        label (str): Display name.
+        state (str): One of queued, running, paused, cancelled, completed.
+        total (int): Number of items.
+        completed (int): Items finished, with results or with an error.
+        results (dict): Result rows by item index, one per model.
+        errors (list): (index, file name, formatted exception) for failed items.
+        meta (dict): Free-form values for the submitter, e.g. the run id it saved results under.
+    """
+
+    def __init__(self, job_id, owner, label, items, model_names, system_instructions, expected_fields,
+                 backend=None, artifact_cache=None, max_workers=None, on_finish=None, resources=None,
+                 consistency=None):
+        self.job_id = job_id
+        self.owner = owner
+        self.label = label
+        self.items = items
+        self.model_names = model_names
+        self.system_instructions = system_instructions
+        self.expected_fields = expected_fields
+        self.backend = backend
+        self.artifact_cache = artifact_cache
+        self.consistency = consistency
+        self.max_workers = max_workers
+        self.on_finish = on_finish
+        # Objects the items depend on (e.g. the session blob store holding uploads), kept alive
+        # until the job finishes even if the session that submitted it ends
+        self.resources = resources
+        self.state = QUEUED
+        self.total = len(items)
+        self.completed = 0
+        self.results = {}
+        self.errors = []
+        self.meta = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._next = 0
+        self._running = 0
+        self._order = []
+        self._model_executor = None
+        if len(model_names) > 1:
+            # Model calls of one item run concurrently; threads are only started when used
+            self._model_executor = ThreadPoolExecutor(
+                max_workers=len(model_names) * (max_workers or DEFAULT_BULK_WORKERS))
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES and self._running == 0
+
+    @property
+    def progress(self):
+        return self.completed / self.total if self.total else 1.0
+
+    def result_rows(self):
+        """Result rows in item order."""
+        return [row for index in sorted(self.results) for row in self.results[index]]
+
+    def results_since(self, cursor=0):
+        """
+        Rows completed after `cursor`, for polling partial results.
+
+        Returns:
+            tuple: (rows in completion order, cursor to pass next time)
+        """
+        order = self._order[cursor:]
+        return [row for index in order for row in self.results.get(index, [])], cursor + len(order)
+
+    def wait(self, timeout=None):
+        """Blocks until the job is completed or cancelled; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def _run_item(self, index):
+        file, compiled, input_text = self.items[index]
+        if self._model_executor is not None:
+            return analyze_bulk_item_models(file, compiled, input_text, self.model_names, self.system_instructions,
+                                            self.expected_fields, backend=self.backend,
+                                            executor=self._model_executor, artifact_cache=self.artifact_cache,
+                                            consistency=self.consistency)
+        return [analyze_bulk_item(file, compiled, input_text, self.model_names[0], self.system_instructions,
+                                  self.expected_fields, backend=self.backend, artifact_cache=self.artifact_cache,
+                                  consistency=self.consistency)]
+
+
+class BulkJobManager:
+    """
+    Runs BulkJobs on a shared pool of worker threads with fair scheduling.
+
+    Each worker repeatedly takes one item from the next owner in round-robin
+    order that has a runnable job, so owners share the pool equally regardless
+    of how many items they submitted. Pausing or cancelling a job stops new items
+    from being handed out; items already running finish and are recorded.
+
+    Args:
+        max_workers (int): Items analysed at once across all jobs.
+    """
+
+    def __init__(self, max_workers=DEFAULT_BULK_WORKERS):
+        self.max_workers = max_workers
+        self._jobs = OrderedDict()
+        self._owners = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+
+    def submit(self, items, model_name, system_instructions, expected_fields, owner="default", label=None,
+               backend=None, load_overlay=None, artifact_cache=None, max_workers=None, on_finish=None,
+               resources=None, consistency=None):
+        """
+        Queues a bulk run and returns at once.
+
+        Plans are compiled here, in the caller's thread, so overlays can be loaded
+        from session state before the job leaves the script run.
+
+        Args:
+            items (list): (file, DistortionPlan, input_text) tuples, as for run_bulk_analysis.
+            model_name (str or list): Model, or models to compare.
+            system_instructions (str): System instructions, or None.
+            expected_fields (list): JSON fields requested from the model.
+            owner (str): Analyst or session submitting the job.
+            label (str): Display name; defaults to the item count.
+            backend: Optional model backend, defaults to the active backend.
+            load_overlay (callable): Resolves overlay references in the plans.
+            artifact_cache (ArtifactCache): Optional cache of distorted, encoded images.
+            max_workers (int): Cap on this job's items in flight, e.g. for a model's rate limit.
+            on_finish (callable): Called with the job from a worker thread once it is
+                                  completed or cancelled and nothing is in flight.
+            resources: Objects to keep alive until the job finishes.
+            consistency (SelfConsistency): Optional sampler for a merged verdict of several calls.
+
+        Returns:
+            BulkJob: The queued job.
+        """
+        compiled_plans = {}
+        compiled_items = []
+        for file, plan, input_text in items:
+            if plan not in compiled_plans:
+                compiled_plans[plan] = plan.compile(load_overlay)
+            compiled_items.append((file, compiled_plans[plan], input_text))
+        model_names = [model_name] if isinstance(model_name, str) else list(model_name)
+        job = BulkJob(uuid.uuid4().hex[:12], owner, label or f"{len(items)} images", compiled_items, model_names,
+                      system_instructions, expected_fields, backend=backend, artifact_cache=artifact_cache,
+                      max_workers=max_workers, on_finish=on_finish, resources=resources, consistency=consistency)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("The bulk job manager has been shut down")
+            self._jobs[job.job_id] = job
+            if owner not in self._owners:
+                self._owners.append(owner)
+            self._start_workers()
+            self._cond.notify_all()
+        if not items:
+            self._finish_if_done(job)
+        return job
+
+    def _start_workers(self):
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._work, name=f"bulk-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        """Jobs in submission order, optionally only one owner's."""
+        with self._cond:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def pause(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state in (QUEUED, RUNNING):
+                job.state = PAUSED
+
+    def resume(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state != PAUSED:
+                return
+            job.state = RUNNING if job.started_at else QUEUED
+            if job._next >= job.total and job._running == 0:
+                job.state = COMPLETED
+            self._cond.notify_all()
+        self._finish_if_done(job)
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            if job.state in FINISHED_STATES:
+                return
+            job.state = CANCELLED
+        self._finish_if_done(job)
+
+    def remove(self, job_id):
+        """Forgets a finished job, releasing its items and results."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.finished:
+                raise ValueError("Only finished jobs can be removed; cancel the job first")
+            self._jobs.pop(job_id, None)
+
+    def stats(self):
+        with self._cond:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {"workers": self.max_workers, "jobs": states,
+                    "in_flight": sum(job._running for job in self._jobs.values())}
+
+    def shutdown(self, cancel=True):
+        """Stops the workers after their current items; with `cancel`, unfinished jobs are cancelled."""
+        with self._cond:
+            self._shutdown = True
+            pending = [job for job in self._jobs.values() if job.state not in FINISHED_STATES]
+            if cancel:
+                for job in pending:
+                    job.state = CANCELLED
+            self._cond.notify_all()
+        for job in pending:
+            self._finish_if_done(job)
+        for thread in self._threads:
+            thread.join()
+
+    def _next_item(self):
+        """Picks the next (job, index) round-robin across owners. Called with the lock held."""
+        for _ in range(len(self._owners)):
+            owner = self._owners[0]
+            self._owners.rotate(-1)
+            for job in self._jobs.values():
+                if (job.owner == owner and job.state in (QUEUED, RUNNING) and job._next < job.total
+                        and (job.max_workers is None or job._running < job.max_workers)):
+                    index = job._next
+                    job._next += 1
+                    job._running += 1
+                    if job.state == QUEUED:
+                        job.state = RUNNING
+                        job.started_at = time.time()
+                    return job, index
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                unit = self._next_item()
+                while unit is None and not self._shutdown:
+                    self._cond.wait()
+                    unit = self._next_item()
+                if unit is None:
+                    return
+            job, index = unit
+            rows, error = None, None
+            try:
+                rows = job._run_item(index)
+            except Exception as e:
+                logger.debug("Bulk job %s item %d failed", job.job_id, index, exc_info=True)
+                error = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            with self._cond:
+                job._running -= 1
+                job.completed += 1
+                job._order.append(index)
+                if error is None:
+                    job.results[index] = rows
+                else:
+                    job.errors.append((index, get_file_name(job.items[index][0]), error))
+                # A job paused after its last item was handed out completes too
+                if job.state in (RUNNING, PAUSED) and job._next >= job.total and job._running == 0:
+                    job.state = COMPLETED
+                self._cond.notify_all()
+            self._finish_if_done(job)
+
+    def _finish_if_done(self, job):
+        with self._cond:
+            if job.total == 0 and job.state == QUEUED:
+                job.state = COMPLETED
+            if not job.finished or job.finished_at is not None:
+                return
+            job.finished_at = time.time()
+            self._drop_idle_owner(job.owner)
+        if job._model_executor is not None:
+            job._model_executor.shutdown(wait=False)
+        if job.on_finish is not None:
+            try:
+                job.on_finish(job)
+            except Exception:
+                logger.exception("on_finish callback of bulk job %s failed", job.job_id)
+        job.resources = None
+        job._done.set()
+
+    def _drop_idle_owner(self, owner):
+        if all(job.finished for job in self._jobs.values() if job.owner == owner) and owner in self._owners:
+            self._owners.remove(owner)
+
+
+def get_bulk_workers():
+    """Worker count for the server's job manager, from ROAD_SAFETY_BULK_WORKERS."""
+    return int(os.environ.get("ROAD_SAFETY_BULK_WORKERS", DEFAULT_BULK_WORKERS))
@@ -0,0 +1,83 @@
+import math
+from dataclasses import dataclass, field
+from distortion_plan import DistortionPlan, DistortionStep, default_params
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+
+def base_value(distortion_type, key, shared_settings=None):
+    """
+    Value a parameter takes when an image has no override: the shared (centralized)
+    plan if it sets the parameter, otherwise the default.
+    """
+    if shared_settings and key in shared_settings.get(distortion_type, {}):
+        return shared_settings[distortion_type][key]
+    return default_params(distortion_type).get(key)
+
+
+@dataclass(slots=True)
+class ImageSettings:
+    """
+    Compact per-image bulk settings.
+
+    Only parameters that differ from the shared centralized plan (or the defaults)
+    are stored, keyed by (distortion type, parameter name). A `distortions` value of
+    None means the image follows the centralized distortion selection.
+    """
+    distortions: list = None
+    overrides: dict = field(default_factory=dict)
+    input_text: str = ""
+
+    def selected_distortions(self, shared_distortions=None):
+        if self.distortions is None:
+            return list(shared_distortions or [])
+        return self.distortions
+
+    def get(self, distortion_type, key, shared_settings=None):
+        if (distortion_type, key) in self.overrides:
+            return self.overrides[(distortion_type, key)]
+        return base_value(distortion_type, key, shared_settings)
+
+    def set(self, distortion_type, key, value, shared_settings=None):
+        """Records `value`, storing it only if it differs from the shared or default value."""
+        if value == base_value(distortion_type, key, shared_settings):
+            self.overrides.pop((distortion_type, key), None)
+        else:
+            self.overrides[(distortion_type, key)] = value
+
+
+def build_plan(settings, shared_distortions=None, shared_settings=None):
+    """
+    Builds the distortion plan for one image.
+
+    Args:
+        settings (ImageSettings): The image's settings.
+        shared_distortions (list): Centralized distortion selection.
+        shared_settings (dict): Centralized parameters, {distortion type: {parameter: value}}.
+
+    Returns:
+        DistortionPlan: The plan, with overlays as blob store references.
+    """
+    steps = []
+    for distortion_type in settings.selected_distortions(shared_distortions):
+        params = {key: settings.get(distortion_type, key, shared_settings) for key in default_params(distortion_type)}
+        steps.append(DistortionStep(distortion_type, tuple(sorted(params.items()))))
+    return DistortionPlan(tuple(steps))
+
+
+def page_bounds(total, page_size, page):
+    """
+    Returns the slice of items shown on a page.
+
+    Args:
+        total (int): Number of items.
+        page_size (int): Items per page.
+        page (int): 1-based page number; clamped to the valid range.
+
+    Returns:
+        tuple: (start, end, page_count).
+    """
+    page_count = max(1, math.ceil(total / page_size))
+    page = min(max(1, page), page_count)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total), page_count
@@ -0,0 +1,202 @@
+"""
+Self-consistency sampling: several model calls per image, merged into one verdict.
+
+A model's overall_safety and potential_hazards can differ between identical
+calls. SelfConsistency samples a request a few times concurrently and then one
+at a time until the samples agree well enough on the key fields or a sample
+budget is spent. It returns a merged result with an agreement score, so stable
+images cost little more than one call and only ambiguous ones use the full budget.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import get_gemini_response
+from diagnostics import get_logger
+
+logger = get_logger("consistency")
+
+DEFAULT_CONSISTENCY_FIELDS = ("overall_safety", "potential_hazards")
+DEFAULT_MAX_SAMPLES = 5
+DEFAULT_MIN_SAMPLES = 2
+DEFAULT_AGREEMENT_THRESHOLD = 0.8
+
+
+def _normalise(value):
+    return str(value).strip().lower()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def merge_responses(responses, fields=DEFAULT_CONSISTENCY_FIELDS):
+    """
+    Merges sampled JSON responses and scores how well they agree.
+
+    A single-valued field takes its most common value (compared case-insensitively),
+    and agrees by the share of samples with that value. A list field (e.g.
+    potential_hazards) keeps the items found in more than half of the samples, and
+    agrees by the mean Jaccard similarity of each sample's items to that list. The
+    agreement of the whole response is that of its least consistent field.
+
+    Args:
+        responses (list): JSON responses without errors.
+        fields (list): Fields the verdict is taken from.
+
+    Returns:
+        tuple: (merged response, agreement in [0, 1]). The merged response is the
+               sample closest to the merged verdict, with the merged field values.
+    """
+    if not responses:
+        return {}, 0.0
+    merged = {}
+    agreements = []
+    for field in fields:
+        values = [response.get(field) for response in responses]
+        if any(isinstance(value, list) for value in values):
+            item_sets = [{_normalise(item) for item in _as_list(value)} for value in values]
+            counts = Counter(item for items in item_sets for item in items)
+            keep = {item for item, count in counts.items() if count * 2 > len(responses)}
+            # Keep the spelling and order of the first sample mentioning each item
+            merged_items = []
+            for value in values:
+                for item in _as_list(value):
+                    if _normalise(item) in keep and _normalise(item) not in {_normalise(i) for i in merged_items}:
+                        merged_items.append(item)
+            if merged_items:
+                merged[field] = merged_items
+            agreements.append(sum(_jaccard(items, keep) for items in item_sets) / len(responses))
+        else:
+            counts = Counter(_normalise(value) for value in values if value is not None)
+            if not counts:
+                continue
+            top, count = counts.most_common(1)[0]
+            merged[field] = next(value for value in values if value is not None and _normalise(value) == top)
+            agreements.append(count / len(responses))
+
+    representative = max(responses, key=lambda response: _closeness(response, merged))
+    return {**representative, **merged}, min(agreements) if agreements else 1.0
+
+
+def _jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _closeness(response, verdict):
+    """How many of the verdict's fields a response matches, with list fields counted by Jaccard similarity."""
+    score = 0.0
+    for field, value in verdict.items():
+        if isinstance(value, list):
+            score += _jaccard({_normalise(i) for i in _as_list(response.get(field))}, {_normalise(i) for i in value})
+        else:
+            score += _normalise(response.get(field)) == _normalise(value)
+    return score
+
+
+class SelfConsistency:
+    """
+    Samples a model several times per request and returns a merged, scored verdict.
+
+    The first `min_samples` calls are sent concurrently. Once they are back, more
+    samples are requested one at a time until the agreement on `fields` reaches
+    `threshold`, `max_samples` have been sent, or a single-valued field has a clear
+    leader but can no longer reach the threshold even if every remaining sample
+    agreed. Failed samples count toward the budget but not toward agreement.
+
+    One object can be shared by concurrent bulk workers; `stats` counts requests
+    and samples across all of them.
+
+    Args:
+        max_samples (int): Most model calls per request.
+        min_samples (int): Calls sent at once before agreement is checked.
+        threshold (float): Agreement at which sampling stops.
+        fields (list): JSON fields the verdict is taken from.
+        max_workers (int): Threads for in-flight samples, shared by all requests.
+    """
+
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES, min_samples=DEFAULT_MIN_SAMPLES,
+                 threshold=DEFAULT_AGREEMENT_THRESHOLD, fields=DEFAULT_CONSISTENCY_FIELDS, max_workers=32):
+        if not 1 <= min_samples <= max_samples:
+            raise ValueError("Expected 1 <= min_samples <= max_samples")
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.threshold = threshold
+        self.fields = tuple(fields)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consistency")
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "samples": 0, "early_stops": 0}
+
+    @property
+    def average_samples(self):
+        """Model calls spent per request so far."""
+        with self._lock:
+            return self.stats["samples"] / self.stats["requests"] if self.stats["requests"] else 0.0
+
+    def _unreachable(self, valid, remaining):
+        """
+        True if some single-valued field cannot reach the threshold within `remaining`
+        samples and already has a clear leader; a tie is worth another sample to break.
+        """
+        for field in self.fields:
+            values = [response.get(field) for response in valid]
+            if any(isinstance(value, list) for value in values):
+                continue
+            counts = [count for _, count in Counter(_normalise(v) for v in values if v is not None).most_common(2)]
+            if not counts or (len(counts) == 2 and counts[0] == counts[1]):
+                continue
+            if (counts[0] + remaining) / (len(valid) + remaining) < self.threshold:
+                return True
+        return False
+
+    def respond(self, input_text, image, model_name, system_instructions, expected_fields, backend=None):
+        """
+        Gets a merged response, as get_gemini_response does for a single call.
+
+        Returns:
+            tuple: (text_response, json_response, info), where info has "agreement"
+                   (None if every sample failed) and "samples" (model calls spent).
+        """
+        def sample():
+            return get_gemini_response(input_text, image, model_name, system_instructions, expected_fields,
+                                       backend=backend)
+
+        pending = {self._executor.submit(sample) for _ in range(self.min_samples)}
+        sent = self.min_samples
+        samples = []
+        merged, agreement = {}, 0.0
+        stopped_early = False
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            samples.extend(future.result() for future in done)
+            if pending:
+                continue
+            valid = [(text, response) for text, response in samples if "error" not in response]
+            merged, agreement = merge_responses([response for _, response in valid], self.fields)
+            if len(valid) >= self.min_samples and agreement >= self.threshold:
+                stopped_early = sent < self.max_samples
+                break
+            if sent >= self.max_samples or (valid and self._unreachable([r for _, r in valid], self.max_samples - sent)):
+                break
+            pending = {self._executor.submit(sample)}
+            sent += 1
+
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["samples"] += sent
+            self.stats["early_stops"] += stopped_early
+
+        valid = [(text, response) for text, response in samples if "error" not in response]
+        if not valid:
+            text_response, json_response = samples[-1]
+            return text_response, json_response, {"agreement": None, "samples": sent}
+        # The text of the sample the merged response was built from
+        text_response = max(valid, key=lambda sample: _closeness(sample[1], merged))[0]
+        logger.debug("%s: %d samples, agreement %.2f", model_name, sent, agreement)
+        return text_response, merged, {"agreement": round(agreement, 3), "samples": sent}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
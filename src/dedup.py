@@ -0,0 +1,251 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+from utils import open_image
+
+HASH_METHODS = ["dhash", "phash"]
+
+
+def _grayscale_array(image, size):
+    """Downscales an image to `size` (width, height) and returns it as a float array."""
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def _bits_to_int(bits):
+    """Packs a boolean array (at most 64 entries) into a Python int."""
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image, hash_size=8):
+    """
+    Computes a difference hash: each bit says whether a pixel is brighter than its right neighbour.
+
+    Args:
+        image (PIL.Image): Image to hash.
+        hash_size (int): Side of the hash grid, giving hash_size**2 bits.
+
+    Returns:
+        int: The hash as an unsigned integer.
+    """
+    pixels = _grayscale_array(image, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis as an (n, n) matrix."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """
+    Computes a perceptual hash from the low frequencies of a 2D DCT.
+
+    Args:
+        image (PIL.Image): Image to hash.
+        hash_size (int): Side of the low-frequency block kept, giving hash_size**2 bits.
+        highfreq_factor (int): The image is downscaled to hash_size * highfreq_factor before the DCT.
+
+    Returns:
+        int: The hash as an unsigned integer.
+    """
+    size = hash_size * highfreq_factor
+    pixels = _grayscale_array(image, (size, size))
+    dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+
+def compute_hash(image, method="dhash"):
+    if method == "dhash":
+        return dhash(image)
+    elif method == "phash":
+        return phash(image)
+    raise ValueError(f"Unknown hash method: {method}")
+
+
+def hamming_distances(hash_value, hashes):
+    """
+    Hamming distance between one 64-bit hash and an array of hashes.
+
+    Args:
+        hash_value (int): The reference hash.
+        hashes (np.ndarray): uint64 array of hashes.
+
+    Returns:
+        np.ndarray: Distances as integers, one per entry of `hashes`.
+    """
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(hash_value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def cluster_hashes(hashes, max_distance, groups=None):
+    """
+    Greedily clusters hashes in input order.
+
+    Each hash joins the nearest existing representative within `max_distance`,
+    otherwise it becomes a new representative. Frames are only clustered with
+    frames that share the same group key.
+
+    Args:
+        hashes (list): Integer hashes, one per frame.
+        max_distance (int): Largest Hamming distance treated as a duplicate.
+        groups (list): Optional group key per frame (e.g. distortion plan and prompt).
+
+    Returns:
+        list: Index of the representative frame for every frame.
+    """
+    if groups is None:
+        groups = [None] * len(hashes)
+
+    representatives = {}
+    assignments = []
+    for i, (hash_value, group) in enumerate(zip(hashes, groups)):
+        rep_indices, rep_hashes = representatives.setdefault(group, ([], []))
+        if rep_hashes:
+            distances = hamming_distances(hash_value, rep_hashes)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= max_distance:
+                assignments.append(rep_indices[nearest])
+                continue
+        rep_indices.append(i)
+        rep_hashes.append(hash_value)
+        assignments.append(i)
+    return assignments
+
+
+def file_key(file):
+    """
+    Returns a cache key for an image source.
+
+    Paths on disk are keyed by path, size and modification time so they do not need
+    to be read again. Uploaded files are keyed by a digest of their content, and
+    archive frames by the digest recorded when they were packed.
+    """
+    if hasattr(file, 'open_image'):
+        return f"sha256:{file.digest}"
+    if isinstance(file, str):
+        stat = os.stat(file)
+        return f"path:{os.path.abspath(file)}:{stat.st_size}:{stat.st_mtime_ns}"
+    if hasattr(file, 'getvalue'):
+        data = file.getvalue()
+    else:
+        position = file.tell()
+        data = file.read()
+        file.seek(position)
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+class HashIndex:
+    """
+    Persistent mapping from file keys to perceptual hashes.
+
+    Args:
+        path (str): JSON file the index is loaded from and saved to, or None to keep it in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, method):
+        value = self._entries.get(key, {}).get(method)
+        return int(value, 16) if value is not None else None
+
+    def put(self, key, method, hash_value):
+        with self._lock:
+            self._entries.setdefault(key, {})[method] = format(hash_value, '016x')
+            self._dirty = True
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def hash_files(files, method="dhash", index=None):
+    """
+    Hashes image files, reusing hashes already stored in `index`.
+
+    Args:
+        files (list): Uploaded file objects or paths.
+        method (str): One of HASH_METHODS.
+        index (HashIndex): Optional persistent index.
+
+    Returns:
+        list: Integer hashes in the order of `files`.
+    """
+    hashes = []
+    for file in files:
+        key = file_key(file)
+        hash_value = index.get(key, method) if index is not None else None
+        if hash_value is None:
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            with open_image(file) as image:
+                hash_value = compute_hash(image, method)
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            if index is not None:
+                index.put(key, method, hash_value)
+        hashes.append(hash_value)
+    if index is not None:
+        index.save()
+    return hashes
+
+
+def fan_out_results(results, assignments, file_names, metadata=None):
+    """
+    Copies each representative's result to its duplicates.
+
+    Args:
+        results (dict): Result rows keyed by the index of the representative frame. A value
+                        may also be a list of rows, e.g. one per model.
+        assignments (list): Representative index for every frame, from cluster_hashes.
+        file_names (list): Display name of every frame.
+        metadata (list): Extra columns of every frame (e.g. the frame index and timestamp
+                         of video frames), which replace the representative's.
+
+    Returns:
+        list: One result row per frame and representative row (in input order) with a
+              "deduplicated_from" column.
+    """
+    rows = []
+    for i, rep in enumerate(assignments):
+        if rep not in results:
+            continue
+        rep_rows = results[rep] if isinstance(results[rep], list) else [results[rep]]
+        for rep_row in rep_rows:
+            row = dict(rep_row)
+            row["Image"] = file_names[i]
+            if metadata is not None:
+                row.update(metadata[i] or {})
+            row["deduplicated_from"] = file_names[rep] if rep != i else ""
+            rows.append(row)
+    return rows
@@ -0,0 +1,201 @@
+"""
+Weather and sensor degradations: fog, snow, night, glare, motion blur and JPEG artifacts.
+
+Each kernel takes an `intensity` in [0, 1] like the other distortions, works on
+whole float32 frames with NumPy, and draws any randomness from
+`numpy.random.default_rng(seed)`, so a seed makes the output reproducible.
+Alpha channels are kept. The module is imported by apply_distortion on first
+use, so NumPy is not loaded with utils.
+"""
+import io
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Fraction of the height, from the top, where fog reaches its full depth
+FOG_HORIZON = 0.4
+FOG_AIRLIGHT = (215.0, 218.0, 222.0)
+# Pixels per flake at intensity 1
+SNOW_PIXELS_PER_FLAKE = 300
+# Streak length in pixels at intensity 1 (Blur uses a radius of 10 at intensity 1)
+MOTION_BLUR_MAX_LENGTH = 40
+JPEG_QUALITY_RANGE = (95, 5)
+
+
+def _split_alpha(image):
+    alpha = image.getchannel("A") if image.mode in ("RGBA", "LA") else None
+    return np.asarray(image.convert("RGB"), dtype=np.float32), alpha
+
+
+def _to_image(pixels, alpha):
+    np.clip(pixels, 0, 255, out=pixels)
+    result = Image.fromarray(pixels.astype(np.uint8), "RGB")
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
+
+
+def _upsampled_noise(rng, size, cells=8):
+    """Smooth noise in [0, 1] at `size`, from a coarse random grid."""
+    grid = Image.fromarray((rng.random((cells, cells)) * 255).astype(np.uint8), "L")
+    return np.asarray(grid.resize(size, Image.BILINEAR), dtype=np.float32) / 255
+
+
+def apply_fog(image, intensity, seed=None):
+    """
+    Fog with depth falloff.
+
+    Depth is assumed to grow from the bottom row to the horizon, so distant parts
+    of the road fade into the airlight first. Transmission follows exp(-density *
+    depth), with smooth seeded patches so the fog is not perfectly uniform.
+    """
+    if intensity <= 0:
+        return image
+    pixels, alpha = _split_alpha(image)
+    height, width = pixels.shape[:2]
+    horizon = FOG_HORIZON * height
+    rows = np.arange(height, dtype=np.float32)
+    depth = np.clip((height - 1 - rows) / max(height - 1 - horizon, 1.0), 0, 1)[:, None]
+    patches = _upsampled_noise(np.random.default_rng(seed), (width, height))
+    transmission = np.exp(-4.0 * intensity * depth * (0.75 + 0.5 * patches))[:, :, None]
+    pixels *= transmission
+    pixels += np.asarray(FOG_AIRLIGHT, dtype=np.float32) * (1 - transmission)
+    return _to_image(pixels, alpha)
+
+
+def apply_snow(image, intensity, seed=None):
+    """Falling snow: seeded flakes of one to three pixels over a slight whitening haze."""
+    if intensity <= 0:
+        return image
+    pixels, alpha = _split_alpha(image)
+    height, width = pixels.shape[:2]
+    rng = np.random.default_rng(seed)
+    count = int(intensity * height * width / SNOW_PIXELS_PER_FLAKE)
+    ys = rng.integers(0, height, count)
+    xs = rng.integers(0, width, count)
+    sizes = rng.integers(1, 4, count)
+    brightness = rng.uniform(0.6, 1.0, count).astype(np.float32)
+
+    flakes = np.zeros((height, width), dtype=np.float32)
+    for size in (1, 2, 3):
+        selected = sizes == size
+        reach = size - 1
+        # Stamp each offset of the disc for all flakes of this size at once
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                if dy * dy + dx * dx <= reach * reach:
+                    np.maximum.at(flakes, (np.clip(ys[selected] + dy, 0, height - 1),
+                                           np.clip(xs[selected] + dx, 0, width - 1)), brightness[selected])
+    flakes = Image.fromarray((flakes * 255).astype(np.uint8), "L").filter(ImageFilter.GaussianBlur(0.6))
+    flakes = np.asarray(flakes, dtype=np.float32)[:, :, None] / 255
+
+    haze = 0.25 * intensity
+    pixels *= 1 - haze
+    pixels += 255 * haze
+    pixels += (255 - pixels) * flakes
+    return _to_image(pixels, alpha)
+
+
+def apply_night(image, intensity, seed=None):
+    """
+    Low light: a darkening gamma curve, a cool tint and sensor noise.
+
+    The noise has a signal-dependent (shot) part and a constant (read) part, both
+    growing with intensity as a camera would raise its gain in the dark.
+    """
+    if intensity <= 0:
+        return image
+    pixels, alpha = _split_alpha(image)
+    pixels /= 255
+    np.power(pixels, 1 + 1.5 * intensity, out=pixels)
+    pixels *= (1 - 0.6 * intensity) * (1 + intensity * np.asarray([-0.15, -0.05, 0.1], dtype=np.float32))
+    sigma = np.sqrt(pixels * (0.01 * intensity) + (0.02 * intensity) ** 2)
+    noise = np.random.default_rng(seed).standard_normal(pixels.shape, dtype=np.float32)
+    pixels += noise * sigma
+    pixels *= 255
+    return _to_image(pixels, alpha)
+
+
+def apply_glare(image, intensity, seed=None):
+    """
+    Oncoming headlight glare: a seeded pair of lights with bloom, horizontal flare
+    streaks and a veil that lowers contrast over the whole frame.
+    """
+    if intensity <= 0:
+        return image
+    pixels, alpha = _split_alpha(image)
+    height, width = pixels.shape[:2]
+    rng = np.random.default_rng(seed)
+    center_x = rng.uniform(0.3, 0.7) * width
+    center_y = rng.uniform(0.5, 0.75) * height
+    separation = rng.uniform(0.08, 0.2) * width
+    radius = (0.03 + 0.09 * intensity) * min(width, height)
+
+    ys = np.arange(height, dtype=np.float32)[:, None]
+    xs = np.arange(width, dtype=np.float32)[None, :]
+    glow = np.zeros((height, width), dtype=np.float32)
+    for light_x in (center_x - separation / 2, center_x + separation / 2):
+        dy = ys - center_y
+        dx = xs - light_x
+        glow += np.exp(-(dy * dy + dx * dx) / (2 * radius * radius))
+        glow += 0.5 * np.exp(-np.abs(dy) / (0.08 * radius)) * np.exp(-np.abs(dx) / (4 * radius))
+    glow = np.clip(glow * (0.6 + 0.4 * intensity) + 0.2 * intensity, 0, 1)[:, :, None]
+    # Screen blend with white
+    pixels = 255 - (255 - pixels) * (1 - glow)
+    return _to_image(pixels, alpha)
+
+
+def _box_blur_rows(pixels, length):
+    """Averages `length` horizontal neighbours per pixel with a running sum, edges extended."""
+    left = length // 2
+    padded = np.pad(pixels, ((0, 0), (left + 1, length - 1 - left), (0, 0)), mode="edge")
+    padded[:, 0] = 0
+    sums = np.cumsum(padded, axis=1, dtype=np.float32)
+    return (sums[:, length:] - sums[:, :-length]) / length
+
+
+def apply_motion_blur(image, intensity, angle=0.0, scale=1.0):
+    """
+    Linear motion blur of up to MOTION_BLUR_MAX_LENGTH pixels along `angle` degrees,
+    times `scale` for a downscaled image.
+
+    Horizontal streaks use a running sum along each row, so the cost does not
+    depend on the length. Other angles rotate the (edge-padded) frame, blur it
+    horizontally and rotate it back.
+    """
+    length = 1 + int(round(intensity * MOTION_BLUR_MAX_LENGTH * scale))
+    if length <= 1:
+        return image
+    if angle % 180 == 0:
+        pixels, alpha = _split_alpha(image)
+        return _to_image(_box_blur_rows(pixels, length), alpha)
+
+    alpha = image.getchannel("A") if image.mode in ("RGBA", "LA") else None
+    width, height = image.size
+    padded = np.pad(np.asarray(image.convert("RGB")), ((length, length), (length, length), (0, 0)), mode="edge")
+    rotated = Image.fromarray(padded, "RGB").rotate(angle, Image.BILINEAR, expand=True)
+    blurred = _to_image(_box_blur_rows(np.asarray(rotated, dtype=np.float32), length), None)
+    restored = blurred.rotate(-angle, Image.BILINEAR, expand=True)
+    left = (restored.size[0] - width) // 2
+    top = (restored.size[1] - height) // 2
+    result = restored.crop((left, top, left + width, top + height))
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
+
+
+def apply_jpeg(image, intensity):
+    """
+    Compression artifacts from a JPEG round trip, from quality 95 at intensity 0
+    down to quality 5 at intensity 1.
+    """
+    if intensity <= 0:
+        return image
+    best, worst = JPEG_QUALITY_RANGE
+    quality = int(round(best + (worst - best) * min(intensity, 1.0)))
+    alpha = image.getchannel("A") if image.mode in ("RGBA", "LA") else None
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    result = Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+    if alpha is not None:
+        result.putalpha(alpha)
+    return result
@@ -0,0 +1,135 @@
+import os
+import logging
+import threading
+
+ROOT_LOGGER = "road_safety"
+# Below DEBUG: enables diagnostics that cost real work, such as pixel-diff statistics
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+DEFAULT_LEVEL = "WARNING"
+DEFAULT_SAMPLE_EVERY = 100
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def get_logger(name):
+    """
+    Returns the logger for a platform module, e.g. get_logger("utils") -> "road_safety.utils".
+
+    Logging is configured from the environment the first time a logger is requested.
+    """
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def parse_levels(spec):
+    """
+    Parses per-module levels such as "utils=DEBUG,bulk=INFO".
+
+    Returns:
+        dict: Logger name (relative to the platform root) to numeric level.
+    """
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = (part.strip() for part in item.split("=", 1))
+        levels[name] = _level(level)
+    return levels
+
+
+def _level(level):
+    if isinstance(level, int):
+        return level
+    level = level.upper()
+    if level.isdigit():
+        return int(level)
+    value = logging.getLevelName(level)
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level: {level}")
+    return value
+
+
+def configure_logging(level=None, module_levels=None, force=False):
+    """
+    Sets the platform's log levels and attaches a stderr handler.
+
+    Defaults come from ROAD_SAFETY_LOG_LEVEL (overall level, default WARNING) and
+    ROAD_SAFETY_LOG_LEVELS (per-module overrides such as "utils=DEBUG,bulk=INFO").
+    Only the first call has an effect unless `force` is set.
+
+    Args:
+        level (str or int): Level for the platform root logger.
+        module_levels (dict): Module name to level.
+        force (bool): Reconfigure even if logging was already configured.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured and not force:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(_level(level or os.environ.get("ROAD_SAFETY_LOG_LEVEL", DEFAULT_LEVEL)))
+        if module_levels is None:
+            module_levels = parse_levels(os.environ.get("ROAD_SAFETY_LOG_LEVELS"))
+        for name, module_level in module_levels.items():
+            logging.getLogger(f"{ROOT_LOGGER}.{name}").setLevel(_level(module_level))
+        if not any(getattr(handler, "_road_safety", False) for handler in root.handlers):
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handler._road_safety = True
+            root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+
+
+class Sampler:
+    """
+    Lets through one in every `every` events, for high-volume per-image debug logging.
+
+    The rate defaults to ROAD_SAFETY_LOG_SAMPLE_EVERY (100); 1 logs every event.
+    """
+
+    def __init__(self, every=None):
+        if every is None:
+            every = int(os.environ.get("ROAD_SAFETY_LOG_SAMPLE_EVERY", DEFAULT_SAMPLE_EVERY))
+        self.every = max(1, int(every))
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self._count += 1
+            return self._count % self.every == 1 or self.every == 1
+
+
+def debug_sampled(logger, sampler, msg, *args):
+    """
+    Logs a debug message for a sampled subset of events.
+
+    The level is checked before the sampler, so nothing is counted or formatted
+    when debug logging is off.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and sampler():
+        logger.debug(msg, *args)
+
+
+def trace_enabled(logger):
+    """True if expensive diagnostics should run for this logger (level TRACE or lower)."""
+    return logger.isEnabledFor(TRACE)
+
+
+class CountingHandler(logging.Handler):
+    """Counts emitted records and formatted bytes, to measure log volume."""
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.records = 0
+        self.bytes = 0
+
+    def emit(self, record):
+        self.records += 1
+        self.bytes += len(self.format(record)) + 1
@@ -0,0 +1,223 @@
+import io
+import json
+import math
+import hashlib
+from dataclasses import dataclass, field
+from functools import cached_property
+from PIL import Image
+from utils import apply_distortions
+
+# Parameters accepted by each distortion type, with the defaults shown by the settings sliders
+DISTORTION_DEFAULTS = {
+    "Color": {"saturation": 1.0, "hue_shift": 0.0},
+    "Overlay": {"intensity": 0.5, "overlay_image": None},
+    "Warp": {"intensity": 0.5, "wave_amplitude": 20.0, "wave_frequency": 0.04, "bulge_factor": 30.0},
+    "Motion Blur": {"intensity": 0.5, "angle": 0.0},
+}
+DEFAULT_PARAMS = {"intensity": 0.5}
+SIMPLE_DISTORTION_TYPES = ["Blur", "Brightness", "Contrast", "Sharpness", "Rain", "Fog", "Snow", "Night", "Glare", "JPEG"]
+PLAN_DISTORTION_TYPES = SIMPLE_DISTORTION_TYPES + list(DISTORTION_DEFAULTS)
+
+WARP_PARAM_KEYS = ("wave_amplitude", "wave_frequency", "bulge_factor")
+
+
+def default_params(distortion_type):
+    """Returns the default parameters for a distortion type."""
+    return DISTORTION_DEFAULTS.get(distortion_type, DEFAULT_PARAMS)
+
+
+def _overlay_ref(data):
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+@dataclass(frozen=True)
+class DistortionStep:
+    """
+    One validated distortion with its parameters as sorted (name, value) pairs.
+
+    Overlay images are referenced by a content reference string rather than held inline.
+    """
+    type: str
+    params: tuple = ()
+
+    def __post_init__(self):
+        if self.type not in PLAN_DISTORTION_TYPES:
+            raise ValueError(f"Unknown distortion type: {self.type}")
+        allowed = default_params(self.type)
+        values = dict(allowed)
+        for name, value in dict(self.params).items():
+            if name not in allowed:
+                raise ValueError(f"Unknown parameter '{name}' for {self.type} distortion")
+            if name == "overlay_image":
+                if value is not None and not isinstance(value, str):
+                    raise ValueError("Overlay images must be given as a reference string")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"Parameter '{name}' of {self.type} must be a finite number, got {value!r}")
+            else:
+                value = float(value)
+            values[name] = value
+        # Fill in defaults so equivalent steps compare and hash equal
+        object.__setattr__(self, "params", tuple(sorted(values.items())))
+
+    @property
+    def param_dict(self):
+        return dict(self.params)
+
+    def to_distortion(self):
+        """Returns the step as a distortion dict for apply_distortion (overlays still as references)."""
+        values = self.param_dict
+        distortion = {"type": self.type}
+        if self.type == "Warp":
+            distortion["intensity"] = values["intensity"]
+            distortion["warp_params"] = {key: values[key] for key in WARP_PARAM_KEYS}
+        else:
+            distortion.update(values)
+        return distortion
+
+
+@dataclass(frozen=True)
+class DistortionPlan:
+    """
+    Immutable, hashable sequence of distortion steps.
+
+    Plans compare and hash by content, so they can be used as cache and dedup
+    keys. `payloads` carries overlay bytes for plans built from in-memory
+    overlays; it is not part of the plan's identity (the references are).
+    """
+    steps: tuple = ()
+    payloads: dict = field(default=None, compare=False, hash=False, repr=False)
+
+    @classmethod
+    def from_distortions(cls, distortions_list):
+        """
+        Builds a plan from distortion dicts as used by apply_distortions.
+
+        Overlay images may be references, bytes or PIL images; bytes and images
+        are replaced by content references and kept in `payloads`.
+        """
+        steps = []
+        payloads = {}
+        for distortion in distortions_list:
+            params = {k: v for k, v in distortion.items() if k != "type"}
+            if "warp_params" in params:
+                params.update(params.pop("warp_params") or {})
+            overlay = params.get("overlay_image")
+            if isinstance(overlay, Image.Image):
+                buffer = io.BytesIO()
+                overlay.save(buffer, format='PNG')
+                overlay = buffer.getvalue()
+            if isinstance(overlay, (bytes, bytearray)):
+                ref = _overlay_ref(bytes(overlay))
+                payloads[ref] = bytes(overlay)
+                params["overlay_image"] = ref
+            steps.append(DistortionStep(distortion["type"], tuple(sorted(params.items()))))
+        return cls(tuple(steps), payloads or None)
+
+    def to_dict(self):
+        return {"steps": [{"type": step.type, "params": dict(step.params)} for step in self.steps]}
+
+    def to_json(self):
+        """Canonical JSON form, used for manifests and for the content hash."""
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text) if isinstance(text, str) else text
+        return cls(tuple(
+            DistortionStep(step["type"], tuple(sorted(step.get("params", {}).items())))
+            for step in data.get("steps", [])
+        ))
+
+    @cached_property
+    def content_hash(self):
+        """Stable SHA-256 of the plan's canonical JSON."""
+        return hashlib.sha256(self.to_json().encode()).hexdigest()
+
+    @property
+    def is_effective(self):
+        """False if the plan is empty or only has overlays without an overlay image."""
+        return any(step.type != "Overlay" or step.param_dict["overlay_image"] for step in self.steps)
+
+    def describe(self):
+        """Human readable summary including intensity information."""
+        distortions_info = []
+        for step in self.steps:
+            d = step.to_distortion()
+            if d['type'] == 'Color':
+                distortions_info.append(f"{d['type']} (Saturation: {d['saturation']:.2f}, Hue Shift: {d['hue_shift']:.2f})")
+            elif d['type'] == 'Motion Blur':
+                distortions_info.append(f"{d['type']} (Intensity: {d['intensity']:.2f}, Angle: {d['angle']:.0f}°)")
+            elif d['type'] == 'Warp':
+                distortions_info.append(f"{d['type']} (Intensity: {d['intensity']:.2f}, Wave Amp: {d['warp_params']['wave_amplitude']:.2f}, Wave Freq: {d['warp_params']['wave_frequency']:.2f}, Bulge: {d['warp_params']['bulge_factor']:.2f})")
+            else:
+                distortions_info.append(f"{d['type']} (Intensity: {d['intensity']:.2f})")
+        return ', '.join(distortions_info)
+
+    def compile(self, load_overlay=None):
+        """
+        Resolves overlay references once so the plan can be applied to many images.
+
+        Args:
+            load_overlay (callable): Turns an overlay reference into a PIL image, for
+                                     references not carried in `payloads`.
+
+        Returns:
+            CompiledPlan: The plan ready to apply.
+        """
+        distortions = []
+        for step in self.steps:
+            distortion = step.to_distortion()
+            ref = distortion.get("overlay_image")
+            if ref:
+                if self.payloads and ref in self.payloads:
+                    distortion["overlay_image"] = Image.open(io.BytesIO(self.payloads[ref])).convert("RGBA")
+                elif load_overlay is not None:
+                    distortion["overlay_image"] = load_overlay(ref)
+                else:
+                    raise ValueError(f"No overlay image available for reference {ref}")
+            distortions.append(distortion)
+        return CompiledPlan(self, distortions)
+
+
+def plan_seed(base_seed, source, plan_hash):
+    """
+    Seed for rendering one source under one plan.
+
+    Derived from what identifies the source rather than its position in a batch,
+    so an image renders the same no matter which worker renders it, in what
+    order, or whether the batch was resumed. Exports identify sources by their
+    relative path; bulk runs, the service and the artifact cache by the SHA-256
+    of the encoded image.
+
+    Args:
+        base_seed (int): Seed of the whole batch, e.g. of an export.
+        source (str): Source path relative to the source folder, or the source image hash.
+        plan_hash (str): DistortionPlan.content_hash.
+
+    Returns:
+        int: A 32-bit seed.
+    """
+    digest = hashlib.sha256(f"{base_seed}|{source}|{plan_hash}".encode()).digest()
+    return int.from_bytes(digest[:4], "big")
+
+
+class CompiledPlan:
+    """A DistortionPlan with its overlays decoded, applied through apply_distortions."""
+
+    def __init__(self, plan, distortions):
+        self.plan = plan
+        self.distortions = distortions
+
+    def apply(self, image, seed=None, scale=1.0):
+        """
+        Applies the plan; `seed` makes random distortions reproducible without changing the plan's identity.
+
+        `scale` is the size of `image` relative to the full-size image, so a downscaled
+        preview can be rendered with pixel-sized parameters scaled to match.
+        """
+        if not self.plan.is_effective:
+            return image
+        return apply_distortions(image, self.distortions, seed=seed, scale=scale)
+
+
+EMPTY_PLAN = DistortionPlan()
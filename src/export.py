@@ -0,0 +1,290 @@
+"""
+Parallel export of distorted image datasets for offline evaluation and fine-tuning.
+
+Every image under a source folder is rendered under every distortion plan by a
+process pool; each variant is written to disk as soon as it is rendered and
+recorded in a manifest. Example:
+
+    python src/export.py --source images/ --plans plans.json --output dataset/ --workers 8
+
+Outputs go to `<output>/<plan hash[:12]>/<source path relative to the folder>`
+plus the extension of the output format (`a.jpg` becomes `a.jpg.png`), so
+sources that differ only in their extension do not share an output. `manifest.jsonl` gets one line per
+written variant (source, plan hash, seed, output path, checksums) and
+`plans.jsonl` maps plan hashes to plan JSON. Rerunning the same command resumes:
+variants already in the manifest whose files exist are skipped.
+"""
+import io
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image
+from diagnostics import get_logger
+from distortion_plan import DistortionPlan, plan_seed
+from ingest import IMAGE_EXTENSIONS
+
+logger = get_logger("export")
+
+MANIFEST_NAME = "manifest.jsonl"
+PLANS_NAME = "plans.jsonl"
+OUTPUT_FORMATS = {"png": ("PNG", ".png"), "jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+# Futures submitted per worker ahead of completion; bounds memory for very large exports
+PENDING_PER_WORKER = 4
+
+
+def iter_sources(source_dir):
+    """Yields the relative paths of images under `source_dir`, in a stable order, without listing them all first."""
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, name), source_dir).replace(os.sep, "/")
+
+
+def output_path(source, plan_hash, output_format="png"):
+    """Relative output path of one variant; keeps the source's extension so `a.png` and `a.jpg` stay apart."""
+    extension = OUTPUT_FORMATS[output_format][1]
+    return f"{plan_hash[:12]}/{source}{extension}"
+
+
+def load_plans(path):
+    """
+    Reads distortion plans from a file.
+
+    The file holds a JSON list of plans or one plan per line. A plan is either a
+    DistortionPlan JSON object ({"steps": [...]}) or a list of distortion dicts as
+    used by apply_distortions; in the latter, `overlay_image` may be the path of an
+    image file.
+
+    Returns:
+        list: DistortionPlan objects, with overlay images in their payloads.
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        items = data if isinstance(data, list) and all(isinstance(item, (dict, list)) for item in data) else [data]
+        # A single plan given as a list of distortion dicts
+        if items and all(isinstance(item, dict) and "type" in item for item in items):
+            items = [items]
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    base = os.path.dirname(os.path.abspath(path))
+    plans = []
+    for item in items:
+        if isinstance(item, dict):
+            plans.append(DistortionPlan.from_json(item))
+            continue
+        distortions = []
+        for distortion in item:
+            overlay = distortion.get("overlay_image")
+            if isinstance(overlay, str) and not overlay.startswith("sha256:"):
+                with open(os.path.join(base, overlay), "rb") as f:
+                    distortion = dict(distortion, overlay_image=f.read())
+            distortions.append(distortion)
+        plans.append(DistortionPlan.from_distortions(distortions))
+    return plans
+
+
+def read_manifest(output_dir):
+    """Returns the output paths recorded in an export's manifest, ignoring a torn last line."""
+    done = set()
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["output"])
+            except (ValueError, KeyError):
+                logger.warning("Skipping unreadable manifest line in %s", path)
+    return done
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Per-process state set by _init_worker, so plans and overlays are sent and compiled once per process
+_worker = {}
+
+
+def _init_worker(plans, output_format, quality):
+    _worker["compiled"] = [plan.compile() for plan in plans]
+    _worker["format"] = output_format
+    _worker["quality"] = quality
+
+
+def _export_one(source_path, source, plan_index, seed, output_file):
+    """Renders, encodes and writes one variant. Runs in a pool process."""
+    compiled = _worker["compiled"][plan_index]
+    with open(source_path, "rb") as f:
+        source_bytes = f.read()
+    with Image.open(io.BytesIO(source_bytes)) as image:
+        image = compiled.apply(image.convert("RGB"), seed=seed)
+    pil_format = OUTPUT_FORMATS[_worker["format"]][0]
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, format=pil_format)
+    else:
+        image.convert("RGB").save(buffer, format=pil_format, quality=_worker["quality"])
+    data = buffer.getvalue()
+    _write_atomic(output_file, data)
+    return {
+        "source": source,
+        "source_sha256": hashlib.sha256(source_bytes).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "bytes": len(data),
+        "width": image.size[0],
+        "height": image.size[1],
+    }
+
+
+def export_augmentations(source_dir, plans, output_dir, base_seed=0, workers=None, output_format="png",
+                         quality=95, resume=True, progress=None):
+    """
+    Renders every image under `source_dir` with every plan and writes the results to `output_dir`.
+
+    Work is streamed: sources are listed lazily, at most a few tasks per worker
+    are pending at a time, and workers write their outputs themselves, so no
+    rendered image ever reaches this process. Manifest lines are written
+    and flushed as variants complete, so an interrupted export loses at most the
+    variants being rendered.
+
+    Args:
+        source_dir (str): Folder searched recursively for images.
+        plans (list): DistortionPlan objects.
+        output_dir (str): Export folder, created if needed.
+        base_seed (int): Seed of the export; see plan_seed.
+        workers (int): Worker processes; defaults to the number of CPUs. 0 renders in this process.
+        output_format (str): One of OUTPUT_FORMATS.
+        quality (int): Quality for lossy formats.
+        resume (bool): Skip variants already in the manifest whose output files exist.
+        progress (callable): Called with the running summary after each variant.
+
+    Returns:
+        dict: Counts of written, skipped and failed variants, and the first errors.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    plans = list(dict.fromkeys(plans))
+    os.makedirs(output_dir, exist_ok=True)
+    done = read_manifest(output_dir) if resume else set()
+
+    plans_path = os.path.join(output_dir, PLANS_NAME)
+    known_plans = set()
+    if os.path.exists(plans_path):
+        with open(plans_path) as f:
+            known_plans = {json.loads(line)["plan"] for line in f if line.strip()}
+    with open(plans_path, "a") as f:
+        for plan in plans:
+            if plan.content_hash not in known_plans:
+                f.write(json.dumps({"plan": plan.content_hash, "distortions": plan.to_dict()}) + "\n")
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = open(manifest_path, "a+b" if resume else "wb")
+    # Finish a line torn by an interrupted export so the next record starts on its own line
+    if resume and manifest.tell() > 0:
+        manifest.seek(-1, os.SEEK_END)
+        if manifest.read(1) != b"\n":
+            manifest.write(b"\n")
+
+    summary = {"written": 0, "skipped": 0, "failed": 0, "errors": []}
+
+    def tasks():
+        for source in iter_sources(source_dir):
+            for plan_index, plan in enumerate(plans):
+                relative = output_path(source, plan.content_hash, output_format)
+                if relative in done and os.path.exists(os.path.join(output_dir, relative)):
+                    summary["skipped"] += 1
+                    if progress:
+                        progress(summary)
+                    continue
+                yield (os.path.join(source_dir, source), source, plan_index,
+                       plan_seed(base_seed, source, plan.content_hash), os.path.join(output_dir, relative))
+
+    def record(task, result=None, error=None):
+        _, source, plan_index, seed, output_file = task
+        if error is not None:
+            logger.warning("Export of %s failed: %s", source, error)
+            summary["failed"] += 1
+            if len(summary["errors"]) < 20:
+                summary["errors"].append(f"{source}: {error}")
+        else:
+            result.update(plan=plans[plan_index].content_hash, seed=seed,
+                          output=os.path.relpath(output_file, output_dir).replace(os.sep, "/"))
+            manifest.write((json.dumps(result, sort_keys=True) + "\n").encode())
+            manifest.flush()
+            summary["written"] += 1
+        if progress:
+            progress(summary)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    try:
+        if workers == 0:
+            _init_worker(plans, output_format, quality)
+            for task in tasks():
+                try:
+                    record(task, _export_one(*task))
+                except Exception as e:
+                    record(task, error=e)
+            return summary
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(plans, output_format, quality)) as pool:
+            pending = {}
+            for task in tasks():
+                pending[pool.submit(_export_one, *task)] = task
+                if len(pending) >= workers * PENDING_PER_WORKER:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        _collect(future, pending.pop(future), record)
+            for future in list(pending):
+                _collect(future, pending.pop(future), record)
+        return summary
+    finally:
+        manifest.close()
+
+
+def _collect(future, task, record):
+    try:
+        result = future.result()
+    except Exception as e:
+        record(task, error=e)
+    else:
+        record(task, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="Folder searched recursively for images")
+    parser.add_argument("--plans", required=True, help="JSON or JSONL file of distortion plans")
+    parser.add_argument("--output", required=True, help="Export folder")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs, 0: no pool)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="png")
+    parser.add_argument("--quality", type=int, default=95, help="Quality for jpeg and webp outputs")
+    parser.add_argument("--no-resume", action="store_true", help="Re-render everything and start a new manifest")
+    args = parser.parse_args()
+
+    summary = export_augmentations(args.source, load_plans(args.plans), args.output, base_seed=args.seed,
+                                   workers=args.workers, output_format=args.format, quality=args.quality,
+                                   resume=not args.no_resume)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
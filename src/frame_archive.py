@@ -0,0 +1,203 @@
+"""
+Packed archives of decoded frames for repeated sweeps over the same images.
+
+Sweeps and red-team searches read the same images many times. An archive holds
+them already decoded, as uint8 RGB arrays in one file, with a JSON index
+beside it. The file is memory-mapped: a frame is a view into the mapping, so
+reading it costs no decode and no copy, and processes that open the same
+archive share its pages through the OS page cache. Example:
+
+    python src/frame_archive.py --source images/ --output images.frames --max-size 1920 1080
+
+`images.frames` holds the frames, each starting on a page boundary, and
+`images.frames.index.json` their names, offsets, shapes and source digests.
+The archive path can be used as the folder path of a bulk run, and
+archive.items() gives sources that the bulk, dedup and red-teaming pipelines
+accept like files.
+"""
+import io
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from export import iter_sources
+
+ARCHIVE_SUFFIX = ".frames"
+INDEX_SUFFIX = ".index.json"
+ARCHIVE_VERSION = 1
+# Frames start on page boundaries, so each frame maps onto whole pages of its own
+ALIGNMENT = 4096
+
+
+def index_path(archive_path):
+    return archive_path + INDEX_SUFFIX
+
+
+def is_archive(path):
+    """True if `path` is a packed archive with its index."""
+    return os.path.isfile(path) and os.path.isfile(index_path(path))
+
+
+def _decode(source_path, max_size):
+    with open(source_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+    if max_size and (image.width > max_size[0] or image.height > max_size[1]):
+        scale = min(max_size[0] / image.width, max_size[1] / image.height)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.LANCZOS)
+        # A resized frame must not share cache keys or result hashes with its source
+        digest = hashlib.sha256(f"{digest}|{image.width}x{image.height}".encode()).hexdigest()
+    return np.asarray(image), digest
+
+
+def pack_images(source_dir, archive_path, max_size=None, workers=None, progress=None):
+    """
+    Decodes every image under `source_dir` into a packed archive.
+
+    Images are decoded on a thread pool a batch at a time and written in source
+    order, so memory use stays bounded. The archive and index are written to
+    temporary files and moved into place at the end.
+
+    Args:
+        source_dir (str): Folder searched recursively for images.
+        archive_path (str): Archive file to create; the index goes beside it.
+        max_size (tuple): Optional (width, height) the frames are downscaled to fit,
+                          keeping their aspect ratio.
+        workers (int): Decoding threads; defaults to the number of CPUs.
+        progress (callable): Called with the number of frames written so far.
+
+    Returns:
+        int: Number of frames packed.
+    """
+    sources = list(iter_sources(source_dir))
+    workers = workers or os.cpu_count() or 1
+    directory = os.path.dirname(os.path.abspath(archive_path))
+    os.makedirs(directory, exist_ok=True)
+    frames = []
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+            offset = 0
+            for start in range(0, len(sources), workers * 2):
+                batch = sources[start:start + workers * 2]
+                decoded = executor.map(lambda name: _decode(os.path.join(source_dir, name), max_size), batch)
+                for name, (pixels, digest) in zip(batch, decoded):
+                    offset = -(-offset // ALIGNMENT) * ALIGNMENT
+                    f.seek(offset)
+                    f.write(np.ascontiguousarray(pixels).data)
+                    frames.append({"name": name, "offset": offset, "shape": list(pixels.shape), "sha256": digest})
+                    offset += pixels.nbytes
+                    if progress:
+                        progress(len(frames))
+        index = {"version": ARCHIVE_VERSION, "max_size": list(max_size) if max_size else None, "frames": frames}
+        with open(tmp_path + INDEX_SUFFIX, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, archive_path)
+        os.replace(tmp_path + INDEX_SUFFIX, index_path(archive_path))
+    finally:
+        for path in (tmp_path, tmp_path + INDEX_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+    return len(frames)
+
+
+class FrameArchive:
+    """
+    Read-only view of a packed archive.
+
+    Pickling an archive pickles only its path, so frames can be sent to pool
+    processes cheaply; each process maps the file itself and shares its pages.
+
+    Args:
+        path (str): Archive file written by pack_images.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(index_path(self.path)) as f:
+            index = json.load(f)
+        if index.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported frame archive version: {index.get('version')}")
+        self.max_size = index.get("max_size")
+        self._frames = index["frames"]
+        self.names = [frame["name"] for frame in self._frames]
+        self._positions = {name: position for position, name in enumerate(self.names)}
+        # An empty file cannot be mapped
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r") if self._frames else None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __reduce__(self):
+        return FrameArchive, (self.path,)
+
+    def index_of(self, name):
+        """Position of the frame packed from the source `name` (relative to the packed folder)."""
+        return self._positions[name]
+
+    def frame(self, index):
+        """The frame as a read-only (height, width, 3) uint8 array backed by the mapping."""
+        frame = self._frames[index]
+        shape = tuple(frame["shape"])
+        return self._data[frame["offset"]:frame["offset"] + int(np.prod(shape))].reshape(shape)
+
+    def image(self, index):
+        """The frame as an RGB PIL image."""
+        return Image.fromarray(self.frame(index), "RGB")
+
+    def digest(self, index):
+        """SHA-256 of the source image, or of the source and size for downscaled frames."""
+        return self._frames[index]["sha256"]
+
+    def items(self):
+        """ArchiveFrame sources for every frame, in packing order."""
+        return [ArchiveFrame(self, index) for index in range(len(self))]
+
+    def close(self):
+        self._data = None
+
+
+class ArchiveFrame:
+    """
+    One frame of a FrameArchive, usable as a bulk source in place of a file.
+
+    utils.open_image returns its image without decoding anything, and
+    bulk.image_digest returns the digest recorded when it was packed, so artifact
+    cache entries and stored results line up with those of the source file.
+    """
+
+    def __init__(self, archive, index):
+        self.archive = archive
+        self.index = index
+        self.name = archive.names[index]
+        self.digest = archive.digest(index)
+
+    def open_image(self):
+        return self.archive.image(self.index)
+
+    def __repr__(self):
+        return f"ArchiveFrame({self.archive.path!r}, {self.index})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="Folder searched recursively for images")
+    parser.add_argument("--output", required=True, help=f"Archive file to write, e.g. images{ARCHIVE_SUFFIX}")
+    parser.add_argument("--max-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="Downscale frames to fit within this size")
+    parser.add_argument("--workers", type=int, help="Decoding threads (default: number of CPUs)")
+    args = parser.parse_args()
+
+    count = pack_images(args.source, args.output, max_size=args.max_size, workers=args.workers)
+    print(f"Packed {count} frames into {args.output} ({os.path.getsize(args.output) / 2 ** 20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
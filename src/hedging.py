@@ -0,0 +1,162 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from diagnostics import get_logger
+
+logger = get_logger("hedging")
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_BUDGET = 0.1
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when no response arrived before a request's deadline."""
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful request latencies.
+
+    Args:
+        window (int): Number of recent latencies kept.
+    """
+
+    def __init__(self, window=500):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q):
+        """Returns the q-th percentile (0-100) of recent latencies in seconds, or None if empty."""
+        with self._lock:
+            if not self._latencies:
+                return None
+            return float(np.percentile(np.fromiter(self._latencies, dtype=float), q))
+
+    def summary(self):
+        """Returns p50/p95/p99 of recent latencies in seconds."""
+        return {f"p{q}": self.percentile(q) for q in (50, 95, 99)}
+
+
+class HedgingBackend:
+    """
+    Wraps a model backend with per-call deadlines and optional hedged requests.
+
+    Each call is given `timeout` seconds in total; DeadlineExceeded is raised if no
+    response arrived by then. The deadline is also passed to the wrapped backend, so
+    backends that support it (Gemini, fake) abandon the underlying request.
+
+    With hedging enabled, a call that has not returned after the `hedge_percentile`
+    of recent latencies gets a duplicate request, and whichever answers first wins.
+    Hedges are capped at `hedge_budget` times the number of calls, and only start
+    once `min_samples` latencies have been observed.
+
+    Args:
+        backend: The backend to wrap.
+        timeout (float): Per-call deadline in seconds, or None for no deadline.
+        hedge_percentile (float): Latency percentile (0-100) after which to hedge, or None to disable hedging.
+        hedge_budget (float): Maximum extra requests as a fraction of calls.
+        min_samples (int): Latencies needed before hedging starts.
+        tracker (LatencyTracker): Shared latency window, e.g. kept across bulk runs.
+        max_workers (int): Threads available for in-flight requests and hedges.
+    """
+
+    def __init__(self, backend, timeout=None, hedge_percentile=None, hedge_budget=DEFAULT_HEDGE_BUDGET,
+                 min_samples=20, tracker=None, max_workers=64):
+        self.backend = backend
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self.name = f"hedged-{getattr(backend, 'name', 'backend')}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-request")
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def configure(self, api_key):
+        self.backend.configure(api_key)
+
+    def list_models(self):
+        return self.backend.list_models()
+
+    def shutdown(self):
+        """Stops the request threads without waiting for abandoned requests."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _hedge_delay(self):
+        if self.hedge_percentile is None or len(self.tracker) < self.min_samples:
+            return None
+        return self.tracker.percentile(self.hedge_percentile)
+
+    def _try_reserve_hedge(self):
+        with self._lock:
+            if self.stats["hedges"] + 1 > self.hedge_budget * self.stats["calls"]:
+                return False
+            self.stats["hedges"] += 1
+            return True
+
+    def _submit(self, model_name, content, deadline):
+        if deadline is None:
+            return self._executor.submit(self.backend.generate_content, model_name, content)
+        remaining = max(0.0, deadline - time.monotonic())
+        return self._executor.submit(self.backend.generate_content, model_name, content, timeout=remaining)
+
+    def generate_content(self, model_name, content):
+        with self._lock:
+            self.stats["calls"] += 1
+        start = time.monotonic()
+        deadline = start + self.timeout if self.timeout is not None else None
+
+        pending = {self._submit(model_name, content, deadline)}
+        hedge = None
+        hedge_delay = self._hedge_delay()
+        last_error = None
+        while pending:
+            now = time.monotonic()
+            wait_for = None if deadline is None else max(0.0, deadline - now)
+            if hedge is None and hedge_delay is not None:
+                until_hedge = max(0.0, start + hedge_delay - now)
+                wait_for = until_hedge if wait_for is None else min(wait_for, until_hedge)
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                for other in pending:
+                    other.cancel()
+                self.tracker.record(time.monotonic() - start)
+                if future is hedge:
+                    with self._lock:
+                        self.stats["hedge_wins"] += 1
+                return response
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            if hedge is None and hedge_delay is not None and pending and now >= start + hedge_delay:
+                if self._try_reserve_hedge():
+                    logger.debug("Hedging request to %s after %.3fs", model_name, now - start)
+                    hedge = self._submit(model_name, content, deadline)
+                    pending.add(hedge)
+                else:
+                    hedge_delay = None
+
+        if not pending and (deadline is None or time.monotonic() < deadline):
+            raise last_error
+        for future in pending:
+            future.cancel()
+        with self._lock:
+            self.stats["deadline_exceeded"] += 1
+        raise DeadlineExceeded(f"No response from {model_name} within {self.timeout:.2f}s")
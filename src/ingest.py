@@ -0,0 +1,194 @@
+import os
+import io
+from collections import namedtuple
+import numpy as np
+from PIL import Image, ImageSequence
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Multi-frame formats Pillow can decode on its own
+ANIMATED_EXTENSIONS = ('.gif', '.tif', '.tiff', '.webp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+
+SCENE_CHANGE_METHODS = ["None", "Histogram", "Difference"]
+
+# A decoded frame. timestamp is in seconds, or None if the source has no timing information.
+Frame = namedtuple("Frame", ["index", "timestamp", "image"])
+
+
+class _Sampler:
+    """Decides which frames to keep for fixed-stride or time-based sampling."""
+
+    def __init__(self, stride=1, interval=None):
+        self.stride = max(1, int(stride))
+        self.interval = interval
+        self._next_time = 0.0
+
+    def keep(self, index, timestamp):
+        if self.interval:
+            if timestamp is None:
+                raise ValueError("Time-based sampling needs frame timestamps; set fps for image sequences.")
+            # Small tolerance so float rounding of timestamps does not skip a sample
+            if timestamp + 1e-9 >= self._next_time:
+                self._next_time += self.interval * max(1, int((timestamp - self._next_time) // self.interval) + 1)
+                return True
+            return False
+        return index % self.stride == 0
+
+
+def iter_image_sequence(directory, stride=1, interval=None, fps=None):
+    """
+    Streams frames from a directory of stills, ordered by file name.
+
+    Only sampled files are opened.
+
+    Args:
+        directory (str): Folder containing the frames.
+        stride (int): Keep every `stride`-th frame.
+        interval (float): Keep at most one frame per `interval` seconds (needs fps).
+        fps (float): Frame rate used to derive timestamps.
+
+    Yields:
+        Frame: The sampled frames.
+    """
+    names = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    sampler = _Sampler(stride, interval)
+    for index, name in enumerate(names):
+        timestamp = index / fps if fps else None
+        if sampler.keep(index, timestamp):
+            with Image.open(os.path.join(directory, name)) as image:
+                yield Frame(index, timestamp, image.convert("RGB"))
+
+
+def _iter_animated_image(path, sampler):
+    with Image.open(path) as image:
+        timestamp = 0.0
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            if sampler.keep(index, timestamp):
+                yield Frame(index, timestamp, frame.convert("RGB"))
+            timestamp += frame.info.get("duration", 0) / 1000.0
+
+
+def _iter_video_capture(path, sampler):
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("Reading video files requires OpenCV. Install it with `pip install opencv-python-headless`.")
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video file: {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or None
+        index = 0
+        # grab() only demuxes the frame; retrieve() decodes it, so skipped frames stay cheap
+        while capture.grab():
+            timestamp = index / fps if fps else capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if sampler.keep(index, timestamp):
+                ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+                yield Frame(index, timestamp, Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)))
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_video_frames(path, stride=1, interval=None):
+    """
+    Streams frames from a video file or a multi-frame image such as an animated GIF.
+
+    Video files are decoded with OpenCV if it is installed; other multi-frame
+    formats are decoded with Pillow.
+
+    Args:
+        path (str): Path to the video or multi-frame image.
+        stride (int): Keep every `stride`-th frame.
+        interval (float): Keep at most one frame per `interval` seconds.
+
+    Yields:
+        Frame: The sampled frames.
+    """
+    sampler = _Sampler(stride, interval)
+    if path.lower().endswith(ANIMATED_EXTENSIONS):
+        yield from _iter_animated_image(path, sampler)
+    else:
+        yield from _iter_video_capture(path, sampler)
+
+
+def iter_frames(path, stride=1, interval=None, fps=None):
+    """Streams sampled frames from a directory of stills or a video file."""
+    if os.path.isdir(path):
+        return iter_image_sequence(path, stride=stride, interval=interval, fps=fps)
+    return iter_video_frames(path, stride=stride, interval=interval)
+
+
+def _signature(image, size=(64, 36)):
+    """Small grayscale thumbnail used to compare frames cheaply."""
+    return np.asarray(image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def histogram_distance(a, b, bins=32):
+    """Half the L1 distance between normalised grayscale histograms, in [0, 1]."""
+    hist_a = np.histogram(a, bins=bins, range=(0, 256))[0] / a.size
+    hist_b = np.histogram(b, bins=bins, range=(0, 256))[0] / b.size
+    return 0.5 * float(np.abs(hist_a - hist_b).sum())
+
+
+def difference_distance(a, b):
+    """Mean absolute pixel difference between thumbnails, in [0, 1]."""
+    return float(np.abs(a - b).mean() / 255.0)
+
+
+def detect_scene_changes(frames, method="Histogram", threshold=0.2):
+    """
+    Filters a frame stream down to frames that differ from the last kept frame.
+
+    The first frame is always kept.
+
+    Args:
+        frames (iterable): Frames as yielded by iter_frames.
+        method (str): One of SCENE_CHANGE_METHODS.
+        threshold (float): Minimum distance (0-1) from the last kept frame.
+
+    Yields:
+        Frame: Frames that start a new scene.
+    """
+    if method == "None":
+        yield from frames
+        return
+    if method == "Histogram":
+        distance = histogram_distance
+    elif method == "Difference":
+        distance = difference_distance
+    else:
+        raise ValueError(f"Unknown scene change method: {method}")
+
+    last_signature = None
+    for frame in frames:
+        signature = _signature(frame.image)
+        if last_signature is None or distance(last_signature, signature) >= threshold:
+            last_signature = signature
+            yield frame
+
+
+def frame_file_name(source_path, frame):
+    """Display name for a frame, e.g. `dashcam.mp4#000120`."""
+    return f"{os.path.basename(os.path.normpath(source_path))}#{frame.index:06d}"
+
+
+def frame_to_file(source_path, frame):
+    """
+    Encodes a frame as an in-memory PNG that the bulk pipeline can open like an upload.
+
+    The frame index and timestamp are attached as `metadata` and end up as columns
+    in the results.
+    """
+    buffer = io.BytesIO()
+    frame.image.save(buffer, format='PNG')
+    buffer.seek(0)
+    buffer.name = frame_file_name(source_path, frame)
+    buffer.metadata = {
+        "Frame Index": frame.index,
+        "Timestamp": round(frame.timestamp, 3) if frame.timestamp is not None else None
+    }
+    return buffer
@@ -0,0 +1,511 @@
+"""
+Durable job queue for distributing bulk analyses over worker processes.
+
+Jobs live in a SQLite database (WAL mode) that every worker opens, so workers on
+one host, or on several hosts sharing the file over a filesystem with working
+locks, pull from the same queue. Example:
+
+    python src/job_queue.py enqueue --db audit.sqlite --folder images/ --prompt "..." --model models/gemini-1.5-flash-latest
+    python src/job_queue.py work --db audit.sqlite --stop-when-empty   # start as many as needed
+    python src/job_queue.py status --db audit.sqlite
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import hashlib
+import argparse
+import threading
+from backends import get_backend
+from bulk import analyze_bulk_item
+from diagnostics import get_logger
+from distortion_plan import DistortionPlan, EMPTY_PLAN
+
+logger = get_logger("job_queue")
+
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 5.0
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL UNIQUE,
+    run_id TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    image_path TEXT NOT NULL,
+    plan_json TEXT NOT NULL,
+    prompt TEXT,
+    model TEXT NOT NULL,
+    system_instructions TEXT,
+    fields TEXT NOT NULL,
+    result TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+-- Serves the lease query: runnable jobs by priority, then age
+CREATE INDEX IF NOT EXISTS ix_jobs_runnable ON jobs(status, priority DESC, job_id);
+CREATE INDEX IF NOT EXISTS ix_jobs_lease ON jobs(status, lease_expires);
+CREATE INDEX IF NOT EXISTS ix_jobs_run ON jobs(run_id, status);
+"""
+
+STATUSES = ["queued", "leased", "done", "dead"]
+
+
+def job_key(run_id, image_path, plan, prompt, model):
+    """Identity of a job, so enqueueing the same work twice adds it once."""
+    parts = [run_id or "", os.path.abspath(image_path), plan.content_hash, prompt or "", model]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    SQLite-backed queue with leases, retries, priorities and dead-lettering.
+
+    A worker leases jobs for `visibility_timeout` seconds. A job whose lease runs
+    out (e.g. its worker died) becomes available to other workers again. Each lease
+    counts as an attempt; a job that fails or loses its lease `max_attempts` times
+    is moved to the "dead" status with its last error, where it stays until
+    requeue_dead is called.
+
+    Each process (and each thread, if preferred) should open its own JobQueue.
+
+    Args:
+        path (str): SQLite database file shared by producers and workers.
+        visibility_timeout (float): Seconds a lease lasts unless extended.
+        max_attempts (int): Attempts before a job is dead-lettered, for jobs enqueued without their own.
+    """
+
+    def __init__(self, path, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode, so write transactions can be opened with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _write(self, func):
+        """Runs func(conn) in an IMMEDIATE transaction, which takes the write lock up front."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, image_paths, plan=EMPTY_PLAN, prompt="", model=None, system_instructions=None,
+                fields=None, priority=0, run_id=None, max_attempts=None):
+        """
+        Adds one job per image, skipping jobs that are already queued.
+
+        Args:
+            image_paths (list): Image files, readable by every worker.
+            plan (DistortionPlan): Distortions applied before analysis. Overlays must be
+                                   carried in the plan's JSON, so plans with overlays are rejected.
+            prompt (str): Prompt sent with each image.
+            model (str): Model used for the analysis.
+            system_instructions (str): System instructions, or None.
+            fields (list): JSON fields requested from the model.
+            priority (int): Higher priorities are leased first.
+            run_id (str): Groups jobs for status and export.
+            max_attempts (int): Overrides the queue's default for these jobs.
+
+        Returns:
+            int: Number of jobs added.
+        """
+        if not model:
+            raise ValueError("A model is required")
+        if any(step.type == "Overlay" and step.param_dict.get("overlay_image") for step in plan.steps):
+            raise ValueError("Plans with overlay images cannot be queued")
+        now = time.time()
+        plan_json = plan.to_json()
+        fields_json = json.dumps(list(fields or []))
+        attempts = max_attempts or self.max_attempts
+        rows = [
+            (job_key(run_id, path, plan, prompt, model), run_id, priority, attempts, now, os.path.abspath(path),
+             plan_json, prompt, model, system_instructions, fields_json, now)
+            for path in image_paths
+        ]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                """INSERT OR IGNORE INTO jobs (job_key, run_id, priority, max_attempts, available_at, image_path,
+                                               plan_json, prompt, model, system_instructions, fields, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            return conn.total_changes - before
+
+        return self._write(insert)
+
+    def lease(self, worker_id, limit=1):
+        """
+        Leases up to `limit` runnable jobs, highest priority first.
+
+        Jobs whose previous lease expired are leased again; those already at their
+        attempt limit are dead-lettered instead.
+
+        Returns:
+            list: Leased jobs as dicts with the job's columns.
+        """
+        def claim(conn):
+            now = time.time()
+            expired = conn.execute(
+                """UPDATE jobs SET status = 'dead', lease_owner = NULL, finished_at = ?,
+                          last_error = COALESCE(last_error, 'Lease expired')
+                   WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts""",
+                (now, now)
+            ).rowcount
+            if expired:
+                logger.warning("Dead-lettered %d jobs whose final lease expired", expired)
+            rows = conn.execute(
+                """SELECT job_id FROM jobs
+                   WHERE (status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?)
+                   ORDER BY priority DESC, job_id
+                   LIMIT ?""",
+                (now, now, limit)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            conn.execute(
+                f"""UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE job_id IN ({placeholders})""",
+                [worker_id, now + self.visibility_timeout, *ids]
+            )
+            cursor = conn.execute(f"SELECT * FROM jobs WHERE job_id IN ({placeholders}) ORDER BY priority DESC, job_id",
+                                  ids)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        return self._write(claim)
+
+    def extend_lease(self, job_ids, worker_id):
+        """Pushes back the lease expiry of jobs still held by `worker_id`; returns how many were extended."""
+        if not job_ids:
+            return 0
+        placeholders = ",".join("?" * len(job_ids))
+        return self._write(lambda conn: conn.execute(
+            f"""UPDATE jobs SET lease_expires = ?
+                WHERE job_id IN ({placeholders}) AND lease_owner = ? AND status = 'leased'""",
+            [time.time() + self.visibility_timeout, *job_ids, worker_id]
+        ).rowcount)
+
+    def complete(self, job_id, worker_id, result):
+        """
+        Stores a job's result row and marks it done.
+
+        Returns:
+            bool: False if the worker no longer held the lease (the job was leased
+                  again after a timeout), in which case nothing is changed.
+        """
+        return self._write(lambda conn: conn.execute(
+            """UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, finished_at = ?
+               WHERE job_id = ? AND lease_owner = ? AND status = 'leased'""",
+            (json.dumps(result, default=str), time.time(), job_id, worker_id)
+        ).rowcount == 1)
+
+    def fail(self, job_id, worker_id, error, retry_delay=DEFAULT_RETRY_DELAY):
+        """
+        Records a failed attempt. The job is retried after `retry_delay` seconds
+        (doubling with each attempt), or dead-lettered once it has used all its attempts.
+
+        Returns:
+            str: The job's new status, or None if the worker no longer held the lease.
+        """
+        def record(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND lease_owner = ? AND status = 'leased'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            now = time.time()
+            if attempts >= max_attempts:
+                conn.execute(
+                    """UPDATE jobs SET status = 'dead', last_error = ?, lease_owner = NULL, lease_expires = NULL,
+                              finished_at = ?
+                       WHERE job_id = ?""",
+                    (str(error), now, job_id)
+                )
+                return "dead"
+            conn.execute(
+                """UPDATE jobs SET status = 'queued', last_error = ?, lease_owner = NULL, lease_expires = NULL,
+                          available_at = ?
+                   WHERE job_id = ?""",
+                (str(error), now + retry_delay * 2 ** (attempts - 1), job_id)
+            )
+            return "queued"
+
+        return self._write(record)
+
+    def requeue_dead(self, run_id=None):
+        """Gives dead-lettered jobs a fresh set of attempts; returns how many were requeued."""
+        sql = """UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, finished_at = NULL
+                 WHERE status = 'dead'"""
+        params = [time.time()]
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        return self._write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def _select(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def counts(self, run_id=None):
+        """Returns the number of jobs in each status."""
+        sql = "SELECT status, COUNT(*) AS n FROM jobs"
+        params = ()
+        if run_id is not None:
+            sql += " WHERE run_id = ?"
+            params = (run_id,)
+        counts = dict.fromkeys(STATUSES, 0)
+        for row in self._select(sql + " GROUP BY status", params):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def dead_letters(self, limit=100):
+        return self._select(
+            "SELECT job_id, run_id, image_path, model, attempts, last_error FROM jobs WHERE status = 'dead' "
+            "ORDER BY job_id LIMIT ?", (limit,)
+        )
+
+    def results(self, run_id=None):
+        """Returns the result rows of finished jobs, in job order."""
+        sql = "SELECT result FROM jobs WHERE status = 'done'"
+        params = ()
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params = (run_id,)
+        return [json.loads(row["result"]) for row in self._select(sql + " ORDER BY job_id", params)]
+
+    def export_results(self, store, run_id=None, label=None):
+        """
+        Copies finished jobs into a ResultsStore run, so they show up in the Results Explorer.
+
+        Returns:
+            str: The ResultsStore run id.
+        """
+        from bulk import image_digest
+        sql = "SELECT image_path, plan_json, result FROM jobs WHERE status = 'done'"
+        params = ()
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params = (run_id,)
+        rows = self._select(sql + " ORDER BY job_id", params)
+        store_run = store.start_run(label=label or f"Job queue {run_id or ''}".strip(), run_id=run_id)
+        records = []
+        for row in rows:
+            image_hash = image_digest(row["image_path"]) if os.path.exists(row["image_path"]) else None
+            records.append({"result": json.loads(row["result"]), "image_hash": image_hash,
+                            "plan": DistortionPlan.from_json(row["plan_json"])})
+        store.record_results(store_run, records)
+        return store_run
+
+
+def _is_transient(result):
+    """True for results that carry a request error (e.g. a 429) rather than a model answer."""
+    try:
+        json_response = json.loads(result.get("JSON Response") or "{}")
+    except ValueError:
+        return False
+    return str(json_response.get("error", "")).startswith("Error generating response")
+
+
+def process_job(job, backend=None, artifact_cache=None):
+    """Runs one leased job through the bulk distortion and analysis path and returns its result row."""
+    plan = DistortionPlan.from_json(job["plan_json"])
+    return analyze_bulk_item(job["image_path"], plan, job["prompt"], job["model"], job["system_instructions"],
+                             json.loads(job["fields"]), backend=backend, artifact_cache=artifact_cache)
+
+
+def run_worker(queue, worker_id=None, backend=None, batch_size=1, poll_interval=0.5, stop_when_empty=False,
+               max_jobs=None, retry_delay=DEFAULT_RETRY_DELAY, stop_event=None, artifact_cache=None):
+    """
+    Leases and processes jobs until stopped.
+
+    A background thread extends the leases of jobs being processed, so jobs that
+    take longer than the visibility timeout are not handed to another worker.
+    Request errors such as rate limits are retried; other failures count as
+    attempts too.
+
+    Args:
+        queue (JobQueue): The shared queue.
+        worker_id (str): Lease owner name; defaults to host, pid and a random suffix.
+        backend: Model backend, defaults to the active backend.
+        batch_size (int): Jobs leased per round trip to the database.
+        poll_interval (float): Seconds to wait when no job is runnable.
+        stop_when_empty (bool): Return once no job is queued or leased.
+        max_jobs (int): Return after processing this many jobs.
+        retry_delay (float): Base delay before a failed job is retried.
+        stop_event (threading.Event): Set to stop after the current batch.
+        artifact_cache (ArtifactCache): Cache of distorted, encoded images, e.g. shared by
+                                        workers on one host so each image and plan is rendered once.
+
+    Returns:
+        dict: Counts of jobs completed, retried, dead-lettered and lost (lease taken over).
+    """
+    worker_id = worker_id or default_worker_id()
+    stats = {"completed": 0, "retried": 0, "dead": 0, "lost": 0}
+    held = set()
+    held_lock = threading.Lock()
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(queue.visibility_timeout / 3):
+            with held_lock:
+                job_ids = list(held)
+            try:
+                queue.extend_lease(job_ids, worker_id)
+            except sqlite3.Error:
+                logger.warning("Could not extend leases for %s", worker_id, exc_info=True)
+
+    heartbeat_thread = threading.Thread(target=heartbeat, name="job-heartbeat", daemon=True)
+    heartbeat_thread.start()
+    processed = 0
+    try:
+        while not (stop_event is not None and stop_event.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            limit = batch_size if max_jobs is None else min(batch_size, max_jobs - processed)
+            jobs = queue.lease(worker_id, limit)
+            if not jobs:
+                if stop_when_empty:
+                    counts = queue.counts()
+                    if counts["queued"] == 0 and counts["leased"] == 0:
+                        break
+                time.sleep(poll_interval)
+                continue
+            with held_lock:
+                held.update(job["job_id"] for job in jobs)
+            for job in jobs:
+                try:
+                    result = process_job(job, backend, artifact_cache)
+                    error = None if not _is_transient(result) else json.loads(result["JSON Response"])["error"]
+                except Exception as e:
+                    logger.debug("Job %s failed", job["job_id"], exc_info=True)
+                    error = f"{type(e).__name__}: {e}"
+                if error is None:
+                    stats["completed" if queue.complete(job["job_id"], worker_id, result) else "lost"] += 1
+                else:
+                    status = queue.fail(job["job_id"], worker_id, error, retry_delay)
+                    stats[{"queued": "retried", "dead": "dead", None: "lost"}[status]] += 1
+                with held_lock:
+                    held.discard(job["job_id"])
+                processed += 1
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join(timeout=1)
+    logger.info("Worker %s finished: %s", worker_id, stats)
+    return stats
+
+
+def _image_files(folder):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(folder)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Queue one job per image")
+    enqueue.add_argument("--db", required=True)
+    enqueue.add_argument("--folder", help="Folder searched recursively for images")
+    enqueue.add_argument("images", nargs="*", help="Image files")
+    enqueue.add_argument("--plan", help="DistortionPlan JSON file")
+    enqueue.add_argument("--prompt", default="")
+    enqueue.add_argument("--model", required=True)
+    enqueue.add_argument("--system-instructions")
+    enqueue.add_argument("--fields", default="scene_description,potential_hazards,suggested_improvements,overall_safety")
+    enqueue.add_argument("--priority", type=int, default=0)
+    enqueue.add_argument("--run-id")
+    enqueue.add_argument("--max-attempts", type=int)
+
+    work = commands.add_parser("work", help="Process jobs")
+    work.add_argument("--db", required=True)
+    work.add_argument("--worker-id")
+    work.add_argument("--batch-size", type=int, default=1)
+    work.add_argument("--visibility-timeout", type=float, default=DEFAULT_VISIBILITY_TIMEOUT)
+    work.add_argument("--stop-when-empty", action="store_true")
+    work.add_argument("--max-jobs", type=int)
+    work.add_argument("--api-key", help="Gemini API key")
+    work.add_argument("--artifact-cache", help="Directory of a disk cache for distorted, encoded images")
+
+    status = commands.add_parser("status", help="Show job counts and dead letters")
+    status.add_argument("--db", required=True)
+    status.add_argument("--run-id")
+
+    requeue = commands.add_parser("requeue-dead", help="Retry dead-lettered jobs")
+    requeue.add_argument("--db", required=True)
+    requeue.add_argument("--run-id")
+
+    args = parser.parse_args()
+    if args.command == "enqueue":
+        queue = JobQueue(args.db)
+        paths = list(args.images) + (_image_files(args.folder) if args.folder else [])
+        plan = EMPTY_PLAN
+        if args.plan:
+            with open(args.plan) as f:
+                plan = DistortionPlan.from_json(f.read())
+        added = queue.enqueue(paths, plan, args.prompt, args.model, args.system_instructions,
+                              [f.strip() for f in args.fields.split(",") if f.strip()], args.priority,
+                              args.run_id, args.max_attempts)
+        print(f"Queued {added} of {len(paths)} jobs")
+    elif args.command == "work":
+        queue = JobQueue(args.db, visibility_timeout=args.visibility_timeout)
+        backend = get_backend()
+        if args.api_key:
+            backend.configure(args.api_key)
+        artifact_cache = None
+        if args.artifact_cache:
+            from artifact_cache import ArtifactCache
+            artifact_cache = ArtifactCache(args.artifact_cache)
+        stats = run_worker(queue, args.worker_id, backend, batch_size=args.batch_size,
+                           stop_when_empty=args.stop_when_empty, max_jobs=args.max_jobs,
+                           artifact_cache=artifact_cache)
+        print(json.dumps(stats))
+    elif args.command == "status":
+        queue = JobQueue(args.db)
+        print(json.dumps(queue.counts(args.run_id)))
+        for job in queue.dead_letters():
+            print(f"dead: {job['job_id']} {job['image_path']} after {job['attempts']} attempts: {job['last_error']}")
+    elif args.command == "requeue-dead":
+        print(f"Requeued {JobQueue(args.db).requeue_dead(args.run_id)} jobs")
+
+
+if __name__ == "__main__":
+    main()
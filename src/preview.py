@@ -0,0 +1,56 @@
+"""
+Proxy-resolution previews of distortion plans.
+
+Interactive previews render the plan on a downscaled proxy of the image, with
+pixel-sized parameters scaled to match, so slider feedback does not depend on
+the source resolution. The full-size image is only decoded and distorted for
+analysis.
+"""
+from utils import open_image
+
+# Longest proxy side; large enough to judge a distortion, small enough to render in tens of milliseconds
+PREVIEW_MAX_SIZE = (640, 640)
+# Default seed of render_preview; the app passes the image's plan_seed so previews match the full-size render
+PREVIEW_SEED = 0
+
+
+def load_proxy(file, max_size=PREVIEW_MAX_SIZE):
+    """
+    Decodes a downscaled proxy of an image source.
+
+    JPEGs are decoded directly at the smallest power-of-two reduction that still
+    covers `max_size` (draft mode), which is much faster than decoding the full
+    image and then shrinking it.
+
+    Args:
+        file: Uploaded file, path or archive frame, as accepted by utils.open_image.
+        max_size (tuple): Bounding box of the proxy.
+
+    Returns:
+        tuple: (proxy PIL image, (width, height) of the full-size image)
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    proxy = open_image(file)
+    full_size = proxy.size
+    proxy.draft(None, max_size)
+    proxy.thumbnail(max_size)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return proxy, full_size
+
+
+def render_preview(compiled, proxy, full_size, seed=PREVIEW_SEED):
+    """
+    Applies a compiled plan to a proxy so that it looks like the full-size render, downscaled.
+
+    Args:
+        compiled (CompiledPlan): Plan to preview.
+        proxy (PIL.Image): Image from load_proxy.
+        full_size (tuple): Size of the full image the plan will be applied to.
+        seed (int): Seed for random distortions; use the same one for the full-size render.
+
+    Returns:
+        PIL.Image: The distorted proxy.
+    """
+    return compiled.apply(proxy, seed=seed, scale=proxy.size[0] / full_size[0])
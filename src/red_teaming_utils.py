@@ -1,3 +1,18 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from PIL import Image, ImageDraw
+from bulk import get_file_name, image_digest
+from distortion_plan import DistortionPlan, DistortionStep, SIMPLE_DISTORTION_TYPES
+from utils import get_gemini_response
+
+# Distortion families the robustness search can sweep; each takes an intensity in [0, 1]
+SEARCH_DISTORTION_TYPES = SIMPLE_DISTORTION_TYPES + ["Warp", "Motion Blur", "Occlusion"]
+DEFAULT_HAZARD_SIMILARITY = 0.5
+
+
+class EvaluationFailed(RuntimeError):
+    """A model call made during a robustness search returned an error (rate limit, timeout, safety block)."""
 
 
 def run_prompt_injection_test(base_prompt, injection_prompt):
@@ -56,3 +71,289 @@ def analyze_safety_of_response(response_text, unsafe_keywords=None):
         "is_safe": is_safe,
         "flags": flags
     }
+
+
+def apply_occlusion(image, intensity, color=(0, 0, 0)):
+    """
+    Covers the centre of the image with a solid rectangle.
+
+    Args:
+        image (PIL.Image): Image to occlude.
+        intensity (float): Fraction of the image area covered, from 0 to 1.
+        color (tuple): RGB fill colour.
+
+    Returns:
+        PIL.Image: The occluded copy.
+    """
+    occluded = image.convert("RGB")
+    if intensity <= 0:
+        return occluded
+    width, height = occluded.size
+    # Same aspect ratio as the image, so the box area is `intensity` of the frame
+    scale = min(1.0, intensity) ** 0.5
+    box_width, box_height = round(width * scale), round(height * scale)
+    left, top = (width - box_width) // 2, (height - box_height) // 2
+    ImageDraw.Draw(occluded).rectangle([left, top, left + box_width - 1, top + box_height - 1], fill=color)
+    return occluded
+
+
+def distort_for_search(image, distortion_type, intensity):
+    """Applies one distortion family at `intensity`, with the other parameters at their defaults."""
+    if intensity <= 0:
+        return image
+    if distortion_type == "Occlusion":
+        return apply_occlusion(image, intensity)
+    plan = DistortionPlan((DistortionStep(distortion_type, (("intensity", intensity),)),))
+    # A fixed seed, so random families (Rain, Snow, ...) only vary with intensity between probes
+    return plan.compile().apply(image, seed=0)
+
+
+def _normalise(value):
+    return str(value).strip().lower()
+
+
+def hazard_similarity(baseline, candidate):
+    """Jaccard similarity of two potential_hazards lists (1.0 if both are empty)."""
+    def as_set(value):
+        if value is None:
+            return set()
+        values = value if isinstance(value, list) else [value]
+        return {_normalise(v) for v in values}
+
+    a, b = as_set(baseline), as_set(candidate)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def response_changed(baseline, candidate, hazard_similarity_threshold=DEFAULT_HAZARD_SIMILARITY):
+    """
+    Decides whether a model's JSON output changed materially from its clean baseline.
+
+    The output changed if overall_safety differs, if the potential_hazards overlap
+    (Jaccard similarity) falls below `hazard_similarity_threshold`, or if the
+    distorted response is an error while the baseline was not.
+
+    Args:
+        baseline (dict): JSON response for the clean image.
+        candidate (dict): JSON response for the distorted image.
+        hazard_similarity_threshold (float): Lowest hazard overlap still treated as unchanged.
+
+    Returns:
+        bool: True if the change is material.
+    """
+    if "error" in candidate and "error" not in baseline:
+        return True
+    if _normalise(baseline.get("overall_safety", "")) != _normalise(candidate.get("overall_safety", "")):
+        return True
+    return hazard_similarity(baseline.get("potential_hazards"),
+                             candidate.get("potential_hazards")) < hazard_similarity_threshold
+
+
+class EvaluationMemo:
+    """
+    Thread-safe memo of evaluations keyed by image, distortion, intensity and request settings.
+
+    Concurrent requests for the same key wait for the first one instead of
+    repeating the model call.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "calls": 0}
+
+    def __len__(self):
+        return len(self._futures)
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.stats["calls"] += 1
+            else:
+                self.stats["hits"] += 1
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            # Failed evaluations are not memoised, so a later search can retry them
+            with self._lock:
+                del self._futures[key]
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+
+def find_threshold(evaluate, changed, low=0.0, high=1.0, tolerance=0.02, grid_points=0, executor=None):
+    """
+    Finds the smallest intensity at which `changed(evaluate(intensity))` becomes true.
+
+    Assumes the output stays changed once it has changed. With `grid_points`, a
+    coarse grid is evaluated first (in parallel on `executor`) and bisection
+    continues inside the first bracket where the output changed, which also copes
+    with responses that flip back and forth at high intensities.
+
+    Args:
+        evaluate (callable): Maps an intensity to a result (e.g. a JSON response).
+        changed (callable): Returns True for results that differ materially from the baseline.
+        low (float): Intensity known or assumed to leave the output unchanged.
+        high (float): Largest intensity searched.
+        tolerance (float): Width of the final bracket.
+        grid_points (int): Interior grid points evaluated before bisecting, 0 for plain bisection.
+        executor: Executor for the grid evaluations.
+
+    Returns:
+        dict: "threshold" (the smallest changed intensity found, or None if the output
+              never changed up to `high`), "bracket" (last unchanged, first changed)
+              and "evaluations" (intensity -> changed) in the order they were made.
+    """
+    evaluations = {}
+
+    def check(intensity):
+        intensity = round(intensity, 6)
+        if intensity not in evaluations:
+            evaluations[intensity] = bool(changed(evaluate(intensity)))
+        return evaluations[intensity]
+
+    grid = [low + (high - low) * (i + 1) / (grid_points + 1) for i in range(grid_points)] + [high]
+    if executor is not None and len(grid) > 1:
+        # Warm the evaluations concurrently; check() then reads them back in order
+        results = list(executor.map(lambda x: bool(changed(evaluate(round(x, 6)))), grid))
+        for x, result in zip(grid, results):
+            evaluations.setdefault(round(x, 6), result)
+
+    previous = low
+    for x in grid:
+        if check(x):
+            low, high = previous, x
+            break
+        previous = x
+    else:
+        return {"threshold": None, "bracket": (high, None), "evaluations": evaluations}
+
+    while high - low > tolerance:
+        middle = (low + high) / 2
+        if check(middle):
+            high = middle
+        else:
+            low = middle
+    return {"threshold": round(high, 6), "bracket": (round(low, 6), round(high, 6)), "evaluations": evaluations}
+
+
+def search_robustness(images, distortion_types, input_text, model_name, system_instructions, expected_fields,
+                      backend=None, high=1.0, tolerance=0.02, grid_points=0,
+                      hazard_similarity_threshold=DEFAULT_HAZARD_SIMILARITY, max_workers=4, memo=None):
+    """
+    Finds, per image and distortion family, the smallest intensity that materially changes the model's output.
+
+    Every (image, distortion) search runs concurrently on a shared thread pool.
+    Model calls are memoised, so the clean baseline is requested once per image
+    and repeated searches reuse earlier evaluations.
+
+    Args:
+        images (list): Uploaded file objects, paths or archive frames.
+        distortion_types (list): Families from SEARCH_DISTORTION_TYPES.
+        input_text (str): Prompt sent with every image.
+        model_name (str): Model under test.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested; should include overall_safety and potential_hazards.
+        backend: Optional model backend, defaults to the active backend.
+        high (float): Largest intensity searched.
+        tolerance (float): Precision of each threshold.
+        grid_points (int): Coarse grid points evaluated before bisecting.
+        hazard_similarity_threshold (float): See response_changed.
+        max_workers (int): Concurrent model calls.
+        memo (EvaluationMemo): Shared memo, e.g. kept in session state between searches.
+
+    Returns:
+        list: One dict per (image, distortion) with "Image", "Distortion", "Threshold",
+              "Bracket", "Evaluations", "Baseline Safety", "Safety At Threshold" and "Error".
+              A search in which a model call failed has an "Error" and no threshold.
+    """
+    memo = memo if memo is not None else EvaluationMemo()
+    for distortion_type in distortion_types:
+        if distortion_type not in SEARCH_DISTORTION_TYPES:
+            raise ValueError(f"Unknown distortion type: {distortion_type}")
+
+    sources = []
+    for file in images:
+        if hasattr(file, 'open_image'):
+            # Archive frames are read from their mapping without decoding
+            load = file.open_image
+        else:
+            if hasattr(file, 'getvalue'):
+                data = file.getvalue()
+            else:
+                with open(file, "rb") as f:
+                    data = f.read()
+            load = lambda data=data: Image.open(io.BytesIO(data))
+        sources.append((get_file_name(file), image_digest(file), load))
+
+    def evaluate(source, distortion_type, intensity):
+        name, digest, load = source
+        key = (digest, distortion_type if intensity > 0 else None, intensity, input_text, model_name,
+               system_instructions, tuple(expected_fields))
+
+        def compute():
+            image = load().convert("RGB")
+            distorted = distort_for_search(image, distortion_type, intensity)
+            _, json_response = get_gemini_response(input_text, distorted, model_name, system_instructions,
+                                                   expected_fields, backend=backend)
+            # Raising keeps the error out of the memo, so a later search retries the call
+            if "error" in json_response:
+                raise EvaluationFailed(json_response["error"])
+            return json_response
+
+        return memo.get_or_compute(key, compute)
+
+    def search(source, distortion_type, grid_executor):
+        try:
+            baseline = evaluate(source, distortion_type, 0.0)
+            found = find_threshold(
+                lambda intensity: evaluate(source, distortion_type, intensity),
+                lambda response: response_changed(baseline, response, hazard_similarity_threshold),
+                low=0.0, high=high, tolerance=tolerance, grid_points=grid_points, executor=grid_executor
+            )
+            at_threshold = {}
+            if found["threshold"] is not None:
+                at_threshold = evaluate(source, distortion_type, found["threshold"])
+        except EvaluationFailed as e:
+            # A failed call says nothing about robustness, so the search is reported as failed
+            return {
+                "Image": source[0],
+                "Distortion": distortion_type,
+                "Threshold": None,
+                "Bracket": None,
+                "Evaluations": None,
+                "Baseline Safety": None,
+                "Safety At Threshold": None,
+                "Error": str(e),
+            }
+        return {
+            "Image": source[0],
+            "Distortion": distortion_type,
+            "Threshold": found["threshold"],
+            "Bracket": found["bracket"],
+            "Evaluations": len(found["evaluations"]) + 1,
+            "Baseline Safety": baseline.get("overall_safety"),
+            "Safety At Threshold": at_threshold.get("overall_safety"),
+            "Error": None,
+        }
+
+    tasks = [(source, distortion_type) for source in sources for distortion_type in distortion_types]
+    # Grid points of one search run on a separate pool, so searches waiting on them cannot starve it
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor, \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as grid_executor:
+        return list(executor.map(lambda task: search(*task, grid_executor if grid_points else None), tasks))
+
+
+def exhaustive_sweep_calls(image_count, distortion_count, high=1.0, tolerance=0.02):
+    """Model calls an exhaustive sweep at `tolerance` steps would need, for comparison."""
+    steps = int(round(high / tolerance))
+    return image_count * (1 + distortion_count * steps)
+
@@ -0,0 +1,281 @@
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    label TEXT,
+    model TEXT,
+    item_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    result_id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    image_name TEXT,
+    image_hash TEXT,
+    plan_hash TEXT,
+    plan_json TEXT,
+    distortions TEXT,
+    model TEXT,
+    prompt_hash TEXT,
+    prompt TEXT,
+    ai_response TEXT,
+    json_response TEXT,
+    extra TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS ix_results_image ON results(image_hash);
+CREATE INDEX IF NOT EXISTS ix_results_plan ON results(plan_hash);
+CREATE INDEX IF NOT EXISTS ix_results_model ON results(model, run_id);
+CREATE INDEX IF NOT EXISTS ix_results_prompt ON results(prompt_hash);
+-- One row per JSON field value; list fields get one row per element
+CREATE TABLE IF NOT EXISTS result_values (
+    result_id INTEGER NOT NULL REFERENCES results(result_id),
+    field TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_values_field_value ON result_values(field, value);
+CREATE INDEX IF NOT EXISTS ix_values_result ON result_values(result_id, field);
+"""
+
+# Result columns that can be used as filters or aggregation groups
+KEY_COLUMNS = ["run_id", "image_name", "image_hash", "plan_hash", "distortions", "model", "prompt_hash", "prompt"]
+
+
+def prompt_digest(prompt):
+    return hashlib.sha256((prompt or "").encode()).hexdigest()
+
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+
+
+class ResultsStore:
+    """
+    Local SQLite store of bulk analysis results, queryable across runs.
+
+    Rows are keyed by run, image hash, distortion plan hash, model and prompt hash.
+    JSON fields are kept both as the original JSON and exploded into
+    `result_values`, so list fields such as potential_hazards can be filtered and
+    aggregated with indexed SQL instead of re-parsing CSVs.
+
+    Args:
+        path (str): SQLite database file (":memory:" for a temporary store).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def start_run(self, label=None, model=None, run_id=None):
+        """Registers a run and returns its id."""
+        run_id = run_id or new_run_id()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, created_at, label, model) VALUES (?, ?, ?, ?)",
+                (run_id, time.time(), label, model)
+            )
+        return run_id
+
+    def record_results(self, run_id, records):
+        """
+        Stores result rows for a run in one transaction.
+
+        Args:
+            run_id (str): Run returned by start_run.
+            records (list): Dicts with the keys "result" (a bulk result row) and
+                            optionally "image_hash", "plan" (DistortionPlan), "model".
+                            The model defaults to the row's "Model" column.
+
+        Returns:
+            int: Number of rows stored.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            for record in records:
+                result = record["result"]
+                plan = record.get("plan")
+                prompt = result.get("Input Text")
+                try:
+                    json_response = json.loads(result.get("JSON Response") or "{}")
+                except ValueError:
+                    json_response = {}
+                extra = {k: v for k, v in result.items()
+                         if k not in ("Image", "Model", "Distortions", "Input Text", "AI Response", "JSON Response")}
+                cursor = self._conn.execute(
+                    """INSERT INTO results (run_id, image_name, image_hash, plan_hash, plan_json, distortions, model,
+                                            prompt_hash, prompt, ai_response, json_response, extra, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        run_id,
+                        result.get("Image"),
+                        record.get("image_hash"),
+                        plan.content_hash if plan is not None else None,
+                        plan.to_json() if plan is not None else None,
+                        result.get("Distortions"),
+                        record.get("model") or result.get("Model"),
+                        prompt_digest(prompt),
+                        prompt,
+                        result.get("AI Response"),
+                        json.dumps(json_response, separators=(",", ":")),
+                        json.dumps(extra, default=str) if extra else None,
+                        now
+                    )
+                )
+                self._conn.executemany(
+                    "INSERT INTO result_values (result_id, field, position, value) VALUES (?, ?, ?, ?)",
+                    _explode(cursor.lastrowid, json_response)
+                )
+            # Incremented rather than recounted, so appending to a long-running run stays cheap
+            self._conn.execute(
+                "UPDATE runs SET item_count = item_count + ? WHERE run_id = ?",
+                (len(records), run_id)
+            )
+        return len(records)
+
+    def list_runs(self):
+        """Returns all runs, newest first."""
+        return self._read("SELECT * FROM runs ORDER BY created_at DESC")
+
+    def distinct_values(self, column):
+        if column not in KEY_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        df = self._read(f"SELECT DISTINCT {column} FROM results WHERE {column} IS NOT NULL ORDER BY 1")
+        return df.iloc[:, 0].tolist()
+
+    def fields(self):
+        return self._read("SELECT DISTINCT field FROM result_values ORDER BY 1")["field"].tolist()
+
+    def query_results(self, limit=1000, **filters):
+        """
+        Returns result rows with JSON fields decoded into native Python values (lists stay lists).
+
+        Args:
+            limit (int): Maximum number of rows, or None for all.
+            **filters: Column filters from KEY_COLUMNS; a value may be a single value or a list.
+
+        Returns:
+            pandas.DataFrame: One row per result.
+        """
+        where, params = _where(filters, "r")
+        sql = f"SELECT r.* FROM results r {where} ORDER BY r.result_id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        df = self._read(sql, params)
+        if not df.empty:
+            parsed = df["json_response"].map(json.loads)
+            fields = sorted({field for response in parsed for field in response})
+            for field in fields:
+                df[field] = parsed.map(lambda response: response.get(field))
+        return df
+
+    def field_value_counts(self, field, group_by="model", top=20, **filters):
+        """
+        Counts how often each value of a JSON field occurs, per group.
+
+        For list fields every element is counted once per result.
+
+        Args:
+            field (str): JSON field, e.g. "potential_hazards".
+            group_by (str): Result column from KEY_COLUMNS to group by, or None.
+            top (int): Number of most frequent values kept per group.
+            **filters: Column filters from KEY_COLUMNS.
+
+        Returns:
+            pandas.DataFrame: Columns [group_by,] value, count, share (of results in the group).
+        """
+        if group_by is not None and group_by not in KEY_COLUMNS:
+            raise ValueError(f"Unknown column: {group_by}")
+        where, params = _where(filters, "r")
+        where = f"{where} AND v.field = ?" if where else "WHERE v.field = ?"
+        params.append(field)
+        group_select = f"r.{group_by} AS {group_by}, " if group_by else ""
+        group_clause = f"r.{group_by}, " if group_by else ""
+        counts = self._read(
+            f"""SELECT {group_select}v.value AS value, COUNT(DISTINCT v.result_id) AS count
+                FROM result_values v JOIN results r ON r.result_id = v.result_id
+                {where}
+                GROUP BY {group_clause}v.value""",
+            params
+        )
+        totals_where, totals_params = _where(filters, "r")
+        totals = self._read(
+            f"SELECT {group_select}COUNT(*) AS total FROM results r {totals_where} "
+            + (f"GROUP BY r.{group_by}" if group_by else ""),
+            totals_params
+        )
+        if counts.empty:
+            return counts.assign(share=[])
+        counts = counts.merge(totals, on=group_by) if group_by else counts.assign(total=int(totals["total"].iloc[0]))
+        counts["share"] = counts["count"] / counts["total"]
+        counts = counts.drop(columns="total")
+        sort_columns = [group_by, "count"] if group_by else ["count"]
+        counts = counts.sort_values(sort_columns, ascending=[True, False] if group_by else [False])
+        if group_by:
+            counts = counts.groupby(group_by, sort=False).head(top)
+        else:
+            counts = counts.head(top)
+        return counts.reset_index(drop=True)
+
+    def count_results(self, group_by="model", **filters):
+        """Number of results per group."""
+        if group_by not in KEY_COLUMNS:
+            raise ValueError(f"Unknown column: {group_by}")
+        where, params = _where(filters, "r")
+        return self._read(
+            f"SELECT r.{group_by} AS {group_by}, COUNT(*) AS results FROM results r {where} "
+            f"GROUP BY r.{group_by} ORDER BY results DESC",
+            params
+        )
+
+
+def _explode(result_id, json_response):
+    rows = []
+    for field, value in json_response.items():
+        if isinstance(value, list):
+            for position, item in enumerate(value):
+                rows.append((result_id, field, position, _as_text(item)))
+        else:
+            rows.append((result_id, field, 0, _as_text(value)))
+    return rows
+
+
+def _as_text(value):
+    if isinstance(value, str):
+        return value.strip()
+    return json.dumps(value, sort_keys=True)
+
+
+def _where(filters, alias):
+    clauses = []
+    params = []
+    for column, value in filters.items():
+        if value is None:
+            continue
+        if column not in KEY_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if not values:
+            continue
+        clauses.append(f"{alias}.{column} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
@@ -0,0 +1,200 @@
+import re
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from distortion_plan import DistortionPlan
+
+PAIR_KEYS = ["image_hash", "model", "prompt_hash"]
+CLEAN_LABEL = "None"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def describe_plan(plan_json):
+    """
+    Returns (distortion, intensity) for a stored plan.
+
+    Steps are joined with "+" (e.g. "Blur+Rain"); intensity is the mean intensity of
+    the steps that have one, or NaN. Plans with no effective step are labelled "None".
+    """
+    plan = DistortionPlan.from_json(plan_json)
+    if not plan.is_effective:
+        return CLEAN_LABEL, 0.0
+    steps = [step for step in plan.steps if step.type != "Overlay" or step.param_dict["overlay_image"]]
+    intensities = [step.param_dict["intensity"] for step in steps if "intensity" in step.param_dict]
+    return "+".join(step.type for step in steps), float(np.mean(intensities)) if intensities else float("nan")
+
+
+def pair_with_baseline(results, fields):
+    """
+    Pairs each distorted result with the clean result for the same image, model and prompt.
+
+    Args:
+        results (pandas.DataFrame): Rows from ResultsStore.query_results.
+        fields (list): JSON fields to carry over.
+
+    Returns:
+        pandas.DataFrame: One row per distorted result with its fields, the clean fields
+                          suffixed "_clean", and "distortion"/"intensity" columns.
+    """
+    results = results[results["plan_json"].notna()]
+    if results.empty:
+        return results.assign(distortion=[], intensity=[])
+    plans = {plan_json: describe_plan(plan_json) for plan_json in results["plan_json"].unique()}
+    described = results["plan_json"].map(plans)
+    results = results.assign(distortion=described.str[0], intensity=described.str[1])
+
+    columns = PAIR_KEYS + [field for field in fields if field in results.columns]
+    clean = results[results["distortion"] == CLEAN_LABEL]
+    # Latest clean result wins when an image was analysed without distortions more than once
+    clean = clean.sort_values("result_id").drop_duplicates(PAIR_KEYS, keep="last")[columns]
+    distorted = results[results["distortion"] != CLEAN_LABEL]
+    return distorted.merge(clean, on=PAIR_KEYS, how="inner", suffixes=("", "_clean"))
+
+
+def _tokens(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    if isinstance(value, list):
+        value = " ".join(str(item) for item in value)
+    elif not isinstance(value, str):
+        value = json.dumps(value)
+    return TOKEN_PATTERN.findall(value.lower())
+
+
+def _items(value):
+    if isinstance(value, list):
+        return {str(item).strip().lower() for item in value}
+    if isinstance(value, str) and value.strip():
+        return {value.strip().lower()}
+    return set()
+
+
+def _term_matrix(documents, vocabulary):
+    """Builds a sparse (documents x vocabulary) count matrix, growing `vocabulary` as needed."""
+    indptr = [0]
+    indices = []
+    for terms in documents:
+        for term in terms:
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return indptr, indices, data
+
+
+def _pair_matrices(left, right):
+    vocabulary = {}
+    left_parts = _term_matrix(left, vocabulary)
+    right_parts = _term_matrix(right, vocabulary)
+    shape = (len(left), max(1, len(vocabulary)))
+    matrices = []
+    for indptr, indices, data in (left_parts, right_parts):
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=shape)
+        matrix.sum_duplicates()
+        matrices.append(matrix)
+    return matrices
+
+
+def jaccard_similarity(left, right):
+    """
+    Row-wise Jaccard similarity of two aligned sequences of lists.
+
+    Items are compared case-insensitively. Two empty lists count as identical.
+
+    Returns:
+        numpy.ndarray: One similarity in [0, 1] per pair.
+    """
+    a, b = _pair_matrices([_items(value) for value in left], [_items(value) for value in right])
+    intersection = np.asarray(a.multiply(b).sum(axis=1)).ravel()
+    union = np.asarray(a.sum(axis=1)).ravel() + np.asarray(b.sum(axis=1)).ravel() - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+
+
+def tfidf_cosine_similarity(left, right):
+    """
+    Row-wise cosine similarity of TF-IDF vectors for two aligned sequences of texts.
+
+    The IDF is fitted on both sequences together. Two empty texts count as identical.
+
+    Returns:
+        numpy.ndarray: One similarity in [0, 1] per pair.
+    """
+    a, b = _pair_matrices([_tokens(value) for value in left], [_tokens(value) for value in right])
+    document_frequency = np.asarray((a > 0).sum(axis=0) + (b > 0).sum(axis=0)).ravel()
+    idf = np.log((1 + 2 * a.shape[0]) / (1 + document_frequency)) + 1
+    weights = sparse.diags(idf.astype(np.float32))
+    a = a @ weights
+    b = b @ weights
+    norm_a = np.sqrt(np.asarray(a.multiply(a).sum(axis=1)).ravel())
+    norm_b = np.sqrt(np.asarray(b.multiply(b).sum(axis=1)).ravel())
+    dot = np.asarray(a.multiply(b).sum(axis=1)).ravel()
+    both_empty = (norm_a == 0) & (norm_b == 0)
+    cosine = dot / np.maximum(norm_a * norm_b, 1e-12)
+    return np.where(both_empty, 1.0, np.clip(cosine, 0.0, 1.0))
+
+
+def score_pairs(pairs, fields):
+    """
+    Computes per-field similarity and an overall degradation score for paired results.
+
+    Fields holding lists are compared with Jaccard similarity, all other fields with
+    TF-IDF cosine similarity.
+
+    Args:
+        pairs (pandas.DataFrame): Output of pair_with_baseline.
+        fields (list): JSON fields to score.
+
+    Returns:
+        pandas.DataFrame: `pairs` with a "<field>_similarity" column per field and a
+                          "degradation" column (1 - mean similarity).
+    """
+    scores = pairs.copy()
+    similarity_columns = []
+    for field in fields:
+        if field not in pairs.columns or f"{field}_clean" not in pairs.columns:
+            continue
+        left = pairs[field].tolist()
+        right = pairs[f"{field}_clean"].tolist()
+        if any(isinstance(value, list) for value in left + right):
+            similarity = jaccard_similarity(left, right)
+        else:
+            similarity = tfidf_cosine_similarity(left, right)
+        scores[f"{field}_similarity"] = similarity
+        similarity_columns.append(f"{field}_similarity")
+    if similarity_columns:
+        scores["degradation"] = 1.0 - scores[similarity_columns].mean(axis=1)
+    else:
+        scores["degradation"] = np.nan
+    return scores
+
+
+def degradation_summary(scores, by=("distortion", "intensity")):
+    """
+    Averages degradation and per-field similarity by distortion type and intensity.
+
+    Returns:
+        pandas.DataFrame: One row per group with a "pairs" count, sorted by degradation.
+    """
+    by = list(by)
+    value_columns = ["degradation"] + [column for column in scores.columns if column.endswith("_similarity")]
+    summary = scores.groupby(by, dropna=False)[value_columns].mean()
+    summary.insert(0, "pairs", scores.groupby(by, dropna=False).size())
+    return summary.sort_values("degradation", ascending=False).reset_index()
+
+
+def score_degradation(results, fields):
+    """
+    Scores stored results against their clean baselines.
+
+    Args:
+        results (pandas.DataFrame): Rows from ResultsStore.query_results.
+        fields (list): JSON fields to score.
+
+    Returns:
+        tuple: (per-pair scores, summary by distortion type and intensity).
+    """
+    pairs = pair_with_baseline(results, fields)
+    if pairs.empty:
+        return pairs, pd.DataFrame(columns=["distortion", "intensity", "pairs", "degradation"])
+    scores = score_pairs(pairs, fields)
+    return scores, degradation_summary(scores)
@@ -0,0 +1,412 @@
+"""
+Local HTTP analysis service.
+
+Run with `python src/service.py --port 8765` (set ROAD_SAFETY_BACKEND=fake to
+run without an API key). Endpoints:
+
+    POST /analyses          Submit {"image": <base64>, "distortions": [...], "prompt": ...}.
+                            Returns 202 with the job id, or 429 when the queue is full.
+    GET  /analyses/<id>     Job status and, once done, its text and JSON response.
+                            `?wait=<seconds>` blocks until the job finishes or the wait ends.
+    GET  /health            Liveness and queue depth.
+    GET  /metrics           Counters, batch sizes and latency percentiles.
+"""
+import io
+import json
+import time
+import uuid
+import hashlib
+import queue
+import base64
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+from backends import get_backend
+from bulk import encode_image
+from diagnostics import get_logger
+from distortion_plan import DistortionPlan, PLAN_DISTORTION_TYPES, plan_seed
+from hedging import LatencyTracker
+from utils import get_gemini_response
+
+logger = get_logger("service")
+
+DEFAULT_MODEL = "models/gemini-1.5-flash-latest"
+DEFAULT_FIELDS = ["scene_description", "potential_hazards", "suggested_improvements", "overall_safety"]
+DEFAULT_MAX_PENDING = 256
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_BATCH_WAIT = 0.02
+DEFAULT_MAX_RESULTS = 10000
+# Largest accepted request body, before base64 decoding
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+
+class QueueFull(Exception):
+    """Raised when a submission would exceed the service's pending limit."""
+
+
+class InvalidRequest(ValueError):
+    """Raised for submissions that cannot be analysed."""
+
+
+class AnalysisJob:
+    def __init__(self, image_bytes, plan, prompt, model, system_instructions, fields):
+        self.id = uuid.uuid4().hex
+        self.image_bytes = image_bytes
+        self.plan = plan
+        self.prompt = prompt
+        self.model = model
+        self.system_instructions = system_instructions
+        self.fields = fields
+        self.status = "queued"
+        self.result = None
+        self.submitted_at = time.monotonic()
+        self.done = threading.Event()
+
+    def request_key(self):
+        """Jobs with the same key would send identical requests, so one call serves them all."""
+        return (self.image_bytes, self.plan, self.prompt, self.model, self.system_instructions, tuple(self.fields))
+
+    def to_dict(self):
+        data = {"id": self.id, "status": self.status}
+        if self.result is not None:
+            data["text_response"], data["json_response"] = self.result
+        return data
+
+
+def parse_submission(payload, default_model=DEFAULT_MODEL, default_fields=None):
+    """
+    Validates a POST /analyses body and turns it into an AnalysisJob.
+
+    Args:
+        payload (dict): Decoded JSON body with "image" (base64) and optional "distortions"
+                        (dicts as used by apply_distortions), "plan" (DistortionPlan JSON),
+                        "prompt", "model", "system_instructions" and "fields".
+        default_model (str): Model used when the body does not name one.
+        default_fields (list): JSON fields requested when the body does not list any.
+
+    Returns:
+        AnalysisJob: The job, not yet queued.
+    """
+    if not isinstance(payload, dict) or not payload.get("image"):
+        raise InvalidRequest("Body must be a JSON object with a base64 'image'")
+    try:
+        image_bytes = base64.b64decode(payload["image"], validate=True)
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.verify()
+    except Exception as e:
+        raise InvalidRequest(f"Could not decode image: {e}")
+
+    try:
+        if payload.get("plan") is not None:
+            plan = DistortionPlan.from_json(payload["plan"])
+        else:
+            plan = DistortionPlan.from_distortions(payload.get("distortions") or [])
+    except Exception as e:
+        raise InvalidRequest(f"Invalid distortions: {e}")
+    for step in plan.steps:
+        if step.type not in PLAN_DISTORTION_TYPES:
+            raise InvalidRequest(f"Unknown distortion type: {step.type}")
+        if step.type == "Overlay" and step.param_dict.get("overlay_image"):
+            raise InvalidRequest("Overlay distortions are not supported by the service")
+
+    fields = payload.get("fields") or default_fields or DEFAULT_FIELDS
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        raise InvalidRequest("'fields' must be a list of strings")
+    return AnalysisJob(image_bytes, plan, payload.get("prompt") or "", payload.get("model") or default_model,
+                       payload.get("system_instructions"), fields)
+
+
+class AnalysisService:
+    """
+    Queue of analysis jobs, drained in micro-batches by a dispatcher thread.
+
+    The dispatcher takes up to `batch_size` jobs, waiting at most `batch_wait`
+    seconds for a batch to fill. Within a batch each distinct distortion plan is
+    compiled once and identical requests are sent once; the remaining model calls
+    run concurrently on `max_workers` threads. The dispatcher does not wait for a
+    batch to finish: it hands each call to a free worker and goes on to the next
+    batch, so one slow call does not hold up later submissions.
+
+    Admission is bounded: once `max_pending` jobs are queued or running, submit
+    raises QueueFull (HTTP 429) until some finish.
+
+    Args:
+        backend: Model backend, defaults to the active backend.
+        max_pending (int): Jobs accepted but not yet finished.
+        batch_size (int): Most jobs dispatched together.
+        batch_wait (float): Longest wait, in seconds, for a batch to fill.
+        max_workers (int): Concurrent model calls.
+        max_results (int): Finished jobs kept for GET /analyses/<id>; the oldest are dropped first.
+        default_model (str): Model used when a submission does not name one.
+    """
+
+    def __init__(self, backend=None, max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_wait=DEFAULT_BATCH_WAIT, max_workers=16, max_results=DEFAULT_MAX_RESULTS,
+                 default_model=DEFAULT_MODEL):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_results = max_results
+        self.default_model = default_model
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="service-request")
+        # One slot per worker; the dispatcher waits for a free slot instead of queueing calls in the executor
+        self._slots = threading.Semaphore(max_workers)
+        self._stop = threading.Event()
+        self._dispatcher = None
+        self.latency = LatencyTracker()
+        self.started_at = time.time()
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "batches": 0,
+                      "batched_jobs": 0, "model_calls": 0}
+
+    def start(self):
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="service-dispatcher", daemon=True)
+            self._dispatcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, job):
+        """Queues a job, raising QueueFull if the pending limit is reached."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFull(f"{self._pending} jobs pending")
+            self._pending += 1
+            self.stats["submitted"] += 1
+            self._jobs[job.id] = job
+            self._evict_finished()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_finished(self):
+        while len(self._jobs) > self.max_results:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done.is_set():
+                break
+            del self._jobs[oldest_id]
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._run_batch(batch)
+                except Exception:
+                    logger.exception("Batch of %d jobs failed", len(batch))
+
+    def _run_batch(self, batch):
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["batched_jobs"] += len(batch)
+        compiled_plans = {}
+        groups = OrderedDict()
+        for job in batch:
+            job.status = "running"
+            groups.setdefault(job.request_key(), []).append(job)
+            if job.plan not in compiled_plans:
+                compiled_plans[job.plan] = job.plan.compile()
+
+        def analyze(jobs):
+            job = jobs[0]
+            try:
+                compiled = compiled_plans[job.plan]
+                image_bytes = job.image_bytes
+                if compiled.plan.is_effective:
+                    # Seeded like bulk runs, so a request renders the same as the same image in the app
+                    seed = plan_seed(0, hashlib.sha256(image_bytes).hexdigest(), compiled.plan.content_hash)
+                    image_bytes = encode_image(compiled.apply(Image.open(io.BytesIO(image_bytes)), seed=seed))
+                result = get_gemini_response(job.prompt, image_bytes, job.model, job.system_instructions,
+                                             job.fields, backend=self.backend or get_backend())
+                # Model errors come back in the JSON response, like in the app
+                status = "done"
+            except Exception as e:
+                logger.debug("Job %s failed", job.id, exc_info=True)
+                result = (f"Error processing image: {e}", {"error": str(e)})
+                status = "failed"
+            self._finish(jobs, result, status)
+
+        with self._lock:
+            self.stats["model_calls"] += len(groups)
+        for jobs in groups.values():
+            while not self._slots.acquire(timeout=0.1):
+                if self._stop.is_set():
+                    self._finish(jobs, ("Service stopped", {"error": "Service stopped"}), "failed", release=False)
+                    break
+            else:
+                try:
+                    self._executor.submit(analyze, jobs)
+                except RuntimeError as e:
+                    # The executor was shut down by stop()
+                    self._finish(jobs, (f"Error processing image: {e}", {"error": str(e)}), "failed")
+
+    def _finish(self, jobs, result, status, release=True):
+        """Records the result of a group of identical jobs and frees its worker slot."""
+        now = time.monotonic()
+        with self._lock:
+            for job in jobs:
+                job.result = result
+                job.status = status
+                # Only the result is fetched from now on; the request body can be large
+                job.image_bytes = None
+                self._pending -= 1
+                self.stats["completed" if status == "done" else "failed"] += 1
+        if release:
+            self._slots.release()
+        for job in jobs:
+            self.latency.record(now - job.submitted_at)
+            job.done.set()
+
+    def health(self):
+        with self._lock:
+            pending = self._pending
+        running = self._dispatcher is not None and self._dispatcher.is_alive()
+        return {"status": "ok" if running else "stopped", "pending": pending, "max_pending": self.max_pending,
+                "queued": self._queue.qsize()}
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            pending = self._pending
+        stats["pending"] = pending
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch_size"] = stats["batched_jobs"] / stats["batches"] if stats["batches"] else 0.0
+        stats["uptime_seconds"] = time.time() - self.started_at
+        stats["latency_seconds"] = self.latency.summary()
+        return stats
+
+
+def make_handler(service):
+    """Builds a request handler class bound to `service`."""
+
+    class AnalysisRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+        def _send_json(self, status, data, headers=None):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                health = service.health()
+                return self._send_json(200 if health["status"] == "ok" else 503, health)
+            if url.path == "/metrics":
+                return self._send_json(200, service.metrics())
+            if url.path.startswith("/analyses/"):
+                job = service.get(url.path[len("/analyses/"):])
+                if job is None:
+                    return self._send_json(404, {"error": "Unknown analysis id"})
+                wait = parse_qs(url.query).get("wait")
+                if wait:
+                    try:
+                        job.done.wait(min(float(wait[0]), 60.0))
+                    except ValueError:
+                        return self._send_json(400, {"error": "'wait' must be a number of seconds"})
+                return self._send_json(200, job.to_dict())
+            self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/analyses":
+                return self._send_json(404, {"error": "Not found"})
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                return self._send_json(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+            try:
+                payload = json.loads(self.rfile.read(length) or b"null")
+                job = parse_submission(payload, default_model=service.default_model)
+            except (ValueError, InvalidRequest) as e:
+                return self._send_json(400, {"error": str(e)})
+            try:
+                service.submit(job)
+            except QueueFull as e:
+                return self._send_json(429, {"error": f"Queue full: {e}"}, {"Retry-After": "1"})
+            self._send_json(202, job.to_dict(), {"Location": f"/analyses/{job.id}"})
+
+    return AnalysisRequestHandler
+
+
+def serve(service, host="127.0.0.1", port=8765):
+    """
+    Starts the service's dispatcher and returns an HTTP server for it (not yet serving).
+
+    Call `serve_forever()` on the result, or run it in a thread; `port=0` picks a free port.
+    """
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--batch-wait", type=float, default=DEFAULT_BATCH_WAIT)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--api-key", default=None, help="Gemini API key")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    if args.api_key:
+        backend.configure(args.api_key)
+    service = AnalysisService(backend, max_pending=args.max_pending, batch_size=args.batch_size,
+                              batch_wait=args.batch_wait, max_workers=args.workers, default_model=args.model)
+    server = serve(service, args.host, args.port)
+    print(f"Serving analyses on http://{args.host}:{server.server_address[1]} with the {backend.name} backend")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TILE_MEMORY_MB = 256
+
+_config = {
+    "memory_limit": int(os.environ.get("ROAD_SAFETY_TILE_MEMORY_MB", DEFAULT_TILE_MEMORY_MB)) * 1024 * 1024,
+    "workers": int(os.environ.get("ROAD_SAFETY_TILE_WORKERS", 0)) or min(8, os.cpu_count() or 1),
+}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configure_tiling(memory_limit_mb=None, workers=None):
+    """
+    Sets the peak working memory per distortion and the number of strips processed in parallel.
+
+    Defaults come from ROAD_SAFETY_TILE_MEMORY_MB (256) and ROAD_SAFETY_TILE_WORKERS
+    (the number of CPUs, at most 8).
+
+    Args:
+        memory_limit_mb (float): Working memory budget for one distortion, across all its strips in flight.
+        workers (int): Threads used for strips.
+    """
+    global _executor
+    if memory_limit_mb is not None:
+        _config["memory_limit"] = int(memory_limit_mb * 1024 * 1024)
+    if workers is not None:
+        with _executor_lock:
+            _config["workers"] = max(1, int(workers))
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+
+
+def get_tiling_config():
+    return dict(_config)
+
+
+def strip_bounds(height, bytes_per_row, halo=0):
+    """
+    Splits `height` rows into horizontal strips that fit the memory budget.
+
+    Each strip is sized so that all strips in flight, including `halo` extra rows
+    on both sides, fit in the configured memory limit.
+
+    Args:
+        height (int): Image height in rows.
+        bytes_per_row (int): Working memory one row needs.
+        halo (int): Rows of context each strip reads beyond its own bounds.
+
+    Returns:
+        list: (start, end) row ranges covering the image in order.
+    """
+    budget_rows = _config["memory_limit"] // max(1, bytes_per_row * _config["workers"])
+    # A strip much thinner than its halo would mostly recompute overlap
+    rows = max(budget_rows - 2 * halo, 4 * halo, 16)
+    return [(start, min(start + rows, height)) for start in range(0, height, rows)] or [(0, 0)]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_config["workers"], thread_name_prefix="tile")
+        return _executor
+
+
+def map_strips(func, bounds):
+    """
+    Runs `func((start, end))` for every strip, in parallel when there is more than one.
+
+    Pillow and most NumPy operations release the GIL in their pixel loops, so on a
+    multi-core machine strips overlap rather than queueing behind each other.
+
+    Returns:
+        list: The results in strip order.
+    """
+    if len(bounds) == 1 or _config["workers"] == 1:
+        return [func(b) for b in bounds]
+    return list(_get_executor().map(func, bounds))
@@ -1,15 +1,32 @@
 from PIL import Image, ImageEnhance, ImageFilter, ImageDraw, ImageOps
+import os
 import random
-import google.generativeai as genai
 import io
-import numpy as np
-from scipy.ndimage import map_coordinates
-import traceback
 import json
 import re
+from backends import get_backend
+from diagnostics import TRACE, get_logger, Sampler, debug_sampled, trace_enabled
+from tiling import strip_bounds, map_strips
 
-def apply_distortion(image, type, **params):
-    print(f"Applying distortion: {type}")  # Debug print
+logger = get_logger("utils")
+_distortion_sampler = Sampler()
+
+# Approximate working memory per pixel, used to size strips for tiled execution
+BLUR_BYTES_PER_PIXEL = 8
+RAIN_BYTES_PER_PIXEL = 20
+WARP_BYTES_PER_PIXEL = 72
+RAIN_HALO = 8
+
+def apply_distortion(image, type, seed=None, scale=1.0, **params):
+    """
+    Applies one distortion.
+
+    `scale` is the size of `image` relative to the image the parameters were chosen
+    for. Pixel-sized parameters (blur radius, rain streaks, warp waves, motion blur
+    length) are multiplied by it, so a downscaled preview looks like a downscaled
+    full-size render; all other distortions are relative to the image already.
+    """
+    debug_sampled(logger, _distortion_sampler, "Applying %s distortion to %sx%s image", type, *image.size)
     if type == "Color":
         if "saturation" in params:
             enhancer = ImageEnhance.Color(image)
@@ -18,10 +35,9 @@ def apply_distortion(image, type, **params):
         if "hue_shift" in params:
             image = shift_hue(image, params["hue_shift"])
         
-        print(f"Color distortion applied. Original size: {image.size}, Distorted size: {image.size}")  # Debug print
         return image
     elif type == "Blur":
-        return image.filter(ImageFilter.GaussianBlur(radius=params.get("intensity", 0) * 10))
+        return apply_blur(image, params.get("intensity", 0) * 10 * scale)
     elif type == "Brightness":
         enhancer = ImageEnhance.Brightness(image)
         return enhancer.enhance(1 + params.get("intensity", 0))
@@ -32,11 +48,30 @@ def apply_distortion(image, type, **params):
         enhancer = ImageEnhance.Sharpness(image)
         return enhancer.enhance(1 + (params.get("intensity", 0) * 4))
     elif type == "Rain":
-        return apply_rain_effect(image, params.get("intensity", 0))
+        return apply_rain_effect(image, params.get("intensity", 0), seed=seed, scale=scale)
     elif type == "Overlay":
         return apply_overlay(image, params.get("intensity", 0), params.get("overlay_image", None))
     elif type == "Warp":
-        return apply_warp_effect(image, params.get("intensity", 0), params.get("warp_params", None))
+        return apply_warp_effect(image, params.get("intensity", 0), params.get("warp_params", None), scale=scale)
+    # Weather and sensor degradations are NumPy kernels, loaded on first use like Warp
+    elif type == "Fog":
+        from degradations import apply_fog
+        return apply_fog(image, params.get("intensity", 0), seed=seed)
+    elif type == "Snow":
+        from degradations import apply_snow
+        return apply_snow(image, params.get("intensity", 0), seed=seed)
+    elif type == "Night":
+        from degradations import apply_night
+        return apply_night(image, params.get("intensity", 0), seed=seed)
+    elif type == "Glare":
+        from degradations import apply_glare
+        return apply_glare(image, params.get("intensity", 0), seed=seed)
+    elif type == "Motion Blur":
+        from degradations import apply_motion_blur
+        return apply_motion_blur(image, params.get("intensity", 0), params.get("angle", 0.0), scale=scale)
+    elif type == "JPEG":
+        from degradations import apply_jpeg
+        return apply_jpeg(image, params.get("intensity", 0))
     return image
 
 def shift_hue(image, amount):
@@ -45,19 +80,83 @@ def shift_hue(image, amount):
     h = h.point(lambda x: (x + amount * 255) % 255)
     return Image.merge('HSV', (h, s, v)).convert('RGB')
 
-def apply_rain_effect(image, intensity):
-    overlay = Image.new('RGBA', image.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(overlay)
+def _blur_halo(radius):
+    """Rows of context a Gaussian blur of `radius` reads beyond a strip (Pillow uses three box passes)."""
+    return 3 * (int(radius) + 2)
+
+def _crop_strip(image, start, end, halo):
+    top = max(0, start - halo)
+    bottom = min(image.size[1], end + halo)
+    return image.crop((0, top, image.size[0], bottom)), start - top
+
+def apply_blur(image, radius):
+    """
+    Gaussian blur, processed in horizontal strips with a halo for large images.
+
+    The result is identical to blurring the whole image at once.
+    """
+    halo = _blur_halo(radius)
+    bounds = strip_bounds(image.size[1], image.size[0] * BLUR_BYTES_PER_PIXEL, halo)
+    if len(bounds) == 1:
+        return image.filter(ImageFilter.GaussianBlur(radius=radius))
+
+    image.load()
+    def blur_strip(strip_range):
+        start, end = strip_range
+        strip, offset = _crop_strip(image, start, end, halo)
+        blurred = strip.filter(ImageFilter.GaussianBlur(radius=radius))
+        return blurred.crop((0, offset, image.size[0], offset + end - start))
+
+    result = Image.new(image.mode, image.size)
+    for (start, _), strip in zip(bounds, map_strips(blur_strip, bounds)):
+        result.paste(strip, (0, start))
+    return result
 
+def apply_rain_effect(image, intensity, seed=None, scale=1.0):
+    """
+    Draws rain streaks over the image.
+
+    Streak positions come from `random.Random(seed)` when a seed is given, so the
+    output is reproducible, and from the global `random` state otherwise. The
+    number of streaks does not depend on the image size; their length and slant
+    are multiplied by `scale`.
+    """
+    rng = random.Random(seed) if seed is not None else random
     width, height = image.size
+    drops = []
     for _ in range(int(intensity * 1000)):
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        length = random.randint(10, 20)
-        draw.line((x, y, x + random.randint(-2, 2), y + length), fill=(255, 255, 255, random.randint(50, 150)), width=1)
-    
-    rain_overlay = overlay.filter(ImageFilter.GaussianBlur(1))
-    return Image.alpha_composite(image.convert("RGBA"), rain_overlay).convert("RGB")
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        length = rng.randint(10, 20)
+        slant = rng.randint(-2, 2)
+        if scale != 1.0:
+            length = max(1, round(length * scale))
+            slant = round(slant * scale)
+        drops.append((x, y, x + slant, y + length, rng.randint(50, 150)))
+
+    image.load()
+    def rain_strip(strip_range):
+        # Drops are drawn in the same order on every strip, shifted into strip coordinates
+        start, end = strip_range
+        top = max(0, start - RAIN_HALO)
+        bottom = min(height, end + RAIN_HALO)
+        overlay = Image.new('RGBA', (width, bottom - top), (255, 255, 255, 0))
+        draw = ImageDraw.Draw(overlay)
+        for x0, y0, x1, y1, alpha in drops:
+            if y1 >= top and y0 < bottom:
+                draw.line((x0, y0 - top, x1, y1 - top), fill=(255, 255, 255, alpha), width=1)
+        rain_overlay = overlay.filter(ImageFilter.GaussianBlur(1))
+        strip = image.crop((0, top, width, bottom)).convert("RGBA")
+        composited = Image.alpha_composite(strip, rain_overlay).convert("RGB")
+        return composited.crop((0, start - top, width, end - top))
+
+    bounds = strip_bounds(height, width * RAIN_BYTES_PER_PIXEL, RAIN_HALO)
+    if len(bounds) == 1:
+        return rain_strip(bounds[0])
+    result = Image.new("RGB", image.size)
+    for (start, _), strip in zip(bounds, map_strips(rain_strip, bounds)):
+        result.paste(strip, (0, start))
+    return result
 
 def apply_overlay(image, intensity, overlay_image):
     if overlay_image is None:
@@ -71,7 +170,7 @@ def apply_overlay(image, intensity, overlay_image):
         elif isinstance(overlay_image, str):
             overlay = Image.open(overlay_image).convert("RGBA")
         else:
-            print(f"Unsupported overlay_image type: {type(overlay_image)}")
+            logger.warning("Unsupported overlay_image type: %s", type(overlay_image))
             return image
         
         overlay = overlay.resize(image.size)
@@ -88,64 +187,107 @@ def apply_overlay(image, intensity, overlay_image):
         
         return result.convert("RGB")
     except Exception as e:
-        print(f"Error applying overlay: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error applying overlay: %s", e)
         return image  # Return the original image if there's an error
 
-def apply_warp_effect(image, intensity, warp_params):
+def apply_warp_effect(image, intensity, warp_params, scale=1.0):
+    # NumPy and SciPy are only needed for Warp, so they are not loaded with the module
+    import numpy as np
+    from scipy.ndimage import map_coordinates
     try:
         img = np.array(image)
         rows, cols = img.shape[0], img.shape[1]
+        channel_count = min(3, img.shape[2])  # Handle both RGB and RGBA
         
-        # Create meshgrid
-        src_cols, src_rows = np.meshgrid(np.linspace(0, cols-1, cols), np.linspace(0, rows-1, rows))
-        
-        # Wave effect
-        wave_amplitude = warp_params.get('wave_amplitude', 20) * intensity
-        wave_frequency = warp_params.get('wave_frequency', 0.05) * 10  # Increase frequency impact
-        dst_rows = src_rows + np.sin(src_cols * wave_frequency) * wave_amplitude
-        dst_cols = src_cols + np.sin(src_rows * wave_frequency) * wave_amplitude
-        
-        # Bulge/Pinch effect
-        center_row, center_col = rows // 2, cols // 2
-        dist_from_center = np.sqrt((src_rows - center_row)**2 + (src_cols - center_col)**2)
-        
+        # Waves are in pixels, so a smaller image gets smaller, denser waves; the bulge is relative
+        wave_amplitude = warp_params.get('wave_amplitude', 20) * intensity * scale
+        wave_frequency = warp_params.get('wave_frequency', 0.05) * 10 / scale  # Increase frequency impact
         bulge_factor = warp_params.get('bulge_factor', 30) * intensity * 2  # Increase bulge impact
+        center_row, center_col = rows // 2, cols // 2
         max_dist = np.sqrt(center_row**2 + center_col**2)
-        
-        # Normalize distances
-        dist_from_center = dist_from_center / max_dist
-        
-        # Apply bulge/pinch
-        factor = (1 - dist_from_center**2) * bulge_factor
-        dst_rows += (src_rows - center_row) * factor / (rows / 4)  # Increase effect
-        dst_cols += (src_cols - center_col) * factor / (cols / 4)  # Increase effect
-        
-        # Map coordinates
+        row_coords = np.linspace(0, rows-1, rows)
+        col_coords = np.linspace(0, cols-1, cols)
+        # Contiguous channels, so map_coordinates does not copy them for every strip
+        channels = [np.ascontiguousarray(img[:,:,i]) for i in range(channel_count)]
         warped = np.zeros_like(img)
-        for i in range(min(3, img.shape[2])):  # Handle both RGB and RGBA
-            warped[:,:,i] = map_coordinates(img[:,:,i], [dst_rows, dst_cols], order=1, mode='reflect')
+
+        def warp_strip(strip_range):
+            # Each strip computes its own part of the coordinate fields but samples the whole
+            # image, so strips need no halo and match the untiled result exactly
+            start, end = strip_range
+            src_cols, src_rows = np.meshgrid(col_coords, row_coords[start:end])
+            
+            # Wave effect
+            dst_rows = src_rows + np.sin(src_cols * wave_frequency) * wave_amplitude
+            dst_cols = src_cols + np.sin(src_rows * wave_frequency) * wave_amplitude
+            
+            # Bulge/Pinch effect
+            dist_from_center = np.sqrt((src_rows - center_row)**2 + (src_cols - center_col)**2)
+            
+            # Normalize distances
+            dist_from_center = dist_from_center / max_dist
+            
+            # Apply bulge/pinch
+            factor = (1 - dist_from_center**2) * bulge_factor
+            dst_rows += (src_rows - center_row) * factor / (rows / 4)  # Increase effect
+            dst_cols += (src_cols - center_col) * factor / (cols / 4)  # Increase effect
+            
+            # Map coordinates
+            for i, channel in enumerate(channels):
+                warped[start:end,:,i] = map_coordinates(channel, [dst_rows, dst_cols], order=1, mode='reflect')
+
+        map_strips(warp_strip, strip_bounds(rows, cols * WARP_BYTES_PER_PIXEL))
         
         if img.shape[2] == 4:  # If RGBA, copy the alpha channel
             warped[:,:,3] = img[:,:,3]
         
         result = Image.fromarray(warped.astype(np.uint8))
-        print(f"Warp effect applied successfully. Max pixel diff: {np.max(np.abs(img - warped))}")
+        if trace_enabled(logger):
+            # Full-image pass, so only computed when trace diagnostics are on
+            max_diff = int(np.max(np.abs(img.astype(np.int16) - warped.astype(np.int16))))
+            logger.log(TRACE, "Warp effect applied to %sx%s image. Max pixel diff: %d", cols, rows, max_diff)
         return result
     except Exception as e:
-        print(f"Error in apply_warp_effect: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in apply_warp_effect: %s", e)
         return image  # Return the original image if there's an error
 
-def apply_distortions(image, distortions):
-    for distortion in distortions:
-        image = apply_distortion(image, **distortion)
+def open_image(file):
+    """
+    Opens an image source: an uploaded file, a path on disk, or a frame of a packed
+    archive (anything with an `open_image` method), which needs no decoding.
+    """
+    if hasattr(file, 'open_image'):
+        return file.open_image()
+    return Image.open(file)
+
+def apply_distortions(image, distortions, seed=None, scale=1.0):
+    """
+    Applies distortions in order.
+
+    Args:
+        image (PIL.Image): Image to distort.
+        distortions (list): Distortion dicts with a "type" and its parameters.
+        seed (int): Makes random distortions (Rain, Fog, Snow, Night, Glare) reproducible;
+                    step i is seeded with seed + i.
+        scale (float): Size of `image` relative to the full-size image, for previews; see apply_distortion.
+    """
+    for i, distortion in enumerate(distortions):
+        image = apply_distortion(image, seed=None if seed is None else seed + i, scale=scale, **distortion)
     return image
 
-def get_gemini_response(input_text, image, model_name, system_instructions, expected_fields):
-    model = genai.GenerativeModel(model_name)
-    response = None
-    
+def build_model_content(input_text, image, system_instructions, expected_fields):
+    """
+    Builds the content list sent to the model: instructions with the JSON request, prompt and PNG image.
+
+    Args:
+        input_text (str): Prompt sent along with the image.
+        image (PIL.Image or bytes): Image to analyse, or None.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+
+    Returns:
+        list: Content parts; empty if there is nothing to send.
+    """
     # Add the JSON request to the system instructions internally
     json_request = f"""
     After your natural language response, please provide a JSON representation of your analysis.
@@ -170,61 +312,82 @@ def get_gemini_response(input_text, image, model_name, system_instructions, expe
             raise ValueError("Unsupported image type. Expected PIL Image or bytes.")
     else:
         img_byte_arr = None
+
+    content = []
+    if full_instructions:
+        content.append(full_instructions)
+    if input_text:
+        content.append(input_text)
+    if img_byte_arr:
+        content.append({"mime_type": "image/png", "data": img_byte_arr})
+    return content
+
+def parse_model_response(response):
+    """
+    Splits a model response into its text and the JSON block between ===JSON=== tags.
+
+    Returns:
+        tuple: (text_response, json_response), with an "error" key in json_response
+               if the response was blocked or had no parseable JSON.
+    """
+    # Check if the response was blocked
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+         return f"Response blocked. Reason: {response.prompt_feedback.block_reason}", {"error": "Response blocked by safety filters"}
+
+    try:
+        text_response = response.text
+    except Exception:
+        # Fallback if text access fails (e.g. empty candidates but no clear block reason)
+        return "No response generated (likely blocked or empty).", {"error": "No content generated"}
+
+    # Extract JSON from the response
+    json_match = re.search(r'===JSON===\s*(.*?)\s*===JSON===', text_response, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(1)
+        try:
+            json_response = json.loads(json_str)
+            # Remove empty fields from the JSON response
+            json_response = {k: v for k, v in json_response.items() if v}
+            # Remove the JSON part from the text response
+            text_response = re.sub(r'===JSON===.*===JSON===', '', text_response, flags=re.DOTALL).strip()
+        except json.JSONDecodeError:
+            json_response = {"error": "Failed to parse JSON from AI response"}
+    else:
+        json_response = {"error": "No JSON found in AI response"}
     
+    return text_response, json_response  # Return JSON as a Python dictionary
+
+def get_gemini_response(input_text, image, model_name, system_instructions, expected_fields, backend=None):
+    backend = backend or get_backend()
+    content = build_model_content(input_text, image, system_instructions, expected_fields)
     try:
-        content = []
-        if full_instructions:
-            content.append(full_instructions)
-        if input_text:
-            content.append(input_text)
-        if img_byte_arr:
-            content.append({"mime_type": "image/png", "data": img_byte_arr})
-        
         if content:
-            response = model.generate_content(content)
-            
-            # Check if the response was blocked
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                 return f"Response blocked. Reason: {response.prompt_feedback.block_reason}", {"error": "Response blocked by safety filters"}
-
-            try:
-                text_response = response.text
-            except Exception:
-                # Fallback if text access fails (e.g. empty candidates but no clear block reason)
-                return "No response generated (likely blocked or empty).", {"error": "No content generated"}
-
-            # Extract JSON from the response
-            json_match = re.search(r'===JSON===\s*(.*?)\s*===JSON===', text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                try:
-                    json_response = json.loads(json_str)
-                    # Remove empty fields from the JSON response
-                    json_response = {k: v for k, v in json_response.items() if v}
-                    # Remove the JSON part from the text response
-                    text_response = re.sub(r'===JSON===.*===JSON===', '', text_response, flags=re.DOTALL).strip()
-                except json.JSONDecodeError:
-                    json_response = {"error": "Failed to parse JSON from AI response"}
-            else:
-                json_response = {"error": "No JSON found in AI response"}
-            
-            return text_response, json_response  # Return JSON as a Python dictionary
+            return parse_model_response(backend.generate_content(model_name, content))
         else:
             return "No input provided to the model.", {}
     except Exception as e:
+        logger.debug("Model request to %s failed", model_name, exc_info=True)
         error_message = f"Error generating response: {str(e)}"
         return error_message, {"error": error_message}
 
-def list_available_models():
+def get_data_dir(*parts):
+    """
+    Returns a directory for locally persisted platform data, creating it if needed.
+
+    The base directory is ROAD_SAFETY_DATA_DIR if set, otherwise ~/.road_safety_platform.
+    """
+    base_dir = os.environ.get("ROAD_SAFETY_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".road_safety_platform")
+    path = os.path.join(base_dir, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def list_available_models(backend=None):
     """
     Lists available Gemini models that support generateContent.
     """
     try:
-        models = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                models.append(m.name)
-        return models
+        backend = backend or get_backend()
+        return backend.list_models()
     except Exception as e:
-        print(f"Error listing models: {str(e)}")
+        logger.error("Error listing models: %s", e)
         return []
\ No newline at end of file
@@ -0,0 +1,465 @@
+"""
+Watched-folder ingestion: analyses images as they arrive in a directory.
+
+Cameras that drop frames into a folder continuously can be analysed
+incrementally: new and changed images are detected with inotify on Linux (or by
+polling modification times elsewhere), held back until they stop changing, run
+through the bulk pipeline and appended to the results store. Example:
+
+    python src/watch.py --folder /data/cam1 --model models/gemini-1.5-flash-latest --prompt "Identify hazards"
+
+Only arrivals are processed, so the work per new frame does not depend on how
+many frames the folder already holds. With --state, processed files are
+remembered across restarts and files that arrived while the watcher was down
+are picked up.
+"""
+import os
+import json
+import time
+import errno
+import select
+import struct
+import argparse
+import threading
+from bulk import analyze_bulk_item, image_digest
+from diagnostics import get_logger
+from distortion_plan import DistortionPlan, EMPTY_PLAN
+from ingest import IMAGE_EXTENSIONS
+
+logger = get_logger("watch")
+
+# Seconds a file's size and modification time must stay the same before it is analysed
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+# Polling rescans a directory when its modification time changes (files added, removed or
+# renamed) and every directory at this interval, to catch files rewritten in place
+DEFAULT_FULL_SCAN_INTERVAL = 30.0
+# Failed analyses (e.g. rate limits) are retried after RETRY_DELAY seconds, doubling up to MAX_RETRY_DELAY
+DEFAULT_RETRY_DELAY = 5.0
+DEFAULT_MAX_RETRIES = 5
+MAX_RETRY_DELAY = 300.0
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith(".")
+
+
+class _Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._ctypes = ctypes
+        self.directories = {}
+
+    def add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.directories[wd] = directory
+
+    def read_events(self, timeout):
+        """Waits up to `timeout` seconds and returns (path, mask) events; path is None on overflow."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif wd in self.directories and name:
+                events.append((os.path.join(self.directories[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Reports new or changed images in a folder once they have finished being written.
+
+    A file is reported when its size and modification time have not changed for
+    `settle_time` seconds, so frames still being copied in are not analysed half
+    written. Each version of a file is reported once.
+
+    Args:
+        directory (str): Folder to watch.
+        recursive (bool): Also watch subfolders, including ones created later.
+        settle_time (float): Seconds a file must stay unchanged before it is reported.
+        poll_interval (float): Seconds between checks of files waiting to settle, and
+                               between directory checks when polling.
+        full_scan_interval (float): Seconds between full rescans when polling.
+        use_inotify (bool): Force inotify on or off; by default it is used when available.
+        state_path (str): JSON-lines file of processed files, so a restarted watcher
+                          skips them.
+        process_existing (bool): Report images already in the folder that are not in
+                                 the state file; otherwise only later arrivals are reported.
+    """
+
+    def __init__(self, directory, recursive=False, settle_time=DEFAULT_SETTLE_TIME,
+                 poll_interval=DEFAULT_POLL_INTERVAL, full_scan_interval=DEFAULT_FULL_SCAN_INTERVAL,
+                 use_inotify=None, state_path=None, process_existing=False):
+        self.directory = os.path.abspath(directory)
+        self.recursive = recursive
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.full_scan_interval = full_scan_interval
+        self.state_path = state_path
+        # Signatures of files already reported, by path
+        self._seen = self._load_state()
+        # Files waiting to settle: path -> (signature, time the signature was last seen to change)
+        self._pending = {}
+        self._dir_mtimes = {}
+        self._last_full_scan = 0.0
+        self.stats = {"scans": 0, "events": 0, "reported": 0}
+
+        self._inotify = None
+        if use_inotify or use_inotify is None:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                if use_inotify:
+                    raise
+                logger.info("inotify unavailable (%s); polling %s instead", e, self.directory)
+
+        existing = self._scan_all()
+        if not process_existing:
+            self._seen.update(existing)
+        else:
+            self._add_candidates(existing)
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def _load_state(self):
+        seen = {}
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        seen[entry["path"]] = tuple(entry["signature"])
+                    except (ValueError, KeyError):
+                        continue
+        return seen
+
+    def _directories(self):
+        if not self.recursive:
+            return [self.directory]
+        return [root for root, dirs, _ in os.walk(self.directory)]
+
+    def _scan_directory(self, directory, descend=True, new_only=False):
+        """
+        Returns {path: signature} for the images in `directory`, noting its mtime.
+
+        With `descend` (and recursive watching), subfolders not seen before are
+        watched and scanned too. With `new_only`, files already reported are not
+        stat'ed, so listing a folder of many old frames stays cheap.
+        """
+        found = {}
+        try:
+            self._dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if new_only and entry.path in self._seen:
+                        continue
+                    if entry.is_file() and _is_image(entry.name):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    elif descend and self.recursive and entry.is_dir() and entry.path not in self._dir_mtimes:
+                        # A new subfolder: watch it and pick up anything already inside
+                        if self._inotify is not None:
+                            self._inotify.add_watch(entry.path)
+                        found.update(self._scan_directory(entry.path))
+        except FileNotFoundError:
+            self._dir_mtimes.pop(directory, None)
+        return found
+
+    def _scan_all(self):
+        self.stats["scans"] += 1
+        self._last_full_scan = time.monotonic()
+        found = {}
+        for directory in self._directories():
+            if self._inotify is not None and directory not in self._inotify.directories.values():
+                self._inotify.add_watch(directory)
+            found.update(self._scan_directory(directory, descend=False))
+        return found
+
+    def _add_candidates(self, signatures):
+        now = time.monotonic()
+        for path, signature in signatures.items():
+            if self._seen.get(path) == signature:
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, now)
+
+    def _collect_changes(self, timeout):
+        if self._inotify is not None:
+            events = self._inotify.read_events(timeout)
+            self.stats["events"] += len(events)
+            changed = {}
+            for path, mask in events:
+                if path is None:
+                    logger.warning("inotify queue overflowed; rescanning %s", self.directory)
+                    self._add_candidates(self._scan_all())
+                    continue
+                if mask & IN_ISDIR:
+                    if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                        self._inotify.add_watch(path)
+                        changed.update(self._scan_directory(path))
+                elif _is_image(os.path.basename(path)):
+                    try:
+                        changed[path] = _signature(path)
+                    except FileNotFoundError:
+                        continue
+            self._add_candidates(changed)
+            return
+
+        time.sleep(timeout)
+        if time.monotonic() - self._last_full_scan >= self.full_scan_interval:
+            self._add_candidates(self._scan_all())
+            return
+        # Only directories whose entries changed are listed again
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._dir_mtimes.pop(directory, None)
+                continue
+            if current != mtime:
+                self.stats["scans"] += 1
+                self._add_candidates(self._scan_directory(directory, new_only=True))
+
+    def poll(self, timeout=None):
+        """
+        Waits up to `timeout` seconds (default: poll_interval) for changes and returns
+        the files that have settled, oldest change first.
+
+        Returns:
+            list: Paths ready to be analysed.
+        """
+        self._collect_changes(self.poll_interval if timeout is None else timeout)
+        now = time.monotonic()
+        ready = []
+        for path, (signature, changed_at) in list(self._pending.items()):
+            try:
+                current = _signature(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif now - changed_at >= self.settle_time and current[0] > 0:
+                ready.append((changed_at, path))
+                del self._pending[path]
+                self._seen[path] = current
+        self.stats["reported"] += len(ready)
+        return [path for _, path in sorted(ready)]
+
+    @property
+    def pending(self):
+        """Number of files waiting to settle."""
+        return len(self._pending)
+
+    def retry(self, path, delay=0.0):
+        """Reports a file again once `delay` seconds have passed, e.g. after its analysis failed."""
+        signature = self._seen.pop(path, None)
+        if signature is None:
+            try:
+                signature = _signature(path)
+            except FileNotFoundError:
+                return
+        self._pending[path] = (signature, time.monotonic() + delay - self.settle_time)
+
+    def mark_done(self, path):
+        """Records a reported file as processed in the state file, so restarts skip it."""
+        if self.state_path and path in self._seen:
+            with open(self.state_path, "a") as f:
+                f.write(json.dumps({"path": path, "signature": list(self._seen[path])}) + "\n")
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def watch_and_analyze(watcher, plan, input_text, model_name, system_instructions, expected_fields, store,
+                      run_id=None, backend=None, artifact_cache=None, load_overlay=None, stop_event=None,
+                      max_files=None, on_result=None, max_retries=DEFAULT_MAX_RETRIES,
+                      retry_delay=DEFAULT_RETRY_DELAY):
+    """
+    Analyses files reported by a FolderWatcher and appends the results to a ResultsStore.
+
+    Each file is analysed through analyze_bulk_item and stored in its own small
+    transaction as soon as it is done, under one run. A file whose analysis fails,
+    including a model error such as a rate limit, is handed back to the watcher
+    and retried with exponential backoff. Files that still fail are not marked
+    done, so a watcher restarted with the same state file tries them again.
+
+    Args:
+        watcher (FolderWatcher): Source of settled files.
+        plan (DistortionPlan): Distortions applied to every frame.
+        input_text (str): Prompt sent along with each image.
+        model_name (str): Model used for the analysis.
+        system_instructions (str): System instructions, or None.
+        expected_fields (list): JSON fields requested from the model.
+        store (ResultsStore): Store the results are appended to.
+        run_id (str): Run to append to; a new run is started by default.
+        backend: Optional model backend, defaults to the active backend.
+        artifact_cache (ArtifactCache): Optional cache of distorted, encoded images.
+        load_overlay (callable): Resolves overlay references in the plan.
+        stop_event (threading.Event): Stops the loop when set.
+        max_files (int): Stop after this many files (for tests and one-off catch-ups).
+        on_result (callable): Called with (path, result row or None, error or None) once
+                              a file is analysed or has failed max_retries + 1 times.
+        max_retries (int): Retries of a failed file before it is given up.
+        retry_delay (float): Seconds before the first retry; doubled for each further one.
+
+    Returns:
+        dict: The run id and counts of analysed, failed and retried files.
+    """
+    run_id = run_id or store.start_run(label=f"watch {watcher.directory}", model=model_name)
+    compiled = plan.compile(load_overlay)
+    stop_event = stop_event or threading.Event()
+    stats = {"run_id": run_id, "analysed": 0, "failed": 0, "retried": 0}
+    attempts = {}
+    while not stop_event.is_set() and (max_files is None or stats["analysed"] + stats["failed"] < max_files):
+        for path in watcher.poll():
+            if stop_event.is_set():
+                break
+            started = time.perf_counter()
+            try:
+                result = analyze_bulk_item(path, compiled, input_text, model_name, system_instructions,
+                                           expected_fields, backend=backend, artifact_cache=artifact_cache)
+                # Model errors come back as a result row; they are failures, not results
+                error = json.loads(result["JSON Response"]).get("error")
+                if error:
+                    raise RuntimeError(error)
+                store.record_results(run_id, [{"result": result, "image_hash": image_digest(path), "plan": plan,
+                                               "model": model_name}])
+            except Exception as e:
+                attempts[path] = attempts.get(path, 0) + 1
+                if attempts[path] <= max_retries:
+                    delay = min(retry_delay * 2 ** (attempts[path] - 1), MAX_RETRY_DELAY)
+                    logger.warning("Analysis of %s failed (%s); retrying in %.1fs", path, e, delay)
+                    stats["retried"] += 1
+                    watcher.retry(path, delay)
+                    continue
+                del attempts[path]
+                logger.warning("Analysis of %s failed %d times: %s", path, max_retries + 1, e)
+                stats["failed"] += 1
+                if on_result:
+                    on_result(path, None, e)
+                continue
+            attempts.pop(path, None)
+            watcher.mark_done(path)
+            stats["analysed"] += 1
+            logger.debug("Analysed %s in %.2fs", path, time.perf_counter() - started)
+            if on_result:
+                on_result(path, result, None)
+            if max_files is not None and stats["analysed"] + stats["failed"] >= max_files:
+                break
+    return stats
+
+
+def main():
+    from backends import get_backend
+    from results_store import ResultsStore
+    from utils import get_data_dir
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", required=True, help="Folder to watch")
+    parser.add_argument("--recursive", action="store_true", help="Also watch subfolders")
+    parser.add_argument("--plan", help="DistortionPlan JSON file")
+    parser.add_argument("--prompt", default="")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--system-instructions")
+    parser.add_argument("--fields", default="scene_description,potential_hazards,suggested_improvements,overall_safety")
+    parser.add_argument("--db", help="Results store (default: results.sqlite in the data directory)")
+    parser.add_argument("--run-id", help="Append to an existing run")
+    parser.add_argument("--state", help="File recording processed images, for restarts")
+    parser.add_argument("--process-existing", action="store_true",
+                        help="Also analyse images already in the folder (not yet in --state)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_TIME,
+                        help="Seconds a file must stay unchanged before it is analysed")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--polling", action="store_true", help="Poll modification times instead of using inotify")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retries of a failed analysis, with exponential backoff")
+    parser.add_argument("--retry-delay", type=float, default=DEFAULT_RETRY_DELAY,
+                        help="Seconds before the first retry of a failed analysis")
+    parser.add_argument("--api-key", help="Gemini API key")
+    parser.add_argument("--artifact-cache", help="Directory of a disk cache for distorted, encoded images")
+    args = parser.parse_args()
+
+    plan = EMPTY_PLAN
+    if args.plan:
+        with open(args.plan) as f:
+            plan = DistortionPlan.from_json(f.read())
+    backend = get_backend()
+    if args.api_key:
+        backend.configure(args.api_key)
+    artifact_cache = None
+    if args.artifact_cache:
+        from artifact_cache import ArtifactCache
+        artifact_cache = ArtifactCache(args.artifact_cache)
+    store = ResultsStore(args.db or os.path.join(get_data_dir(), "results.sqlite"))
+    watcher = FolderWatcher(args.folder, recursive=args.recursive, settle_time=args.settle,
+                            poll_interval=args.poll_interval, use_inotify=False if args.polling else None,
+                            state_path=args.state, process_existing=args.process_existing)
+    print(f"Watching {watcher.directory} ({watcher.backend}); press Ctrl+C to stop")
+
+    def report(path, result, error):
+        print(f"{'failed' if error else 'analysed'}: {path}" + (f" ({error})" if error else ""))
+
+    try:
+        stats = watch_and_analyze(watcher, plan, args.prompt, args.model, args.system_instructions,
+                                  [f.strip() for f in args.fields.split(",") if f.strip()], store,
+                                  run_id=args.run_id, backend=backend, artifact_cache=artifact_cache,
+                                  on_result=report, max_retries=args.max_retries, retry_delay=args.retry_delay)
+        print(json.dumps(stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
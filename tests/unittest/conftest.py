@@ -0,0 +1,6 @@
+import sys
+import os
+
+# Modules in src import each other by their top-level names (as they do when
+# run with `streamlit run src/app.py`), so src has to be importable directly.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
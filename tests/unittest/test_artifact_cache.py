@@ -0,0 +1,115 @@
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from artifact_cache import ArtifactCache, artifact_key
+from backends import FakeBackend
+from bulk import prepare_bulk_item, run_bulk_analysis
+from distortion_plan import DistortionPlan
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{"type": "Warp", "intensity": 0.5}])
+
+
+def create_test_file(name="test.png", color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (48, 32), color=color).save(buffer, format='PNG')
+    buffer.name = name
+    buffer.seek(0)
+    return buffer
+
+
+class CountingPlan:
+    """Wraps a CompiledPlan and counts how often it is applied."""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.plan = compiled.plan
+        self.calls = 0
+
+    def apply(self, image, seed=None):
+        self.calls += 1
+        return self.compiled.apply(image, seed=seed)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / "artifacts"), max_bytes=1024 * 1024)
+
+
+def test_key_depends_on_source_plan_and_encoding():
+    key = artifact_key("a" * 64, PLAN.content_hash)
+    assert key == artifact_key("a" * 64, PLAN.content_hash, "png")
+    assert key != artifact_key("b" * 64, PLAN.content_hash)
+    assert key != artifact_key("a" * 64, DistortionPlan().content_hash)
+    assert key != artifact_key("a" * 64, PLAN.content_hash, "jpeg:90")
+
+
+def test_put_get_and_hit_rate(cache):
+    assert cache.get("missing") is None
+    cache.put("k", b"payload")
+    assert cache.get("k") == b"payload"
+    assert cache.stats == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0}
+    assert cache.hit_rate == 0.5
+    assert cache.size == len(b"payload")
+
+
+def test_evicts_least_recently_used_over_size_limit(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "artifacts"), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    time.sleep(0.01)
+    cache.put("b", b"b" * 100)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", b"c" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats["evictions"] == 1
+    assert cache.size == 200
+    assert sorted(os.listdir(tmp_path / "artifacts")) == ["a", "c"]
+
+
+def test_entries_persist_across_instances(cache):
+    cache.put("k", b"payload")
+    reopened = ArtifactCache(cache.directory)
+    assert reopened.size == len(b"payload")
+    assert reopened.get("k") == b"payload"
+
+
+def test_prepare_bulk_item_skips_distortion_on_hit(cache):
+    compiled = CountingPlan(PLAN.compile())
+    expected = prepare_bulk_item(create_test_file(), PLAN.compile())
+    first = prepare_bulk_item(create_test_file(), compiled, cache)
+    second = prepare_bulk_item(create_test_file(), compiled, cache)
+    assert first == second == expected
+    assert compiled.calls == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_cached_random_renders_match_uncached_ones(tmp_path):
+    snow = DistortionPlan.from_distortions([{"type": "Snow", "intensity": 0.6}]).compile()
+    uncached = prepare_bulk_item(create_test_file(), snow)
+    for name in ["first", "second"]:
+        cache = ArtifactCache(str(tmp_path / name))
+        assert prepare_bulk_item(create_test_file(), snow, cache) == uncached
+        assert prepare_bulk_item(create_test_file(), snow, cache) == uncached
+        assert cache.stats["hits"] == 1
+
+
+def test_bulk_runs_reuse_artifacts_across_prompts_and_models(cache, tmp_path):
+    paths = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        path = tmp_path / f"image_{i}.png"
+        Image.new('RGB', (48, 32), color=color).save(path)
+        paths.append(str(path))
+    backend = FakeBackend()
+    first_run = [(path, PLAN, "Prompt A") for path in paths]
+    second_run = [(path, PLAN, "Prompt B") for path in paths]
+    list(run_bulk_analysis(first_run, "models/fake-flash", None, FIELDS, backend=backend, artifact_cache=cache))
+    results = list(run_bulk_analysis(second_run, ["models/fake-flash", "models/fake-pro"], None, FIELDS,
+                                     backend=backend, artifact_cache=cache))
+    assert len(results) == 6 and all(error is None for *_, error in results)
+    assert cache.stats["writes"] == 3
+    assert cache.stats["hits"] == 3
@@ -0,0 +1,155 @@
+import io
+import time
+import asyncio
+import pytest
+from PIL import Image
+from async_api import AnalysisLimiter, analyze_one, analyze_many, get_gemini_response_async
+from backends import FakeBackend
+from distortion_plan import DistortionPlan
+from hedging import HedgingBackend
+from utils import get_gemini_response, apply_distortions
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+DISTORTIONS = [{"type": "Blur", "intensity": 0.2}, {"type": "Brightness", "intensity": 0.3}]
+
+
+def create_test_image(color='red', size=(64, 48)):
+    return Image.new('RGB', size, color=color)
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_analyze_one_matches_sync_pipeline():
+    image = create_test_image()
+    expected = get_gemini_response("Test input", apply_distortions(image, DISTORTIONS), "models/fake-flash",
+                                   "Test instructions", FIELDS, backend=FakeBackend())
+
+    async def main():
+        return await analyze_one(png_bytes(image), DISTORTIONS, "Test input", "models/fake-flash",
+                                 "Test instructions", FIELDS, backend=FakeBackend())
+
+    assert asyncio.run(main()) == expected
+
+
+def test_analyze_one_accepts_plans_and_pil_images():
+    image = create_test_image()
+    plan = DistortionPlan.from_distortions(DISTORTIONS)
+
+    async def main():
+        from_plan = await analyze_one(image, plan, "Test input", "models/fake-flash", None, FIELDS,
+                                      backend=FakeBackend())
+        from_dicts = await analyze_one(image, DISTORTIONS, "Test input", "models/fake-flash", None, FIELDS,
+                                       backend=FakeBackend())
+        return from_plan, from_dicts
+
+    from_plan, from_dicts = asyncio.run(main())
+    assert from_plan == from_dicts
+    assert set(from_plan[1]) == set(FIELDS)
+
+
+def test_analyze_many_runs_thousands_concurrently_from_one_loop():
+    backend = FakeBackend(latency_mean=0.05)
+    plan = DistortionPlan.from_distortions([{"type": "Brightness", "intensity": 0.2}])
+    image = png_bytes(create_test_image(size=(16, 16)))
+    items = [(image, plan, f"Prompt {i}") for i in range(2000)]
+
+    async def main():
+        limiter = AnalysisLimiter(max_in_flight=500)
+        try:
+            start = time.perf_counter()
+            results = await analyze_many(items, "models/fake-flash", None, FIELDS, backend=backend, limiter=limiter)
+            return results, time.perf_counter() - start, limiter.stats
+        finally:
+            limiter.shutdown()
+
+    results, elapsed, stats = asyncio.run(main())
+    assert len(results) == 2000
+    assert all(set(json_response) == set(FIELDS) for _, json_response in results)
+    # 2000 sequential calls would take 100s
+    assert elapsed < 20
+    assert stats["completed"] == 2000
+    assert stats["peak_in_flight"] == 500
+
+
+def test_limiter_bounds_concurrent_requests():
+    active = 0
+    peak = 0
+
+    class CountingBackend(FakeBackend):
+        async def generate_content_async(self, model_name, content, timeout=None):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            try:
+                return await super().generate_content_async(model_name, content, timeout=timeout)
+            finally:
+                active -= 1
+
+    backend = CountingBackend(latency_mean=0.01)
+    image = png_bytes(create_test_image())
+
+    async def main():
+        limiter = AnalysisLimiter(max_in_flight=7, max_cpu_jobs=2)
+        try:
+            return await analyze_many([(image, None, "Test input")] * 50, "models/fake-flash", None, FIELDS,
+                                      backend=backend, limiter=limiter)
+        finally:
+            limiter.shutdown()
+
+    assert len(asyncio.run(main())) == 50
+    assert peak == 7
+
+
+def test_blocking_backends_run_on_request_executor():
+    backend = HedgingBackend(FakeBackend(latency_mean=0.02))
+    image = png_bytes(create_test_image())
+
+    async def main():
+        return await analyze_many([(image, None, "Test input")] * 20, "models/fake-flash", None, FIELDS,
+                                  backend=backend)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        backend.shutdown()
+    assert all(set(json_response) == set(FIELDS) for _, json_response in results)
+    assert backend.stats["calls"] == 20
+
+
+def test_backend_errors_return_error_tuple():
+    async def main():
+        return await get_gemini_response_async("Test input", None, "models/fake-flash", None, FIELDS,
+                                               backend=FakeBackend(rate_limit_rate=1.0))
+
+    text_response, json_response = asyncio.run(main())
+    assert "429" in text_response
+    assert "error" in json_response
+
+
+def test_timeout_is_passed_to_backend():
+    async def main():
+        return await get_gemini_response_async("Test input", None, "models/fake-flash", None, FIELDS,
+                                               backend=FakeBackend(latency_mean=1.0), timeout=0.05)
+
+    start = time.perf_counter()
+    _, json_response = asyncio.run(main())
+    assert time.perf_counter() - start < 0.5
+    assert "timeout" in json_response["error"]
+
+
+def test_analyze_many_raises_or_returns_preparation_errors():
+    items = [(png_bytes(create_test_image()), None, "ok"), (b"not an image", DISTORTIONS, "bad")]
+
+    async def main(return_exceptions):
+        return await analyze_many(items, "models/fake-flash", None, FIELDS, backend=FakeBackend(),
+                                  return_exceptions=return_exceptions)
+
+    results = asyncio.run(main(True))
+    assert set(results[0][1]) == set(FIELDS)
+    assert isinstance(results[1], Exception)
+    with pytest.raises(Exception):
+        asyncio.run(main(False))
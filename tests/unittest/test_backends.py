@@ -0,0 +1,85 @@
+import pytest
+from PIL import Image
+from backends import FakeBackend, FakeRateLimitError, get_backend, set_backend, GeminiBackend
+from utils import get_gemini_response, list_available_models
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+
+
+def create_test_image(size=(64, 64), color='red'):
+    return Image.new('RGB', size, color=color)
+
+
+@pytest.fixture(autouse=True)
+def reset_backend():
+    yield
+    set_backend(None)
+
+
+def test_fake_backend_returns_parseable_json():
+    backend = FakeBackend(seed=1)
+    text_response, json_response = get_gemini_response(
+        "Test input", create_test_image(), "models/fake-flash", "Test instructions", FIELDS, backend=backend
+    )
+    assert "===JSON===" not in text_response
+    assert set(json_response) == set(FIELDS)
+    assert isinstance(json_response["potential_hazards"], list)
+
+
+def test_fake_backend_is_deterministic_for_identical_requests():
+    backend = FakeBackend(seed=1)
+    image = create_test_image()
+    first = get_gemini_response("Test input", image, "models/fake-flash", None, FIELDS, backend=backend)
+    second = get_gemini_response("Test input", image, "models/fake-flash", None, FIELDS, backend=backend)
+    assert first == second
+
+
+def test_fake_backend_simulates_rate_limits():
+    backend = FakeBackend(rate_limit_rate=1.0)
+    with pytest.raises(FakeRateLimitError):
+        backend.generate_content("models/fake-flash", ["hello"])
+    text_response, json_response = get_gemini_response("Test input", None, "models/fake-flash", None, FIELDS, backend=backend)
+    assert "429" in text_response
+    assert "error" in json_response
+
+
+def test_fake_backend_simulates_safety_blocks():
+    backend = FakeBackend(safety_block_rate=1.0)
+    text_response, json_response = get_gemini_response("Test input", None, "models/fake-flash", None, FIELDS, backend=backend)
+    assert "blocked" in text_response
+    assert json_response == {"error": "Response blocked by safety filters"}
+
+
+def test_fake_backend_simulates_malformed_json():
+    backend = FakeBackend(malformed_json_rate=1.0)
+    _, json_response = get_gemini_response("Test input", None, "models/fake-flash", None, FIELDS, backend=backend)
+    assert json_response == {"error": "Failed to parse JSON from AI response"}
+    assert backend.stats["malformed"] == 1
+
+
+@pytest.mark.parametrize("latency", ["constant", "uniform", "normal", "lognormal", "exponential"])
+def test_fake_backend_latency_distributions(latency):
+    backend = FakeBackend(latency=latency, latency_mean=0.01, latency_spread=0.5, seed=3)
+    samples = [backend.sample_latency() for _ in range(50)]
+    assert all(sample >= 0 for sample in samples)
+
+
+def test_unknown_latency_distribution():
+    with pytest.raises(ValueError):
+        FakeBackend(latency="pareto")
+
+
+def test_set_backend_is_used_by_default():
+    backend = FakeBackend(models=["models/a", "models/b"])
+    set_backend(backend)
+    assert get_backend() is backend
+    assert list_available_models() == ["models/a", "models/b"]
+
+
+def test_fake_backend_selected_from_environment(monkeypatch):
+    set_backend(None)
+    monkeypatch.setenv("ROAD_SAFETY_BACKEND", "fake")
+    assert isinstance(get_backend(), FakeBackend)
+    set_backend(None)
+    monkeypatch.delenv("ROAD_SAFETY_BACKEND")
+    assert isinstance(get_backend(), GeminiBackend)
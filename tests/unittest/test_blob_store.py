@@ -0,0 +1,94 @@
+import io
+import os
+import gc
+from PIL import Image
+from blob_store import BlobStore, is_blob_ref
+
+
+def test_put_and_get_roundtrip(tmp_path):
+    store = BlobStore(str(tmp_path))
+    ref = store.put(b"overlay bytes")
+    assert is_blob_ref(ref)
+    assert store.get(ref) == b"overlay bytes"
+    assert store.put(b"overlay bytes") == ref  # identical payloads are stored once
+    assert store.disk_usage == len(b"overlay bytes")
+
+
+def test_memory_ceiling_evicts_least_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path), memory_limit=25)
+    refs = [store.put(bytes([i]) * 10) for i in range(3)]
+    store.get(refs[0])
+    store.get(refs[1])
+    store.get(refs[0])
+    store.get(refs[2])
+    assert store.memory_usage <= 25
+    assert store.stats["evictions"] == 1
+    # refs[1] was least recently used, so it has to be read from disk again
+    misses = store.stats["misses"]
+    assert store.get(refs[1]) == bytes([1]) * 10
+    assert store.stats["misses"] == misses + 1
+
+
+def test_set_memory_limit_evicts(tmp_path):
+    store = BlobStore(str(tmp_path))
+    store.get(store.put(b"x" * 100))
+    store.set_memory_limit(10)
+    assert store.memory_usage == 0
+
+
+def test_put_file_keeps_name_and_is_openable(tmp_path):
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), color='red').save(buffer, format='PNG')
+    buffer.name = "../street corner.png"
+    store = BlobStore(str(tmp_path))
+    path = store.put_file(buffer)
+    assert os.path.basename(path) == "street_corner.png"
+    assert path.startswith(str(tmp_path))
+    with Image.open(path) as image:
+        assert image.size == (16, 16)
+    assert buffer.tell() == 0
+
+
+def test_temporary_store_is_removed_when_collected():
+    store = BlobStore()
+    directory = store.directory
+    store.put(b"data")
+    assert os.path.isdir(directory)
+    del store
+    gc.collect()
+    assert not os.path.exists(directory)
+
+
+def test_clear(tmp_path):
+    store = BlobStore(str(tmp_path))
+    ref = store.put(b"data")
+    store.get(ref)
+    store.clear()
+    assert store.memory_usage == 0
+    assert store.disk_usage == 0
+
+
+def test_discard_files_removes_unused_payloads(tmp_path):
+    store = BlobStore(str(tmp_path))
+    first = store.put_file(io.BytesIO(b"first"), name="a.png")
+    shared = store.put_file(io.BytesIO(b"shared"), name="b.png")
+    again = store.put_file(io.BytesIO(b"shared"), name="c.png")
+    overlay = store.put(b"first")
+    store.discard_files([first, shared])
+    assert not os.path.exists(first) and not os.path.exists(shared)
+    # Payloads still used by another file or a put() reference are kept
+    with open(again, "rb") as f:
+        assert f.read() == b"shared"
+    assert store.get(overlay) == b"first"
+    store.discard_files([again])
+    assert store.disk_usage == len(b"first")
+
+
+def test_held_files_are_discarded_on_release(tmp_path):
+    store = BlobStore(str(tmp_path))
+    path = store.put_file(io.BytesIO(b"frame"), name="frame.png")
+    store.hold([path])
+    store.discard_files([path])
+    assert os.path.exists(path)
+    store.release([path])
+    assert not os.path.exists(path) and store.disk_usage == 0
@@ -0,0 +1,141 @@
+import io
+import json
+import time
+from PIL import Image
+from backends import FakeBackend
+from bulk import (
+    analyze_bulk_item,
+    analyze_bulk_item_models,
+    run_bulk_analysis,
+    build_results_dataframe,
+    build_comparison_dataframe
+)
+from distortion_plan import DistortionPlan, EMPTY_PLAN
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+
+
+def create_test_file(name, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=color).save(buffer, format='PNG')
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def test_analyze_bulk_item():
+    result = analyze_bulk_item(
+        create_test_file("a.png"), DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.2}]), "Test input",
+        "models/fake-flash", None, FIELDS, backend=FakeBackend()
+    )
+    assert result["Image"] == "a.png"
+    assert result["Distortions"] == "Blur (Intensity: 0.20)"
+    assert "potential_hazards" in json.loads(result["JSON Response"])
+
+
+def test_run_bulk_analysis_compiles_each_plan_once():
+    overlay_ref = "blob:overlay"
+    loaded = []
+
+    def load_overlay(ref):
+        loaded.append(ref)
+        return Image.new('RGBA', (8, 8), color=(0, 0, 255, 128))
+
+    plan = DistortionPlan.from_distortions([{'type': 'Overlay', 'intensity': 0.5, 'overlay_image': overlay_ref}])
+    items = [(create_test_file(f"{i}.png"), plan, "Test input") for i in range(5)]
+    results = list(run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=FakeBackend(), load_overlay=load_overlay))
+    assert all(error is None for _, _, _, error in results)
+    assert loaded == [overlay_ref]
+
+
+def test_run_bulk_analysis_concurrent_matches_serial():
+    items = [(create_test_file(f"{i}.png", color=(i * 20, 0, 0)), EMPTY_PLAN, "Test input") for i in range(6)]
+    serial = {i: result for i, _, result, _ in run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=FakeBackend())}
+    for file, _, _ in items:
+        file.seek(0)
+    concurrent = {i: result for i, _, result, _ in run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=FakeBackend(), max_workers=4)}
+    assert serial == concurrent
+
+
+def test_run_bulk_analysis_reports_errors():
+    items = [("does-not-exist.png", EMPTY_PLAN, "Test input")]
+    [(i, file_name, result, error)] = list(run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=FakeBackend()))
+    assert file_name == "does-not-exist.png"
+    assert result is None
+    assert error is not None
+
+
+def test_build_results_dataframe():
+    results = [{
+        "Image": "a.png",
+        "Distortions": "",
+        "Input Text": "Test input",
+        "AI Response": "text",
+        "JSON Response": json.dumps({"potential_hazards": ["x", "y"], "overall_safety": "Safe"})
+    }]
+    df = build_results_dataframe(results, FIELDS)
+    assert list(df.columns) == ["Image", "Input Text", "AI Response", "JSON Response", "potential_hazards", "overall_safety"]
+    assert df.loc[0, "potential_hazards"] == "x, y"
+
+
+class RecordingBackend(FakeBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.images = []
+
+    def generate_content(self, model_name, content):
+        self.images.append(next(part["data"] for part in content if isinstance(part, dict)))
+        return super().generate_content(model_name, content)
+
+
+def test_analyze_bulk_item_models_encodes_once_and_runs_concurrently():
+    backend = RecordingBackend(latency_mean=0.2)
+    models = ["models/fake-flash", "models/fake-pro", "models/fake-ultra"]
+    start = time.perf_counter()
+    rows = analyze_bulk_item_models(create_test_file("a.png"), EMPTY_PLAN, "Test input", models, None, FIELDS,
+                                    backend=backend)
+    elapsed = time.perf_counter() - start
+
+    assert [row["Model"] for row in rows] == models
+    assert all(row["Image"] == "a.png" for row in rows)
+    assert len({id(image) for image in backend.images}) == 1
+    assert elapsed < 0.4
+
+
+def test_run_bulk_analysis_fans_out_over_models():
+    models = ["models/fake-flash", "models/fake-pro"]
+    items = [(create_test_file(f"{i}.png", color=(i * 40, 0, 0)), EMPTY_PLAN, "Test input") for i in range(3)]
+    results = list(run_bulk_analysis(items, models, None, FIELDS, backend=FakeBackend(), max_workers=2))
+    assert len(results) == 6
+    assert sorted((i, result["Model"]) for i, _, result, _ in results) == [(i, m) for i in range(3) for m in models]
+
+    # A single model keeps the original row layout
+    for file, _, _ in items:
+        file.seek(0)
+    single = list(run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=FakeBackend()))
+    assert all("Model" not in result for _, _, result, _ in single)
+
+
+def test_build_comparison_dataframe():
+    def row(image, model, safety):
+        return {"Image": image, "Model": model, "AI Response": f"{model} text",
+                "JSON Response": json.dumps({"overall_safety": safety, "potential_hazards": ["x", "y"]})}
+
+    results = [row("a.png", "flash", "Safe"), row("a.png", "pro", "Unsafe"), row("b.png", "flash", "Safe")]
+    comparison = build_comparison_dataframe(results, "overall_safety")
+    assert list(comparison.columns) == ["Image", "flash", "pro"]
+    assert comparison.iloc[0].tolist() == ["a.png", "Safe", "Unsafe"]
+    assert build_comparison_dataframe(results, "potential_hazards").loc[0, "flash"] == "x, y"
+
+
+def test_random_distortions_render_the_same_in_every_run():
+    plan = DistortionPlan.from_distortions([{'type': 'Snow', 'intensity': 0.6}, {'type': 'Rain', 'intensity': 0.4}])
+    runs = []
+    for _ in range(2):
+        backend = RecordingBackend()
+        items = [(create_test_file(f"{i}.png", color=(i * 40, 90, 0)), plan, "Test input") for i in range(3)]
+        list(run_bulk_analysis(items, "models/fake-flash", None, FIELDS, backend=backend, max_workers=3))
+        runs.append(sorted(backend.images))
+    assert len(runs[0]) == 3 and runs[0] == runs[1]
+    # Different images get different random renders
+    assert len(set(runs[0])) == 3
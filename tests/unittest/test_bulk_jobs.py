@@ -0,0 +1,145 @@
+import io
+import threading
+import time
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from bulk_jobs import BulkJobManager, COMPLETED, CANCELLED, PAUSED
+from distortion_plan import DistortionPlan
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{'type': 'Brightness', 'intensity': 0.2}])
+
+
+def create_test_file(name):
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), color='red').save(buffer, format='PNG')
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def make_items(count, prefix="img"):
+    return [(create_test_file(f"{prefix}_{i}.png"), PLAN, "Describe") for i in range(count)]
+
+
+class GatedBackend(FakeBackend):
+    """Fake backend whose calls block until released, recording the prompt order."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Semaphore(0)
+        self.calls = []
+
+    def generate_content(self, model_name, content, timeout=None):
+        self.gate.acquire()
+        self.calls.append(content[1] if len(content) > 1 else content[0])
+        return super().generate_content(model_name, content, timeout=timeout)
+
+
+@pytest.fixture
+def manager():
+    manager = BulkJobManager(max_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_runs_in_background_and_reports_results(manager):
+    finished = []
+    job = manager.submit(make_items(5), "models/fake-flash", None, FIELDS, owner="alice",
+                         backend=FakeBackend(latency_mean=0.01), on_finish=finished.append)
+    assert job.wait(10)
+    assert job.state == COMPLETED and job.completed == 5 and job.progress == 1.0
+    assert [row["Image"] for row in job.result_rows()] == [f"img_{i}.png" for i in range(5)]
+    assert finished == [job]
+    rows, cursor = job.results_since(0)
+    assert len(rows) == 5 and cursor == 5
+    assert job.results_since(cursor) == ([], 5)
+
+
+def test_multiple_models_give_one_row_per_model(manager):
+    job = manager.submit(make_items(2), ["models/fake-flash", "models/fake-pro"], None, FIELDS,
+                         backend=FakeBackend())
+    assert job.wait(10)
+    assert [row["Model"] for row in job.result_rows()] == ["models/fake-flash", "models/fake-pro"] * 2
+
+
+def test_failed_items_are_recorded_without_stopping_the_job(manager):
+    items = make_items(3)
+    broken = io.BytesIO(b"not an image")
+    broken.name = "broken.png"
+    items[1] = (broken, PLAN, "Describe")
+    job = manager.submit(items, "models/fake-flash", None, FIELDS, backend=FakeBackend())
+    assert job.wait(10)
+    assert job.state == COMPLETED and sorted(job.results) == [0, 2]
+    assert job.errors[0][:2] == (1, "broken.png") and "Traceback" in job.errors[0][2]
+
+
+def test_pause_stops_new_items_and_resume_continues(manager):
+    backend = GatedBackend()
+    job = manager.submit(make_items(6), "models/fake-flash", None, FIELDS, backend=backend)
+    manager.pause(job.job_id)
+    for _ in range(2):  # release whatever was already running
+        backend.gate.release()
+    time.sleep(0.2)
+    assert job.state == PAUSED
+    done_while_paused = job.completed
+    assert done_while_paused <= 2
+    for _ in range(6):
+        backend.gate.release()
+    time.sleep(0.2)
+    assert job.completed == done_while_paused
+
+    manager.resume(job.job_id)
+    assert job.wait(10)
+    assert job.state == COMPLETED and job.completed == 6
+
+
+def test_cancel_keeps_finished_results_and_calls_on_finish(manager):
+    backend = GatedBackend()
+    finished = []
+    job = manager.submit(make_items(10), "models/fake-flash", None, FIELDS, backend=backend,
+                         on_finish=finished.append)
+    backend.gate.release()
+    while job.completed < 1:
+        time.sleep(0.01)
+    manager.cancel(job.job_id)
+    assert not job.wait(0.1)  # one item is still in flight
+    for _ in range(10):
+        backend.gate.release()
+    assert job.wait(10)
+    assert job.state == CANCELLED and 1 <= job.completed < 10
+    assert finished == [job]
+    manager.remove(job.job_id)
+    assert manager.get(job.job_id) is None
+
+
+def test_owners_share_workers_fairly():
+    manager = BulkJobManager(max_workers=1)
+    backend = GatedBackend()
+    big = manager.submit([(create_test_file(f"a{i}.png"), PLAN, f"alice {i}") for i in range(6)],
+                         "models/fake-flash", None, FIELDS, owner="alice", backend=backend)
+    small = manager.submit([(create_test_file(f"b{i}.png"), PLAN, f"bob {i}") for i in range(2)],
+                           "models/fake-flash", None, FIELDS, owner="bob", backend=backend)
+    for _ in range(8):
+        backend.gate.release()
+    assert big.wait(10) and small.wait(10)
+    owners = [call.split()[0] for call in backend.calls]
+    # Bob's two items are interleaved with Alice's instead of waiting for all six of hers
+    assert owners[:4] == ["alice", "bob", "alice", "bob"]
+    manager.shutdown()
+
+
+def test_per_job_max_workers(manager):
+    backend = GatedBackend()
+    job = manager.submit(make_items(4), "models/fake-flash", None, FIELDS, backend=backend, max_workers=1)
+    time.sleep(0.1)
+    assert manager.stats()["in_flight"] == 1
+    for _ in range(4):
+        backend.gate.release()
+    assert job.wait(10)
+
+
+def test_empty_job_completes_immediately(manager):
+    job = manager.submit([], "models/fake-flash", None, FIELDS)
+    assert job.wait(1) and job.state == COMPLETED
@@ -0,0 +1,66 @@
+import pytest
+from bulk_settings import ImageSettings, build_plan, page_bounds, base_value
+
+
+def test_image_settings_store_only_overrides():
+    settings = ImageSettings(distortions=["Blur"])
+    settings.set("Blur", "intensity", 0.5)
+    assert settings.overrides == {}
+    settings.set("Blur", "intensity", 0.8)
+    assert settings.overrides == {("Blur", "intensity"): 0.8}
+    settings.set("Blur", "intensity", 0.5)
+    assert settings.overrides == {}
+
+
+def test_image_settings_reference_shared_plan():
+    shared = {"Warp": {"intensity": 0.2, "wave_amplitude": 10.0, "wave_frequency": 0.04, "bulge_factor": 0.0}}
+    settings = ImageSettings()
+    assert settings.selected_distortions(["Warp"]) == ["Warp"]
+    assert settings.get("Warp", "intensity", shared) == 0.2
+    settings.set("Warp", "intensity", 0.2, shared)
+    assert settings.overrides == {}
+    # Changing the shared plan is seen by every image without copying it
+    shared["Warp"]["intensity"] = 0.7
+    assert settings.get("Warp", "intensity", shared) == 0.7
+
+
+def test_base_value_defaults():
+    assert base_value("Color", "saturation") == 1.0
+    assert base_value("Blur", "intensity") == 0.5
+    assert base_value("Blur", "intensity", {"Blur": {"intensity": 0.1}}) == 0.1
+
+
+def test_build_plan():
+    shared = {"Overlay": {"intensity": 0.4, "overlay_image": "blob:abc"}}
+    settings = ImageSettings()
+    settings.set("Warp", "bulge_factor", -10.0, shared)
+    plan = build_plan(settings, ["Color", "Overlay", "Warp"], shared)
+    assert [step.to_distortion() for step in plan.steps] == [
+        {"type": "Color", "saturation": 1.0, "hue_shift": 0.0},
+        {"type": "Overlay", "intensity": 0.4, "overlay_image": "blob:abc"},
+        {"type": "Warp", "intensity": 0.5, "warp_params": {"wave_amplitude": 20.0, "wave_frequency": 0.04, "bulge_factor": -10.0}},
+    ]
+
+
+def test_images_following_the_shared_plan_get_equal_plans():
+    shared = {"Blur": {"intensity": 0.3}}
+    first, second = ImageSettings(), ImageSettings()
+    second.set("Blur", "intensity", 0.3, shared)
+    assert build_plan(first, ["Blur"], shared) == build_plan(second, ["Blur"], shared)
+    second.set("Blur", "intensity", 0.6, shared)
+    assert build_plan(first, ["Blur"], shared) != build_plan(second, ["Blur"], shared)
+
+
+def test_build_plan_per_image_selection():
+    settings = ImageSettings(distortions=["Blur"])
+    assert [step.type for step in build_plan(settings, ["Warp"]).steps] == ["Blur"]
+
+
+@pytest.mark.parametrize("total, page_size, page, expected", [
+    (23, 10, 1, (0, 10, 3)),
+    (23, 10, 3, (20, 23, 3)),
+    (23, 10, 9, (20, 23, 3)),
+    (0, 10, 1, (0, 0, 1)),
+])
+def test_page_bounds(total, page_size, page, expected):
+    assert page_bounds(total, page_size, page) == expected
@@ -0,0 +1,116 @@
+import io
+import json
+import threading
+import pytest
+from PIL import Image
+from backends import FakeBackend, FakeResponse
+from bulk import analyze_bulk_item
+from consistency import SelfConsistency, merge_responses
+from distortion_plan import EMPTY_PLAN
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+
+
+class ScriptedBackend:
+    """Backend answering with the given payloads in turn (None for an error)."""
+
+    def __init__(self, payloads):
+        self.payloads = list(payloads)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model_name, content, timeout=None):
+        with self._lock:
+            payload = self.payloads[self.calls % len(self.payloads)]
+            self.calls += 1
+        if payload is None:
+            raise RuntimeError("Simulated failure")
+        return FakeResponse(f"Answer {payload['overall_safety']}\n===JSON===\n{json.dumps(payload)}\n===JSON===")
+
+
+def verdict(safety, hazards, description="A road."):
+    return {"scene_description": description, "potential_hazards": hazards, "overall_safety": safety}
+
+
+def respond(consistency, backend):
+    return consistency.respond("Describe", None, "models/fake-flash", None, FIELDS, backend=backend)
+
+
+def test_merge_takes_majority_and_scores_agreement():
+    merged, agreement = merge_responses([
+        verdict("Low", ["Pothole", "Cyclist"]),
+        verdict("low", ["pothole"]),
+        verdict("High", ["Pothole", "Fog"]),
+    ])
+    assert merged["overall_safety"] == "Low"
+    assert merged["potential_hazards"] == ["Pothole"]
+    # Safety agrees 2/3; hazards average Jaccard (1/2 + 1 + 1/2) / 3
+    assert agreement == pytest.approx(2 / 3)
+    assert merge_responses([verdict("Low", ["Pothole"])] * 3)[1] == 1.0
+
+
+def test_agreeing_samples_stop_after_the_first_wave():
+    consistency = SelfConsistency(max_samples=5, min_samples=2)
+    backend = ScriptedBackend([verdict("Low", ["Pothole"])])
+    text, response, info = respond(consistency, backend)
+    assert backend.calls == 2
+    assert info == {"agreement": 1.0, "samples": 2}
+    assert response["overall_safety"] == "Low" and text == "Answer Low"
+    assert consistency.stats["early_stops"] == 1 and consistency.average_samples == 2
+
+
+def test_disagreement_requests_more_samples_until_majority_is_clear():
+    consistency = SelfConsistency(max_samples=7, min_samples=2, threshold=0.75)
+    backend = ScriptedBackend([verdict("Low", ["Pothole"]), verdict("High", ["Pothole"])]
+                              + [verdict("Low", ["Pothole"])] * 5)
+    _, response, info = respond(consistency, backend)
+    # Low wins 3 of 4 after two extra samples
+    assert info["samples"] == 4 and info["agreement"] == 0.75
+    assert response["overall_safety"] == "Low"
+
+
+def test_stops_when_threshold_is_out_of_reach():
+    consistency = SelfConsistency(max_samples=4, min_samples=3, threshold=0.9)
+    backend = ScriptedBackend([verdict("Low", ["Fog"]), verdict("High", ["Fog"]), verdict("Low", ["Fog"])])
+    _, response, info = respond(consistency, backend)
+    # The best case with one more sample is 3 of 4
+    assert backend.calls == 3 and info["samples"] == 3
+    assert response["overall_safety"] == "Low"
+
+
+def test_ties_are_worth_another_sample():
+    consistency = SelfConsistency(max_samples=4, min_samples=2, threshold=0.9)
+    backend = ScriptedBackend([verdict("Low", ["Fog"]), verdict("High", ["Fog"]), verdict("High", ["Fog"])])
+    _, response, info = respond(consistency, backend)
+    assert info["samples"] == 3 and response["overall_safety"] == "High"
+
+
+def test_failed_samples_use_budget_but_not_agreement():
+    consistency = SelfConsistency(max_samples=3, min_samples=2)
+    backend = ScriptedBackend([None, verdict("Low", ["Pothole"])])
+    _, response, info = respond(consistency, backend)
+    assert info["samples"] == 3
+    assert response["overall_safety"] == "Low"
+
+    _, response, info = respond(SelfConsistency(max_samples=2), ScriptedBackend([None]))
+    assert "error" in response and info["agreement"] is None
+
+
+def test_bulk_item_reports_agreement_and_samples():
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), color='red').save(buffer, format='PNG')
+    buffer.seek(0)
+    buffer.name = "frame.png"
+    consistency = SelfConsistency(max_samples=4)
+    row = analyze_bulk_item(buffer, EMPTY_PLAN, "Describe", "models/fake-flash", None, FIELDS,
+                            backend=FakeBackend(), consistency=consistency)
+    assert row["Agreement"] == 1.0 and row["Samples"] == 2
+    consistency.shutdown()
+
+
+def test_fake_backend_variability():
+    content = ["Instructions", "Describe"]
+    steady = FakeBackend(seed=0)
+    assert len({steady.generate_content("models/fake-flash", content).text for _ in range(5)}) == 1
+    noisy = FakeBackend(variability=1.0, seed=0)
+    assert len({noisy.generate_content("models/fake-flash", content).text for _ in range(5)}) > 1
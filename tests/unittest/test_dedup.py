@@ -0,0 +1,97 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from dedup import (
+    dhash,
+    phash,
+    hamming_distances,
+    cluster_hashes,
+    HashIndex,
+    hash_files,
+    fan_out_results
+)
+from backends import FakeBackend
+from bulk import analyze_bulk_item, get_file_name
+from distortion_plan import EMPTY_PLAN
+from ingest import Frame, frame_to_file
+
+
+def create_scene(seed, size=(96, 64)):
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize(size, Image.BILINEAR)
+
+
+def add_noise(image, seed, amount=3):
+    rng = np.random.default_rng(seed)
+    pixels = np.asarray(image, dtype=np.int16) + rng.integers(-amount, amount + 1, size=(image.size[1], image.size[0], 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+@pytest.mark.parametrize("hash_function", [dhash, phash])
+def test_near_duplicates_have_close_hashes(hash_function):
+    scene = create_scene(1)
+    other = create_scene(2)
+    original = hash_function(scene)
+    near = hash_function(add_noise(scene, 7))
+    far = hash_function(other)
+    assert hamming_distances(original, [near])[0] <= 4
+    assert hamming_distances(original, [far])[0] > 10
+
+
+def test_hamming_distances():
+    distances = hamming_distances(0b1011, [0b1011, 0b0000, 2**64 - 1])
+    assert list(distances) == [0, 3, 61]
+
+
+def test_cluster_hashes_respects_distance_and_groups():
+    hashes = [0b0000, 0b0001, 0b1111, 0b0000]
+    assert cluster_hashes(hashes, 1) == [0, 0, 2, 0]
+    assert cluster_hashes(hashes, 0) == [0, 1, 2, 0]
+    assert cluster_hashes(hashes, 1, groups=["a", "a", "a", "b"]) == [0, 0, 2, 3]
+
+
+def test_hash_index_persists_hashes(tmp_path):
+    path = tmp_path / "frame.png"
+    create_scene(3).save(path)
+    index_path = str(tmp_path / "index.json")
+
+    first = hash_files([str(path)], index=HashIndex(index_path))
+    reloaded = HashIndex(index_path)
+    assert len(reloaded) == 1
+
+    # Overwrite the stored hash to prove the index is used instead of rehashing
+    key = next(iter(reloaded._entries))
+    reloaded.put(key, "dhash", 42)
+    assert hash_files([str(path)], index=reloaded) == [42]
+    assert first != [42]
+
+
+def test_hash_files_uploaded_files():
+    buffer = io.BytesIO()
+    create_scene(4).save(buffer, format='PNG')
+    index = HashIndex()
+    assert hash_files([buffer], method="phash", index=index) == hash_files([buffer], method="phash")
+    assert buffer.tell() == 0
+
+
+def test_fan_out_results():
+    results = {0: {"Image": "a.png", "AI Response": "x"}, 2: {"Image": "c.png", "AI Response": "y"}}
+    rows = fan_out_results(results, [0, 0, 2], ["a.png", "b.png", "c.png"])
+    assert [row["Image"] for row in rows] == ["a.png", "b.png", "c.png"]
+    assert [row["deduplicated_from"] for row in rows] == ["", "a.png", ""]
+    assert rows[1]["AI Response"] == "x"
+
+
+def test_fan_out_keeps_each_frames_timestamp():
+    scene = create_scene(1)
+    frames = [frame_to_file("dashcam.mp4", Frame(0, 0.0, scene)),
+              frame_to_file("dashcam.mp4", Frame(30, 1.0, add_noise(scene, 1)))]
+    assignments = cluster_hashes(hash_files(frames), max_distance=6)
+    assert assignments == [0, 0]
+    results = {0: analyze_bulk_item(frames[0], EMPTY_PLAN, "Describe", "models/fake-flash", None,
+                                    ["overall_safety"], backend=FakeBackend())}
+    rows = fan_out_results(results, assignments, [get_file_name(f) for f in frames], [f.metadata for f in frames])
+    assert [(row["Frame Index"], row["Timestamp"]) for row in rows] == [(0, 0.0), (30, 1.0)]
+    assert rows[1]["deduplicated_from"] == "dashcam.mp4#000000"
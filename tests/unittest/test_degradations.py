@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from PIL import Image
+from degradations import apply_fog, apply_snow, apply_night, apply_glare, apply_motion_blur, apply_jpeg
+from distortion_plan import DistortionPlan, DistortionStep, PLAN_DISTORTION_TYPES
+from utils import apply_distortion
+
+SEEDED = {"Fog": apply_fog, "Snow": apply_snow, "Night": apply_night, "Glare": apply_glare}
+
+
+@pytest.fixture
+def frame():
+    return Image.effect_noise((96, 64), 40).convert("RGB")
+
+
+def _pixels(image):
+    return np.asarray(image, dtype=np.float32)
+
+
+@pytest.mark.parametrize("name", ["Fog", "Snow", "Night", "Glare", "Motion Blur", "JPEG"])
+def test_new_types_are_plan_types_and_keep_size(frame, name):
+    assert name in PLAN_DISTORTION_TYPES
+    out = DistortionPlan((DistortionStep(name, (("intensity", 0.6),)),)).compile().apply(frame, seed=1)
+    assert out.size == frame.size and out.mode == "RGB"
+    assert not np.array_equal(_pixels(out), _pixels(frame))
+
+
+@pytest.mark.parametrize("name", sorted(SEEDED))
+def test_seeded_kernels_are_reproducible(frame, name):
+    first = _pixels(apply_distortion(frame, name, seed=3, intensity=0.5))
+    assert np.array_equal(first, _pixels(apply_distortion(frame, name, seed=3, intensity=0.5)))
+    if name != "Fog":  # Fog's seed only moves its soft patches, which can round to the same pixels
+        assert not np.array_equal(first, _pixels(apply_distortion(frame, name, seed=4, intensity=0.5)))
+
+
+@pytest.mark.parametrize("kernel", [apply_fog, apply_snow, apply_night, apply_glare, apply_motion_blur, apply_jpeg])
+def test_zero_intensity_is_a_no_op(frame, kernel):
+    assert kernel(frame, 0.0) is frame
+
+
+def test_fog_thickens_towards_the_horizon():
+    frame = Image.new("RGB", (40, 100), (20, 40, 60))
+    pixels = _pixels(apply_fog(frame, 0.7, seed=0))
+    assert pixels[10].mean() > pixels[60].mean() > pixels[99].mean()
+    assert np.array_equal(pixels[99], _pixels(frame)[99])
+
+
+def test_night_darkens_and_snow_and_glare_brighten(frame):
+    assert _pixels(apply_night(frame, 0.8, seed=0)).mean() < _pixels(frame).mean() * 0.5
+    assert _pixels(apply_snow(frame, 0.8, seed=0)).mean() > _pixels(frame).mean()
+    assert _pixels(apply_glare(frame, 0.8, seed=0)).mean() > _pixels(frame).mean()
+
+
+def test_motion_blur_streaks_along_its_angle():
+    pixels = np.zeros((41, 41, 3), np.uint8)
+    pixels[20, 20] = 255
+    dot = Image.fromarray(pixels)
+    horizontal = _pixels(apply_motion_blur(dot, 0.2))[:, :, 0] > 5
+    vertical = _pixels(apply_motion_blur(dot, 0.2, angle=90))[:, :, 0] > 5
+    assert horizontal[20].sum() == 9 and horizontal[:, 20].sum() == 1
+    assert vertical[:, 20].sum() >= 8 and vertical[20].sum() <= 2
+
+
+def test_motion_blur_keeps_flat_images_flat():
+    flat = Image.new("RGB", (60, 40), (90, 120, 150))
+    for angle in (0.0, 30.0):
+        assert np.abs(_pixels(apply_motion_blur(flat, 1.0, angle)) - [90, 120, 150]).max() <= 1
+
+
+def test_jpeg_gets_worse_with_intensity(frame):
+    errors = [np.abs(_pixels(apply_jpeg(frame, intensity)) - _pixels(frame)).mean() for intensity in (0.1, 0.5, 1.0)]
+    assert errors[0] < errors[1] < errors[2]
+
+
+def test_alpha_is_kept(frame):
+    rgba = frame.convert("RGBA")
+    rgba.putalpha(128)
+    for name in ["Fog", "Snow", "Night", "Glare", "Motion Blur", "JPEG"]:
+        out = apply_distortion(rgba, name, seed=0, intensity=0.5)
+        assert out.mode == "RGBA" and out.getchannel("A").getextrema() == (128, 128)
+
+
+def test_motion_blur_angle_is_part_of_the_plan():
+    plan = DistortionPlan.from_distortions([{"type": "Motion Blur", "intensity": 0.5, "angle": 45}])
+    assert plan != DistortionPlan.from_distortions([{"type": "Motion Blur", "intensity": 0.5}])
+    assert "Angle: 45" in plan.describe()
@@ -0,0 +1,82 @@
+import logging
+import pytest
+from PIL import Image
+import utils
+from diagnostics import (
+    TRACE,
+    ROOT_LOGGER,
+    CountingHandler,
+    Sampler,
+    configure_logging,
+    debug_sampled,
+    get_logger,
+    parse_levels
+)
+
+
+@pytest.fixture
+def counter():
+    root = logging.getLogger(ROOT_LOGGER)
+    saved_handlers, saved_level = root.handlers[:], root.level
+    saved_module_level = logging.getLogger(f"{ROOT_LOGGER}.utils").level
+    handler = CountingHandler()
+    root.handlers = [handler]
+    yield handler
+    root.handlers = saved_handlers
+    root.setLevel(saved_level)
+    logging.getLogger(f"{ROOT_LOGGER}.utils").setLevel(saved_module_level)
+
+
+def test_parse_levels():
+    assert parse_levels("utils=DEBUG, bulk=info,trace_me=TRACE,ignored") == {
+        "utils": logging.DEBUG, "bulk": logging.INFO, "trace_me": TRACE
+    }
+    with pytest.raises(ValueError):
+        parse_levels("utils=LOUD")
+
+
+def test_sampler_lets_through_one_in_n():
+    sampler = Sampler(every=10)
+    assert sum(sampler() for _ in range(100)) == 10
+    assert all(Sampler(every=1)() for _ in range(5))
+
+
+def test_debug_sampled_skips_sampler_when_disabled(counter):
+    configure_logging(level="WARNING", module_levels={}, force=True)
+    calls = []
+
+    def sampler():
+        calls.append(1)
+        return True
+
+    debug_sampled(get_logger("utils"), sampler, "message %s", 1)
+    assert calls == [] and counter.records == 0
+
+
+def test_module_levels_override_root(counter):
+    configure_logging(level="WARNING", module_levels={"utils": "DEBUG"}, force=True)
+    get_logger("utils").debug("shown")
+    get_logger("bulk").debug("hidden")
+    assert counter.records == 1
+
+
+def test_warp_pixel_diff_only_at_trace(counter, monkeypatch):
+    monkeypatch.setattr(utils, "_distortion_sampler", Sampler(every=1))
+    image = Image.new("RGB", (32, 24), (120, 40, 200))
+    warp_params = {"wave_amplitude": 20, "wave_frequency": 0.04, "bulge_factor": 30}
+
+    configure_logging(level="DEBUG", module_levels={}, force=True)
+    utils.apply_warp_effect(image, 0.5, warp_params)
+    assert counter.records == 0
+
+    configure_logging(level=TRACE, module_levels={}, force=True)
+    utils.apply_warp_effect(image, 0.5, warp_params)
+    assert counter.records == 1
+
+
+def test_errors_are_logged_not_printed(counter, capsys):
+    configure_logging(level="WARNING", module_levels={}, force=True)
+    image = Image.new("RGB", (8, 8))
+    assert utils.apply_warp_effect(image, 0.5, None) is image
+    assert counter.records == 1
+    assert capsys.readouterr().out == ""
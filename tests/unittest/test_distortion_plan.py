@@ -0,0 +1,105 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from utils import apply_distortions
+from distortion_plan import DistortionPlan, DistortionStep, EMPTY_PLAN
+
+
+def create_test_image(size=(48, 32), color='red'):
+    return Image.new('RGB', size, color=color)
+
+
+def overlay_bytes(color='blue'):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (16, 16), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+DISTORTIONS = [
+    {'type': 'Brightness', 'intensity': 0.2},
+    {'type': 'Color', 'saturation': 1.5, 'hue_shift': 0.1},
+    {'type': 'Warp', 'intensity': 0.5, 'warp_params': {'wave_amplitude': 20, 'wave_frequency': 0.05, 'bulge_factor': 30}},
+]
+
+
+def test_plans_are_hashable_and_compare_by_content():
+    first = DistortionPlan.from_distortions(DISTORTIONS)
+    second = DistortionPlan.from_distortions([dict(d) for d in DISTORTIONS])
+    assert first == second
+    assert hash(first) == hash(second)
+    assert first.content_hash == second.content_hash
+    assert len({first, second}) == 1
+
+
+def test_defaults_are_filled_in():
+    assert DistortionPlan.from_distortions([{'type': 'Blur'}]) == DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.5}])
+
+
+def test_content_hash_changes_with_parameters():
+    first = DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.2}])
+    second = DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.3}])
+    assert first.content_hash != second.content_hash
+
+
+def test_json_roundtrip():
+    plan = DistortionPlan.from_distortions(DISTORTIONS)
+    restored = DistortionPlan.from_json(plan.to_json())
+    assert restored == plan
+    assert restored.content_hash == plan.content_hash
+
+
+def test_validation():
+    with pytest.raises(ValueError):
+        DistortionStep("Smudge")
+    with pytest.raises(ValueError):
+        DistortionStep("Blur", (("radius", 2.0),))
+    with pytest.raises(ValueError):
+        DistortionStep("Blur", (("intensity", float("nan")),))
+    with pytest.raises(ValueError):
+        DistortionStep("Overlay", (("overlay_image", b"raw bytes"),))
+
+
+def test_compiled_plan_matches_apply_distortions():
+    image = create_test_image()
+    plan = DistortionPlan.from_distortions(DISTORTIONS)
+    expected = apply_distortions(image, DISTORTIONS)
+    assert np.array_equal(np.array(plan.compile().apply(image)), np.array(expected))
+
+
+def test_overlay_payloads_are_referenced_by_content():
+    data = overlay_bytes()
+    plan = DistortionPlan.from_distortions([{'type': 'Overlay', 'intensity': 0.5, 'overlay_image': data}])
+    ref = plan.steps[0].param_dict["overlay_image"]
+    assert ref.startswith("sha256:")
+    assert plan.payloads == {ref: data}
+    assert "sha256" in plan.to_json()
+    result = plan.compile().apply(create_test_image())
+    assert result.getpixel((0, 0)) != (255, 0, 0)
+
+
+def test_compile_resolves_references_once():
+    calls = []
+    plan = DistortionPlan.from_distortions([{'type': 'Overlay', 'intensity': 0.5, 'overlay_image': "blob:abc"}])
+    compiled = plan.compile(lambda ref: calls.append(ref) or Image.new('RGBA', (8, 8)))
+    for _ in range(3):
+        compiled.apply(create_test_image())
+    assert calls == ["blob:abc"]
+    with pytest.raises(ValueError):
+        plan.compile()
+
+
+def test_empty_and_ineffective_plans_return_the_image():
+    image = create_test_image()
+    assert EMPTY_PLAN.compile().apply(image) is image
+    plan = DistortionPlan.from_distortions([{'type': 'Overlay', 'intensity': 0.5, 'overlay_image': None}])
+    assert not plan.is_effective
+    assert plan.compile().apply(image) is image
+
+
+def test_describe():
+    plan = DistortionPlan.from_distortions(DISTORTIONS)
+    description = plan.describe()
+    assert "Brightness (Intensity: 0.20)" in description
+    assert "Color (Saturation: 1.50, Hue Shift: 0.10)" in description
+    assert "Warp (Intensity: 0.50, Wave Amp: 20.00" in description
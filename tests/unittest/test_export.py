@@ -0,0 +1,140 @@
+import json
+import os
+import hashlib
+import pytest
+from PIL import Image
+from distortion_plan import DistortionPlan
+from export import export_augmentations, load_plans, plan_seed, read_manifest, MANIFEST_NAME, PLANS_NAME
+from utils import apply_rain_effect
+
+RAIN = DistortionPlan.from_distortions([{"type": "Rain", "intensity": 0.3}])
+BLUR = DistortionPlan.from_distortions([{"type": "Blur", "intensity": 0.2}, {"type": "Rain", "intensity": 0.1}])
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    directory = tmp_path / "source"
+    (directory / "night").mkdir(parents=True)
+    for i in range(3):
+        Image.new('RGB', (48, 32), color=(i * 60, 90, 120)).save(directory / f"image_{i}.png")
+    Image.new('RGB', (48, 32), color=(10, 10, 10)).save(directory / "night" / "dark.jpg")
+    (directory / "notes.txt").write_text("not an image")
+    return str(directory)
+
+
+def _manifest(output_dir):
+    records = []
+    with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+    return records
+
+
+def test_seeded_rain_is_reproducible():
+    image = Image.new('RGB', (64, 48), color=(100, 100, 100))
+    first = apply_rain_effect(image, 0.5, seed=7).tobytes()
+    assert apply_rain_effect(image, 0.5, seed=7).tobytes() == first
+    assert apply_rain_effect(image, 0.5, seed=8).tobytes() != first
+
+
+def test_plan_seed_depends_on_source_plan_and_base_seed():
+    seed = plan_seed(0, "a.png", RAIN.content_hash)
+    assert seed == plan_seed(0, "a.png", RAIN.content_hash)
+    assert seed != plan_seed(1, "a.png", RAIN.content_hash)
+    assert seed != plan_seed(0, "b.png", RAIN.content_hash)
+    assert seed != plan_seed(0, "a.png", BLUR.content_hash)
+
+
+def test_sources_with_the_same_stem_get_separate_outputs(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    Image.new('RGB', (48, 32), color='red').save(source / "a.png")
+    Image.new('RGB', (48, 32), color='blue').save(source / "a.jpg")
+    output_dir = str(tmp_path / "out")
+    assert export_augmentations(str(source), [RAIN], output_dir, workers=0)["written"] == 2
+
+    records = _manifest(output_dir)
+    assert len({record["output"] for record in records}) == 2
+    for record in records:
+        with open(os.path.join(output_dir, record["output"]), "rb") as f:
+            assert hashlib.sha256(f.read()).hexdigest() == record["sha256"]
+    assert export_augmentations(str(source), [RAIN], output_dir, workers=0)["skipped"] == 2
+
+
+def test_export_writes_every_variant_with_manifest(source_dir, tmp_path):
+    output_dir = str(tmp_path / "out")
+    summary = export_augmentations(source_dir, [RAIN, BLUR], output_dir, workers=0)
+    assert summary["written"] == 8 and summary["failed"] == 0
+
+    records = _manifest(output_dir)
+    assert {record["source"] for record in records} == {"image_0.png", "image_1.png", "image_2.png", "night/dark.jpg"}
+    assert {record["plan"] for record in records} == {RAIN.content_hash, BLUR.content_hash}
+    for record in records:
+        path = os.path.join(output_dir, record["output"])
+        assert record["output"].startswith(record["plan"][:12] + "/") and path.endswith(".png")
+        assert record["seed"] == plan_seed(0, record["source"], record["plan"])
+        with open(path, "rb") as f:
+            data = f.read()
+        assert hashlib.sha256(data).hexdigest() == record["sha256"]
+        assert record["bytes"] == len(data)
+
+    with open(os.path.join(output_dir, PLANS_NAME)) as f:
+        plans = {json.loads(line)["plan"]: json.loads(line)["distortions"] for line in f}
+    assert DistortionPlan.from_json(plans[RAIN.content_hash]) == RAIN
+
+
+def test_export_is_deterministic_across_runs_and_process_pool(source_dir, tmp_path):
+    export_augmentations(source_dir, [RAIN, BLUR], str(tmp_path / "a"), base_seed=3, workers=0)
+    export_augmentations(source_dir, [RAIN, BLUR], str(tmp_path / "b"), base_seed=3, workers=2)
+    export_augmentations(source_dir, [RAIN, BLUR], str(tmp_path / "c"), base_seed=4, workers=0)
+    checksums = {name: {r["output"]: r["sha256"] for r in _manifest(str(tmp_path / name))} for name in "abc"}
+    assert checksums["a"] == checksums["b"]
+    assert checksums["a"] != checksums["c"]
+
+
+def test_export_resumes_and_repairs_torn_manifest(source_dir, tmp_path):
+    output_dir = str(tmp_path / "out")
+    export_augmentations(source_dir, [RAIN], output_dir, workers=0)
+    records = _manifest(output_dir)
+    # Simulate an interruption: drop one record, tear the last line and delete another variant's file
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        f.write(json.dumps(records[0]) + "\n" + json.dumps(records[1]) + "\n" + json.dumps(records[2])[:20])
+    os.remove(os.path.join(output_dir, records[1]["output"]))
+
+    summary = export_augmentations(source_dir, [RAIN], output_dir, workers=0)
+    assert summary == {"written": 3, "skipped": 1, "failed": 0, "errors": []}
+    assert len(read_manifest(output_dir)) == 4
+    assert {r["sha256"] for r in _manifest(output_dir)} >= {r["sha256"] for r in records}
+
+    summary = export_augmentations(source_dir, [RAIN], output_dir, workers=0)
+    assert summary["written"] == 0 and summary["skipped"] == 4
+
+
+def test_export_records_failures_without_stopping(source_dir, tmp_path):
+    with open(os.path.join(source_dir, "broken.png"), "wb") as f:
+        f.write(b"not a png")
+    output_dir = str(tmp_path / "out")
+    summary = export_augmentations(source_dir, [RAIN], output_dir, workers=0)
+    assert summary["written"] == 4 and summary["failed"] == 1
+    assert summary["errors"][0].startswith("broken.png")
+    assert all(record["source"] != "broken.png" for record in _manifest(output_dir))
+
+
+def test_load_plans_accepts_plan_json_distortion_lists_and_overlay_paths(tmp_path):
+    Image.new('RGBA', (8, 8), color=(255, 0, 0, 128)).save(tmp_path / "sticker.png")
+    (tmp_path / "plans.json").write_text(json.dumps([
+        RAIN.to_dict(),
+        [{"type": "Overlay", "intensity": 0.5, "overlay_image": "sticker.png"}],
+    ]))
+    plans = load_plans(str(tmp_path / "plans.json"))
+    assert plans[0] == RAIN
+    ref = plans[1].steps[0].param_dict["overlay_image"]
+    assert ref.startswith("sha256:") and ref in plans[1].payloads
+
+    (tmp_path / "plans.jsonl").write_text(RAIN.to_json() + "\n" + BLUR.to_json() + "\n")
+    assert load_plans(str(tmp_path / "plans.jsonl")) == [RAIN, BLUR]
+    (tmp_path / "single.json").write_text(json.dumps([{"type": "Rain", "intensity": 0.3}]))
+    assert load_plans(str(tmp_path / "single.json")) == [RAIN]
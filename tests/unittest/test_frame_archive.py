@@ -0,0 +1,95 @@
+import os
+import pickle
+import numpy as np
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from bulk import analyze_bulk_item, image_digest, prepare_bulk_item
+from dedup import hash_files
+from distortion_plan import DistortionPlan
+from frame_archive import ALIGNMENT, FrameArchive, is_archive, pack_images
+from red_teaming_utils import search_robustness
+from utils import open_image
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{'type': 'Blur', 'intensity': 0.3}])
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    directory = tmp_path / "images"
+    (directory / "cam2").mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for name, size in [("a.png", (40, 30)), ("b.jpg", (64, 48)), ("cam2/c.png", (33, 17))]:
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(directory / name)
+    (directory / "notes.txt").write_text("not an image")
+    return directory
+
+
+@pytest.fixture
+def archive(source_dir, tmp_path):
+    path = str(tmp_path / "images.frames")
+    assert pack_images(str(source_dir), path, workers=2) == 3
+    archive = FrameArchive(path)
+    yield archive
+    archive.close()
+
+
+def test_frames_match_decoded_sources(archive, source_dir):
+    assert is_archive(archive.path)
+    assert archive.names == ["a.png", "b.jpg", "cam2/c.png"]
+    for index, name in enumerate(archive.names):
+        with Image.open(source_dir / name) as image:
+            expected = np.asarray(image.convert("RGB"))
+        frame = archive.frame(index)
+        assert np.array_equal(frame, expected)
+        assert archive._frames[index]["offset"] % ALIGNMENT == 0
+    assert archive.index_of("cam2/c.png") == 2
+
+
+def test_frames_are_views_of_the_mapping(archive):
+    frame = archive.frame(1)
+    assert np.shares_memory(frame, archive._data)
+    assert not frame.flags.writeable
+
+
+def test_archive_frames_act_like_their_source_files(archive, source_dir):
+    item = archive.items()[0]
+    source = str(source_dir / "a.png")
+    assert item.name == "a.png"
+    assert image_digest(item) == image_digest(source)
+    assert open_image(item).size == (40, 30)
+    assert prepare_bulk_item(item, PLAN.compile()) == prepare_bulk_item(source, PLAN.compile())
+    assert hash_files([item]) == hash_files([source])
+
+    row = analyze_bulk_item(item, PLAN, "Describe", "models/fake-flash", None, FIELDS, backend=FakeBackend())
+    assert row["Image"] == "a.png"
+
+
+def test_search_robustness_accepts_archive_frames(archive):
+    results = search_robustness(archive.items()[:1], ["Blur"], "Describe", "models/fake-flash", None, FIELDS,
+                                backend=FakeBackend(), tolerance=0.25, max_workers=1)
+    assert results[0]["Image"] == "a.png"
+
+
+def test_max_size_downscales_and_changes_digest(source_dir, tmp_path):
+    path = str(tmp_path / "small.frames")
+    pack_images(str(source_dir), path, max_size=(32, 32))
+    archive = FrameArchive(path)
+    assert [archive.frame(i).shape for i in range(len(archive))] == [(24, 32, 3), (24, 32, 3), (16, 32, 3)]
+    assert archive.items()[0].digest != image_digest(str(source_dir / "a.png"))
+
+
+def test_archive_pickles_by_path(archive):
+    item = pickle.loads(pickle.dumps(archive.items()[2]))
+    assert item.archive.path == archive.path
+    assert np.array_equal(item.archive.frame(2), archive.frame(2))
+
+
+def test_empty_folder_gives_empty_archive(tmp_path):
+    (tmp_path / "empty").mkdir()
+    path = str(tmp_path / "empty.frames")
+    assert pack_images(str(tmp_path / "empty"), path) == 0
+    assert len(FrameArchive(path)) == 0
+    assert sorted(os.listdir(tmp_path)) == ["empty", "empty.frames", "empty.frames.index.json"]
@@ -0,0 +1,95 @@
+import time
+import threading
+import pytest
+from backends import FakeBackend
+from hedging import DeadlineExceeded, HedgingBackend, LatencyTracker
+from utils import get_gemini_response
+
+
+class SlowFirstBackend:
+    """Answers the first request after `slow` seconds and every later one after `fast` seconds."""
+
+    def __init__(self, slow=1.0, fast=0.01):
+        self.slow = slow
+        self.fast = fast
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model_name, content, timeout=None):
+        with self._lock:
+            self.calls += 1
+            delay = self.slow if self.calls == 1 else self.fast
+        time.sleep(delay)
+        return f"response {delay}"
+
+
+def warm_tracker(latency=0.01, samples=20):
+    tracker = LatencyTracker()
+    for _ in range(samples):
+        tracker.record(latency)
+    return tracker
+
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(50) is None
+    for value in range(1, 201):
+        tracker.record(value / 1000)
+    assert len(tracker) == 100
+    assert tracker.percentile(50) == pytest.approx(0.1505)
+    assert set(tracker.summary()) == {"p50", "p95", "p99"}
+
+
+def test_deadline_abandons_slow_request():
+    backend = HedgingBackend(FakeBackend(latency_mean=2.0), timeout=0.1)
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        backend.generate_content("models/fake-flash", ["prompt"])
+    assert time.perf_counter() - start < 0.5
+    assert backend.stats["deadline_exceeded"] == 1
+    backend.shutdown()
+
+
+def test_hedge_answers_first():
+    backend = HedgingBackend(SlowFirstBackend(), hedge_percentile=95, hedge_budget=1.0, tracker=warm_tracker())
+    start = time.perf_counter()
+    assert backend.generate_content("model", ["prompt"]) == "response 0.01"
+    assert time.perf_counter() - start < 0.5
+    assert backend.stats["hedges"] == 1
+    assert backend.stats["hedge_wins"] == 1
+    backend.shutdown()
+
+
+def test_hedges_respect_budget():
+    backend = HedgingBackend(SlowFirstBackend(slow=0.2), hedge_percentile=95, hedge_budget=0.0, tracker=warm_tracker())
+    assert backend.generate_content("model", ["prompt"]) == "response 0.2"
+    assert backend.stats["hedges"] == 0
+    backend.shutdown()
+
+
+def test_no_hedging_before_min_samples():
+    backend = HedgingBackend(SlowFirstBackend(slow=0.2), hedge_percentile=95, hedge_budget=1.0,
+                             tracker=warm_tracker(samples=5))
+    assert backend.generate_content("model", ["prompt"]) == "response 0.2"
+    assert backend.stats["hedges"] == 0
+    backend.shutdown()
+
+
+def test_errors_propagate():
+    class FailingBackend:
+        def generate_content(self, model_name, content):
+            raise ValueError("bad request")
+
+    backend = HedgingBackend(FailingBackend())
+    with pytest.raises(ValueError):
+        backend.generate_content("model", ["prompt"])
+    backend.shutdown()
+
+
+def test_get_gemini_response_reports_deadline():
+    backend = HedgingBackend(FakeBackend(latency_mean=2.0), timeout=0.1)
+    text, json_response = get_gemini_response("prompt", None, "models/fake-flash", None, ["overall_safety"],
+                                              backend=backend)
+    assert "error" in json_response
+    assert "within" in text
+    backend.shutdown()
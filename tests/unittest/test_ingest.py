@@ -0,0 +1,82 @@
+import os
+import json
+import importlib.util
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from bulk import analyze_bulk_item
+from distortion_plan import EMPTY_PLAN
+from ingest import (
+    iter_image_sequence,
+    iter_video_frames,
+    iter_frames,
+    detect_scene_changes,
+    frame_to_file,
+    Frame
+)
+
+
+def write_sequence(directory, colors):
+    for i, color in enumerate(colors):
+        Image.new('RGB', (32, 24), color=color).save(os.path.join(directory, f"frame_{i:04d}.png"))
+
+
+def write_gif(path, colors, duration=100):
+    frames = [Image.new('RGB', (32, 24), color=color) for color in colors]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=duration, loop=0)
+
+
+def test_image_sequence_fixed_stride(tmp_path):
+    write_sequence(tmp_path, [(i * 10, 0, 0) for i in range(10)])
+    frames = list(iter_image_sequence(str(tmp_path), stride=3, fps=10))
+    assert [f.index for f in frames] == [0, 3, 6, 9]
+    assert [f.timestamp for f in frames] == [0.0, 0.3, 0.6, 0.9]
+
+
+def test_image_sequence_time_based_sampling(tmp_path):
+    write_sequence(tmp_path, [(i * 10, 0, 0) for i in range(10)])
+    frames = list(iter_frames(str(tmp_path), interval=0.25, fps=10))
+    assert [f.index for f in frames] == [0, 3, 5, 8]
+
+
+def test_time_based_sampling_requires_timestamps(tmp_path):
+    write_sequence(tmp_path, [(0, 0, 0), (10, 0, 0)])
+    with pytest.raises(ValueError):
+        list(iter_image_sequence(str(tmp_path), interval=1.0))
+
+
+def test_animated_gif_frames_have_timestamps(tmp_path):
+    path = str(tmp_path / "clip.gif")
+    write_gif(path, [(0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255)], duration=200)
+    frames = list(iter_video_frames(path, stride=2))
+    assert [f.index for f in frames] == [0, 2]
+    assert frames[1].timestamp == pytest.approx(0.4)
+    assert frames[0].image.mode == 'RGB'
+
+
+@pytest.mark.skipif(importlib.util.find_spec("cv2") is not None, reason="OpenCV is installed")
+def test_video_without_opencv(tmp_path):
+    with pytest.raises(ImportError):
+        list(iter_video_frames(str(tmp_path / "clip.mp4")))
+
+
+@pytest.mark.parametrize("method", ["Histogram", "Difference"])
+def test_detect_scene_changes(method):
+    colors = [(0, 0, 0)] * 5 + [(255, 255, 255)] * 5 + [(0, 0, 0)]
+    frames = (Frame(i, None, Image.new('RGB', (32, 24), color=c)) for i, c in enumerate(colors))
+    assert [f.index for f in detect_scene_changes(frames, method=method, threshold=0.2)] == [0, 5, 10]
+
+
+def test_detect_scene_changes_disabled():
+    frames = [Frame(i, None, Image.new('RGB', (8, 8))) for i in range(3)]
+    assert len(list(detect_scene_changes(iter(frames), method="None"))) == 3
+
+
+def test_frame_metadata_reaches_results(tmp_path):
+    frame = Frame(120, 4.0, Image.new('RGB', (32, 24), color='red'))
+    file = frame_to_file(str(tmp_path / "dashcam.mp4"), frame)
+    assert file.name == "dashcam.mp4#000120"
+    result = analyze_bulk_item(file, EMPTY_PLAN, "Test input", "models/fake-flash", None, ["overall_safety"], backend=FakeBackend())
+    assert result["Frame Index"] == 120
+    assert result["Timestamp"] == 4.0
+    assert "overall_safety" in json.loads(result["JSON Response"])
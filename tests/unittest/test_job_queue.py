@@ -0,0 +1,137 @@
+import json
+import time
+import multiprocessing
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from distortion_plan import DistortionPlan
+from job_queue import JobQueue, run_worker
+from results_store import ResultsStore
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{"type": "Brightness", "intensity": 0.3}])
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"image_{i}.png"
+        Image.new('RGB', (32, 24), color=(i * 40, 0, 0)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout=30)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_is_idempotent(queue, images):
+    assert queue.enqueue(images, PLAN, "Prompt", "models/fake-flash", fields=FIELDS) == 6
+    assert queue.enqueue(images, PLAN, "Prompt", "models/fake-flash", fields=FIELDS) == 0
+    assert queue.enqueue(images[:2], PLAN, "Other prompt", "models/fake-flash", fields=FIELDS) == 2
+    assert queue.counts()["queued"] == 8
+
+
+def test_lease_orders_by_priority_then_age(queue, images):
+    queue.enqueue(images[:3], PLAN, "Low", "models/fake-flash", fields=FIELDS)
+    queue.enqueue(images[3:], PLAN, "High", "models/fake-flash", fields=FIELDS, priority=5)
+    leased = queue.lease("worker-a", limit=4)
+    assert [job["prompt"] for job in leased] == ["High", "High", "High", "Low"]
+    assert [job["image_path"] for job in leased[:3]] == images[3:]
+    assert all(job["attempts"] == 1 and job["lease_owner"] == "worker-a" for job in leased)
+    assert len(queue.lease("worker-b", limit=10)) == 2
+
+
+def test_expired_lease_is_taken_over_and_stale_worker_cannot_complete(tmp_path, images):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout=0.05)
+    queue.enqueue(images[:1], PLAN, "Prompt", "models/fake-flash", fields=FIELDS)
+    [job] = queue.lease("worker-a")
+    assert queue.lease("worker-b") == []
+    time.sleep(0.1)
+    [retaken] = queue.lease("worker-b")
+    assert retaken["job_id"] == job["job_id"] and retaken["attempts"] == 2
+    assert not queue.complete(job["job_id"], "worker-a", {"AI Response": "stale"})
+    assert queue.complete(job["job_id"], "worker-b", {"AI Response": "fresh"})
+    assert queue.results() == [{"AI Response": "fresh"}]
+
+
+def test_extend_lease_keeps_job_with_its_worker(tmp_path, images):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout=0.2)
+    queue.enqueue(images[:1], PLAN, "Prompt", "models/fake-flash", fields=FIELDS)
+    [job] = queue.lease("worker-a")
+    time.sleep(0.12)
+    assert queue.extend_lease([job["job_id"]], "worker-a") == 1
+    time.sleep(0.12)
+    assert queue.lease("worker-b") == []
+
+
+def test_failures_retry_with_backoff_then_dead_letter(queue, images):
+    queue.enqueue(images[:1], PLAN, "Prompt", "models/fake-flash", fields=FIELDS, max_attempts=2)
+    [job] = queue.lease("worker-a")
+    assert queue.fail(job["job_id"], "worker-a", "boom", retry_delay=0.05) == "queued"
+    assert queue.lease("worker-a") == []
+    time.sleep(0.1)
+    [job] = queue.lease("worker-a")
+    assert queue.fail(job["job_id"], "worker-a", "boom again") == "dead"
+    assert queue.counts()["dead"] == 1
+    [dead] = queue.dead_letters()
+    assert dead["last_error"] == "boom again" and dead["attempts"] == 2
+
+    assert queue.requeue_dead() == 1
+    assert queue.lease("worker-a")[0]["attempts"] == 1
+
+
+def test_expired_final_lease_is_dead_lettered(tmp_path, images):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout=0.05, max_attempts=1)
+    queue.enqueue(images[:1], PLAN, "Prompt", "models/fake-flash", fields=FIELDS)
+    queue.lease("worker-a")
+    time.sleep(0.1)
+    assert queue.lease("worker-b") == []
+    assert queue.dead_letters()[0]["last_error"] == "Lease expired"
+
+
+def test_worker_runs_bulk_pipeline(queue, images, tmp_path):
+    queue.enqueue(images, PLAN, "Prompt", "models/fake-flash", fields=FIELDS, run_id="audit-1")
+    stats = run_worker(queue, "worker-a", backend=FakeBackend(), batch_size=4, stop_when_empty=True)
+    assert stats == {"completed": 6, "retried": 0, "dead": 0, "lost": 0}
+    results = queue.results("audit-1")
+    assert [row["Image"] for row in results] == [f"image_{i}.png" for i in range(6)]
+    assert all(set(json.loads(row["JSON Response"])) == set(FIELDS) for row in results)
+    assert results[0]["Distortions"] == PLAN.describe()
+
+    store = ResultsStore(":memory:")
+    run_id = queue.export_results(store, "audit-1")
+    assert len(store.query_results(run_id=run_id)) == 6
+
+
+def test_worker_retries_rate_limited_requests(queue, images):
+    queue.enqueue(images[:2], PLAN, "Prompt", "models/fake-flash", fields=FIELDS, max_attempts=2)
+    stats = run_worker(queue, "worker-a", backend=FakeBackend(rate_limit_rate=1.0), retry_delay=0.01,
+                       stop_when_empty=True, poll_interval=0.01)
+    assert stats == {"completed": 0, "retried": 2, "dead": 2, "lost": 0}
+    assert "429" in queue.dead_letters()[0]["last_error"]
+
+
+def _work(path, worker_id):
+    queue = JobQueue(path)
+    stats = run_worker(queue, worker_id, backend=FakeBackend(latency_mean=0.01), stop_when_empty=True,
+                       poll_interval=0.01)
+    queue.close()
+    return stats
+
+
+def test_several_worker_processes_share_the_queue(tmp_path, images):
+    path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(path)
+    prompts = [f"Prompt {i}" for i in range(10)]
+    for prompt in prompts:
+        queue.enqueue(images, PLAN, prompt, "models/fake-flash", fields=FIELDS)
+    with multiprocessing.get_context("fork").Pool(3) as pool:
+        all_stats = pool.starmap(_work, [(path, f"worker-{i}") for i in range(3)])
+    assert sum(stats["completed"] for stats in all_stats) == 60
+    assert sum(stats["lost"] for stats in all_stats) == 0
+    assert queue.counts() == {"queued": 0, "leased": 0, "done": 60, "dead": 0}
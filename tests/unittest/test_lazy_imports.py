@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+import pytest
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+HEAVY_MODULES = ["google.generativeai", "scipy", "pandas"]
+
+
+def loaded_modules(statement):
+    code = f"import sys\n{statement}\nprint('\\n'.join(sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                               cwd=SRC_DIR, env=dict(os.environ, PYTHONPATH=SRC_DIR), check=True)
+    return set(completed.stdout.split())
+
+
+@pytest.mark.parametrize("module", ["utils", "bulk", "distortion_plan", "bulk_settings", "backends"])
+def test_library_modules_do_not_load_heavy_dependencies(module):
+    modules = loaded_modules(f"import {module}")
+    assert module in modules
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules, f"importing {module} loads {heavy}"
+
+
+def test_warp_loads_scipy_on_first_use():
+    modules = loaded_modules(
+        "from PIL import Image\n"
+        "from utils import apply_warp_effect\n"
+        "apply_warp_effect(Image.new('RGB', (8, 8)), 0.5, {})"
+    )
+    assert "scipy.ndimage" in modules
+    assert "google.generativeai" not in modules
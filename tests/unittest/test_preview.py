@@ -0,0 +1,82 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from bulk import image_digest, prepare_bulk_item
+from distortion_plan import DistortionPlan, plan_seed
+from preview import load_proxy, render_preview
+from utils import apply_distortions
+
+SCALED_DISTORTIONS = [
+    {'type': 'Blur', 'intensity': 0.8},
+    {'type': 'Rain', 'intensity': 0.6},
+    {'type': 'Warp', 'intensity': 0.8, 'warp_params': {'wave_amplitude': 40, 'wave_frequency': 0.02, 'bulge_factor': 0}},
+    {'type': 'Motion Blur', 'intensity': 0.8, 'angle': 0},
+]
+
+
+def create_scene(size=(1280, 960)):
+    """Stripes and a gradient, so pixel-sized distortions change the image visibly."""
+    width, height = size
+    x = np.arange(width)[None, :, None]
+    y = np.arange(height)[:, None, None]
+    pixels = np.broadcast_to(((x // 24) % 2) * 180 + y * 60 // height, (height, width, 3))
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+def difference(first, second):
+    return np.abs(np.asarray(first, dtype=np.float32) - np.asarray(second, dtype=np.float32)).mean()
+
+
+@pytest.mark.parametrize("distortion", SCALED_DISTORTIONS, ids=lambda d: d['type'])
+def test_scale_one_matches_full_render(distortion):
+    image = create_scene((160, 120))
+    expected = apply_distortions(image.copy(), [distortion], seed=3)
+    actual = DistortionPlan.from_distortions([distortion]).compile().apply(image.copy(), seed=3, scale=1.0)
+    assert np.array_equal(np.asarray(expected), np.asarray(actual))
+
+
+@pytest.mark.parametrize("distortion", SCALED_DISTORTIONS, ids=lambda d: d['type'])
+def test_proxy_preview_looks_like_downscaled_full_render(distortion):
+    full = create_scene()
+    compiled = DistortionPlan.from_distortions([distortion]).compile()
+    proxy = full.copy()
+    proxy.thumbnail((320, 320))
+
+    reference = compiled.apply(full, seed=0).convert('RGB').resize(proxy.size, Image.BILINEAR)
+    scaled = render_preview(compiled, proxy, full.size, seed=0).convert('RGB')
+    unscaled = compiled.apply(proxy, seed=0).convert('RGB')
+    assert difference(scaled, reference) < difference(unscaled, reference)
+
+
+def test_load_proxy_bounds_size_and_reports_full_size():
+    buffer = io.BytesIO()
+    create_scene((2000, 1000)).save(buffer, format='PNG')
+    buffer.seek(5)
+    proxy, full_size = load_proxy(buffer, max_size=(400, 400))
+    assert full_size == (2000, 1000)
+    assert proxy.size == (400, 200)
+    # The source is rewound for the full-size render
+    assert buffer.tell() == 0
+
+
+def test_load_proxy_reads_jpeg_paths(tmp_path):
+    path = tmp_path / "frame.jpg"
+    create_scene((1600, 1200)).save(path, format='JPEG')
+    proxy, full_size = load_proxy(str(path), max_size=(200, 200))
+    assert full_size == (1600, 1200)
+    assert max(proxy.size) == 200
+
+
+def test_preview_seeded_like_bulk_render_matches_it():
+    buffer = io.BytesIO()
+    create_scene().save(buffer, format='PNG')
+    plan = DistortionPlan.from_distortions([{'type': 'Rain', 'intensity': 0.8}])
+    full = Image.open(io.BytesIO(prepare_bulk_item(buffer, plan.compile()))).convert('RGB')
+
+    proxy, full_size = load_proxy(buffer, max_size=(320, 320))
+    reference = full.resize(proxy.size, Image.BILINEAR)
+    seed = plan_seed(0, image_digest(buffer), plan.content_hash)
+    matching = render_preview(plan.compile(), proxy, full_size, seed=seed).convert('RGB')
+    other = render_preview(plan.compile(), proxy, full_size, seed=seed + 1).convert('RGB')
+    assert difference(matching, reference) < difference(other, reference)
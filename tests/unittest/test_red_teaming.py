@@ -6,7 +6,44 @@ import os
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src')))
 
-from red_teaming_utils import run_prompt_injection_test, analyze_safety_of_response
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from backends import FakeBackend, FakeResponse
+from red_teaming_utils import (
+    run_prompt_injection_test, analyze_safety_of_response, apply_occlusion, response_changed,
+    find_threshold, search_robustness, EvaluationMemo, exhaustive_sweep_calls
+)
+
+
+class OcclusionSensitiveBackend:
+    """Reports the scene as unsafe once more than `limit` of the image is black."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model_name, content):
+        with self._lock:
+            self.calls += 1
+        image = next(part for part in content if isinstance(part, dict))
+        pixels = np.asarray(Image.open(io.BytesIO(image["data"])).convert("L"))
+        black = float((pixels == 0).mean())
+        payload = {"overall_safety": "Unsafe" if black > self.limit else "Safe",
+                   "potential_hazards": ["wet road surface"]}
+        return FakeResponse(f"Analysis\n===JSON===\n{json.dumps(payload)}\n===JSON===")
+
+
+def png_file(name, color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (80, 60), color=color).save(buffer, format="PNG")
+    buffer.name = name
+    buffer.seek(0)
+    return buffer
 
 class TestRedTeamingUtils(unittest.TestCase):
     def test_run_prompt_injection_test(self):
@@ -30,5 +67,105 @@ class TestRedTeamingUtils(unittest.TestCase):
         self.assertTrue(analysis['is_safe'])
         self.assertEqual(len(analysis['flags']), 0)
 
+class TestRobustnessSearch(unittest.TestCase):
+    def test_occlusion_covers_requested_area(self):
+        image = Image.new("RGB", (100, 80), color="white")
+        covered = (np.asarray(apply_occlusion(image, 0.25).convert("L")) == 0).mean()
+        self.assertAlmostEqual(covered, 0.25, delta=0.01)
+        self.assertEqual((np.asarray(apply_occlusion(image, 0).convert("L")) == 0).mean(), 0)
+
+    def test_response_changed(self):
+        baseline = {"overall_safety": "Safe", "potential_hazards": ["a", "b"]}
+        self.assertFalse(response_changed(baseline, {"overall_safety": "safe ", "potential_hazards": ["B", "a"]}))
+        self.assertTrue(response_changed(baseline, {"overall_safety": "Unsafe", "potential_hazards": ["a", "b"]}))
+        self.assertTrue(response_changed(baseline, {"overall_safety": "Safe", "potential_hazards": ["c"]}))
+        self.assertFalse(response_changed(baseline, {"overall_safety": "Safe", "potential_hazards": ["a", "b", "c"]}))
+        self.assertTrue(response_changed(baseline, {"error": "No JSON found in AI response"}))
+
+    def test_find_threshold_bisects_to_tolerance(self):
+        calls = []
+
+        def evaluate(intensity):
+            calls.append(intensity)
+            return intensity
+
+        found = find_threshold(evaluate, lambda x: x >= 0.37, tolerance=0.01)
+        self.assertLessEqual(found["bracket"][0], 0.37)
+        self.assertGreaterEqual(found["threshold"], 0.37)
+        self.assertLessEqual(found["threshold"] - found["bracket"][0], 0.01)
+        # 1 + log2(1 / 0.01) evaluations instead of 100
+        self.assertLessEqual(len(calls), 8)
+
+    def test_find_threshold_reports_robust_inputs(self):
+        found = find_threshold(lambda x: x, lambda x: False)
+        self.assertIsNone(found["threshold"])
+        self.assertEqual(len(found["evaluations"]), 1)
+
+    def test_find_threshold_grid_finds_first_changed_bracket(self):
+        # Changes between 0.2 and 0.3 and flips back above 0.6, which plain bisection would miss
+        changed = lambda x: 0.25 <= x <= 0.6  # noqa: E731
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            found = find_threshold(lambda x: x, changed, tolerance=0.01, grid_points=9, executor=executor)
+        self.assertAlmostEqual(found["threshold"], 0.25, delta=0.01)
+        self.assertIsNone(find_threshold(lambda x: x, changed, tolerance=0.01)["threshold"])
+
+    def test_memo_computes_each_key_once_across_threads(self):
+        memo = EvaluationMemo()
+        computed = []
+
+        def compute():
+            computed.append(1)
+            return "value"
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: memo.get_or_compute("key", compute), range(32)))
+        self.assertEqual(results, ["value"] * 32)
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(memo.stats, {"hits": 31, "calls": 1})
+
+    def test_search_finds_per_image_thresholds_with_few_calls(self):
+        backend = OcclusionSensitiveBackend(limit=0.3)
+        files = [png_file("a.png", "white"), png_file("b.png", "gray"), png_file("c.png", "white")]
+        memo = EvaluationMemo()
+        rows = search_robustness(files, ["Occlusion", "Brightness"], "Identify hazards", "models/fake-flash",
+                                 None, ["overall_safety", "potential_hazards"], backend=backend,
+                                 tolerance=0.02, max_workers=4, memo=memo)
+        by_key = {(row["Image"], row["Distortion"]): row for row in rows}
+        for name in ["a.png", "b.png", "c.png"]:
+            occlusion = by_key[(name, "Occlusion")]
+            self.assertAlmostEqual(occlusion["Threshold"], 0.3, delta=0.03)
+            self.assertEqual(occlusion["Baseline Safety"], "Safe")
+            self.assertEqual(occlusion["Safety At Threshold"], "Unsafe")
+            self.assertIsNone(by_key[(name, "Brightness")]["Threshold"])
+        # a.png and c.png are identical, so c.png is answered from the memo
+        self.assertLess(backend.calls, 2 * 10)
+        self.assertEqual(backend.calls, memo.stats["calls"])
+        self.assertLess(backend.calls, exhaustive_sweep_calls(3, 2, tolerance=0.02) / 10)
+
+        # Re-running the search is served entirely from the memo
+        search_robustness(files, ["Occlusion"], "Identify hazards", "models/fake-flash", None,
+                          ["overall_safety", "potential_hazards"], backend=backend, memo=memo)
+        self.assertEqual(backend.calls, memo.stats["calls"])
+
+    def test_rate_limited_search_fails_and_is_not_memoised(self):
+        files = [png_file("a.png", "white")]
+        memo = EvaluationMemo()
+        rows = search_robustness(files, ["Occlusion"], "Identify hazards", "models/fake-flash", None,
+                                 ["overall_safety", "potential_hazards"], backend=FakeBackend(rate_limit_rate=1.0),
+                                 memo=memo)
+        self.assertIsNone(rows[0]["Threshold"])
+        self.assertIsNone(rows[0]["Bracket"])
+        self.assertIn("429", rows[0]["Error"])
+        self.assertEqual(len(memo), 0)
+
+        # Once the backend recovers, the same memo retries the calls
+        backend = OcclusionSensitiveBackend(limit=0.3)
+        rows = search_robustness(files, ["Occlusion"], "Identify hazards", "models/fake-flash", None,
+                                 ["overall_safety", "potential_hazards"], backend=backend, memo=memo)
+        self.assertIsNone(rows[0]["Error"])
+        self.assertAlmostEqual(rows[0]["Threshold"], 0.3, delta=0.03)
+
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import io
+import json
+import time
+import pytest
+from results_store import ResultsStore, prompt_digest
+from distortion_plan import DistortionPlan, EMPTY_PLAN
+from bulk import image_digest
+
+BLUR_PLAN = DistortionPlan.from_distortions([{"type": "Blur", "intensity": 0.3}])
+
+
+def make_result(name, hazards, safety="Moderate", prompt="Analyze the road."):
+    return {
+        "Image": name,
+        "Distortions": "",
+        "Input Text": prompt,
+        "AI Response": "text",
+        "JSON Response": json.dumps({"potential_hazards": hazards, "overall_safety": safety}, indent=2)
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    yield store
+    store.close()
+
+
+def test_record_and_query_keeps_lists(store):
+    run_id = store.start_run(model="model-a")
+    store.record_results(run_id, [
+        {"result": make_result("a.png", ["Pothole", "Cyclist"]), "image_hash": "h1", "plan": BLUR_PLAN, "model": "model-a"},
+        {"result": make_result("b.png", ["Pothole"]), "image_hash": "h2", "plan": EMPTY_PLAN, "model": "model-a"},
+    ])
+
+    rows = store.query_results(run_id=run_id)
+    assert list(rows["image_name"]) == ["a.png", "b.png"]
+    assert rows["potential_hazards"].iloc[0] == ["Pothole", "Cyclist"]
+    assert rows["plan_hash"].iloc[0] == BLUR_PLAN.content_hash
+    assert rows["prompt_hash"].iloc[0] == prompt_digest("Analyze the road.")
+    assert DistortionPlan.from_json(rows["plan_json"].iloc[0]) == BLUR_PLAN
+    assert store.list_runs()["item_count"].iloc[0] == 2
+
+
+def test_field_value_counts_across_runs(store):
+    for model, hazards in [("model-a", ["Pothole", "Cyclist"]), ("model-b", ["Cyclist"])]:
+        run_id = store.start_run(model=model)
+        store.record_results(run_id, [
+            {"result": make_result(f"{i}.png", hazards), "image_hash": str(i), "model": model} for i in range(3)
+        ])
+
+    counts = store.field_value_counts("potential_hazards", group_by="model")
+    by_key = {(row.model, row.value): (row.count, row.share) for row in counts.itertuples()}
+    assert by_key[("model-a", "Pothole")] == (3, 1.0)
+    assert by_key[("model-a", "Cyclist")] == (3, 1.0)
+    assert by_key[("model-b", "Cyclist")] == (3, 1.0)
+    assert ("model-b", "Pothole") not in by_key
+
+    only_b = store.field_value_counts("potential_hazards", group_by=None, model="model-b")
+    assert list(only_b["value"]) == ["Cyclist"]
+
+    totals = store.count_results(group_by="model")
+    assert dict(zip(totals["model"], totals["results"])) == {"model-a": 3, "model-b": 3}
+
+
+def test_malformed_json_response_is_stored_without_fields(store):
+    run_id = store.start_run()
+    result = make_result("a.png", [])
+    result["JSON Response"] = "not json"
+    store.record_results(run_id, [{"result": result}])
+    assert len(store.query_results()) == 1
+    assert store.fields() == []
+
+
+def test_rejects_unknown_columns(store):
+    with pytest.raises(ValueError):
+        store.query_results(json_response="x")
+    with pytest.raises(ValueError):
+        store.field_value_counts("potential_hazards", group_by="ai_response")
+
+
+def test_aggregation_is_fast_at_scale(store):
+    hazards = ["Pothole", "Cyclist", "Pedestrian", "Poor lighting", "Faded markings"]
+    for run in range(10):
+        run_id = store.start_run(model=f"model-{run % 2}")
+        store.record_results(run_id, [
+            {"result": make_result(f"{i}.png", hazards[i % 5:i % 5 + 2]), "image_hash": str(i), "model": f"model-{run % 2}"}
+            for i in range(2000)
+        ])
+
+    start = time.perf_counter()
+    counts = store.field_value_counts("potential_hazards", group_by="model", model="model-1")
+    elapsed = time.perf_counter() - start
+    assert counts["count"].sum() == 5 * 2000 * 9 // 5
+    assert elapsed < 1.0
+
+
+def test_image_digest_matches_for_path_and_upload(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"image bytes")
+    upload = io.BytesIO(b"image bytes")
+    assert image_digest(str(path)) == image_digest(upload)
@@ -0,0 +1,98 @@
+import time
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from distortion_plan import DistortionPlan, EMPTY_PLAN
+from results_store import ResultsStore
+from scoring import (
+    describe_plan,
+    jaccard_similarity,
+    tfidf_cosine_similarity,
+    score_degradation
+)
+
+BLUR_LOW = DistortionPlan.from_distortions([{"type": "Blur", "intensity": 0.2}])
+BLUR_HIGH = DistortionPlan.from_distortions([{"type": "Blur", "intensity": 0.8}])
+
+
+def test_jaccard_similarity():
+    left = [["Pothole", "Cyclist"], ["Pothole"], [], ["a"]]
+    right = [["cyclist", "pothole"], ["Pothole", "Glare"], [], []]
+    assert jaccard_similarity(left, right) == pytest.approx([1.0, 0.5, 1.0, 0.0])
+
+
+def test_tfidf_cosine_similarity():
+    left = ["A wet road with a cyclist", "Clear sunny day", "", "Night"]
+    right = ["a wet road with a cyclist", "Heavy fog on the motorway", "", ""]
+    similarity = tfidf_cosine_similarity(left, right)
+    assert similarity[0] == pytest.approx(1.0)
+    assert similarity[1] == pytest.approx(0.0)
+    assert similarity[2] == 1.0
+    assert similarity[3] == 0.0
+
+
+def test_describe_plan():
+    assert describe_plan(EMPTY_PLAN.to_json()) == ("None", 0.0)
+    assert describe_plan(BLUR_HIGH.to_json()) == ("Blur", 0.8)
+    distortion, intensity = describe_plan(DistortionPlan.from_distortions([{"type": "Color"}]).to_json())
+    assert distortion == "Color" and np.isnan(intensity)
+
+
+def record(plan, image_hash, hazards, description, model="model-a"):
+    return {
+        "result": {
+            "Image": f"{image_hash}.png",
+            "Input Text": "Analyze the road.",
+            "JSON Response": json.dumps({"potential_hazards": hazards, "scene_description": description}),
+        },
+        "image_hash": image_hash,
+        "plan": plan,
+        "model": model,
+    }
+
+
+def test_score_degradation_from_store(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    run_id = store.start_run()
+    store.record_results(run_id, [
+        record(EMPTY_PLAN, "img1", ["Pothole", "Cyclist"], "Wet road with a cyclist"),
+        record(BLUR_LOW, "img1", ["Pothole", "Cyclist"], "Wet road with a cyclist"),
+        record(BLUR_HIGH, "img1", ["Pothole"], "Blurry scene"),
+        # No clean baseline for this image, so it is not scored
+        record(BLUR_HIGH, "img2", ["Pothole"], "Blurry scene"),
+        # Different model, so it does not pair with model-a's baseline
+        record(BLUR_LOW, "img1", ["Pothole"], "Wet road", model="model-b"),
+    ])
+    scores, summary = score_degradation(store.query_results(limit=None), ["potential_hazards", "scene_description"])
+    store.close()
+
+    assert len(scores) == 2
+    by_intensity = summary.set_index("intensity")
+    assert by_intensity.loc[0.2, "degradation"] == pytest.approx(0.0)
+    assert by_intensity.loc[0.8, "potential_hazards_similarity"] == pytest.approx(0.5)
+    assert by_intensity.loc[0.8, "degradation"] > 0.5
+    assert list(summary["distortion"]) == ["Blur", "Blur"]
+
+
+def test_score_degradation_without_baseline_is_empty():
+    results = pd.DataFrame({"plan_json": [BLUR_LOW.to_json()], "image_hash": ["x"], "model": ["m"],
+                            "prompt_hash": ["p"], "result_id": [1], "potential_hazards": [["a"]]})
+    scores, summary = score_degradation(results, ["potential_hazards"])
+    assert scores.empty and summary.empty
+
+
+def test_scores_100k_pairs_quickly():
+    rng = np.random.default_rng(0)
+    hazards = np.array(["pothole", "cyclist", "pedestrian", "glare", "fog", "debris", "animal", "ice"])
+    words = np.array(["wet", "road", "cyclist", "busy", "junction", "night", "clear", "lane", "truck", "sign"])
+    n = 100_000
+    left_lists = [list(hazards[rng.integers(0, 8, 3)]) for _ in range(n)]
+    right_lists = [list(hazards[rng.integers(0, 8, 3)]) for _ in range(n)]
+    left_text = [" ".join(words[rng.integers(0, 10, 12)]) for _ in range(n)]
+    right_text = [" ".join(words[rng.integers(0, 10, 12)]) for _ in range(n)]
+
+    start = time.perf_counter()
+    jaccard_similarity(left_lists, right_lists)
+    tfidf_cosine_similarity(left_text, right_text)
+    assert time.perf_counter() - start < 10
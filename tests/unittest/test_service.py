@@ -0,0 +1,174 @@
+import io
+import json
+import time
+import base64
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from service import AnalysisService, serve, parse_submission, InvalidRequest, QueueFull
+from utils import get_gemini_response, apply_distortions
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+DISTORTIONS = [{"type": "Brightness", "intensity": 0.3}, {"type": "Blur", "intensity": 0.1}]
+
+
+def create_test_image(color='red', size=(64, 48)):
+    return Image.new('RGB', size, color=color)
+
+
+def encoded(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def submission(color='red', prompt="Test input", **extra):
+    body = {"image": encoded(create_test_image(color)), "distortions": DISTORTIONS, "prompt": prompt,
+            "model": "models/fake-flash", "fields": FIELDS}
+    body.update(extra)
+    return body
+
+
+@pytest.fixture
+def running_service():
+    servers = []
+
+    def start(**kwargs):
+        service = AnalysisService(**kwargs)
+        server = serve(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return f"http://127.0.0.1:{server.server_address[1]}", service
+
+    yield start
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.stop()
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, json.loads(response.read()), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read()), e.headers
+
+
+def test_submit_and_fetch_result_end_to_end(running_service):
+    url, _ = running_service(backend=FakeBackend())
+    status, job, headers = request(f"{url}/analyses", submission())
+    assert status == 202
+    assert headers["Location"] == f"/analyses/{job['id']}"
+
+    status, result, _ = request(f"{url}/analyses/{job['id']}?wait=5")
+    assert status == 200
+    assert result["status"] == "done"
+    expected = get_gemini_response("Test input", apply_distortions(create_test_image(), DISTORTIONS),
+                                   "models/fake-flash", None, FIELDS, backend=FakeBackend())
+    assert (result["text_response"], result["json_response"]) == expected
+
+
+def test_full_queue_returns_429(running_service):
+    url, service = running_service(backend=FakeBackend(latency_mean=0.5), max_pending=2, batch_wait=0)
+    statuses = [request(f"{url}/analyses", submission(prompt=f"Prompt {i}"))[0] for i in range(2)]
+    status, body, headers = request(f"{url}/analyses", submission(prompt="Prompt 3"))
+    assert statuses == [202, 202]
+    assert status == 429
+    assert headers["Retry-After"] == "1"
+    assert service.metrics()["rejected"] == 1
+
+
+def test_submissions_are_micro_batched_and_identical_requests_shared():
+    service = AnalysisService(backend=FakeBackend(latency_mean=0.01), batch_size=8, batch_wait=0.2)
+    jobs = [service.submit(parse_submission(submission(prompt=f"Prompt {i % 4}"))) for i in range(16)]
+    service.start()
+    try:
+        for job in jobs:
+            assert job.done.wait(5)
+    finally:
+        service.stop()
+    metrics = service.metrics()
+    assert metrics["batches"] == 2
+    assert metrics["mean_batch_size"] == 8
+    # Four distinct prompts per batch
+    assert metrics["model_calls"] == 8
+    assert jobs[0].result == jobs[4].result
+    assert metrics["completed"] == 16 and metrics["pending"] == 0
+
+
+def test_health_and_metrics_endpoints(running_service):
+    url, _ = running_service(backend=FakeBackend())
+    request(f"{url}/analyses/{request(f'{url}/analyses', submission())[1]['id']}?wait=5")
+    status, health, _ = request(f"{url}/health")
+    assert status == 200
+    assert health["status"] == "ok" and health["pending"] == 0
+    status, metrics, _ = request(f"{url}/metrics")
+    assert metrics["completed"] == 1
+    assert metrics["latency_seconds"]["p50"] is not None
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"prompt": "no image"}, "image"),
+    ({"image": "not base64!"}, "decode"),
+    ({"image": base64.b64encode(b"not an image").decode()}, "decode"),
+    (submission(distortions=[{"type": "Melt", "intensity": 1}]), "Unknown distortion"),
+])
+def test_invalid_submissions_return_400(running_service, body, message):
+    url, _ = running_service(backend=FakeBackend())
+    status, response, _ = request(f"{url}/analyses", body)
+    assert status == 400
+    assert message in response["error"]
+
+
+def test_unknown_analysis_returns_404(running_service):
+    url, _ = running_service(backend=FakeBackend())
+    assert request(f"{url}/analyses/missing")[0] == 404
+
+
+def test_submit_raises_queue_full_without_http():
+    service = AnalysisService(backend=FakeBackend(), max_pending=1)
+    service.submit(parse_submission(submission()))
+    with pytest.raises(QueueFull):
+        service.submit(parse_submission(submission()))
+    with pytest.raises(InvalidRequest):
+        parse_submission({"image": ""})
+
+
+class BlockingBackend(FakeBackend):
+    """Fake backend that holds calls whose prompt mentions "slow" until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def generate_content(self, model_name, content, timeout=None):
+        if any("slow" in part for part in content if isinstance(part, str)):
+            self.release.wait(5)
+        return super().generate_content(model_name, content, timeout=timeout)
+
+
+def test_slow_call_does_not_block_later_batches():
+    backend = BlockingBackend()
+    service = AnalysisService(backend=backend, batch_size=4, batch_wait=0.01, max_workers=4).start()
+    try:
+        slow = service.submit(parse_submission(submission(prompt="slow")))
+        deadline = time.monotonic() + 5
+        while slow.status != "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Dispatched in a later batch than the slow call
+        fast = service.submit(parse_submission(submission(color='blue', prompt="fast")))
+        assert fast.done.wait(5)
+        assert not slow.done.is_set()
+        assert fast.image_bytes is None and fast.result[1]
+        backend.release.set()
+        assert slow.done.wait(5)
+    finally:
+        backend.release.set()
+        service.stop()
+    assert service.metrics()["pending"] == 0
@@ -0,0 +1,71 @@
+import random
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+import tiling
+from tiling import configure_tiling, strip_bounds, get_tiling_config
+from utils import apply_blur, apply_rain_effect, apply_warp_effect
+
+WARP_PARAMS = {"wave_amplitude": 20, "wave_frequency": 0.04, "bulge_factor": 30}
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, size=(301, 257, 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def small_tiles():
+    saved = get_tiling_config()
+    configure_tiling(memory_limit_mb=0.05, workers=4)
+    yield
+    configure_tiling(memory_limit_mb=saved["memory_limit"] / (1024 * 1024), workers=saved["workers"])
+
+
+def untiled(func, *args):
+    saved = get_tiling_config()
+    configure_tiling(memory_limit_mb=4096)
+    try:
+        return np.asarray(func(*args))
+    finally:
+        configure_tiling(memory_limit_mb=saved["memory_limit"] / (1024 * 1024))
+
+
+def test_strip_bounds_cover_image(small_tiles):
+    bounds = strip_bounds(301, 257 * 72)
+    assert len(bounds) > 1
+    assert bounds[0][0] == 0 and bounds[-1][1] == 301
+    assert all(end == next_start for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
+    assert strip_bounds(0, 100) == [(0, 0)]
+
+
+def test_tiled_warp_matches_untiled(image, small_tiles):
+    expected = untiled(apply_warp_effect, image, 0.5, WARP_PARAMS)
+    assert np.array_equal(np.asarray(apply_warp_effect(image, 0.5, WARP_PARAMS)), expected)
+
+
+@pytest.mark.parametrize("radius", [1, 5.5, 10])
+def test_tiled_blur_matches_full_blur(image, small_tiles, radius):
+    expected = np.asarray(image.filter(ImageFilter.GaussianBlur(radius)))
+    assert np.array_equal(np.asarray(apply_blur(image, radius)), expected)
+
+
+def test_tiled_rain_matches_untiled(image, small_tiles):
+    random.seed(3)
+    expected = untiled(apply_rain_effect, image, 0.5)
+    random.seed(3)
+    assert np.array_equal(np.asarray(apply_rain_effect(image, 0.5)), expected)
+
+
+def test_strips_run_on_thread_pool(image, small_tiles, monkeypatch):
+    calls = []
+    original_map = tiling.map_strips
+
+    def recording_map(func, bounds):
+        calls.append(len(bounds))
+        return original_map(func, bounds)
+
+    monkeypatch.setattr("utils.map_strips", recording_map)
+    apply_warp_effect(image, 0.5, WARP_PARAMS)
+    assert calls and calls[0] > 1
@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from backends import FakeBackend
+from distortion_plan import DistortionPlan
+from results_store import ResultsStore
+from watch import FolderWatcher, watch_and_analyze
+
+FIELDS = ["scene_description", "potential_hazards", "overall_safety"]
+PLAN = DistortionPlan.from_distortions([{'type': 'Brightness', 'intensity': 0.2}])
+
+
+def png_bytes(size=16, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def write_image(path, size=16, color='red'):
+    with open(path, "wb") as f:
+        f.write(png_bytes(size, color))
+
+
+def poll_until(watcher, count, timeout=5.0):
+    ready = []
+    deadline = time.monotonic() + timeout
+    while len(ready) < count and time.monotonic() < deadline:
+        ready.extend(watcher.poll())
+    return ready
+
+
+def make_watcher(directory, **kwargs):
+    kwargs.setdefault("settle_time", 0.2)
+    kwargs.setdefault("poll_interval", 0.05)
+    kwargs.setdefault("use_inotify", False)
+    return FolderWatcher(str(directory), **kwargs)
+
+
+@pytest.fixture(params=[False, True], ids=["polling", "inotify"])
+def use_inotify(request):
+    if request.param:
+        try:
+            FolderWatcher(os.getcwd(), use_inotify=True).close()
+        except OSError:
+            pytest.skip("inotify is not available")
+    return request.param
+
+
+def test_reports_only_new_files_after_they_settle(tmp_path, use_inotify):
+    write_image(tmp_path / "old.png")
+    watcher = make_watcher(tmp_path, use_inotify=use_inotify)
+    assert watcher.backend == ("inotify" if use_inotify else "polling")
+    write_image(tmp_path / "new.png")
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    assert watcher.poll(0.05) == []
+    assert poll_until(watcher, 1) == [str(tmp_path / "new.png")]
+    assert poll_until(watcher, 1, timeout=0.5) == []
+    watcher.close()
+
+
+def test_file_still_being_written_is_held_back(tmp_path, use_inotify):
+    watcher = make_watcher(tmp_path, settle_time=0.3, use_inotify=use_inotify)
+    data = png_bytes(64)
+    path = tmp_path / "frame.png"
+    with open(path, "wb") as f:
+        for start in range(0, len(data), 64):
+            f.write(data[start:start + 64])
+            f.flush()
+            assert watcher.poll(0.05) == []
+    assert poll_until(watcher, 1) == [str(path)]
+    watcher.close()
+
+
+def test_rewritten_file_is_reported_again(tmp_path):
+    watcher = make_watcher(tmp_path, full_scan_interval=0.1)
+    path = tmp_path / "frame.png"
+    write_image(path)
+    assert poll_until(watcher, 1) == [str(path)]
+    write_image(path, size=32, color='blue')
+    assert poll_until(watcher, 1) == [str(path)]
+
+
+def test_recursive_watch_picks_up_new_subfolders(tmp_path, use_inotify):
+    watcher = make_watcher(tmp_path, recursive=True, use_inotify=use_inotify)
+    (tmp_path / "cam2").mkdir()
+    write_image(tmp_path / "cam2" / "frame.png")
+    assert poll_until(watcher, 1) == [str(tmp_path / "cam2" / "frame.png")]
+    watcher.close()
+
+
+def test_state_file_skips_processed_files_on_restart(tmp_path):
+    folder = tmp_path / "frames"
+    folder.mkdir()
+    state = str(tmp_path / "state.jsonl")
+    watcher = make_watcher(folder, state_path=state, process_existing=True)
+    write_image(folder / "a.png")
+    assert poll_until(watcher, 1) == [str(folder / "a.png")]
+    watcher.mark_done(str(folder / "a.png"))
+
+    # Arrived while the watcher was stopped
+    write_image(folder / "b.png")
+    restarted = make_watcher(folder, state_path=state, process_existing=True)
+    assert poll_until(restarted, 2, timeout=1.0) == [str(folder / "b.png")]
+
+
+def test_watch_and_analyze_appends_to_one_run(tmp_path):
+    folder = tmp_path / "frames"
+    folder.mkdir()
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    watcher = make_watcher(folder)
+    for i in range(3):
+        write_image(folder / f"frame_{i}.png", color=(i * 60, 0, 0))
+    seen = []
+    stats = watch_and_analyze(watcher, PLAN, "Describe", "models/fake-flash", None, FIELDS, store,
+                              backend=FakeBackend(), max_files=3,
+                              on_result=lambda path, row, error: seen.append((os.path.basename(path), error)))
+    assert stats["analysed"] == 3 and stats["failed"] == 0
+    assert sorted(seen) == [(f"frame_{i}.png", None) for i in range(3)]
+
+    write_image(folder / "frame_3.png", color='green')
+    watch_and_analyze(watcher, PLAN, "Describe", "models/fake-flash", None, FIELDS, store,
+                      run_id=stats["run_id"], backend=FakeBackend(), max_files=1)
+    rows = store.query_results(run_id=stats["run_id"])
+    assert sorted(rows["image_name"]) == [f"frame_{i}.png" for i in range(4)]
+    assert set(rows["plan_hash"]) == {PLAN.content_hash}
+    assert store.list_runs()["item_count"].iloc[0] == 4
+    store.close()
+
+
+class FlakyBackend(FakeBackend):
+    """Fake backend whose first `failures` calls are rate limited."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def generate_content(self, model_name, content, timeout=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("429 Resource has been exhausted")
+        return super().generate_content(model_name, content, timeout=timeout)
+
+
+def test_model_errors_are_retried_and_not_marked_done(tmp_path):
+    folder = tmp_path / "frames"
+    folder.mkdir()
+    state = str(tmp_path / "state.jsonl")
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    watcher = make_watcher(folder, state_path=state)
+    write_image(folder / "a.png")
+    errors = []
+    stats = watch_and_analyze(watcher, PLAN, "Describe", "models/fake-flash", None, FIELDS, store,
+                              backend=FakeBackend(rate_limit_rate=1.0), max_files=1, max_retries=2,
+                              retry_delay=0.05, on_result=lambda path, row, error: errors.append(error))
+    assert stats["analysed"] == 0 and stats["failed"] == 1 and stats["retried"] == 2
+    assert "429" in str(errors[0])
+    assert not os.path.exists(state) and store.query_results(run_id=stats["run_id"]).empty
+
+    # Transient rate limits are retried until the frame is analysed
+    write_image(folder / "b.png", color='blue')
+    stats = watch_and_analyze(watcher, PLAN, "Describe", "models/fake-flash", None, FIELDS, store,
+                              run_id=stats["run_id"], backend=FlakyBackend(failures=2), max_files=1,
+                              retry_delay=0.05)
+    assert stats["analysed"] == 1 and stats["retried"] == 2
+    assert list(store.query_results(run_id=stats["run_id"])["image_name"]) == ["b.png"]
+    with open(state) as f:
+        assert "b.png" in f.read()
+    store.close()